@@ -0,0 +1,320 @@
+"""
+Compare the performance of configuration DB backends.
+
+Runs workloads against each backend and prints the throughput and
+latency percentiles of each operation:
+
+- creating, reading, updating and deleting keys one transaction each
+- listing prefixes holding 10, 100 and 1000 keys
+- transactions reading and writing 1, 10 and 50 keys
+- threads incrementing the same key, retrying on conflicts
+- the time from an update to a watcher seeing it
+- encoding and decoding processing blocks, without a backend
+
+Concurrent workloads are skipped for the memory backend, as its
+transactions are not isolated between threads and its watchers do not
+wait. The etcd3 backend is skipped if no server is reachable (see
+``SDP_CONFIG_HOST`` and ``SDP_CONFIG_PORT``). Use ``--json`` to write
+the results as JSON lines, one per backend and workload.
+
+Usage::
+
+    python scripts/benchmark_backends.py [-n KEYS] [--json FILE] [BACKEND ...]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from ska_sdp_config import Config, ProcessingBlock
+from ska_sdp_config.backend import MemoryBackend
+from ska_sdp_config.config import dict_to_json
+
+PREFIX = "/__bench"
+LIST_SIZES = (10, 100, 1000)
+TXN_SIZES = (1, 10, 50)
+WORKFLOW = {"type": "batch", "id": "bench", "version": "0.0.1"}
+
+
+def timed(calls):
+    """Run functions, returns their latencies in seconds."""
+    latencies = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _workloads(config, connect, count, threads):
+    """Yield (name, function) for each workload.
+
+    Functions return the latencies of their operations, and optionally
+    a dictionary of further results.
+    """
+    # pylint: disable=too-many-locals
+    backend = config.backend
+    keys = ["{}/{}/key".format(PREFIX, i) for i in range(count)]
+
+    def create(key):
+        for txn in backend.txn():
+            txn.create(key, "x" * 100)
+
+    def get(key):
+        for txn in backend.txn():
+            txn.get(key)
+
+    def update(key):
+        for txn in backend.txn():
+            txn.update(key, txn.get(key) + "y")
+
+    def delete(key):
+        for txn in backend.txn():
+            txn.delete(key)
+
+    def list_keys(prefix):
+        for txn in backend.txn():
+            txn.list_keys(prefix)
+
+    def read_write(size):
+        for txn in backend.txn():
+            for key in keys[:size]:
+                txn.update(key, txn.get(key) + "z")
+
+    yield "create", lambda: timed(lambda key=key: create(key) for key in keys)
+    yield "get", lambda: timed(lambda key=key: get(key) for key in keys)
+    yield "get+update", lambda: timed(lambda key=key: update(key) for key in keys)
+    for size in TXN_SIZES:
+        if size <= count:
+            yield "txn {} r/w".format(size), lambda size=size: timed(
+                lambda: read_write(size) for _ in range(max(10, count // size))
+            )
+    yield "delete", lambda: timed(lambda key=key: delete(key) for key in keys)
+
+    for size in LIST_SIZES:
+        prefix = "{}/list{}/".format(PREFIX, size)
+        for txn in backend.txn():
+            for start in range(0, size, 50):
+                for i in range(start, min(size, start + 50)):
+                    txn.create("{}{:06d}".format(prefix, i), "x" * 100)
+        yield "list ({} keys)".format(size), lambda prefix=prefix: timed(
+            lambda: list_keys(prefix) for _ in range(max(10, count // 10))
+        )
+
+    if not isinstance(backend, MemoryBackend):
+        yield "contended incr", lambda: _contention(connect, count, threads)
+        yield "watch latency", lambda: _watch_latency(config, count // 10)
+
+
+def _contention(connect, count, threads):
+    """Increment one key from several threads, each connected separately."""
+    key = PREFIX + "/counter"
+    with connect() as config:
+        for txn in config.backend.txn():
+            txn.create(key, "0")
+    latencies = []
+    attempts = []
+
+    def worker(config):
+        def increment():
+            for txn in config.backend.txn():
+                attempts.append(1)
+                txn.update(key, str(int(txn.get(key)) + 1))
+
+        latencies.extend(timed(increment for _ in range(count // threads)))
+
+    configs = [connect() for _ in range(threads)]
+    workers = [threading.Thread(target=worker, args=(cfg,)) for cfg in configs]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    for cfg in configs:
+        cfg.close()
+    return latencies, {"threads": threads, "attempts": len(attempts)}
+
+
+def _watch_latency(config, count):
+    """Measure time from committing an update to a watcher reading it."""
+    key = PREFIX + "/watched"
+    for txn in config.backend.txn():
+        txn.create(key, "0")
+    latencies = []
+    seen = threading.Event()
+    stop = threading.Event()
+
+    def follow():
+        last = "0"
+        for watcher in config.watcher(timeout=1):
+            for txn in watcher.txn():
+                value = txn.raw.get(key)
+            if value != last:
+                latencies.append(time.perf_counter() - float(value))
+                last = value
+                seen.set()
+            if stop.is_set():
+                return
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    # Let the watcher start watching
+    time.sleep(0.1)
+    for _ in range(count):
+        seen.clear()
+        for txn in config.backend.txn():
+            txn.update(key, repr(time.perf_counter()))
+        seen.wait(5)
+    stop.set()
+    thread.join()
+    return latencies
+
+
+def _entity_workloads(count):
+    """Yield (name, function) for encoding and decoding entities."""
+    pblocks = [
+        ProcessingBlock(
+            "pb-bench-{:06d}".format(i),
+            "sbi-bench",
+            WORKFLOW,
+            parameters={"channels": list(range(20))},
+            dependencies=[{"pb_id": "pb-bench-000000", "kind": ["calibration"]}],
+        )
+        for i in range(count)
+    ]
+    texts = [dict_to_json(pblock.to_dict()) for pblock in pblocks]
+    yield "pb encode", lambda: timed(
+        lambda pblock=pblock: dict_to_json(pblock.to_dict()) for pblock in pblocks
+    )
+    yield "pb decode", lambda: timed(
+        lambda text=text: ProcessingBlock(**json.loads(text)) for text in texts
+    )
+
+
+def percentile(ordered, percent):
+    """Get a percentile of sorted latencies, None if there are none."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def open_output(path):
+    """
+    Open the file to write results to.
+
+    :param path: Path of file, "-" for standard output, None for none
+    :returns: (stream for the table, stream for results or None). The
+        table goes to standard error if results go to standard output.
+    """
+    if path == "-":
+        return sys.stderr, sys.stdout
+    if path:
+        return sys.stdout, open(path, "w", encoding="utf-8")  # pylint: disable=R1732
+    return sys.stdout, None
+
+
+def _connect(name, tmpdir, **cargs):
+    """Connect to a backend, keeping local databases in a directory."""
+    if name in ("shm", "sqlite"):
+        cargs["path"] = os.path.join(tmpdir, "bench." + name)
+    return Config(backend=name, **cargs)
+
+
+def _result(backend, workload, latencies, elapsed, extra=None):
+    """Summarise the latencies of a workload."""
+    ordered = sorted(latencies)
+
+    def microseconds(value):
+        return None if value is None else round(1e6 * value, 1)
+
+    result = {
+        "backend": backend,
+        "workload": workload,
+        "ops": len(ordered),
+        "seconds": round(elapsed, 6),
+        "ops_per_s": round(len(ordered) / elapsed, 1) if elapsed else None,
+        "mean_us": round(1e6 * sum(ordered) / len(ordered), 1) if ordered else None,
+        "p50_us": microseconds(percentile(ordered, 50)),
+        "p99_us": microseconds(percentile(ordered, 99)),
+        "max_us": round(1e6 * ordered[-1], 1) if ordered else None,
+    }
+    result.update(extra or {})
+    return result
+
+
+def _run(name, workloads, table, output):
+    """Run workloads, print and write their results."""
+    for workload, func in workloads:
+        start = time.perf_counter()
+        latencies = func()
+        elapsed = time.perf_counter() - start
+        extra = None
+        if isinstance(latencies, tuple):
+            latencies, extra = latencies
+        result = _result(name, workload, latencies, elapsed, extra)
+        print(
+            "{:8} {:20} {:>12} {:>10} {:>10} {:>10}".format(
+                name,
+                workload,
+                "{:.0f}".format(result["ops_per_s"] or 0),
+                *(
+                    "-" if result[field] is None else "{:.1f}".format(result[field])
+                    for field in ("mean_us", "p50_us", "p99_us")
+                ),
+            ),
+            file=table,
+        )
+        if output is not None:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+
+def main(argv=None):
+    """Run benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", type=int, default=1000, help="number of keys")
+    parser.add_argument(
+        "-t", type=int, default=8, help="number of threads for contention"
+    )
+    parser.add_argument(
+        "--json", metavar="FILE", help='write results as JSON lines ("-" for stdout)'
+    )
+    parser.add_argument(
+        "backends", nargs="*", default=["memory", "shm", "sqlite", "etcd3"]
+    )
+    args = parser.parse_args(argv)
+
+    table, output = open_output(args.json)
+
+    print(
+        "{:8} {:20} {:>12} {:>10} {:>10} {:>10}".format(
+            "backend", "workload", "ops/s", "mean us", "p50 us", "p99 us"
+        ),
+        file=table,
+    )
+    try:
+        _run("-", _entity_workloads(args.n), table, output)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in args.backends:
+                try:
+                    config = _connect(name, tmpdir)
+                    config.backend.delete(PREFIX, must_exist=False, recursive=True)
+                except Exception as err:  # pylint: disable=broad-except
+                    print("{:8} skipped: {}".format(name, err), file=table)
+                    continue
+                with config:
+                    workloads = _workloads(
+                        config, lambda name=name: _connect(name, tmpdir), args.n, args.t
+                    )
+                    _run(name, workloads, table, output)
+                    config.backend.delete(PREFIX, must_exist=False, recursive=True)
+    finally:
+        if output not in (None, sys.stdout):
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark the etcd3 backend at different network round trip times.
+
+Serves the etcd v3 gateway stand-in through a proxy adding latency
+(see :py:mod:`ska_sdp_config.testing.fault_proxy`), and measures for
+each round trip time:
+
+- transactions making one, two and eleven requests
+- reading ten keys with one batched request (``get_many``)
+- the time from an update to a watcher seeing it
+- the same after all connections got reset, so the watch has to
+  reconnect and resume first
+
+Use ``--json`` to write the results as JSON lines, one per round trip
+time and scenario.
+
+Usage::
+
+    python scripts/benchmark_latency.py [-n COUNT] [--rtt MS,...] [--json FILE]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from benchmark_backends import open_output, percentile, timed
+
+from ska_sdp_config import Config
+from ska_sdp_config.testing.etcd3_gateway import Etcd3Gateway
+from ska_sdp_config.testing.fault_proxy import FaultProxy
+
+PREFIX = "/__bench_latency"
+KEYS = ["{}/key{}".format(PREFIX, i) for i in range(10)]
+
+
+def _scenarios(config, proxy, count):
+    """Yield (name, function returning latencies) for each scenario."""
+    backend = config.backend
+
+    def get():
+        for txn in backend.txn():
+            txn.get(KEYS[0])
+
+    def update():
+        for txn in backend.txn():
+            txn.update(KEYS[0], txn.get(KEYS[0]) + "y")
+
+    def read_write():
+        for txn in backend.txn():
+            for key in KEYS:
+                txn.get(key)
+            txn.update(KEYS[0], "z")
+
+    def get_many():
+        for txn in backend.txn():
+            txn.get_many(KEYS)
+
+    yield "get", lambda: timed(get for _ in range(count))
+    yield "get+update", lambda: timed(update for _ in range(count))
+    yield "txn 10 reads+write", lambda: timed(read_write for _ in range(count))
+    yield "get_many 10", lambda: timed(get_many for _ in range(count))
+    yield "watch notify", lambda: _watch(config, count)
+    yield "watch recovery", lambda: _watch(config, count, proxy.reset)
+
+
+def _watch(config, count, fault=None):
+    """Measure time from an update to a watcher reading it.
+
+    :param fault: Function to call before each update
+    """
+    key = PREFIX + "/watched"
+    latencies = []
+    seen = threading.Event()
+    stop = threading.Event()
+    started = {}
+
+    def follow():
+        last = None
+        for watcher in config.watcher(timeout=1):
+            for txn in watcher.txn():
+                value = txn.raw.get(key)
+            if last is not None and value != last:
+                latencies.append(time.perf_counter() - started[value])
+                seen.set()
+            last = value
+            if stop.is_set():
+                return
+
+    for txn in config.backend.txn():
+        txn.create(key, "0")
+    thread = threading.Thread(target=follow)
+    thread.start()
+    # Let the watcher start watching
+    time.sleep(0.2)
+    for i in range(1, count + 1):
+        seen.clear()
+        if fault is not None:
+            fault()
+        started[str(i)] = time.perf_counter()
+        for txn in config.backend.txn():
+            txn.update(key, str(i))
+        seen.wait(5)
+    stop.set()
+    thread.join()
+    for txn in config.backend.txn():
+        txn.delete(key)
+    return latencies
+
+
+def _result(rtt, scenario, latencies):
+    """Summarise the latencies of a scenario."""
+    ordered = sorted(latencies)
+
+    def milliseconds(value):
+        return None if value is None else round(1e3 * value, 2)
+
+    return {
+        "rtt_ms": rtt,
+        "scenario": scenario,
+        "ops": len(ordered),
+        "mean_ms": milliseconds(sum(ordered) / len(ordered)) if ordered else None,
+        "p50_ms": milliseconds(percentile(ordered, 50)),
+        "p99_ms": milliseconds(percentile(ordered, 99)),
+    }
+
+
+def main(argv=None):
+    """Run benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", type=int, default=20, help="operations per scenario")
+    parser.add_argument(
+        "--rtt", default="0,5,10,20,50", help="round trip times in milliseconds"
+    )
+    parser.add_argument(
+        "--json", metavar="FILE", help='write results as JSON lines ("-" for stdout)'
+    )
+    args = parser.parse_args(argv)
+
+    table, output = open_output(args.json)
+
+    print(
+        "{:>7} {:20} {:>10} {:>10} {:>10}".format(
+            "rtt ms", "scenario", "mean ms", "p50 ms", "p99 ms"
+        ),
+        file=table,
+    )
+    try:
+        for rtt in [float(rtt) for rtt in args.rtt.split(",")]:
+            with Etcd3Gateway() as gateway, FaultProxy(
+                gateway.host, gateway.port, latency=rtt / 2000
+            ) as proxy, Config(
+                backend="etcd3", host=proxy.host, port=proxy.port
+            ) as config:
+                for txn in config.backend.txn():
+                    for key in KEYS:
+                        txn.create(key, "x")
+                for scenario, func in _scenarios(config, proxy, args.n):
+                    result = _result(rtt, scenario, func())
+                    print(
+                        "{:7g} {:20} {:>10} {:>10} {:>10}".format(
+                            rtt,
+                            scenario,
+                            *(
+                                "-" if result[field] is None else result[field]
+                                for field in ("mean_ms", "p50_ms", "p99_ms")
+                            ),
+                        ),
+                        file=table,
+                    )
+                    if output is not None:
+                        output.write(json.dumps(result) + "\n")
+                        output.flush()
+    finally:
+        if output not in (None, sys.stdout):
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark claiming batch processing blocks by many workers.
+
+Queues processing blocks, then starts worker threads that claim them
+until none are left, and prints the throughput. The "queue" mode uses
+:py:class:`ska_sdp_config.batch_queue.BatchQueue`, where workers wait in
+line. The "race" mode has every worker list all processing blocks and
+race to take the first one without owner, which is what workers did
+before, and reports how many transaction attempts that took. The memory
+backend is not supported, as its transactions are not isolated between
+threads. The etcd3 backend is skipped if no server is reachable (see
+``SDP_CONFIG_HOST`` and ``SDP_CONFIG_PORT``).
+
+Usage::
+
+    python scripts/benchmark_queue.py [-n PBS] [-w WORKERS] [-m MODE] [BACKEND ...]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+
+from benchmark_backends import _connect
+
+from ska_sdp_config import ProcessingBlock
+from ska_sdp_config.backend import ConfigCollision
+
+PREFIX = "/__bench_queue"
+WORKFLOW = {"type": "batch", "id": "bench", "version": "0.0.1"}
+
+
+def _fill(config, count, batch_size=50):
+    """Create processing blocks and queue them."""
+    queue = config.batch_queue()
+    for start in range(0, count, batch_size):
+        for txn in config.txn():
+            for i in range(start, min(count, start + batch_size)):
+                pb_id = "pb-bench-{:06d}".format(i)
+                txn.create_processing_block(ProcessingBlock(pb_id, None, WORKFLOW))
+                queue.put(txn, pb_id, priority=i % 10)
+
+
+def _queue_worker(config, claimed, _attempts):
+    queue = config.batch_queue()
+    with config.lease() as lease:
+        while True:
+            pb_id = queue.claim(lease, timeout=1)
+            if pb_id is None:
+                return
+            claimed.append(pb_id)
+
+
+def _race_worker(config, claimed, attempts):
+    with config.lease() as lease:
+        while True:
+            try:
+                for txn in config.txn():
+                    attempts.append(1)
+                    owners = txn.get_all_processing_block_owners()
+                    states = txn.get_all_processing_block_states()
+                    pb_id = None
+                    for candidate in txn.list_processing_blocks():
+                        if candidate not in owners and candidate not in states:
+                            pb_id = candidate
+                            txn.take_processing_block(pb_id, lease)
+                            # Owners vanish with the lease, states stay
+                            txn.create_processing_block_state(
+                                pb_id, {"state": "RUNNING"}
+                            )
+                            break
+            except ConfigCollision:
+                # Somebody else took it since we listed the owners
+                continue
+            if pb_id is None:
+                return
+            claimed.append(pb_id)
+
+
+def _run(name, tmpdir, mode, count, workers):
+    """Run benchmark, returns (claimed, attempts, elapsed)."""
+    with _connect(name, tmpdir, global_prefix=PREFIX) as config:
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+        _fill(config, count)
+
+    claimed = []
+    attempts = []
+    target = _queue_worker if mode == "queue" else _race_worker
+    configs = [_connect(name, tmpdir, global_prefix=PREFIX) for _ in range(workers)]
+    threads = [
+        threading.Thread(target=target, args=(cfg, claimed, attempts))
+        for cfg in configs
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for cfg in configs:
+        cfg.close()
+    with _connect(name, tmpdir, global_prefix=PREFIX) as config:
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+    return len(claimed), len(attempts), elapsed
+
+
+def main(argv=None):
+    """Run benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", type=int, default=10000, help="number of PBs")
+    parser.add_argument("-w", type=int, default=100, help="number of workers")
+    parser.add_argument(
+        "-m", "--mode", action="append", choices=["queue", "race"], help="mode"
+    )
+    parser.add_argument("backends", nargs="*", default=["shm", "sqlite", "etcd3"])
+    args = parser.parse_args(argv)
+
+    print(
+        "{:8} {:6} {:>8} {:>8} {:>12} {:>10}".format(
+            "backend", "mode", "claimed", "workers", "claims/s", "attempts"
+        )
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in args.backends:
+            for mode in args.mode or ["queue"]:
+                try:
+                    claimed, attempts, elapsed = _run(
+                        name, tmpdir, mode, args.n, args.w
+                    )
+                except Exception as err:  # pylint: disable=broad-except
+                    print("{:8} skipped: {}".format(name, err))
+                    break
+                print(
+                    "{:8} {:6} {:8} {:8} {:12.0f} {:>10}".format(
+                        name,
+                        mode,
+                        claimed,
+                        args.w,
+                        claimed / elapsed,
+                        attempts if mode == "race" else "-",
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Benchmark sharded ownership of processing blocks.
+
+Starts member threads, each running a watcher loop like a processing
+controller replica, then creates processing blocks in batches and waits
+until all are owned. The "shard" mode uses
+:py:class:`ska_sdp_config.sharding.ShardMembership`, where every member
+only takes processing blocks assigned to it. The "race" mode has every
+member try to take every processing block without owner, one
+transaction each, like the processing controller does. Reports the
+number of transaction attempts, how many of those conflicted (were
+repeated, collided or found the processing block taken already), and
+the time it took to rebalance after the lease of one member was
+revoked. The etcd3 backend is skipped if no
+server is reachable (see ``SDP_CONFIG_HOST`` and ``SDP_CONFIG_PORT``).
+
+Usage::
+
+    python scripts/benchmark_sharding.py [-n PBS] [-w MEMBERS] [-m MODE] [BACKEND ...]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+
+from benchmark_backends import _connect
+
+from ska_sdp_config import ProcessingBlock
+from ska_sdp_config.backend import ConfigCollision
+
+PREFIX = "/__bench_shard"
+WORKFLOW = {"type": "realtime", "id": "bench", "version": "0.0.1"}
+BATCH_SIZE = 10
+
+
+def _race_claim(config, lease, stats):
+    """Try to take every processing block without owner, one at a time."""
+    for txn in config.txn():
+        owners = txn.get_all_processing_block_owners()
+        pb_ids = [
+            pb_id for pb_id in txn.list_processing_blocks() if pb_id not in owners
+        ]
+    for pb_id in pb_ids:
+        try:
+            for txn in config.txn():
+                stats["attempts"] += 1
+                taken = txn.get_processing_block_owner(pb_id) is None
+                if taken:
+                    txn.take_processing_block(pb_id, lease)
+            if taken:
+                stats["commits"] += 1
+        except ConfigCollision:
+            pass
+
+
+class _Member(threading.Thread):
+    """Controller replica taking processing blocks."""
+
+    def __init__(self, config, member_id, mode, stats):
+        super().__init__()
+        self.config = config
+        self.member_id = member_id
+        self.mode = mode
+        self.stats = stats
+        self.stop = threading.Event()
+        self.joined = threading.Event()
+        self.revoked = None
+
+    def run(self):
+        shards = self.config.shard_membership("bench", member_id=self.member_id)
+        with self.config.lease() as lease:
+            shards.join(lease)
+            self.joined.set()
+            for watcher in self.config.watcher(timeout=0.05):
+                if self.stop.is_set():
+                    break
+                if self.mode == "race":
+                    # Only to wait for changes
+                    for txn in watcher.txn():
+                        txn.list_processing_blocks()
+                        txn.get_all_processing_block_owners()
+                    _race_claim(self.config, lease, self.stats)
+                    continue
+                for txn in watcher.txn():
+                    self.stats["attempts"] += 1
+                    shards.claim(txn, lease)
+                self.stats["commits"] += 1
+            # The lease gets revoked when leaving the block
+            self.revoked = time.perf_counter()
+
+
+def _wait_owned(config, count, timeout=120):
+    """Wait until count processing blocks are owned."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for txn in config.txn():
+            owners = txn.get_all_processing_block_owners()
+        if len(owners) >= count:
+            return
+        time.sleep(0.005)
+    raise RuntimeError("Only {} of {} PBs got owned".format(len(owners), count))
+
+
+def _run(name, tmpdir, mode, count, members):
+    """Run benchmark, returns (attempts, conflicts, elapsed, rebalance)."""
+    # pylint: disable=too-many-arguments,too-many-locals
+    config = _connect(name, tmpdir, global_prefix=PREFIX)
+    config.backend.delete(PREFIX, must_exist=False, recursive=True)
+
+    stats = {"attempts": 0, "commits": 0}
+    threads = [
+        _Member(
+            _connect(name, tmpdir, global_prefix=PREFIX),
+            "member-{}".format(i),
+            mode,
+            stats,
+        )
+        for i in range(members)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+            thread.joined.wait()
+
+        # Processing blocks arrive in batches, as they would with
+        # scheduling block instances
+        start = time.perf_counter()
+        for first in range(0, count, BATCH_SIZE):
+            last = min(count, first + BATCH_SIZE)
+            for txn in config.txn():
+                for i in range(first, last):
+                    pb_id = "pb-bench-{:06d}".format(i)
+                    txn.create_processing_block(ProcessingBlock(pb_id, None, WORKFLOW))
+            _wait_owned(config, last)
+        elapsed = time.perf_counter() - start
+        attempts, commits = stats["attempts"], stats["commits"]
+
+        # Revoke the lease of one member, as would happen once it dies
+        # and its lease expires. Its processing blocks lose their owner.
+        victim = threads.pop()
+        victim.stop.set()
+        victim.join()
+        _wait_owned(config, count)
+        rebalance = time.perf_counter() - victim.revoked
+    finally:
+        for thread in threads:
+            thread.stop.set()
+        for thread in threads:
+            thread.join()
+            thread.config.close()
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+        config.close()
+    return attempts, attempts - commits, elapsed, rebalance
+
+
+def main(argv=None):
+    """Run benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", type=int, default=500, help="number of PBs")
+    parser.add_argument("-w", type=int, default=4, help="number of members")
+    parser.add_argument(
+        "-m", "--mode", action="append", choices=["shard", "race"], help="mode"
+    )
+    parser.add_argument("backends", nargs="*", default=["shm", "sqlite", "etcd3"])
+    args = parser.parse_args(argv)
+
+    print(
+        "{:8} {:6} {:>6} {:>8} {:>10} {:>10} {:>10} {:>14}".format(
+            "backend",
+            "mode",
+            "PBs",
+            "members",
+            "attempts",
+            "conflicts",
+            "time [s]",
+            "rebalance [ms]",
+        )
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in args.backends:
+            for mode in args.mode or ["race", "shard"]:
+                try:
+                    attempts, conflicts, elapsed, rebalance = _run(
+                        name, tmpdir, mode, args.n, args.w
+                    )
+                except Exception as err:  # pylint: disable=broad-except
+                    print("{:8} skipped: {}".format(name, err))
+                    break
+                print(
+                    "{:8} {:6} {:6} {:8} {:10} {:10} {:10.2f} {:14.1f}".format(
+                        name,
+                        mode,
+                        args.n,
+                        args.w,
+                        attempts,
+                        conflicts,
+                        elapsed,
+                        rebalance * 1000,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
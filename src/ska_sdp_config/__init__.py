@@ -8,7 +8,7 @@ updates to the stored configuration information.
 """
 
 from .version import __version__
-from .backend import ConfigCollision, ConfigVanished
+from .backend import ConfigCollision, ConfigTimeout, ConfigVanished
 from .config import Config
 from .entity import ProcessingBlock, Deployment
 
@@ -16,6 +16,7 @@ __all__ = [
     "__version__",
     "Config",
     "ConfigCollision",
+    "ConfigTimeout",
     "ConfigVanished",
     "ProcessingBlock",
     "Deployment",
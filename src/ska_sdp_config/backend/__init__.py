@@ -1,5 +1,7 @@
 """Backends for SKA SDP configuration DB."""
 
-from .common import ConfigCollision, ConfigVanished
+from .common import ConfigCollision, ConfigTimeout, ConfigVanished
 from .etcd3 import Etcd3Backend
 from .memory import MemoryBackend
+from .shm import SharedMemoryBackend
+from .sqlite import SQLiteBackend
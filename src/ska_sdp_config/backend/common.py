@@ -1,5 +1,17 @@
 """Common functionality for implementing backends."""
 
+# pylint: disable=too-many-lines
+
+import contextlib
+import itertools
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .explain import TransactionReport, payload_size
+from .metrics import instrumented, instrumented_commit
+from .tracing import maybe_span, traced, traced_commit
+
 
 # Some utilities for handling tagging paths.
 #
@@ -46,6 +58,11 @@ def _untag_depth(path: str) -> str:
     return path[slash_ix:]
 
 
+def _prefix_end(prefix: str) -> str:
+    """Return the smallest string greater than all strings with the prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
 def _check_path(path: str) -> None:
     if path and path[-1] == "/":
         raise ValueError("Path should not have a trailing '/'!")
@@ -67,3 +84,1053 @@ class ConfigVanished(RuntimeError):
         """Instantiate the exception."""
         self.path = path
         super().__init__(message)
+
+
+class ConfigTimeout(TimeoutError):
+    """Exception generated if a request or transaction missed its deadline.
+
+    If the deadline passed while committing a transaction, the
+    transaction might or might not have been applied.
+    """
+
+
+# Deadline of requests made by the current thread
+_DEADLINE = threading.local()
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """
+    Bound the time requests made by the current thread in a block can take.
+
+    Transactions raise :py:class:`ConfigTimeout` instead of retrying
+    once the deadline passed, and requests to the database get timed
+    out. Nested scopes can only shorten the deadline.
+
+    :param deadline: Time (as in :py:func:`time.time`) by which requests
+        must have finished, None for no deadline
+    """
+    previous = getattr(_DEADLINE, "value", None)
+    if previous is not None and (deadline is None or previous < deadline):
+        deadline = previous
+    _DEADLINE.value = deadline
+    try:
+        yield
+    finally:
+        _DEADLINE.value = previous
+
+
+def remaining_time(what: str = "Request") -> Optional[float]:
+    """
+    Get time left until the deadline of the current thread.
+
+    :param what: What is checked, for the exception message
+    :returns: Time left in seconds, None if there is no deadline
+    :raises: ConfigTimeout if the deadline has passed
+    """
+    deadline = getattr(_DEADLINE, "value", None)
+    if deadline is None:
+        return None
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise ConfigTimeout("{} missed its deadline!".format(what))
+    return remaining
+
+
+class Revision:
+    """Identifies the revision of a local database backend."""
+
+    def __init__(self, revision: int, mod_revision: int = None):
+        """Instantiate the revision."""
+        self._revision = revision
+        self._mod_revision = mod_revision
+
+    def __repr__(self):
+        """Build string representation."""
+        return "Revision({},{})".format(self.revision, self.mod_revision)
+
+    @property
+    def revision(self):
+        """The database revision at the point in time when the query was made."""
+        return self._revision
+
+    @property
+    def mod_revision(self):
+        """The revision when a key was last modified (None if it does not exist)."""
+        return self._mod_revision
+
+
+def _depth_range(recurse):
+    """Return the depths covered by a ``recurse`` parameter."""
+    try:
+        return iter(recurse)
+    except TypeError:
+        return range(recurse + 1)
+
+
+class _RetryLoop:
+    """Retry and loop logic shared by the transaction classes.
+
+    Subclasses implement ``commit()``, ``reset()``, ``_explain()`` and
+    ``_do_watch()``, and call :py:meth:`_reset_loop` from ``reset()``.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        max_retries: int,
+        deadline: float,
+        report: TransactionReport,
+        metrics,
+        tracer,
+    ):
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self._max_retries = max_retries
+        self._deadline = deadline
+        self._report = report
+        self._metrics = metrics
+        self._tracer = tracer
+        self._retries = 0
+        self._committed = False
+        self._loop = False
+        self._watch = False
+        self._watch_timeout = None
+
+    def commit(self) -> bool:
+        """Commit the transaction, returning whether it succeeded."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Reset the transaction so it can be restarted after commit()."""
+        raise NotImplementedError
+
+    def _explain(self):
+        """Record what committing would send in the report."""
+        raise NotImplementedError
+
+    def _do_watch(self):
+        """Wait for a change on one of the values read, or a timeout."""
+        raise NotImplementedError
+
+    def _reset_loop(self):
+        """Clear the loop request after an attempt."""
+        self._committed = False
+        self._loop = False
+        self._watch = False
+        self._watch_timeout = None
+
+    def _request_loop(self, watch: bool, watch_timeout: float):
+        """Request that the transaction gets repeated, see ``loop()``."""
+        if self._loop:
+            # If called multiple times, looping immediately takes precedence
+            self._watch = self._watch and watch
+        else:
+            self._loop = True
+            self._watch = watch
+        if watch and watch_timeout is not None:
+            self._watch_timeout = watch_timeout
+
+    def _iterate(self):
+        # Explain mode: run once, but do not commit
+        if self._report is not None:
+            yield self
+            self._explain()
+            return
+
+        for attempt in itertools.count():
+            if self._retries > self._max_retries:
+                break
+
+            # Give up once the deadline passed
+            remaining_time("Transaction")
+
+            # Should build up a transaction, then try to commit. Only
+            # hold a span open across the yield if tracing, as closing
+            # the generator early has to unwind it.
+            if self._tracer is None:
+                yield self
+                committed = self.commit()
+            else:
+                with self._tracer.span("txn", attempt=attempt):
+                    yield self
+                    committed = self.commit()
+
+            # Count how many times we have tried
+            if not committed:
+                self._retries += 1
+                if self._metrics is not None:
+                    self._metrics.retries.inc()
+            else:
+                self._retries = 0
+
+                # No further loop?
+                if not self._loop:
+                    return
+
+                # Use watches? Then wait for something to happen
+                # before looping.
+                if self._watch:
+                    self._do_watch()
+
+            # Repeat after reset otherwise
+            self.reset()
+
+        # Ran out of repeats? Fail
+        raise RuntimeError(
+            "Transaction did not succeed after {} retries!".format(self._max_retries)
+        )
+
+
+class OptimisticTransaction(_RetryLoop):
+    """A series of queries and updates to be executed atomically.
+
+    Implements the optimistic, STM-style protocol of
+    :py:class:`Etcd3Transaction` for local backends: all reads of an
+    attempt see the database as it was at the first read, and are
+    logged together with the revision at which the key was last
+    modified, while writes are deferred until :py:meth:`commit`. The
+    commit asks the backend to apply the writes only if none of the
+    keys read and none of the key ranges listed have changed in the
+    meantime.
+
+    The backend needs to implement ``snapshot()``, returning a
+    snapshot of the database with a ``revision`` attribute,
+    ``read(path)`` returning the value and mod revision of a key,
+    ``read_keys(path, depth)`` returning the keys at the given depth
+    with the given prefix, ``read_created(path, depth)`` returning
+    them ordered by create revision and ``close()``. Furthermore ``check(gets,
+    lists)`` to validate a read log against the current state, and
+    ``commit(gets, lists, updates)`` to validate it and apply updates
+    atomically, returning the new revision (or None if validation
+    failed).
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        backend,
+        max_retries: int = 64,
+        deadline: float = None,
+        report: TransactionReport = None,
+    ):
+        """Initialise transaction."""
+        super().__init__(
+            max_retries,
+            deadline,
+            report,
+            getattr(backend, "metrics", None),
+            getattr(backend, "tracer", None),
+        )
+        self._backend = backend
+
+        self._revision = None  # Revision after commit
+        self._snapshot = None  # Snapshot reads are made from
+        self._get_queries = {}  # path -> (value, mod_revision)
+        self._list_queries = {}  # (path, depth) -> keys
+        self._updates = {}  # path -> (value, lease)
+
+        self._commit_callbacks = []
+        self._triggered = threading.Event()
+
+    def _ensure_uncommitted(self):
+        if self._committed:
+            raise RuntimeError("Attempted to modify committed transaction!")
+
+    @property
+    def revision(self) -> int:
+        """The last-committed database revision.
+
+        Only valid to call after the transaction has been comitted.
+        """
+        if not self._committed:
+            raise RuntimeError("Revision is undefined on an uncommitted transaction!")
+        return self._revision
+
+    def _read_snapshot(self):
+        """Get the snapshot to read from, taking it on the first read."""
+        if self._snapshot is None:
+            self._snapshot = self._backend.snapshot()
+        return self._snapshot
+
+    def _close_snapshot(self):
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    @traced("get")
+    def get(self, path: str) -> str:
+        """
+        Get value of a key.
+
+        :param path: Path of key to query
+        :returns: Key value. None if it doesn't exist.
+        """
+        self._ensure_uncommitted()
+        _check_path(path)
+
+        # Check whether it was written as part of this transaction
+        if path in self._updates:
+            return self._updates[path][0]
+
+        # Check whether we already have the request response
+        if path not in self._get_queries:
+            self._backend.throttle("read")
+            self._get_queries[path] = self._read_snapshot().read(path)
+            if self._report is not None:
+                self._report.read(
+                    "get", path, size=payload_size([self._get_queries[path][0]])
+                )
+        return self._get_queries[path][0]
+
+    @traced("get_many")
+    def get_many(self, paths: Iterable[str], known: dict = None) -> dict:
+        """
+        Get values of several keys.
+
+        Local backends read keys cheaply, so this simply gets them one
+        by one.
+
+        :param paths: Paths of keys to query
+        :param known: not used, for compatibility with etcd
+        :returns: {path: (value, mod_revision)}
+        """
+        # pylint: disable=unused-argument
+        result = {}
+        for path in paths:
+            value = self.get(path)
+            if path in self._updates:
+                result[path] = (value, None)
+            else:
+                result[path] = (value, self._get_queries[path][1])
+        return result
+
+    @traced("list_keys")
+    def list_keys(self, path: str, recurse: int = 0):
+        """
+        List keys under given path.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :returns: sorted key list
+        """
+        self._ensure_uncommitted()
+        path_depth = _depth(path)
+
+        keys = []
+        for depth in _depth_range(recurse):
+            query = (path, path_depth + depth)
+            if query not in self._list_queries:
+                self._backend.throttle("read")
+                self._list_queries[query] = self._read_snapshot().read_keys(*query)
+                if self._report is not None:
+                    self._report.read(
+                        "list_keys",
+                        path,
+                        size=payload_size(self._list_queries[query]),
+                    )
+
+            # We might have created or deleted an uncommitted key that
+            # falls into the range
+            tagged_path = _tag_depth(*query)
+            matching_vals = [
+                kv
+                for kv in self._updates.items()
+                if _tag_depth(kv[0]).startswith(tagged_path)
+            ]
+            added_keys = {key for key, val in matching_vals if val[0] is not None}
+            removed_keys = {key for key, val in matching_vals if val[0] is None}
+            keys.extend(set(self._list_queries[query]) - removed_keys | added_keys)
+
+        return sorted(keys)
+
+    @traced("list_created")
+    def list_created(self, path: str, limit: int = None) -> List[str]:
+        """
+        List keys under given path, oldest first.
+
+        Keys are ordered by the revision they were created at, with
+        keys created by this transaction last. Besides the listing, the
+        keys returned get read, so that a key deleted and created again
+        meanwhile fails the commit.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param limit: Maximum number of keys to return
+        :returns: key list
+        """
+        self._ensure_uncommitted()
+        query = (path, _depth(path))
+        self._backend.throttle("read")
+        created = self._read_snapshot().read_created(*query)
+        if self._report is not None:
+            self._report.read("list_created", path, size=payload_size(created))
+        self._list_queries.setdefault(query, sorted(created))
+
+        tagged_path = _tag_depth(*query)
+        pending = [
+            (key, value)
+            for key, (value, _) in self._updates.items()
+            if _tag_depth(key).startswith(tagged_path)
+        ]
+        removed = {key for key, value in pending if value is None}
+        keys = [key for key in created if key not in removed]
+        existing = set(created)
+        keys += [
+            key for key, value in pending if value is not None and key not in existing
+        ]
+        if limit is not None:
+            keys = keys[:limit]
+        for key in keys:
+            self.get(key)
+        return keys
+
+    @traced("list_values")
+    def list_values(self, path: str, recurse: int = 0):
+        """
+        List keys under given path, together with their values.
+
+        Local backends read keys cheaply, so this simply gets every
+        listed key. The reads get validated on commit as usual.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :returns: sorted list of (key, value) pairs
+        """
+        return list(self.iter_values(path, recurse))
+
+    def iter_values(self, path: str, recurse: int = 0, batch_size: int = 100):
+        """
+        Iterate over keys under given path, together with their values.
+
+        Values get read as the iterator is consumed.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :param batch_size: not used, for compatibility with etcd
+        :returns: iterator of (key, value) pairs, sorted by key
+        """
+        # pylint: disable=unused-argument
+        for key in self.list_keys(path, recurse):
+            yield (key, self.get(key))
+
+    def create(self, path: str, value: str, lease=None, check: bool = True):
+        """Create a key and initialise it with the value.
+
+        Fails if the key already exists. If a lease is given, the key will
+        automatically get deleted once it expires.
+
+        :param path: Path to create
+        :param value: Value to set
+        :param lease: Lease to associate
+        :param check: Read the key to check that it doesn't exist yet.
+            Otherwise the commit just requires it not to exist, and
+            fails (and gets retried) if it does.
+        :raises: ConfigCollision
+        """
+        self._ensure_uncommitted()
+        if not check and path not in self._get_queries and path not in self._updates:
+            _check_path(path)
+            self._get_queries[path] = (None, None)
+        if self.get(path) is not None:
+            raise ConfigCollision(
+                path, "Cannot create {}, as it already exists!".format(path)
+            )
+        self._updates[path] = (str(value), lease)
+
+    def update(self, path: str, value: str):
+        """
+        Update an existing key. Fails if the key does not exist.
+
+        :param path: Path to update
+        :param value: Value to set
+        :raises: ConfigVanished
+        """
+        self._ensure_uncommitted()
+        if self.get(path) is None:
+            raise ConfigVanished(
+                path, "Cannot update {}, as it does not exist!".format(path)
+            )
+        self._updates[path] = (str(value), None)
+
+    def delete(self, path: str, must_exist: bool = True):
+        """
+        Delete the given key.
+
+        :param path: Path of key to remove
+        :param must_exist: Fail if path does not exist?
+        """
+        self._ensure_uncommitted()
+        if must_exist and self.get(path) is None:
+            raise ConfigVanished(
+                path, "Cannot delete {}, it does not exist!".format(path)
+            )
+        self._updates[path] = (None, None)
+
+    @instrumented_commit
+    @traced_commit
+    def commit(self) -> bool:
+        """
+        Commit the transaction to the database.
+
+        This can fail, in which case the transaction must get `reset`
+        and built again.
+
+        :returns: Whether the commit succeeded
+        """
+        self._ensure_uncommitted()
+        self._committed = True
+
+        # Read-only transactions read a consistent snapshot, so there
+        # is nothing to check
+        if not self._updates:
+            if self._snapshot is not None:
+                self._revision = self._snapshot.revision
+            else:
+                self._revision = self._backend.check({}, {})
+            self._close_snapshot()
+        else:
+            self._close_snapshot()
+            self._backend.throttle("write")
+            self._revision = self._backend.commit(
+                self._get_queries, self._list_queries, self._updates
+            )
+        if self._revision is None:
+            self._commit_callbacks = []
+            return False
+        for callback in self._commit_callbacks:
+            callback()
+        self._commit_callbacks = []
+        return True
+
+    def on_commit(self, callback: Callable[[], None]):
+        """Register a callback to call when the transaction succeeds.
+
+        :param callback: Callback to call
+        """
+        self._commit_callbacks.append(callback)
+
+    def reset(self):
+        """Reset the transaction so it can be restarted after commit()."""
+        if not self._committed:
+            raise RuntimeError("Called reset on an uncommitted transaction!")
+        self._close_snapshot()
+        self._get_queries = {}
+        self._list_queries = {}
+        self._updates = {}
+        self._reset_loop()
+
+    def loop(self, watch: bool = False, watch_timeout: float = None):
+        """Repeat transaction execution, even if it succeeds.
+
+        :param watch: Once the transaction succeeds, block until one of
+           the values read changes, then loop the transaction
+        :param watch_timeout: Maximum time to wait, in seconds
+        """
+        self._request_loop(watch, watch_timeout)
+
+    def __iter__(self):
+        """Iterate transaction as requested by loop(), or until it succeeds."""
+        try:
+            with deadline_scope(self._deadline):
+                yield from self._iterate()
+        finally:
+            # Release the snapshot if the transaction body failed
+            self._close_snapshot()
+
+    def _explain(self):
+        """Record what committing would send in the report."""
+        compares = 0
+        if self._updates:
+            compares = len(self._get_queries) + sum(
+                len(keys) + 1 for keys in self._list_queries.values()
+            )
+        self._report.add_commit(compares, self._updates)
+
+    def _do_watch(self):
+        """Wait for a change on one of the values read, or a timeout."""
+        wait_for_change(
+            self._backend,
+            self._get_queries,
+            self._list_queries,
+            self._watch_timeout,
+            self._triggered,
+        )
+
+    def trigger_loop(self):
+        """Manually triggers a loop.
+
+        Interrupts a waiting loop from a different thread.
+        """
+        self._triggered.set()
+
+
+def wait_for_change(backend, gets, lists, timeout, triggered):
+    """
+    Wait until a read log is invalidated.
+
+    :param backend: Backend implementing ``check`` and ``wait``
+    :param gets: Logged get queries
+    :param lists: Logged list queries
+    :param timeout: Maximum time to wait, None to wait indefinitely
+    :param triggered: Event to interrupt waiting
+    :returns: False if the wait timed out
+    """
+    tracer = getattr(backend, "tracer", None)
+    with maybe_span(tracer, "watch", keys=len(gets), ranges=len(lists)) as span:
+        changed = _wait_for_change(backend, gets, lists, timeout, triggered)
+        if span is not None:
+            span["timeout"] = not changed
+    return changed
+
+
+def _wait_for_change(backend, gets, lists, timeout, triggered):
+    # Do not wait past the deadline of the current thread
+    remaining = remaining_time("Watch")
+    if remaining is not None and (timeout is None or remaining < timeout):
+        timeout = remaining
+    deadline = None if timeout is None else time.monotonic() + timeout
+    changed = True
+    while not triggered.is_set():
+        if backend.check(gets, lists) is None:
+            break
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                changed = False
+                break
+        backend.wait(remaining)
+    triggered.clear()
+    return changed
+
+
+class OptimisticWatcher:
+    """Watch for database changes by using nested transactions.
+
+    Behaves like :py:class:`Etcd3Watcher`: at the end of a for loop
+    iteration, the watcher waits until one of the values read by
+    transactions started through :py:meth:`txn` has changed. Local
+    backends do not queue events, so only the latency from waking up to
+    the commit of the next transaction ("action") gets recorded.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        backend,
+        timeout: float = None,
+        txn_wrapper=None,
+        deadline: float = None,
+        name: str = None,
+    ):
+        """Initialise watcher.
+
+        :param backend: Backend implementing :py:class:`OptimisticTransaction`
+            requirements, plus ``wait(timeout)`` for blocking until the
+            database might have changed
+        :param timeout: Maximum time to wait per loop. If ``None``, will
+            wait indefinetely.
+        :param txn_wrapper: Function to wrap transactions
+        :param deadline: Time by which the watcher must have finished,
+            see :py:func:`deadline_scope`
+        :param name: Name of the watcher in metrics
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self._backend = backend
+        self._name = name or "default"
+        self._woken = None
+        self._timeout = timeout
+        self._deadline = deadline
+        self._txn_wrapper = txn_wrapper
+        self._get_queries = {}
+        self._list_queries = {}
+        self._triggered = threading.Event()
+
+    @property
+    def name(self) -> str:
+        """Name of the watcher in metrics."""
+        return self._name
+
+    def set_timeout(self, timeout: float):
+        """Set a timeout.
+
+        :param timeout: Maximum time to wait per loop. If ``None``, will
+            wait indefinetely.
+        """
+        self._timeout = timeout
+
+    def txn(self, max_retries: int = 64):
+        """Create nested transaction.
+
+        The watcher loop will iterate when any value read by
+        transactions created by this method have changed in the
+        database.
+
+        :param max_retries: Maximum number of times the transaction will be
+           tried before giving up.
+        """
+        txn = OptimisticTransaction(self._backend, max_retries)
+        for loop_txn in txn:
+            if self._txn_wrapper is not None:
+                yield self._txn_wrapper(loop_txn)
+            else:
+                yield loop_txn
+
+        # pylint: disable=protected-access
+        if txn._committed:
+            self._get_queries.update(txn._get_queries)
+            self._list_queries.update(txn._list_queries)
+            if self._woken is not None:
+                metrics = getattr(self._backend, "metrics", None)
+                if metrics is not None:
+                    metrics.watcher_latency.observe(
+                        time.monotonic() - self._woken, self._name, "action"
+                    )
+                self._woken = None
+
+    def __iter__(self):
+        """Iterate forever, waiting after every interaction for something to change."""
+        with deadline_scope(self._deadline):
+            yield from self._iterate()
+
+    def _iterate(self):
+        while True:
+            remaining_time("Watcher")
+            yield self
+            changed = wait_for_change(
+                self._backend,
+                self._get_queries,
+                self._list_queries,
+                self._timeout,
+                self._triggered,
+            )
+            self._woken = time.monotonic() if changed else None
+            metrics = getattr(self._backend, "metrics", None)
+            if metrics is not None:
+                metrics.watcher_wakeups.inc("change" if changed else "timeout")
+            self._get_queries = {}
+            self._list_queries = {}
+
+    def trigger(self):
+        """Manually triggers a loop.
+
+        Can be called from a different thread to force a loop, even if
+        the watcher is currently waiting.
+        """
+        self._triggered.set()
+
+
+class OptimisticBackend:
+    """Base class for local backends using :py:class:`OptimisticTransaction`.
+
+    Provides the direct key access methods of :py:class:`Etcd3Backend`
+    on top of the backend interface required by the transactions, see
+    :py:class:`OptimisticTransaction` and :py:class:`OptimisticWatcher`.
+
+    Changes made by other processes are picked up by a background
+    thread, which calls ``_poll_changes()`` every poll interval, and
+    ``_reap_leases()`` every ten. Changes get passed to
+    :py:meth:`_dispatch` to notify watches and waiting transactions.
+
+    :param poll_interval: Interval in seconds in which to check for
+        changes made by other processes
+    """
+
+    # Rate limiter for requests, see ratelimit.RateLimiter
+    rate_limiter = None
+
+    # Registry to record metrics in, see metrics.MetricsRegistry
+    metrics = None
+
+    # Tracer to record spans with, see tracing.Tracer
+    tracer = None
+
+    def __init__(self, poll_interval: float = 0.01):
+        """Initialise change notification."""
+        self._poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._watches = set()
+        self._leases = {}  # lease ID -> lease object (granted here)
+        self._poller = None
+        self._closed = False
+
+    def _poll_changes(self):
+        """Check for changes by other processes, see :py:meth:`_dispatch`."""
+
+    def _reap_leases(self):
+        """Expire leases whose time to live has run out."""
+
+    def _dispatch(self, changes: List[Tuple[str, str, int]]):
+        """
+        Notify watches and waiting transactions about changes.
+
+        :param changes: List of (tagged path, value, revision), value
+           None if the key was deleted
+        """
+        with self._lock:
+            for tag, value, rev in changes:
+                for watch in self._watches:
+                    if watch.matches(tag):
+                        watch.queue.put((_untag_depth(tag), value, Revision(rev, rev)))
+                        if self.metrics is not None:
+                            self.metrics.watch_events.inc()
+            self._changed.notify_all()
+
+    def _keep_alive(self):
+        """Refresh leases kept alive by this process, if due."""
+        now = time.monotonic()
+        for lease in list(self._leases.values()):
+            if lease.keeping and lease.deadline - now < 0.75 * lease.granted_ttl:
+                try:
+                    if self.metrics is not None:
+                        self.metrics.lease_keepalives.inc()
+                    self.refresh_lease(lease)
+                except ValueError:
+                    self._leases.pop(lease.ID, None)
+
+    def refresh_lease(self, lease) -> None:
+        """
+        Keep a lease alive, resetting its time to live.
+
+        :param lease: Lease to refresh
+        """
+        raise NotImplementedError
+
+    def snapshot(self):
+        """
+        Take a snapshot of the database, for a transaction to read from.
+
+        :returns: snapshot, see :py:class:`OptimisticTransaction`
+        """
+        raise NotImplementedError
+
+    def _start_poller(self):
+        with self._lock:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(
+                    target=self._poll,
+                    name="{}-poll".format(type(self).__name__),
+                    daemon=True,
+                )
+                self._poller.start()
+
+    def _poll(self):
+        """Pick up changes, keep leases alive and expire dead ones."""
+        last_reap = 0
+        while not self._closed:
+            self._poll_changes()
+            self._keep_alive()
+            if time.monotonic() - last_reap > 10 * self._poll_interval:
+                self._reap_leases()
+                last_reap = time.monotonic()
+            time.sleep(self._poll_interval)
+
+    def throttle(self, kind: str) -> None:
+        """
+        Check the deadline, and wait until the rate limiter allows a
+        request, if there is one.
+
+        :param kind: Kind of request ("read", "write" or "watch")
+        :raises: ConfigTimeout if the deadline of the thread passed
+        """
+        remaining_time()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(kind)
+
+    def add_watch(self, watch) -> None:
+        """
+        Start notifying a watch about changes.
+
+        :param watch: Watch to add
+        """
+        self.throttle("watch")
+        with self._lock:
+            self._watches.add(watch)
+        self._start_poller()
+
+    def remove_watch(self, watch) -> None:
+        """
+        Stop notifying a watch about changes.
+
+        :param watch: Watch to remove
+        """
+        with self._lock:
+            self._watches.discard(watch)
+
+    def wait(self, timeout: float = None) -> None:
+        """
+        Block until the database might have changed.
+
+        :param timeout: Maximum time to wait in seconds
+        """
+        self._start_poller()
+        # Changes might slip in between checking and waiting, so never
+        # wait for long
+        cap = 10 * self._poll_interval
+        with self._changed:
+            self._changed.wait(cap if timeout is None else min(timeout, cap))
+
+    def txn(
+        self,
+        max_retries: int = 64,
+        deadline: float = None,
+        report: TransactionReport = None,
+    ) -> Iterable[OptimisticTransaction]:
+        """Create a new transaction.
+
+        This uses the same optimistic STM-style implementation as
+        :py:meth:`Etcd3Backend.txn`, therefore this function returns
+        an iterator, which loops until the transaction succeeds.
+
+        :param max_retries: Maximum number of transaction loops
+        :param deadline: Time by which the transaction must have
+            succeeded, see :py:func:`deadline_scope`
+        :param report: Explain mode: run the transaction once without
+            committing, and record its requests in the report
+        :returns: Transaction iterator
+        """
+        yield from OptimisticTransaction(self, max_retries, deadline, report)
+
+    def watcher(
+        self,
+        timeout=None,
+        txn_wrapper=None,
+        deadline: float = None,
+        name: str = None,
+    ) -> OptimisticWatcher:
+        """Create a new watcher.
+
+        :param timeout: Timeout for waiting. Watcher will loop after this time.
+        :param txn_wrapper: Function to wrap transactions returned by the
+           wrapper.
+        :param deadline: Time by which the watcher must have finished,
+            see :py:func:`deadline_scope`
+        :param name: Name of the watcher in metrics
+        :returns: Watcher iterator
+        """
+        return OptimisticWatcher(self, timeout, txn_wrapper, deadline, name)
+
+    @instrumented("get")
+    def get(self, path: str) -> Tuple[str, Revision]:
+        """
+        Get value of a key.
+
+        :param path: Path of key to query
+        :returns: (value, revision). value is None if it doesn't exist
+        """
+        txn = OptimisticTransaction(self)
+        for loop_txn in txn:
+            value = loop_txn.get(path)
+        # pylint: disable=protected-access
+        return (value, Revision(txn.revision, txn._get_queries[path][1]))
+
+    @instrumented("list_keys")
+    def list_keys(self, path: str, recurse: int = 0) -> Tuple[List[str], Revision]:
+        """
+        List keys under given path.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Maximum recursion level to query. If iterable,
+           cover exactly the recursion levels specified.
+        :returns: (sorted key list, revision)
+        """
+        txn = OptimisticTransaction(self)
+        for loop_txn in txn:
+            keys = loop_txn.list_keys(path, recurse)
+        return (keys, Revision(txn.revision))
+
+    @instrumented("create")
+    def create(self, path: str, value: str, lease=None):
+        """Create a key and initialise it with the value.
+
+        Fails if the key already exists. If a lease is given, the key will
+        automatically get deleted once it expires.
+
+        :param path: Path to create
+        :param value: Value to set
+        :param lease: Lease to associate
+        :raises: ConfigCollision
+        """
+        for txn in self.txn():
+            txn.create(path, value, lease)
+
+    @instrumented("update")
+    def update(self, path: str, value: str, must_be_rev: Revision = None):
+        """
+        Update an existing key. Fails if the key does not exist.
+
+        :param path: Path to update
+        :param value: Value to set
+        :param must_be_rev: Fail if found value does not match given
+            revision (atomic update)
+        :raises: ConfigVanished
+        """
+        if must_be_rev is not None and must_be_rev.mod_revision is None:
+            raise ValueError("Did not pass a valid mod_revision!")
+        for txn in self.txn():
+            txn.update(path, value)
+            # pylint: disable=protected-access
+            if (
+                must_be_rev is not None
+                and txn._get_queries[path][1] != must_be_rev.mod_revision
+            ):
+                raise ConfigVanished(
+                    path, "Cannot update {}, as it was modified!".format(path)
+                )
+
+    @instrumented("delete")
+    def delete(
+        self,
+        path: str,
+        must_exist: bool = True,
+        recursive: bool = False,
+        prefix: bool = False,
+        max_depth: int = 16,
+    ):
+        # pylint: disable=too-many-arguments
+        """
+        Delete the given key or key range.
+
+        :param path: Path (prefix) of keys to remove
+        :param must_exist: Fail if path does not exist?
+        :param recursive: Delete children keys at lower levels recursively
+        :param prefix: Delete all keys at given level with prefix
+        :param max_depth: Maximum recursion depth
+        """
+        for txn in self.txn():
+            if must_exist and txn.get(path) is None:
+                raise ConfigVanished(
+                    path, "Cannot delete {}, as it does not exist!".format(path)
+                )
+            keys = txn.list_keys(path) if prefix else [path]
+            if recursive:
+                depths = range(1, max_depth)
+                if prefix:
+                    keys += txn.list_keys(path, depths)
+                else:
+                    keys += txn.list_keys(path + "/", [d - 1 for d in depths])
+            for key in keys:
+                txn.delete(key, must_exist=False)
+
+    def close(self):
+        """Stop background activity."""
+        self._closed = True
+        if self._poller is not None and self._poller is not threading.current_thread():
+            self._poller.join(1)
+
+    def __enter__(self):
+        """Use for scoping backend to a block."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Use for scoping backend to a block."""
+        self.close()
+        return False
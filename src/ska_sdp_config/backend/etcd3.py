@@ -2,25 +2,182 @@
 
 # pylint: disable=fixme
 
+import heapq
 import time
 import queue as queue_m
-from typing import Iterable, Callable
+from typing import Dict, Iterable, Iterator, Callable, List, Tuple
 import logging
 import socket
+import threading
+import urllib.parse
 
 from deprecated import deprecated
 import etcd3
 import requests
 from .common import (
+    _RetryLoop,
+    _depth_range,
+    _prefix_end,
     _tag_depth,
     _untag_depth,
     _check_path,
     ConfigCollision,
+    ConfigTimeout,
     ConfigVanished,
+    deadline_scope,
+    remaining_time,
 )
+from .explain import MAX_TXN_OPS, TransactionReport, payload_size
+from .metrics import instrumented, instrumented_commit
+from .tracing import maybe_span, traced, traced_commit
 
 LOGGER = logging.getLogger(__name__)
 
+# Kinds of requests for rate limiting, by etcd RPC method
+_RPC_KINDS = {
+    "/kv/range": "read",
+    "/kv/put": "write",
+    "/kv/deleterange": "write",
+    "/watch": "watch",
+}
+
+
+def _txn_kind(data: dict) -> str:
+    """Determine whether a transaction request writes."""
+    for request in (data or {}).get("success", []) + (data or {}).get("failure", []):
+        if "request_put" in request or "request_delete_range" in request:
+            return "write"
+    return "read"
+
+
+class _Client(etcd3.Client):
+    """etcd client passing requests through a rate limiter, if set,
+    timing them out at the deadline of the calling thread and recording
+    metrics and spans, if enabled."""
+
+    # pylint: disable=too-many-ancestors
+
+    rate_limiter = None
+    metrics = None
+    tracer = None
+
+    def call_rpc(self, method, data=None, *args, **kwargs):
+        # pylint: disable=keyword-arg-before-vararg
+        if self.rate_limiter is not None:
+            if method == "/kv/txn":
+                self.rate_limiter.acquire(_txn_kind(data))
+            elif method in _RPC_KINDS:
+                self.rate_limiter.acquire(_RPC_KINDS[method])
+
+        # Streams (i.e. watches) are not bounded by the deadline
+        remaining = None
+        if not kwargs.get("stream"):
+            remaining = remaining_time()
+        if remaining is None:
+            return self._timed_rpc(method, data, *args, **kwargs)
+        deadline = time.time() + remaining
+        if self.timeout is None or remaining < self.timeout:
+            kwargs["timeout"] = remaining
+        try:
+            return self._timed_rpc(method, data, *args, **kwargs)
+        except requests.RequestException as exc:
+            # Timeouts reading the response surface as connection errors
+            if isinstance(exc, requests.Timeout) or time.time() >= deadline:
+                raise ConfigTimeout(
+                    "Request {} missed its deadline!".format(method)
+                ) from exc
+            raise
+
+    def _timed_rpc(self, method, data, *args, **kwargs):
+        """Make request, recording round trip metrics and spans."""
+        metrics = self.metrics
+        if metrics is None and self.tracer is None:
+            return super().call_rpc(method, data, *args, **kwargs)
+        if metrics is not None and method == "/lease/keepalive":
+            metrics.lease_keepalives.inc()
+        start = time.perf_counter()
+        try:
+            with maybe_span(self.tracer, "rpc", method=method):
+                return super().call_rpc(method, data, *args, **kwargs)
+        finally:
+            if metrics is not None:
+                metrics.requests.observe(time.perf_counter() - start, method)
+
+    def _post(self, url, *args, **kwargs):
+        """Send request, recording bytes transferred."""
+        response = super()._post(url, *args, **kwargs)
+        metrics = self.metrics
+        if metrics is None and self.tracer is None:
+            return response
+        sent = int(response.request.headers.get("Content-Length") or 0)
+        received = None if kwargs.get("stream") else len(response.content)
+        if metrics is not None:
+            # Strip API version from path to get the RPC method
+            method = "/" + urllib.parse.urlsplit(url).path.lstrip("/").split("/", 1)[-1]
+            metrics.request_bytes.inc(method, amount=sent)
+            if received is not None:
+                metrics.response_bytes.inc(method, amount=received)
+        if self.tracer is not None:
+            self.tracer.annotate(request_bytes=sent, response_bytes=received)
+        return response
+
+
+def _range_batches(
+    client: etcd3.Client, tagged_path: str, rev: int, batch_size: int
+) -> Iterator[Tuple[str, str, int]]:
+    """
+    Read all keys with a tagged prefix in batches, at a fixed revision.
+
+    :param client: etcd client
+    :param tagged_path: Depth-tagged prefix of keys to read
+    :param rev: Database revision to read at
+    :param batch_size: Number of keys to request at a time
+    :returns: iterator of (path, value, mod_revision)
+    """
+    start = tagged_path
+    end = _prefix_end(tagged_path)
+    while True:
+        response = client.range(start, range_end=end, limit=batch_size, revision=rev)
+        for kv in response.kvs or []:
+            yield (
+                _untag_depth(kv.key.decode("utf-8")),
+                kv.value.decode("utf-8"),
+                kv.mod_revision,
+            )
+        if not response.more:
+            break
+        start = response.kvs[-1].key + b"\0"
+
+
+def _deepest(client: etcd3.Client, rev: int) -> int:
+    """
+    Find the depth of the deepest key, at a fixed revision.
+
+    Every key is stored below exactly one depth tag, so count keys
+    depth by depth until all keys starting with a digit are accounted
+    for. Keys not written by us might start with a digit as well, so
+    give up after a long run of depths without keys.
+
+    :param client: etcd client
+    :param rev: Database revision to count at
+    :returns: maximum depth
+    """
+
+    def count(start, end):
+        response = client.range(start, range_end=end, count_only=True, revision=rev)
+        return int(response.count or 0)
+
+    remaining = count("0", ":")
+    depth = deepest = 0
+    while remaining > 0 and depth - deepest < 64:
+        depth += 1
+        tagged_prefix = _tag_depth("/", depth)
+        found = count(tagged_prefix, _prefix_end(tagged_prefix))
+        if found:
+            remaining -= found
+            deepest = depth
+    return deepest
+
 
 class Etcd3Backend:
     """
@@ -34,7 +191,40 @@ class Etcd3Backend:
 
     def __init__(self, *args, **kw_args):
         """Instantiate the database client."""
-        self._client = etcd3.Client(*args, **kw_args)
+        self._client = _Client(*args, **kw_args)
+
+    @property
+    def rate_limiter(self):
+        """Rate limiter for requests, see
+        :py:class:`~ska_sdp_config.backend.ratelimit.RateLimiter`.
+        """
+        return self._client.rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, limiter):
+        self._client.rate_limiter = limiter
+
+    @property
+    def metrics(self):
+        """Registry to record metrics in, see
+        :py:class:`~ska_sdp_config.backend.metrics.MetricsRegistry`.
+        """
+        return self._client.metrics
+
+    @metrics.setter
+    def metrics(self, registry):
+        self._client.metrics = registry
+
+    @property
+    def tracer(self):
+        """Tracer to record spans with, see
+        :py:class:`~ska_sdp_config.backend.tracing.Tracer`.
+        """
+        return self._client.tracer
+
+    @tracer.setter
+    def tracer(self, tracer):
+        self._client.tracer = tracer
 
     def lease(self, ttl: int = 10) -> etcd3.Lease:
         """Generate a new lease.
@@ -49,7 +239,12 @@ class Etcd3Backend:
         """
         return self._client.Lease(ttl=ttl)
 
-    def txn(self, max_retries: int = 64) -> Iterable["Etcd3Transaction"]:
+    def txn(
+        self,
+        max_retries: int = 64,
+        deadline: float = None,
+        report: TransactionReport = None,
+    ) -> Iterable["Etcd3Transaction"]:
         """Create a new transaction.
 
         Note that this uses an optimistic STM-style implementation,
@@ -67,14 +262,26 @@ class Etcd3Backend:
         you intend to wait for something to happen in the
         configuration - use :py:meth:`watcher()` instead.
 
+        Requests made by the transaction get timed out at the deadline,
+        and instead of retrying the transaction after that
+        :py:class:`ConfigTimeout` gets raised.
+
         :param max_retries: Maximum number of transaction loops
+        :param deadline: Time (as in :py:func:`time.time`) by which the
+            transaction must have succeeded
+        :param report: Explain mode: run the transaction once without
+            committing, and record its requests in the report
         :returns: Transaction iterator
         """
-        for txn in Etcd3Transaction(self, self._client, max_retries):
+        for txn in Etcd3Transaction(self, self._client, max_retries, deadline, report):
             yield txn
 
     def watcher(
-        self, timeout=None, txn_wrapper: Callable[["Etcd3Transaction"], object] = None
+        self,
+        timeout=None,
+        txn_wrapper: Callable[["Etcd3Transaction"], object] = None,
+        deadline: float = None,
+        name: str = None,
     ) -> Iterable["Etcd3Watcher"]:
         """Create a new watcher.
 
@@ -84,10 +291,16 @@ class Etcd3Backend:
         :param timeout: Timeout for waiting. Watcher will loop after this time.
         :param txn_wrapper: Function to wrap transactions returned by the
            wrapper.
+        :param deadline: Time (as in :py:func:`time.time`) by which the
+            watcher must have finished, :py:class:`ConfigTimeout` gets
+            raised after that
+        :param name: Name of the watcher in metrics
         :returns: Watcher iterator
         """
-        return Etcd3Watcher(self, self._client, timeout, txn_wrapper)
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        return Etcd3Watcher(self, self._client, timeout, txn_wrapper, deadline, name)
 
+    @instrumented("get")
     def get(self, path: str, revision: "Etcd3Revision" = None):
         """
         Get value of a key.
@@ -117,6 +330,67 @@ class Etcd3Backend:
         # Return value together with revision
         return (result, Etcd3Revision(response.header.revision, mod_revision))
 
+    def get_many(
+        self,
+        paths: Iterable[str],
+        revision: "Etcd3Revision" = None,
+        known: Dict[str, Tuple[str, int]] = None,
+    ) -> Tuple[Dict[str, Tuple[str, int]], "Etcd3Revision"]:
+        """
+        Get values of several keys with one request.
+
+        Values of keys in `known` only get transferred if the key was
+        modified since. Keys are requested in chunks to stay within the
+        etcd limit on the number of operations per transaction.
+
+        :param paths: Paths of keys to query
+        :param revision: Database revision for which to read keys
+        :param known: Values read earlier, as {path: (value, mod_revision)}
+        :returns: ({path: (value, mod_revision)}, revision). value and
+            mod_revision are None for keys that don't exist
+        """
+        paths = list(paths)
+        known = known or {}
+        rev = None if revision is None else revision.revision
+        result = {}
+        for start in range(0, len(paths), MAX_TXN_OPS // 2):
+            chunk = paths[start : start + MAX_TXN_OPS // 2]
+            cached = {path for path in chunk if known.get(path, (None, None))[1]}
+
+            # Read every key, but only with its value if it changed
+            txn = self._client.Txn()
+            for path in chunk:
+                _check_path(path)
+                if path not in cached:
+                    txn.success(txn.range(_tag_depth(path), revision=rev))
+                    continue
+                txn.success(txn.range(_tag_depth(path), keys_only=True, revision=rev))
+                txn.success(
+                    txn.range(
+                        _tag_depth(path),
+                        min_mod_revision=known[path][1] + 1,
+                        revision=rev,
+                    )
+                )
+            response = txn.commit()
+
+            # Read all chunks at the same revision
+            rev = response.header.revision
+            ranges = iter(res.response_range.kvs for res in response.responses)
+            for path in chunk:
+                kvs = next(ranges)
+                if path in cached:
+                    changed = next(ranges)
+                    if kvs and not changed:
+                        result[path] = (known[path][0], kvs[0].mod_revision)
+                        continue
+                    kvs = changed
+                if kvs:
+                    result[path] = (kvs[0].value.decode("utf-8"), kvs[0].mod_revision)
+                else:
+                    result[path] = (None, None)
+        return (result, Etcd3Revision(rev, None))
+
     def watch(
         self,
         path: str,
@@ -144,6 +418,7 @@ class Etcd3Backend:
         watcher = self._client.Watcher(tagged_path, start_revision=rev, prefix=prefix)
         return Etcd3Watch(watcher, self)
 
+    @instrumented("list_keys")
     def list_keys(self, path: str, recurse: int = 0, revision: "Etcd3Revision" = None):
         """
         List keys under given path.
@@ -191,6 +466,104 @@ class Etcd3Backend:
         )
         return (sorted_keys, revision)
 
+    def list_values(
+        self, path: str, recurse: int = 0, revision: "Etcd3Revision" = None
+    ):
+        """
+        List keys under given path, together with their values.
+
+        Like :py:meth:`list_keys`, but returning values as well. All
+        keys of a depth are read using a single range request.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Maximum recursion level to query. If iterable,
+           cover exactly the recursion levels specified.
+        :param revision: Database revision for which to list
+        :returns: (sorted list of (key, value, mod_revision), revision)
+        """
+        path_depth = path.count("/")
+        rev = None if revision is None else revision.revision
+
+        # Make transaction to collect keys from all levels
+        txn = self._client.Txn()
+        for depth in _depth_range(recurse):
+            tagged_path = _tag_depth(path, depth + path_depth)
+            txn.success(txn.range(tagged_path, prefix=True, revision=rev))
+        response = txn.commit()
+
+        revision = Etcd3Revision(response.header.revision, None)
+        items = sorted(
+            (
+                _untag_depth(kv.key.decode("utf-8")),
+                kv.value.decode("utf-8"),
+                kv.mod_revision,
+            )
+            for res in response.responses or []
+            if res.response_range.kvs is not None
+            for kv in res.response_range.kvs
+        )
+        return (items, revision)
+
+    def current_revision(self) -> "Etcd3Revision":
+        """
+        Get the current revision of the database.
+
+        Watches started from the revision after it see every later
+        change.
+
+        :returns: current revision
+        """
+        response = self._client.range(_tag_depth("/"), count_only=True)
+        return Etcd3Revision(response.header.revision, None)
+
+    def range_values(
+        self,
+        path: str = "/",
+        revision: "Etcd3Revision" = None,
+        batch_size: int = 1000,
+        max_depth: int = None,
+    ) -> Tuple["Etcd3Revision", Iterator[Tuple[str, str, int]]]:
+        """
+        Read all keys with the given prefix, at any depth, with values.
+
+        Keys get requested in batches, all at the same database
+        revision. This way we can stream a consistent snapshot of a
+        large number of keys without holding all of them in memory.
+        Note that etcd might compact the revision away if reading
+        takes very long.
+
+        :param path: Prefix of keys to read
+        :param revision: Database revision to read at. Defaults to the
+            current revision.
+        :param batch_size: Number of keys to request at a time
+        :param max_depth: Maximum depth of keys to read, relative to path.
+            Defaults to all depths.
+        :returns: (revision, iterator of (path, value, mod_revision))
+        """
+        path_depth = path.count("/")
+        if revision is None:
+            # Pin the revision for all following requests
+            response = self._client.range(
+                _tag_depth(path, path_depth), prefix=True, count_only=True
+            )
+            rev = response.header.revision
+        else:
+            rev = revision.revision
+
+        def iterate():
+            if max_depth is None:
+                end_depth = _deepest(self._client, rev) + 1
+            else:
+                end_depth = path_depth + max_depth
+            for depth in range(path_depth, end_depth):
+                yield from _range_batches(
+                    self._client, _tag_depth(path, depth), rev, batch_size
+                )
+
+        return (Etcd3Revision(rev, None), iterate())
+
+    @instrumented("create")
     def create(self, path: str, value: str, lease: etcd3.Lease = None):
         """Create a key and initialise it with the value.
 
@@ -217,6 +590,7 @@ class Etcd3Backend:
                 path, "Cannot create {}, as it already exists!".format(path)
             )
 
+    @instrumented("update")
     def update(self, path: str, value: str, must_be_rev: "Etcd3Revision" = None):
         """
         Update an existing key. Fails if the key does not exist.
@@ -244,6 +618,7 @@ class Etcd3Backend:
                 path, "Cannot update {}, as it does not exist!".format(path)
             )
 
+    @instrumented("delete")
     def delete(
         self,
         path: str,
@@ -333,11 +708,30 @@ class Etcd3Revision:
         return self._mod_revision
 
 
+class _TimestampedQueue(queue_m.Queue):
+    """Queue remembering when the item taken last was put on it."""
+
+    def __init__(self):
+        """Create queue."""
+        super().__init__()
+        self.put_time = None
+
+    def _put(self, item):
+        super()._put((time.monotonic(), item))
+
+    def _get(self):
+        self.put_time, item = super()._get()
+        return item
+
+
 class Etcd3Watch:
     """Wrapper for etc3 watch requests.
 
     Entering the watcher using a `with` block yields a queue of `(key,
-    val, rev)` triples.
+    val, rev)` triples. If the watch gets cancelled by the server - for
+    instance because the requested start revision was compacted - a
+    `(None, None, None)` triple is put on the queue, and updates might
+    have been missed.
     """
 
     def __init__(self, watcher: etcd3.Watcher, backend: Etcd3Backend):
@@ -352,6 +746,8 @@ class Etcd3Watch:
             self.queue = queue = queue_m.Queue()
 
         def on_event(event):
+            if self._backend.metrics is not None:
+                self._backend.metrics.watch_events.inc()
             key = _untag_depth(event.key.decode("utf-8"))
             if event.type == etcd3.EventType.PUT:
                 val = event.value.decode("utf-8")
@@ -359,10 +755,28 @@ class Etcd3Watch:
             else:
                 val = None
                 rev = Etcd3Revision(event.mod_revision, event.mod_revision)
+            # The watcher silently skips compacted revisions when
+            # re-connecting, so check whether it had to do that
+            if any(
+                isinstance(err, etcd3.errors.Etcd3WatchCanceled)
+                for err in self._watcher.errors
+            ):
+                self._watcher.errors.clear()
+                queue.put((None, None, None))
             queue.put((key, val, rev))
 
+        def run():
+            try:
+                self._watcher.run()
+            except etcd3.errors.Etcd3WatchCanceled as exc:
+                LOGGER.warning("Watch cancelled: %s", exc.error)
+                queue.put((None, None, None))
+
+        # Equivalent to self._watcher.runDaemon(), but reporting cancellation
+        # pylint: disable=protected-access
         self._watcher.onEvent(on_event)
-        self._watcher.runDaemon()
+        self._watcher._thread = threading.Thread(target=run, daemon=True)
+        self._watcher._thread.start()
 
     # pylint: disable=too-many-branches
     def stop(self):
@@ -462,7 +876,7 @@ class Etcd3Watch:
         self.stop()
 
 
-class Etcd3Transaction:
+class Etcd3Transaction(_RetryLoop):
     """A series of queries and updates to be executed atomically.
 
     Use :py:meth:`Etcd3Backend.txn()` or :py:meth:`Etcd3Watcher.txn()`
@@ -498,27 +912,33 @@ class Etcd3Transaction:
     # "create" should be quite rare.
 
     def __init__(
-        self, backend: Etcd3Backend, client: etcd3.Client, max_retries: int = 64
+        self,
+        backend: Etcd3Backend,
+        client: etcd3.Client,
+        max_retries: int = 64,
+        deadline: float = None,
+        report: TransactionReport = None,
     ):
         """Initialise transaction."""
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        super().__init__(max_retries, deadline, report, backend.metrics, backend.tracer)
         self._backend = backend
         self._client = client
-        self._max_retries = max_retries
 
         self._revision = None  # Revision backed in after first read
         self._get_queries = {}  # Query log
         self._list_queries = {}  # Query log
+        self._value_queries = {}  # Values returned by list_values
+        self._scan_queries = {}  # Keys returned by iter_values
         self._updates = {}  # Delayed updates
 
-        self._committed = False
-        self._loop = False
-        self._watch = False
-        self._watch_timeout = None
         self._got_timeout = False  # For test cases
-        self._retries = 0
+        self._woken = None  # (queued, woken) times of event ending wait
+        self._misfires = 0  # Events ignored by last wait
+        self._watcher_name = "default"
 
         self._watchers = {}
-        self._watch_queue = queue_m.Queue()
+        self._watch_queue = _TimestampedQueue()
 
         self._commit_callbacks = []
 
@@ -536,6 +956,7 @@ class Etcd3Transaction:
             raise RuntimeError("Revision is undefined on an uncommitted transaction!")
         return self._revision.revision
 
+    @traced("get")
     def get(self, path: str) -> str:
         """
         Get value of a key.
@@ -552,17 +973,82 @@ class Etcd3Transaction:
         # Check whether we already have the request response
         if path in self._get_queries:
             return self._get_queries[path][0]
+        if self._value_queries:
+            tagged_path = _tag_depth(path)
+            for (lpath, depth), values in self._value_queries.items():
+                if tagged_path.startswith(_tag_depth(lpath, depth)):
+                    return values.get(path)
 
         # Perform get request
         val, rev = self._get_queries[path] = self._backend.get(
             path, revision=self._revision
         )
+        if self._report is not None:
+            self._report.read("get", path, size=payload_size([val]))
 
         # Set revision, if not already done so
         if self._revision is None:
             self._revision = rev
         return val
 
+    @traced("get_many")
+    def get_many(
+        self, paths: Iterable[str], known: Dict[str, Tuple[str, int]] = None
+    ) -> Dict[str, Tuple[str, int]]:
+        """
+        Get values of several keys with one request.
+
+        The reads get logged like with :py:meth:`get`.
+
+        :param paths: Paths of keys to query
+        :param known: Values read earlier, for instance by a previous
+            transaction, as {path: (value, mod_revision)}. They only
+            get transferred again if the key was modified since.
+        :returns: {path: (value, mod_revision)}. value is None if the
+            key doesn't exist, mod_revision is None if additionally the
+            key was written by this transaction.
+        """
+        self._ensure_uncommitted()
+        paths = list(paths)
+
+        # Request keys we don't know about yet
+        missing = [
+            path
+            for path in paths
+            if path not in self._updates and path not in self._get_queries
+        ]
+        if missing:
+            values, rev = self._backend.get_many(
+                missing, revision=self._revision, known=known
+            )
+            if self._report is not None:
+                chunks = -(-len(missing) // (MAX_TXN_OPS // 2))
+                self._report.read(
+                    "get_many",
+                    missing[0],
+                    chunks,
+                    payload_size(value for value, _ in values.values()),
+                )
+            for path, (value, mod_revision) in values.items():
+                self._get_queries[path] = (
+                    value,
+                    Etcd3Revision(rev.revision, mod_revision),
+                )
+
+            # Bake in revision if not already done so
+            if self._revision is None:
+                self._revision = rev
+
+        result = {}
+        for path in paths:
+            if path in self._updates:
+                result[path] = (self._updates[path][0], None)
+            else:
+                value, rev = self._get_queries[path]
+                result[path] = (value, rev.mod_revision)
+        return result
+
+    @traced("list_keys")
     def list_keys(self, path: str, recurse: int = 0):
         """
         List keys under given path.
@@ -600,6 +1086,12 @@ class Etcd3Transaction:
                 self._list_queries[query] = self._backend.list_keys(
                     path, recurse=(depth,), revision=self._revision
                 )
+                if self._report is not None:
+                    self._report.read(
+                        "list_keys",
+                        path,
+                        size=payload_size(self._list_queries[query][0]),
+                    )
 
             # Add to key set
             result, rev = self._list_queries[query]
@@ -612,7 +1104,180 @@ class Etcd3Transaction:
         # Sort
         return sorted(keys)
 
-    def create(self, path: str, value: str, lease=None):
+    @traced("list_created")
+    def list_created(self, path: str, limit: int = None) -> List[str]:
+        """
+        List keys under given path, oldest first.
+
+        Keys are ordered by the revision they were created at, with
+        keys created by this transaction last. Only the keys get
+        requested. They are remembered like with :py:meth:`iter_values`,
+        so that the query can get validated on commit.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param limit: Maximum number of keys to return
+        :returns: key list
+        """
+        self._ensure_uncommitted()
+        depth = path.count("/")
+        tagged_path = _tag_depth(path, depth)
+        pending = [
+            (key, value)
+            for key, (value, _) in self._updates.items()
+            if _tag_depth(key).startswith(tagged_path)
+        ]
+        removed = {key for key, value in pending if value is None}
+
+        # Keys we deleted might be among the oldest, so request more
+        response = self._client.range(
+            tagged_path,
+            range_end=_prefix_end(tagged_path),
+            limit=0 if limit is None else limit + len(removed),
+            revision=None if self._revision is None else self._revision.revision,
+            keys_only=True,
+            sort_order=etcd3.models.RangeRequestSortOrder.ASCEND,
+            sort_target=etcd3.models.RangeRequestSortTarget.CREATE,
+        )
+        # Bake in revision if not already done so
+        if self._revision is None:
+            self._revision = Etcd3Revision(response.header.revision, None)
+
+        created = [_untag_depth(kv.key.decode("utf-8")) for kv in response.kvs or []]
+        if self._report is not None:
+            self._report.read("list_created", path, size=payload_size(created))
+        self._scan_queries.setdefault((path, depth), set()).update(created)
+        keys = [key for key in created if key not in removed]
+        existing = set(created)
+        keys += [
+            key for key, value in pending if value is not None and key not in existing
+        ]
+        return keys if limit is None else keys[:limit]
+
+    @traced("list_values")
+    def list_values(self, path: str, recurse: int = 0):
+        """
+        List keys under given path, together with their values.
+
+        This reads all keys of a depth with one request, which is much
+        faster than listing keys and getting them one by one. On
+        commit, the query gets validated like :py:meth:`list_keys`,
+        and additionally fails if any value in the range changed.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :returns: sorted list of (key, value) pairs
+        """
+        self._ensure_uncommitted()
+        path_depth = path.count("/")
+
+        values = {}
+        for depth in _depth_range(recurse):
+            query = (path, depth + path_depth)
+            if query not in self._value_queries:
+                items, rev = self._backend.list_values(
+                    path, recurse=(depth,), revision=self._revision
+                )
+                if self._report is not None:
+                    self._report.read(
+                        "list_values",
+                        path,
+                        size=payload_size(value for _, value, _ in items),
+                    )
+                self._value_queries[query] = {key: value for key, value, _ in items}
+                self._list_queries.setdefault(
+                    query, ([key for key, _, _ in items], rev)
+                )
+
+                # Bake in revision if not already done so
+                if self._revision is None:
+                    self._revision = rev
+            values.update(self._value_queries[query])
+
+            # Apply uncommitted changes
+            tagged_path = _tag_depth(path, depth + path_depth)
+            for key, (value, _) in self._updates.items():
+                if _tag_depth(key).startswith(tagged_path):
+                    if value is None:
+                        values.pop(key, None)
+                    else:
+                        values[key] = value
+
+        return sorted(values.items())
+
+    def iter_values(
+        self, path: str, recurse: int = 0, batch_size: int = 100
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Iterate over keys under given path, together with their values.
+
+        Works like :py:meth:`list_values`, but requests keys in batches
+        as the iterator gets consumed, so only one batch of values is
+        held in memory at a time. All batches are read at the revision
+        of the transaction. Values are not cached, but the keys are
+        remembered so that the query can get validated on commit.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :param batch_size: Number of keys to request at a time
+        :returns: iterator of (key, value) pairs, sorted by key
+        """
+        self._ensure_uncommitted()
+        path_depth = path.count("/")
+
+        # Bake in revision if not already done so
+        if self._revision is None:
+            self._revision = self._backend.current_revision()
+            if self._report is not None:
+                self._report.read("range", path)
+
+        # Uncommitted changes to apply, as they were when we started
+        depths = [depth + path_depth for depth in _depth_range(recurse)]
+        prefixes = [_tag_depth(path, depth) for depth in depths]
+        pending = sorted(
+            (key, value)
+            for key, (value, _) in self._updates.items()
+            if any(_tag_depth(key).startswith(prefix) for prefix in prefixes)
+        )
+
+        def scan(depth):
+            keys = self._scan_queries.setdefault((path, depth), set())
+            count = size = 0
+            try:
+                for key, value, _ in _range_batches(
+                    self._client,
+                    _tag_depth(path, depth),
+                    self._revision.revision,
+                    batch_size,
+                ):
+                    keys.add(key)
+                    count += 1
+                    if self._report is not None:
+                        size += payload_size([value])
+                    yield (key, value)
+            finally:
+                if self._report is not None:
+                    batches = max(1, -(-count // batch_size))
+                    self._report.read("iter_values", path, batches, size)
+
+        # Merge depths into one sorted stream, overlaying our changes
+        index = 0
+        for key, value in heapq.merge(*[scan(depth) for depth in depths]):
+            while index < len(pending) and pending[index][0] <= key:
+                if pending[index][0] == key:
+                    value = pending[index][1]
+                elif pending[index][1] is not None:
+                    yield pending[index]
+                index += 1
+            if value is not None:
+                yield (key, value)
+        for key, value in pending[index:]:
+            if value is not None:
+                yield (key, value)
+
+    def create(self, path: str, value: str, lease=None, check: bool = True):
         """Create a key and initialise it with the value.
 
         Fails if the key already exists. If a lease is given, the key will
@@ -621,10 +1286,17 @@ class Etcd3Transaction:
         :param path: Path to create
         :param value: Value to set
         :param lease: Lease to associate
+        :param check: Read the key to check that it doesn't exist yet.
+            Otherwise the commit just requires it not to exist, and
+            fails (and gets retried) if it does.
         :raises: ConfigCollision
         """
         self._ensure_uncommitted()
 
+        # Log the key as not existing, which gets checked on commit
+        if not check and path not in self._get_queries and path not in self._updates:
+            self._get_queries[path] = (None, Etcd3Revision(None, None))
+
         # Attempt to get the value - mainly to check whether it exists
         # and put it into the query log
         result = self.get(path)
@@ -674,6 +1346,8 @@ class Etcd3Transaction:
         # Add delete request
         self._updates[path] = (None, None)
 
+    @instrumented_commit
+    @traced_commit
     def commit(self):
         """
         Commit the transaction to the database.
@@ -690,7 +1364,23 @@ class Etcd3Transaction:
             self._committed = True
             return True
 
-        # Create transaction
+        # Done
+        txn = self._build_commit()
+        self._committed = True
+        response = txn.commit()
+
+        # Transactions that did not read anything (e.g. only unchecked
+        # creates) take the revision of their commit
+        if self._revision is None:
+            self._revision = Etcd3Revision(response.header.revision, None)
+        if response.succeeded:
+            for callback in self._commit_callbacks:
+                callback()
+        self._commit_callbacks = []
+        return response.succeeded
+
+    def _build_commit(self) -> etcd3.Txn:
+        """Build etcd transaction checking the query log and applying updates."""
         txn = self._client.Txn()
 
         # Verify get() calls from the query log
@@ -724,6 +1414,15 @@ class Etcd3Transaction:
                 txn.key(tagged_path, prefix=True).create < self._revision.revision + 1
             )
 
+            # If we read values, check that none of them changed
+            if (path, depth) in self._value_queries:
+                txn.compare(
+                    txn.key(tagged_path, prefix=True).mod < self._revision.revision + 1
+                )
+
+        # Verify iter_values() calls from the query log
+        self._compare_scans(txn)
+
         # Commit changes. Note that the dictionary guarantees that we
         # only update any key at most once.
         for path, (value, lease) in self._updates.items():
@@ -733,15 +1432,32 @@ class Etcd3Transaction:
                 txn.success(txn.delete(tagged_path, value, lease_id))
             else:
                 txn.success(txn.put(tagged_path, value, lease_id))
+        return txn
 
-        # Done
-        self._committed = True
-        response = txn.commit()
-        if response.succeeded:
-            for callback in self._commit_callbacks:
-                callback()
-        self._commit_callbacks = []
-        return response.succeeded
+    def _explain(self):
+        """Record what committing would send in the report."""
+        compares = 0
+        if self._updates:
+            # pylint: disable=protected-access
+            compares = len(self._build_commit()._compare)
+        self._report.add_commit(compares, self._updates)
+
+    def _compare_scans(self, txn):
+        """Add checks for iter_values() queries to a commit.
+
+        As for list_values(), all returned keys must still exist, and
+        no key in the range may have been created or changed since.
+        """
+        for (path, depth), result in self._scan_queries.items():
+            tagged_path = _tag_depth(path, depth)
+            for res_path in sorted(result):
+                txn.compare(txn.key(_tag_depth(res_path)).version > 0)
+            txn.compare(
+                txn.key(tagged_path, prefix=True).create < self._revision.revision + 1
+            )
+            txn.compare(
+                txn.key(tagged_path, prefix=True).mod < self._revision.revision + 1
+            )
 
     def on_commit(self, callback: Callable[[], None]):
         """Register a callback to call when the transaction succeeds.
@@ -763,11 +1479,10 @@ class Etcd3Transaction:
         self._revision = revision
         self._get_queries = {}
         self._list_queries = {}
+        self._value_queries = {}
+        self._scan_queries = {}
         self._updates = {}
-        self._committed = False
-        self._loop = False
-        self._watch = False
-        self._watch_timeout = None
+        self._reset_loop()
 
     @deprecated
     def loop(self, watch: bool = False, watch_timeout: float = None):
@@ -778,50 +1493,16 @@ class Etcd3Transaction:
         :param watch: Once the transaction succeeds, block until one of
            the values read changes, then loop the transaction
         """
-        if self._loop:
-            # If called multiple times, looping immediately takes precedence
-            self._watch = self._watch and watch
-        else:
-            self._loop = True
-            self._watch = watch
-        if watch and watch_timeout is not None:
-            self._watch_timeout = watch_timeout
+        self._request_loop(watch, watch_timeout)
 
     def __iter__(self):
         """Iterate transaction as requested by loop(), or until it succeeds."""
         try:
-
-            while self._retries <= self._max_retries:
-
-                # Should build up a transaction
-                yield self
-
-                # Try to commit, count how many times we have tried
-                if not self.commit():
-                    self._retries += 1
-                else:
-                    self._retries = 0
-
-                    # No further loop?
-                    if not self._loop:
-                        return
-
-                    # Use watches? Then wait for something to happen
-                    # before looping.
-                    if self._watch:
-                        self._do_watch()
-
-                # Repeat after reset otherwise
-                self.reset()
-
+            with deadline_scope(self._deadline):
+                yield from self._iterate()
         finally:
             self._clear_watch()
 
-        # Ran out of repeats? Fail
-        raise RuntimeError(
-            "Transaction did not succeed after {} retries!".format(self._max_retries)
-        )
-
     @deprecated
     def clear_watch(self):
         """Stop all currently active watchers.
@@ -843,7 +1524,7 @@ class Etcd3Transaction:
         # on key updates, we will filter that below.
         prefixes = []
         active_watchers = set()
-        for path, depth in self._list_queries:
+        for path, depth in set(self._list_queries) | set(self._scan_queries):
             query = ("list", path, depth)
             # Add tagged prefixes so we can check for key overlap later
             prefixes.append(_tag_depth(path, depth))
@@ -896,11 +1577,42 @@ class Etcd3Transaction:
         """
         return self._do_watch()
 
+    def _wait_time(self, start_time: float) -> float:
+        """Time left to wait for changes, not waiting past the deadline."""
+        timeout = None
+        if self._watch_timeout is not None:
+            timeout = max(0, start_time + self._watch_timeout - time.time())
+        remaining = remaining_time("Watch")
+        if remaining is not None and (timeout is None or remaining < timeout):
+            timeout = remaining
+        return timeout
+
     def _do_watch(self):
         """Wait for a change on one of the values read.
 
         :returns: The revision at which a change was detected.
         """
+        with maybe_span(
+            self._tracer,
+            "watch",
+            keys=len(self._get_queries),
+            ranges=len(self._list_queries) + len(self._scan_queries),
+        ) as span:
+            revision = self._wait_for_change()
+            if span is not None:
+                span["timeout"] = self._got_timeout
+                span["misfires"] = self._misfires
+            return revision
+
+    def _count_event(self, outcome: str):
+        """Count an event seen while waiting, by outcome."""
+        if outcome != "change":
+            self._misfires += 1
+        if self._metrics is not None:
+            self._metrics.watcher_events.inc(self._watcher_name, outcome)
+
+    def _wait_for_change(self):
+        """Wait for a change on one of the values read."""
 
         # Make sure the watchers we have in place match what we read
         self._update_watchers()
@@ -909,12 +1621,12 @@ class Etcd3Transaction:
         block = True
         revision = self._revision
         start_time = time.time()
+        self._woken = None
+        self._misfires = 0
         while True:
 
             # Determine timeout
-            timeout = None
-            if self._watch_timeout is not None:
-                timeout = max(0, start_time + self._watch_timeout - time.time())
+            timeout = self._wait_time(start_time) if block else 0
 
             # Wait for something to get pushed on the queue
             try:
@@ -930,6 +1642,7 @@ class Etcd3Transaction:
 
             # Check that revision is newer (prevent duplicated updates)
             if rev.revision <= revision.revision:
+                self._count_event("stale")
                 continue
 
             # Are we waiting on a value change of this one?
@@ -942,21 +1655,35 @@ class Etcd3Transaction:
                     if tagged_path.startswith(_tag_depth(lpath, depth)):
 
                         # We should not notify for a value change,
-                        # only if a key was added / removed. Good
-                        # thing we can check that using the log.
-                        if value is None or path not in result:
+                        # only if a key was added / removed - unless
+                        # we read the values. Good thing we can check
+                        # that using the log.
+                        if (
+                            value is None
+                            or path not in result
+                            or (lpath, depth) in self._value_queries
+                        ):
                             found_match = True
                             break
 
+                # Any change in a range we iterated over is relevant
+                for lpath, depth in self._scan_queries:
+                    if tagged_path.startswith(_tag_depth(lpath, depth)):
+                        found_match = True
+
                 # Otherwise this is either a misfire from an old
                 # watcher, or a value update from a list watcher (see
                 # above). Ignore.
                 if not found_match:
+                    self._count_event("filtered")
                     continue
 
             # Alright, we can stop waiting. However, we will attempt
             # to clear the queue before we do so, as we might get a
             # lot of updates in batch
+            self._count_event("change")
+            if block:
+                self._woken = (self._watch_queue.put_time, time.monotonic())
             revision = rev
             block = False
 
@@ -989,27 +1716,51 @@ class Etcd3Watcher:
     watching all values read by transactions started through
     :py:meth:`txn`, and only repeat the execution of the loop body
     once one of these values has changed.
+
+    If the backend records metrics, the watcher counts the events it
+    sees by outcome, and records the latency from an event reaching the
+    client to the loop waking up ("queue"), and from there to the
+    commit of the next transaction ("action" and "total"). Events
+    ignored because they were seen already ("stale") or do not change
+    anything read ("filtered") are misfires.
     """
 
+    # pylint: disable=too-many-instance-attributes
+
     def __init__(
         self,
         backend: Etcd3Backend,
         client: etcd3.Client,
         timeout: float = None,
         txn_wrapper: Callable[[Etcd3Transaction], object] = None,
+        deadline: float = None,
+        name: str = None,
     ):
         """Initialise watcher.
 
         :param timeout: Maximum time to wait per loop. If ``None``, will
             wait indefinetely.
+        :param deadline: Time (as in :py:func:`time.time`) by which the
+            watcher must have finished
+        :param name: Name of the watcher in metrics
         """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
 
         self._wait_txn = Etcd3Transaction(backend, client)
+        self._name = name or "default"
+        self._wait_txn._watcher_name = self._name
+        self._woken = None
 
         self._backend = backend
         self._client = client
         self._timeout = timeout
         self._txn_wrapper = txn_wrapper
+        self._deadline = deadline
+
+    @property
+    def name(self) -> str:
+        """Name of the watcher in metrics."""
+        return self._name
 
     def set_timeout(self, timeout: float):
         """Set a timeout.
@@ -1053,11 +1804,12 @@ class Etcd3Watcher:
         # Extract read values from transaction
         # pylint: disable=protected-access,undefined-loop-variable
         if txn._committed:
+            self._record_action()
 
             # Take over earliest revision used in a transaction, as we
             # want to know about any changes from that particular
             # point forward.
-            if (
+            if txn._revision is not None and (
                 self._wait_txn._revision is None
                 or self._wait_txn._revision.revision > txn._revision.revision
             ):
@@ -1065,27 +1817,56 @@ class Etcd3Watcher:
 
             self._wait_txn._get_queries.update(txn._get_queries)
             self._wait_txn._list_queries.update(txn._list_queries)
+            self._wait_txn._value_queries.update(txn._value_queries)
+            self._wait_txn._scan_queries.update(txn._scan_queries)
 
     def __iter__(self):
         """Iterate forever, waiting after every interaction for something to change."""
 
         try:
-            while True:
-                yield self
-
-                # TODO: Move those to this class!
-                # pylint: disable=protected-access
-                self._wait_txn.loop(True, self._timeout)
-                self._wait_txn._do_watch()
-
-                # Clear current queries
-                self._wait_txn._get_queries = {}
-                self._wait_txn._list_queries = {}
-
+            with deadline_scope(self._deadline):
+                yield from self._iterate()
         finally:
             # pylint: disable=protected-access
             self._wait_txn._clear_watch()
 
+    def _iterate(self):
+        while True:
+            remaining_time("Watcher")
+            yield self
+
+            # TODO: Move those to this class!
+            # pylint: disable=protected-access
+            self._wait_txn.loop(True, self._timeout)
+            self._wait_txn._do_watch()
+            self._woken = self._wait_txn._woken
+            metrics = self._backend.metrics
+            if metrics is not None:
+                metrics.watcher_wakeups.inc(
+                    "timeout" if self._wait_txn._got_timeout else "change"
+                )
+                if self._woken is not None:
+                    queued, woken = self._woken
+                    metrics.watcher_latency.observe(woken - queued, self._name, "queue")
+
+            # Clear current queries
+            self._wait_txn._get_queries = {}
+            self._wait_txn._list_queries = {}
+            self._wait_txn._value_queries = {}
+            self._wait_txn._scan_queries = {}
+
+    def _record_action(self):
+        """Record latency from a change to the first commit after it."""
+        if self._woken is None:
+            return
+        queued, woken = self._woken
+        self._woken = None
+        metrics = self._backend.metrics
+        if metrics is not None:
+            now = time.monotonic()
+            metrics.watcher_latency.observe(now - woken, self._name, "action")
+            metrics.watcher_latency.observe(now - queued, self._name, "total")
+
     def trigger(self):
         """Manually triggers a loop
 
@@ -0,0 +1,114 @@
+"""
+Explaining transactions.
+
+In explain mode, a transaction runs once against the database, but
+does not get committed. Instead, it records the requests it makes in
+a :py:class:`TransactionReport`: the reads going to the database, and
+the compares and writes its commit would send. See
+:py:meth:`ska_sdp_config.config.Config.explain`.
+"""
+
+from typing import Dict, Iterable, Optional
+
+# Default limit of etcd on the number of operations in a transaction
+MAX_TXN_OPS = 128
+
+
+def payload_size(values: Iterable[Optional[str]]) -> int:
+    """
+    Count the bytes of values sent or received, as encoded by etcd.
+
+    :param values: Values (or keys), None for missing ones
+    :returns: number of bytes
+    """
+    return sum(len(value.encode("utf-8")) for value in values if value is not None)
+
+
+class TransactionReport:
+    """Requests a transaction would make, as recorded in explain mode.
+
+    For local backends, the numbers are a projection of what etcd
+    would need: every read hitting the local database counts as one
+    request, and compares are derived from the read log as etcd
+    would check it.
+
+    :param max_txn_ops: Limit on the number of operations in a
+        transaction, as configured for etcd (``--max-txn-ops``)
+    """
+
+    def __init__(self, max_txn_ops: int = MAX_TXN_OPS):
+        """Create empty report."""
+        self.max_txn_ops = max_txn_ops
+        self.reads = []  # (operation, path, requests, bytes)
+        self.writes = []  # (operation, path, bytes)
+        self.compares = 0
+
+    def read(self, operation: str, path: str, requests: int = 1, size: int = 0) -> None:
+        """
+        Record a read that went to the database.
+
+        :param operation: Transaction method, e.g. "get"
+        :param path: Path or prefix read
+        :param requests: Number of requests the read needed
+        :param size: Bytes of the values read, or of the keys for
+            reads returning keys only, see :py:func:`payload_size`
+        """
+        self.reads.append((operation, path, requests, size))
+
+    def add_commit(self, compares: int, updates: dict) -> None:
+        """
+        Record what committing the transaction would send.
+
+        :param compares: Number of compares checking the reads
+        :param updates: Deferred updates, as {path: (value, lease)}
+        """
+        self.compares = compares
+        self.writes = [
+            ("delete" if value is None else "put", path, payload_size([value]))
+            for path, (value, _) in updates.items()
+        ]
+
+    @property
+    def requests(self) -> int:
+        """Number of requests, including the commit if there are writes."""
+        return sum(requests for _, _, requests, _ in self.reads) + (
+            1 if self.writes else 0
+        )
+
+    @property
+    def bytes_read(self) -> int:
+        """Number of bytes the reads returned."""
+        return sum(size for _, _, _, size in self.reads)
+
+    @property
+    def bytes_written(self) -> int:
+        """Number of bytes of values the commit would write."""
+        return sum(size for _, _, size in self.writes)
+
+    @property
+    def over_limit(self) -> Dict[str, int]:
+        """Parts of the commit exceeding the limit on operations.
+
+        Maps "compares" and/or "writes" to their number, empty if the
+        commit is within the limit.
+        """
+        sizes = {"compares": self.compares, "writes": len(self.writes)}
+        return {name: size for name, size in sizes.items() if size > self.max_txn_ops}
+
+    def summary(self) -> dict:
+        """
+        Summarise the report.
+
+        :returns: dictionary with the number of requests, reads,
+            compares and writes, the bytes read and written, and the
+            parts over the limit
+        """
+        return {
+            "requests": self.requests,
+            "reads": len(self.reads),
+            "bytes_read": self.bytes_read,
+            "compares": self.compares,
+            "writes": len(self.writes),
+            "bytes_written": self.bytes_written,
+            "over_limit": self.over_limit,
+        }
@@ -3,17 +3,27 @@ Memory backend for SKA SDP configuration DB.
 
 The main purpose of this is for use in testing.
 In principle it should behave in the same way as the etcd backend.
-No attempt has been made to make it thread-safe, so it probably isn't.
+No attempt has been made to make transactions thread-safe. However,
+leases expire on a background thread, so modifications of the data
+are serialised using a lock.
 """
-from typing import List, Callable
+
+import itertools
+import math
+import queue as queue_m
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Tuple
 
 from .common import (
     _depth,
+    _depth_range,
     _tag_depth,
     _untag_depth,
     _check_path,
     ConfigCollision,
     ConfigVanished,
+    Revision,
 )
 
 
@@ -29,46 +39,363 @@ def _op(
     to_do(tag, value)
 
 
+class TimerWheel:
+    """
+    Hashed timer wheel for scheduling expiry of many items cheaply.
+
+    Time is divided into ticks of fixed resolution, which are mapped
+    onto a ring of slots. Scheduling and cancelling an item is O(1),
+    and advancing the wheel only visits the slots of the ticks that
+    have passed. Items scheduled more than one revolution ahead stay in
+    their slot until their tick comes around.
+    """
+
+    def __init__(self, resolution: float = 0.05, slots: int = 512):
+        """
+        Construct an empty timer wheel.
+
+        :param resolution: Duration of a tick in seconds
+        :param slots: Number of slots on the wheel
+        """
+        self._resolution = resolution
+        self._slots = [set() for _ in range(slots)]
+        self._ticks = {}  # item -> tick at which it expires
+        self._tick = self._to_tick(time.monotonic())
+
+    @property
+    def resolution(self) -> float:
+        """Duration of a tick in seconds."""
+        return self._resolution
+
+    def _to_tick(self, when: float) -> int:
+        return math.ceil(when / self._resolution)
+
+    def __len__(self) -> int:
+        """Get number of scheduled items."""
+        return len(self._ticks)
+
+    def __contains__(self, item) -> bool:
+        """Check whether an item is scheduled."""
+        return item in self._ticks
+
+    def schedule(self, item, deadline: float) -> None:
+        """
+        Schedule an item, replacing any previous deadline.
+
+        :param item: Item to schedule (must be hashable)
+        :param deadline: Expiry time, as returned by :py:func:`time.monotonic`
+        """
+        self.cancel(item)
+        tick = max(self._to_tick(deadline), self._tick + 1)
+        self._ticks[item] = tick
+        self._slots[tick % len(self._slots)].add(item)
+
+    def cancel(self, item) -> None:
+        """
+        Remove an item from the wheel, if scheduled.
+
+        :param item: Item to remove
+        """
+        tick = self._ticks.pop(item, None)
+        if tick is not None:
+            self._slots[tick % len(self._slots)].discard(item)
+
+    def advance(self, now: float = None) -> list:
+        """
+        Advance the wheel, removing and returning all expired items.
+
+        :param now: Current time, defaults to :py:func:`time.monotonic`
+        :returns: list of expired items
+        """
+        if now is None:
+            now = time.monotonic()
+        now_tick = math.floor(now / self._resolution)
+        if now_tick <= self._tick:
+            return []
+
+        # Visit every slot whose tick has passed, but never more than
+        # one revolution's worth
+        first = max(self._tick + 1, now_tick - len(self._slots) + 1)
+        expired = []
+        for tick in range(first, now_tick + 1):
+            slot = self._slots[tick % len(self._slots)]
+            due = [item for item in slot if self._ticks[item] <= now_tick]
+            for item in due:
+                slot.discard(item)
+                del self._ticks[item]
+            expired.extend(due)
+        self._tick = now_tick
+        return expired
+
+
+class MemoryLease:
+    """
+    Lease for the memory backend.
+
+    Mirrors the :py:class:`etcd3.Lease` interface. Entering the lease
+    grants it and keeps it alive until it is exited, which revokes it.
+    Alternatively, the lease can be granted with :py:meth:`grant` and
+    kept alive manually using :py:meth:`refresh`. Once a lease expires
+    or gets revoked, all keys associated with it are deleted.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, backend: "MemoryBackend", ttl: float):
+        """
+        Construct a lease (without granting it).
+
+        :param backend: Backend to grant the lease from
+        :param ttl: Time to live in seconds
+        """
+        self._backend = backend
+        self._id = next(self._ids)
+        self.granted_ttl = ttl
+        self.keeping = False
+        self.deadline = None
+
+    # pylint: disable=invalid-name
+    @property
+    def ID(self) -> int:
+        """Lease ID, used for associating keys with the lease."""
+        return self._id
+
+    def grant(self) -> None:
+        """Grant the lease, starting its time to live."""
+        self._backend.grant_lease(self)
+
+    def refresh(self) -> None:
+        """Keep the lease alive once, resetting its time to live."""
+        self._backend.refresh_lease(self)
+
+    keepalive_once = refresh
+
+    def keepalive(self) -> None:
+        """Keep the lease alive until :py:meth:`cancel_keepalive` is called."""
+        self.refresh()
+        self.keeping = True
+
+    def cancel_keepalive(self) -> None:
+        """
+        Stop keeping the lease alive.
+
+        The lease will expire once its time to live runs out, as it
+        would if the owning process had died.
+        """
+        if self.keeping:
+            self.keeping = False
+            self.refresh()
+
+    def ttl(self) -> float:
+        """
+        Get the remaining time to live.
+
+        :returns: time to live in seconds, -1 if expired or not granted
+        """
+        return self._backend.lease_ttl(self)
+
+    def alive(self) -> bool:
+        """Check whether the lease is still alive."""
+        return self.ttl() > 0
+
+    def revoke(self) -> None:
+        """Revoke the lease, deleting all associated keys."""
+        self.keeping = False
+        self._backend.revoke_lease(self)
+
+    def __enter__(self):
+        """Grant the lease and keep it alive."""
+        self.grant()
+        self.keepalive()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Revoke the lease."""
+        self.revoke()
+        return False
+
+
+class MemoryWatch:
+    """
+    Watch request on the memory backend.
+
+    Entering the watch using a `with` block yields a queue of `(key,
+    val, rev)` triples, in the same way as :py:class:`Etcd3Watch`. The
+    value is None if the key was deleted, and the revision is the
+    revision of the backend after the change.
+    """
+
+    def __init__(self, backend: "MemoryBackend", tagged_path: str, prefix: bool):
+        """Initialise watch."""
+        self._backend = backend
+        self._tagged_path = tagged_path
+        self._prefix = prefix
+        self.queue = None
+
+    def matches(self, tag: str) -> bool:
+        """Check whether the watch covers a (tagged) key."""
+        if self._prefix:
+            return tag.startswith(self._tagged_path)
+        return tag == self._tagged_path
+
+    def start(self, queue: queue_m.Queue = None):
+        """Activate the watch, yielding a queue for updates."""
+        if queue is None:
+            queue = queue_m.Queue()
+        self.queue = queue
+        self._backend.add_watch(self)
+
+    def stop(self):
+        """Deactivate the watch."""
+        self._backend.remove_watch(self)
+        self.queue = None
+
+    def __enter__(self):
+        """Use for scoping watch to a block."""
+        self.start()
+        return self.queue
+
+    def __exit__(self, *args):
+        """Use for scoping watch to a block."""
+        self.stop()
+
+
 class MemoryBackend:
     """In-memory backend implementation, principally for testing."""
 
-    # Class variable to store data
+    # pylint: disable=too-many-public-methods
+
+    # Class variables to store data, leases and watches
     _data = {}
+    _revision = 0
+    _lock = threading.RLock()
+    _leases = {}  # lease ID -> lease
+    _lease_keys = {}  # lease ID -> set of tagged paths
+    _key_leases = {}  # tagged path -> lease ID
+    _lease_wheel = TimerWheel()
+    _reaper = None
+    _watches = set()
 
     def __init__(self):
         """Construct a memory backend."""
         return
 
-    def lease(self, *_args, **_kwargs) -> "Lease":  # pylint: disable=no-self-use
+    def lease(self, ttl: float = 10) -> MemoryLease:
         """
-        Generate a dummy lease object.
+        Generate a new lease.
 
-        This currently has no additional methods.
+        Once entered it can be associated with keys, which will be
+        kept alive until the end of the lease. If it is not kept
+        alive, the lease expires after its time to live and all keys
+        associated with it get deleted.
 
-        :param args: arbitrary, not used
-        :param kwargs: arbitrary, not used
-        :returns: dummy lease object
+        :param ttl: Time to live for lease in seconds
+        :returns: lease object
+        """
+        return MemoryLease(self, ttl)
+
+    def grant_lease(self, lease: MemoryLease) -> None:
         """
+        Grant a lease, scheduling its expiry.
 
-        class Lease:  # pylint: disable=too-few-public-methods
-            """Dummy lease class."""
+        :param lease: Lease to grant
+        """
+        with self._lock:
+            self._leases[lease.ID] = lease
+            self._lease_keys.setdefault(lease.ID, set())
+            self._schedule_lease(lease)
+            self._start_reaper()
 
-            def __enter__(self):
-                """Dummy enter method."""
+    def refresh_lease(self, lease: MemoryLease) -> None:
+        """
+        Keep a lease alive, resetting its time to live.
 
-            def __exit__(self, exc_type, exc_val, exc_tb):
-                """Dummy exit method."""
+        :param lease: Lease to refresh
+        """
+        with self._lock:
+            if lease.ID not in self._leases:
+                raise ValueError("Lease {} not granted or expired!".format(lease.ID))
+            self._schedule_lease(lease)
 
-        return Lease()
+    def revoke_lease(self, lease: MemoryLease) -> None:
+        """
+        Revoke a lease, deleting all keys associated with it.
 
-    def txn(self, *_args, **_kwargs) -> "MemoryTransaction":
+        :param lease: Lease to revoke
+        """
+        with self._lock:
+            self._lease_wheel.cancel(lease.ID)
+            self._expire_lease(lease.ID)
+
+    def lease_ttl(self, lease: MemoryLease) -> float:
+        """
+        Get the remaining time to live of a lease.
+
+        :param lease: Lease to query
+        :returns: time to live in seconds, -1 if expired or not granted
+        """
+        with self._lock:
+            self._expire_leases()
+            if lease.ID not in self._leases:
+                return -1
+            if lease.keeping:
+                return lease.granted_ttl
+            return max(0.0, lease.deadline - time.monotonic())
+
+    def _schedule_lease(self, lease: MemoryLease) -> None:
+        lease.deadline = time.monotonic() + lease.granted_ttl
+        self._lease_wheel.schedule(lease.ID, lease.deadline)
+
+    def _expire_lease(self, lease_id: int) -> None:
+        """Forget a lease and delete all keys associated with it."""
+        self._leases.pop(lease_id, None)
+        for tag in sorted(self._lease_keys.get(lease_id, ())):
+            self._pop(tag)
+        self._lease_keys.pop(lease_id, None)
+
+    def _expire_leases(self) -> None:
+        """Expire all leases whose time to live has run out."""
+        with self._lock:
+            for lease_id in self._lease_wheel.advance():
+                lease = self._leases.get(lease_id)
+                if lease is not None and lease.keeping:
+                    # Kept alive - simply reschedule
+                    self._schedule_lease(lease)
+                else:
+                    self._expire_lease(lease_id)
+
+    @classmethod
+    def _start_reaper(cls) -> None:
+        """Make sure somebody is expiring leases."""
+        if cls._reaper is None or not cls._reaper.is_alive():
+            cls._reaper = threading.Thread(
+                target=cls._reap_leases, name="MemoryBackend-leases", daemon=True
+            )
+            cls._reaper.start()
+
+    @classmethod
+    def _reap_leases(cls) -> None:
+        """Expire leases in the background until none are left."""
+        backend = cls()
+        while True:
+            time.sleep(cls._lease_wheel.resolution)
+            with cls._lock:
+                backend._expire_leases()  # pylint: disable=protected-access
+                if not cls._lease_wheel:
+                    cls._reaper = None
+                    return
+
+    def txn(self, *_args, report=None, **_kwargs) -> "MemoryTransaction":
         """
         Create an in-memory "transaction".
 
         :param args: arbitrary, not used
+        :param report: not supported, as writes are applied immediately
         :param kwargs: arbitrary, not used
         :returns: transaction object
         """
+        if report is not None:
+            raise ValueError("Memory backend cannot explain transactions!")
         return MemoryTransaction(self)
 
     def watcher(self, timeout, txn_wrapper, *args, **kwargs):
@@ -82,6 +409,48 @@ class MemoryBackend:
         # pylint: disable=unused-argument
         return MemoryWatcher(txn_wrapper, self, *args, **kwargs)
 
+    def watch(self, path: str, prefix: bool = False, depth: int = None, **_kwargs):
+        """
+        Watch key or key range.
+
+        Use a path ending with `'/'` in combination with `prefix` to
+        watch all child keys.
+
+        :param path: Path of key to query, or prefix of keys.
+        :param prefix: Watch for keys with given prefix if set
+        :param depth: Depth to watch at, defaults to that of the path
+        :returns: `MemoryWatch` object for watch request
+        """
+        if not prefix:
+            _check_path(path)
+        return MemoryWatch(self, _tag_depth(path, depth), prefix)
+
+    def add_watch(self, watch: MemoryWatch) -> None:
+        """
+        Start notifying a watch about changes.
+
+        :param watch: Watch to add
+        """
+        with self._lock:
+            self._watches.add(watch)
+
+    def remove_watch(self, watch: MemoryWatch) -> None:
+        """
+        Stop notifying a watch about changes.
+
+        :param watch: Watch to remove
+        """
+        with self._lock:
+            self._watches.discard(watch)
+
+    def _notify(self, tag: str, value: str) -> None:
+        type(self)._revision += 1
+        for watch in self._watches:
+            if watch.matches(tag):
+                watch.queue.put(
+                    (_untag_depth(tag), value, Revision(self._revision, self._revision))
+                )
+
     def get(self, path: str) -> str:
         """
         Get the value at the given path.
@@ -89,10 +458,32 @@ class MemoryBackend:
         :param path: to lookup
         :returns: the value
         """
+        self._expire_leases()
         return self._data.get(_tag_depth(path), None)
 
-    def _put(self, path: str, value: str) -> None:
-        self._data[path] = value
+    def _put(self, path: str, value: str, lease: MemoryLease = None) -> None:
+        with self._lock:
+            # Writing a key always replaces its lease association
+            old_lease = self._key_leases.pop(path, None)
+            if old_lease is not None:
+                self._lease_keys[old_lease].discard(path)
+            if lease is not None:
+                if lease.ID not in self._leases:
+                    raise ValueError(
+                        "Lease {} not granted or expired!".format(lease.ID)
+                    )
+                self._key_leases[path] = lease.ID
+                self._lease_keys[lease.ID].add(path)
+            self._data[path] = value
+            self._notify(path, value)
+
+    def _pop(self, path: str) -> None:
+        with self._lock:
+            lease_id = self._key_leases.pop(path, None)
+            if lease_id is not None:
+                self._lease_keys[lease_id].discard(path)
+            self._data.pop(path)
+            self._notify(path, None)
 
     def _check_exists(self, path: str) -> None:
         if path not in self._data.keys():
@@ -102,17 +493,26 @@ class MemoryBackend:
         if path in self._data.keys():
             raise ConfigCollision(path, "path {} already in dictionary".format(path))
 
-    def create(self, path: str, value: str, *_args, **_kwargs) -> None:
+    def create(
+        self, path: str, value: str, lease: MemoryLease = None, **_kwargs
+    ) -> None:
         """
         Create an entry at the given path.
 
         :param path: to create an entry
         :param value: of the entry
-        :param args: arbitrary, not used
+        :param lease: lease to associate, the entry gets deleted when
+            it expires
         :param kwargs: arbitrary, not used
         :returns: nothing
         """
-        _op(path, value, self._check_not_exists, self._put)
+        self._expire_leases()
+        _op(
+            path,
+            value,
+            self._check_not_exists,
+            lambda tag, value: self._put(tag, value, lease),
+        )
 
     def update(self, path: str, value: str, *_args, **_kwargs) -> None:
         """
@@ -124,6 +524,7 @@ class MemoryBackend:
         :param kwargs: arbitrary, not used
         :returns: nothing
         """
+        self._expire_leases()
         _op(path, value, self._check_exists, self._put)
 
     def delete(
@@ -143,6 +544,7 @@ class MemoryBackend:
         :param max_depth: maximum depth of recursion
         :returns: nothing
         """
+        self._expire_leases()
         _check_path(path)
         tag = _tag_depth(path)
         if must_exist:
@@ -153,9 +555,9 @@ class MemoryBackend:
                 tag = _tag_depth(path, depth=lvl)
                 for key in self._data.copy().keys():
                     if key.startswith(tag):
-                        self._data.pop(key)
+                        self._pop(key)
         elif tag in self._data.keys():
-            self._data.pop(tag)
+            self._pop(tag)
 
     def list_keys(self, path: str) -> List[str]:
         """
@@ -167,6 +569,7 @@ class MemoryBackend:
         :param path:
         :returns: list of keys
         """
+        self._expire_leases()
         # Match only at this depth level. Special case for top level.
         if path == "/":
             new_path = path
@@ -174,9 +577,84 @@ class MemoryBackend:
         else:
             new_path = path.rstrip("/")
             depth = _depth(new_path) + 1
-        tag = _tag_depth(new_path, depth=depth)
+        # Keep the trailing "/", so that children of other keys with
+        # this one as prefix do not match
+        tag = _tag_depth(path, depth=depth)
         return sorted([_untag_depth(k) for k in self._data if k.startswith(tag)])
 
+    def list_created(self, path: str, limit: int = None) -> List[str]:
+        """
+        Get a list of the keys under the given path, oldest first.
+
+        Dictionaries keep keys in the order they were inserted, which
+        is the order they were created in.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param limit: Maximum number of keys to return
+        :returns: list of keys
+        """
+        self._expire_leases()
+        tag = _tag_depth(path)
+        with self._lock:
+            keys = [_untag_depth(key) for key in self._data if key.startswith(tag)]
+        return keys[:limit]
+
+    def list_values(self, path: str, recurse: int = 0) -> List[Tuple[str, str]]:
+        """
+        Get a list of the keys under the given path, with values.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :returns: sorted list of (key, value) pairs
+        """
+        self._expire_leases()
+        tags = [_tag_depth(path, _depth(path) + lvl) for lvl in _depth_range(recurse)]
+        with self._lock:
+            return sorted(
+                (_untag_depth(key), value)
+                for key, value in self._data.items()
+                if any(key.startswith(tag) for tag in tags)
+            )
+
+    def current_revision(self) -> Revision:
+        """
+        Get the current revision of the database.
+
+        Mirrors :py:meth:`Etcd3Backend.current_revision`.
+
+        :returns: current revision
+        """
+        with self._lock:
+            return Revision(self._revision)
+
+    def range_values(
+        self, path: str = "/", max_depth: int = None, **_kwargs
+    ) -> Tuple[Revision, Iterator[Tuple[str, str, int]]]:
+        """
+        Read all keys with the given prefix, at any depth, with values.
+
+        Mirrors :py:meth:`Etcd3Backend.range_values`. Only the current
+        revision is available, and keys do not have mod revisions.
+
+        :param path: Prefix of keys to read
+        :param max_depth: Maximum depth of keys to read, relative to path.
+            Defaults to all depths.
+        :param kwargs: arbitrary, not used
+        :returns: (revision, iterator of (path, value, None))
+        """
+        self._expire_leases()
+        with self._lock:
+            end_depth = None if max_depth is None else _depth(path) + max_depth
+            items = [
+                (_untag_depth(key), value, None)
+                for key, value in sorted(self._data.items())
+                if _untag_depth(key).startswith(path)
+                and (end_depth is None or _depth(_untag_depth(key)) < end_depth)
+            ]
+            return (Revision(self._revision), iter(items))
+
     def close(self) -> None:
         """
         Close the resource.
@@ -233,17 +711,27 @@ class MemoryTransaction:
         """
         return self.backend.get(path)
 
-    def create(self, path: str, value: str, *_args, **_kwargs) -> None:
+    def get_many(self, paths: Iterable[str], **_kwargs) -> dict:
+        """
+        Get the values at the given paths.
+
+        :param paths: to lookup
+        :param kwargs: arbitrary, not used
+        :returns: {path: (value, None)}
+        """
+        return {path: (self.backend.get(path), None) for path in paths}
+
+    def create(self, path: str, value: str, lease=None, **_kwargs) -> None:
         """
         Create an entry at the given path.
 
         :param path: to create an entry
         :param value: of the entry
-        :param args: arbitrary, not used
+        :param lease: lease to associate
         :param kwargs: arbitrary, not used
         :returns: nothing
         """
-        self.backend.create(path, value)
+        self.backend.create(path, value, lease)
 
     def update(self, path: str, value: str, *_args, **_kwargs) -> None:
         """
@@ -285,6 +773,42 @@ class MemoryTransaction:
         # pylint: disable=unused-argument
         return self.backend.list_keys(path)
 
+    def list_created(self, path: str, limit: int = None) -> List[str]:
+        """
+        Get a list of the keys under the given path, oldest first.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param limit: Maximum number of keys to return
+        :returns: list of keys
+        """
+        return self.backend.list_created(path, limit)
+
+    def list_values(self, path: str, recurse: int = 0) -> List[Tuple[str, str]]:
+        """
+        Get a list of the keys under the given path, with values.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :returns: sorted list of (key, value) pairs
+        """
+        return self.backend.list_values(path, recurse)
+
+    def iter_values(
+        self, path: str, recurse: int = 0, **_kwargs
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Iterate over the keys under the given path, with values.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Children depths to include in search
+        :param kwargs: arbitrary, not used
+        :returns: iterator of (key, value) pairs, sorted by key
+        """
+        return iter(self.backend.list_values(path, recurse))
+
     def loop(self, *_args, **_kwargs) -> None:
         """
         Loop the transaction.
@@ -0,0 +1,433 @@
+"""
+Metrics of requests made to the configuration database.
+
+Backends record round trips, latencies, bytes transferred, transaction
+commits and retries, watch events, watcher wake-ups and lease
+keep-alives in a :py:class:`MetricsRegistry`, if one is set. Without a
+registry, instrumented methods only check for it, so the overhead is
+negligible.
+
+Metrics can be exported in the Prometheus text exposition format,
+either by calling :py:meth:`MetricsRegistry.exposition` or by serving
+them over HTTP using :py:meth:`MetricsRegistry.serve`.
+"""
+
+import bisect
+import functools
+import http.server
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# Upper bounds of latency histogram buckets, in seconds. Covers both
+# local backends (sub-millisecond) and etcd round trips.
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+PREFIX = "ska_sdp_config_"
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(
+                name,
+                str(value)
+                .replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n"),
+            )
+            for name, value in zip(names, values)
+        )
+    )
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Counter, optionally with labels.
+
+    :param name: Name of the metric
+    :param documentation: Help text
+    :param labelnames: Names of labels
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str] = ()):
+        """Create counter."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """
+        Increment counter.
+
+        :param labels: Values of labels
+        :param amount: Amount to increment by
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        """
+        Get value of counter.
+
+        :param labels: Values of labels
+        :returns: Current value
+        """
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Get samples as (name, labels, value) for exposition."""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            (self.name + "_total", _format_labels(self.labelnames, labels), value)
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """Histogram of observations, optionally with labels.
+
+    :param name: Name of the metric
+    :param documentation: Help text
+    :param labelnames: Names of labels
+    :param buckets: Upper bounds of buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str] = (),
+        buckets: Tuple[float] = DEFAULT_BUCKETS,
+    ):
+        """Create histogram."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Record an observation.
+
+        :param value: Observed value
+        :param labels: Values of labels
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def count(self, *labels: str) -> int:
+        """
+        Get number of observations.
+
+        :param labels: Values of labels
+        :returns: Number of observations
+        """
+        values = self._values.get(labels)
+        return 0 if values is None else values[-1]
+
+    def sum(self, *labels: str) -> float:
+        """
+        Get sum of observations.
+
+        :param labels: Values of labels
+        :returns: Sum of observed values
+        """
+        values = self._values.get(labels)
+        return 0.0 if values is None else values[-2]
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Get samples as (name, labels, value) for exposition."""
+        with self._lock:
+            items = sorted(
+                (labels, list(values)) for labels, values in self._values.items()
+            )
+        names = self.labelnames + ("le",)
+        samples = []
+        for labels, values in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                samples.append(
+                    (
+                        self.name + "_bucket",
+                        _format_labels(names, labels + (_format_value(bound),)),
+                        cumulative,
+                    )
+                )
+            samples.append(
+                (
+                    self.name + "_bucket",
+                    _format_labels(names, labels + ("+Inf",)),
+                    values[-1],
+                )
+            )
+            label_str = _format_labels(self.labelnames, labels)
+            samples.append((self.name + "_sum", label_str, values[-2]))
+            samples.append((self.name + "_count", label_str, values[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """Registry of metrics recorded by backends.
+
+    Use :py:data:`REGISTRY` to share metrics between all backends of a
+    process, or create separate registries.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self):
+        """Create registry with the metrics recorded by backends."""
+        self._metrics = []
+        self.requests = self.histogram(
+            "request_duration_seconds",
+            "Round trips to the database server by RPC method, and their latency",
+            ("method",),
+        )
+        self.request_bytes = self.counter(
+            "request_bytes", "Bytes sent to the database server", ("method",)
+        )
+        self.response_bytes = self.counter(
+            "response_bytes", "Bytes received from the database server", ("method",)
+        )
+        self.operations = self.histogram(
+            "operation_duration_seconds",
+            "Backend operations by type, and their latency",
+            ("operation",),
+        )
+        self.operation_errors = self.counter(
+            "operation_errors",
+            "Backend operations raising an exception",
+            ("operation",),
+        )
+        self.commits = self.histogram(
+            "commit_duration_seconds",
+            "Transaction commits by result, and their latency",
+            ("result",),
+        )
+        self.retries = self.counter(
+            "transaction_retries", "Transactions repeated because of conflicts"
+        )
+        self.watch_events = self.counter("watch_events", "Events received by watches")
+        self.watcher_wakeups = self.counter(
+            "watcher_wakeups",
+            "Watcher loops woken up, by reason (change or timeout)",
+            ("reason",),
+        )
+        self.watcher_events = self.counter(
+            "watcher_events",
+            "Events seen by watchers, by outcome: change (relevant), stale "
+            "(revision seen already) or filtered (no relevant change)",
+            ("watcher", "outcome"),
+        )
+        self.watcher_latency = self.histogram(
+            "watcher_latency_seconds",
+            "Latency of watchers by stage: queue (event queued to loop woken), "
+            "action (loop woken to next commit) and total",
+            ("watcher", "stage"),
+        )
+        self.lease_keepalives = self.counter(
+            "lease_keepalives", "Lease keep-alive requests"
+        )
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Tuple[str] = ()
+    ) -> Counter:
+        """
+        Add a counter to the registry.
+
+        :param name: Name of the metric, without prefix and ``_total``
+        :param documentation: Help text
+        :param labelnames: Names of labels
+        :returns: counter
+        """
+        metric = Counter(PREFIX + name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str] = (),
+        buckets: Tuple[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """
+        Add a histogram to the registry.
+
+        :param name: Name of the metric, without prefix
+        :param documentation: Help text
+        :param labelnames: Names of labels
+        :param buckets: Upper bounds of buckets
+        :returns: histogram
+        """
+        metric = Histogram(PREFIX + name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Get totals of all metrics, summed over labels.
+
+        Histograms are reported by their number of observations.
+
+        :returns: Totals by metric name (without prefix)
+        """
+        totals = {}
+        for metric in self._metrics:
+            name = metric.name[len(PREFIX) :]
+            suffix = "_total" if metric.kind == "counter" else "_count"
+            totals[name] = sum(
+                value
+                for sample, _, value in metric.samples()
+                if sample == metric.name + suffix
+            )
+        return totals
+
+    def exposition(self) -> str:
+        """
+        Format metrics in the Prometheus text exposition format.
+
+        :returns: metrics as text
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append("{}{} {}".format(name, labels, _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, addr: str = "") -> http.server.HTTPServer:
+        """
+        Serve metrics over HTTP for Prometheus to scrape.
+
+        The server runs in a daemon thread, use ``shutdown()`` on the
+        returned server to stop it.
+
+        :param port: Port to listen on, 0 to pick a free one
+        :param addr: Address to listen on, defaults to all interfaces
+        :returns: HTTP server
+        """
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Respond to every GET request with the metrics."""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Send metrics."""
+                body = registry.exposition().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):  # pylint: disable=arguments-differ
+                """Do not log requests."""
+
+        server = http.server.ThreadingHTTPServer((addr, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(
+            target=server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        return server
+
+
+# Registry shared by all backends of the process by default
+REGISTRY = MetricsRegistry()
+
+
+def instrumented(operation: str, attribute: str = "metrics"):
+    """
+    Decorate a method to record its latency as a backend operation.
+
+    :param operation: Name of the operation
+    :param attribute: Attribute of the object holding the registry,
+        which is None if metrics are disabled
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            metrics = getattr(self, attribute)
+            if metrics is None:
+                return func(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            except Exception:
+                metrics.operation_errors.inc(operation)
+                raise
+            finally:
+                metrics.operations.observe(time.perf_counter() - start, operation)
+
+        return wrapper
+
+    return decorator
+
+
+def instrumented_commit(func):
+    """
+    Decorate the commit method of a transaction to record its latency
+    and result ("success", "conflict" or "error").
+
+    The transaction holds the registry in its ``_metrics`` attribute.
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        metrics = self._metrics  # pylint: disable=protected-access
+        if metrics is None:
+            return func(self, *args, **kwargs)
+        start = time.perf_counter()
+        result = "error"
+        try:
+            committed = func(self, *args, **kwargs)
+            result = "success" if committed else "conflict"
+            return committed
+        finally:
+            metrics.commits.observe(time.perf_counter() - start, result)
+
+    return wrapper
@@ -0,0 +1,214 @@
+"""
+Client-side rate limiting of database requests.
+
+Requests are limited by token buckets, with separate budgets for reads,
+writes and creating watches. Every request belongs to a priority class.
+Requests of lower priority classes can only use part of a budget, the
+rest is held back for requests of higher priority classes. This way,
+bulk operations and interactive use yield to control-path traffic.
+"""
+
+import contextlib
+import threading
+import time
+from typing import Dict, Iterator
+
+from .common import ConfigTimeout, remaining_time
+
+# Kinds of requests with separate budgets
+KINDS = ("read", "write", "watch")
+
+# Priority classes, most important first, with the fraction of the
+# budget held back from them for more important requests
+PRIORITIES = {"control": 0.0, "interactive": 0.25, "bulk": 0.5}
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """
+    Parse rate limits from a string like ``read=200,write=50``.
+
+    :param spec: Comma-separated ``kind=rate`` pairs
+    :returns: Rate limits by kind of request, in requests per second
+    """
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        kind, _, rate = item.partition("=")
+        limits[kind.strip()] = float(rate)
+    return limits
+
+
+class TokenBucket:
+    """Token bucket.
+
+    :param rate: Tokens added per second
+    :param burst: Maximum number of tokens, defaults to one second worth
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        """Create bucket, initially full."""
+        if rate <= 0:
+            raise ValueError("Rate must be positive, not {}!".format(rate))
+        self._rate = rate
+        self._capacity = max(burst or rate, 1.0)
+        self._tokens = self._capacity
+        self._time = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second."""
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        """Maximum number of tokens."""
+        return self._capacity
+
+    def try_take(self, reserve: float = 0.0) -> float:
+        """
+        Take a token, if available.
+
+        :param reserve: Fraction of the capacity that must be left in
+            the bucket after taking the token
+        :returns: 0 if a token was taken, otherwise the time until
+            one will be available, in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._time) * self._rate
+            )
+            self._time = now
+            # Always allow using the last token, so that every priority
+            # class can make progress on small budgets
+            needed = 1.0 + min(reserve * self._capacity, self._capacity - 1.0)
+            if self._tokens >= needed:
+                self._tokens -= 1.0
+                return 0.0
+            return (needed - self._tokens) / self._rate
+
+
+class RateLimiter:
+    """Rate limiter for requests of a backend.
+
+    :param read: Read requests per second, None for no limit
+    :param write: Write requests per second, None for no limit
+    :param watch: Watches created per second, None for no limit
+    :param burst: Number of seconds worth of requests that can be made
+        at once
+    :param priority: Default priority class, see :py:data:`PRIORITIES`
+    """
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self,
+        read: float = None,
+        write: float = None,
+        watch: float = None,
+        burst: float = 1.0,
+        priority: str = "control",
+    ):
+        """Create rate limiter."""
+        self._check_priority(priority)
+        rates = {"read": read, "write": write, "watch": watch}
+        self._buckets = {
+            kind: TokenBucket(rate, rate * burst)
+            for kind, rate in rates.items()
+            if rate is not None
+        }
+        self._priority = priority
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {
+            (kind, name): {"requests": 0, "throttled": 0, "throttled_seconds": 0.0}
+            for kind in KINDS
+            for name in PRIORITIES
+        }
+
+    @staticmethod
+    def _check_priority(priority: str):
+        if priority not in PRIORITIES:
+            raise ValueError(
+                "Unknown priority class {}, expected one of {}!".format(
+                    priority, ", ".join(PRIORITIES)
+                )
+            )
+
+    @property
+    def limits(self) -> Dict[str, float]:
+        """Rate limits by kind of request."""
+        return {kind: bucket.rate for kind, bucket in self._buckets.items()}
+
+    @property
+    def priority(self) -> str:
+        """Priority class of requests made by the current thread."""
+        return getattr(self._local, "priority", self._priority)
+
+    @contextlib.contextmanager
+    def priority_class(self, priority: str) -> Iterator[None]:
+        """
+        Make requests in a block with the given priority class.
+
+        Only applies to requests made by the current thread.
+
+        :param priority: Priority class, see :py:data:`PRIORITIES`
+        """
+        self._check_priority(priority)
+        previous = self.priority
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def acquire(self, kind: str) -> float:
+        """
+        Wait until a request may be made.
+
+        :param kind: Kind of request, see :py:data:`KINDS`
+        :returns: Time waited, in seconds
+        :raises: ConfigTimeout if the request could only be made after
+            the deadline of the current thread
+        """
+        bucket = self._buckets.get(kind)
+        if bucket is None:
+            return 0.0
+        priority = self.priority
+        reserve = PRIORITIES[priority]
+        waited = 0.0
+        while True:
+            delay = bucket.try_take(reserve)
+            if delay == 0.0:
+                break
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                raise ConfigTimeout(
+                    "Rate limit for {} requests would miss deadline!".format(kind)
+                )
+            time.sleep(delay)
+            waited += delay
+
+        with self._lock:
+            stats = self._stats[kind, priority]
+            stats["requests"] += 1
+            if waited > 0:
+                stats["throttled"] += 1
+                stats["throttled_seconds"] += waited
+        return waited
+
+    def stats(self) -> Dict[str, Dict[str, dict]]:
+        """
+        Get statistics about requests and throttling.
+
+        :returns: For every kind of request and priority class, the
+            number of ``requests``, how many were ``throttled`` and the
+            time spent waiting in ``throttled_seconds``
+        """
+        with self._lock:
+            return {
+                kind: {name: dict(self._stats[kind, name]) for name in PRIORITIES}
+                for kind in KINDS
+            }
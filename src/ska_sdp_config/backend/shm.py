@@ -0,0 +1,745 @@
+"""
+Shared-memory backend for SKA SDP configuration DB.
+
+Keeps the keyspace in a memory-mapped file - by default placed in
+``/dev/shm`` - so that several processes on the same node can share a
+configuration database without running etcd.
+
+The file holds a header, a table of leases and an append-only log of
+changes. Every process maintains its own index of the keyspace, which
+it brings up to date by replaying the log from where it left off.
+Readers never take locks: a sequence counter in the header (a
+"seqlock") tells them whether they have seen a consistent end of the
+log. Writers serialise using an exclusive ``flock`` on the file,
+validate their transaction against the up-to-date index, append their
+changes and then publish the new end of the log. Once the log fills
+up, it gets compacted in place (or grown if mostly live). Other
+processes pick up changes by polling the header, which is cheap.
+
+Transactions read from a snapshot at a fixed revision. While any
+snapshot is open, the index remembers the previous version of every
+key changed, so that it can be read as it was at the revision of the
+snapshot.
+"""
+
+import bisect
+import collections
+import contextlib
+import fcntl
+import mmap
+import os
+import struct
+import time
+import weakref
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .common import (
+    _check_path,
+    _depth,
+    _tag_depth,
+    _untag_depth,
+    ConfigCollision,
+    OptimisticBackend,
+    Revision,
+)
+from .memory import MemoryLease, MemoryWatch
+
+DEFAULT_PATH = "/dev/shm/ska-sdp-config"
+
+# File layout. Header: magic, sequence counter, generation (bumped on
+# compaction), revision, end of log, next lease ID
+_MAGIC = b"SDPSHM01"
+_HEADER = struct.Struct("<8sQQQQQ")
+_SEQ = struct.Struct("<Q")
+_SEQ_OFFSET = 8
+_HEADER_SIZE = 64
+
+# Lease table: ID (0 if slot is free), TTL, deadline (monotonic clock,
+# which is shared between processes on Linux)
+_LEASE = struct.Struct("<Qdd")
+_MAX_LEASES = 1024
+_LEASES_START = _HEADER_SIZE
+_LOG_START = _LEASES_START + _MAX_LEASES * _LEASE.size
+
+# Log records: length, (mod) revision, create revision, operation,
+# lease, key length - followed by key and value
+_RECORD = struct.Struct("<IQQBQI")
+_PUT = 1
+_DELETE = 2
+
+_Entry = collections.namedtuple(
+    "_Entry", ["value", "mod_revision", "create_revision", "lease"]
+)
+
+
+class _Retry(Exception):
+    """Log changed under our feet while reading, try again."""
+
+
+class _Snapshot:
+    """Reads the index of the shared-memory backend at a fixed revision."""
+
+    def __init__(self, backend: "SharedMemoryBackend", revision: int):
+        self._backend = backend
+        self.revision = revision
+
+    def read(self, path: str) -> Tuple[str, int]:
+        """Read value and mod revision of a key, both None if it doesn't exist."""
+        # pylint: disable=protected-access
+        with self._backend._lock:
+            entry = self._backend._entry_at(_tag_depth(path), self.revision)
+        if entry is None:
+            return (None, None)
+        return (entry.value, entry.mod_revision)
+
+    def read_keys(self, path: str, depth: int) -> List[str]:
+        """List keys with the given prefix at the given depth."""
+        # pylint: disable=protected-access
+        with self._backend._lock:
+            tags = self._backend._tags_at(_tag_depth(path, depth), self.revision)
+        return [_untag_depth(tag) for tag in tags]
+
+    def read_created(self, path: str, depth: int) -> List[str]:
+        """List keys with the given prefix at the given depth, oldest first."""
+        # pylint: disable=protected-access
+        with self._backend._lock:
+            tags = self._backend._tags_at(_tag_depth(path, depth), self.revision)
+            created = [
+                (self._backend._entry_at(tag, self.revision).create_revision, tag)
+                for tag in tags
+            ]
+        return [_untag_depth(tag) for _, tag in sorted(created)]
+
+    def close(self):
+        """Release the snapshot."""
+        self._backend._release(self)  # pylint: disable=protected-access
+
+
+class SharedMemoryWatch(MemoryWatch):
+    """
+    Watch request on the shared-memory backend.
+
+    Entering the watch using a `with` block yields a queue of `(key,
+    val, rev)` triples, in the same way as :py:class:`Etcd3Watch`.
+    """
+
+
+class SharedMemoryLease(MemoryLease):
+    """
+    Lease for the shared-memory backend.
+
+    Leases are stored in the shared file, so keys associated with them
+    get deleted by whichever process notices the expiry first. The
+    lease ID is allocated when the lease is granted.
+    """
+
+    def grant(self) -> None:
+        """Grant the lease, starting its time to live."""
+        self._id = self._backend.grant_lease(self)
+
+
+class SharedMemoryBackend(OptimisticBackend):
+    """
+    Database backend sharing the keyspace between processes on one node.
+
+    :param path: Path of the shared file. Created if it doesn't exist.
+    :param size: Initial size of the file in bytes
+    :param poll_interval: Interval in seconds in which to check for
+        changes made by other processes while watching
+    """
+
+    # pylint: disable=too-many-instance-attributes,too-many-public-methods
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        size: int = 16 * 1024 * 1024,
+        poll_interval: float = 0.01,
+    ):
+        """Open (or create) the shared keyspace."""
+        super().__init__(poll_interval)
+        self._path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < _LOG_START:
+                os.ftruncate(self._fd, max(size, 2 * _LOG_START))
+                with mmap.mmap(self._fd, _LOG_START) as init:
+                    init[:_LOG_START] = bytes(_LOG_START)
+                    _HEADER.pack_into(init, 0, _MAGIC, 0, 0, 1, _LOG_START, 1)
+            self._mmap = mmap.mmap(self._fd, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if self._mmap[:8] != _MAGIC:
+            raise ValueError("{} is not a configuration database!".format(path))
+
+        # Process-local index
+        self._index = {}  # tagged path -> _Entry
+        self._sorted = []  # sorted tagged paths
+        self._lease_index = {}  # lease ID -> set of tagged paths
+        self._generation = None
+        self._offset = _LOG_START
+        self._revision = 0
+
+        # Previous versions of keys changed while snapshots are open
+        self._snapshots = weakref.WeakSet()
+        self._undo = {}  # tagged path -> [(revision, previous _Entry)]
+        self._undo_log = collections.deque()  # (revision, tagged path)
+
+        self._sync()
+
+    @property
+    def path(self) -> str:
+        """Path of the shared file."""
+        return self._path
+
+    # -------------------------------------
+    # Reading the log
+    # -------------------------------------
+
+    def _read_header(self) -> Tuple[int, int, int, int]:
+        """Read a consistent header: sequence, generation, revision, end."""
+        while True:
+            magic, seq, generation, revision, end, _ = _HEADER.unpack_from(
+                self._mmap, 0
+            )
+            if magic != _MAGIC:
+                raise ValueError("Configuration database corrupted!")
+            if seq & 1 or _SEQ.unpack_from(self._mmap, _SEQ_OFFSET)[0] != seq:
+                time.sleep(0)
+                continue
+            return seq, generation, revision, end
+
+    def _read_records(self, start: int, end: int) -> list:
+        """Decode log records in the given byte range."""
+        if end > len(self._mmap):
+            self._mmap = mmap.mmap(self._fd, 0)
+        records = []
+        offset = start
+        while offset < end:
+            try:
+                length, mod_rev, create_rev, opr, lease, klen = _RECORD.unpack_from(
+                    self._mmap, offset
+                )
+            except struct.error as err:
+                raise _Retry() from err
+            if length < _RECORD.size + klen or offset + length > end:
+                raise _Retry()
+            body = offset + _RECORD.size
+            try:
+                tag = self._mmap[body : body + klen].decode("utf-8")
+                value = self._mmap[body + klen : offset + length].decode("utf-8")
+            except UnicodeDecodeError as err:
+                raise _Retry() from err
+            records.append((tag, opr, value, mod_rev, create_rev, lease))
+            offset += length
+        return records
+
+    def _sync(self) -> List[tuple]:
+        """Bring the local index up to date with the shared log.
+
+        :returns: list of `(tagged path, value, revision)` changes
+        """
+        with self._lock:
+            while True:
+                seq, generation, revision, end = self._read_header()
+                if generation == self._generation and end == self._offset:
+                    return []
+                start = self._offset if generation == self._generation else _LOG_START
+                try:
+                    records = self._read_records(start, end)
+                except _Retry:
+                    continue
+                # Make sure nobody compacted the log while we were reading
+                if _SEQ.unpack_from(self._mmap, _SEQ_OFFSET)[0] != seq:
+                    _, new_generation, _, _ = self._read_header()
+                    if new_generation != generation:
+                        continue
+                break
+
+            if generation == self._generation:
+                changes = [self._apply(record) for record in records]
+            else:
+                changes = self._reload(records, revision)
+            self._generation = generation
+            self._offset = end
+            self._revision = revision
+            changes = [change for change in changes if change is not None]
+            if changes:
+                self._dispatch(changes)
+            return changes
+
+    def _remember(self, tag: str, revision: int, old):
+        """Remember the previous version of a changed key for snapshots."""
+        if self._snapshots:
+            self._undo.setdefault(tag, []).append((revision, old))
+            self._undo_log.append((revision, tag))
+
+    def _apply(self, record, remember: bool = True):
+        tag, opr, value, mod_rev, create_rev, lease = record
+        old = self._index.get(tag)
+        if old is not None and old.lease:
+            self._lease_index.get(old.lease, set()).discard(tag)
+        if opr == _DELETE:
+            if old is None:
+                return None
+            if remember:
+                self._remember(tag, mod_rev, old)
+            del self._index[tag]
+            del self._sorted[bisect.bisect_left(self._sorted, tag)]
+            return (tag, None, mod_rev)
+        if old is None:
+            bisect.insort(self._sorted, tag)
+        if remember:
+            self._remember(tag, mod_rev, old)
+        self._index[tag] = _Entry(value, mod_rev, create_rev, lease)
+        if lease:
+            self._lease_index.setdefault(lease, set()).add(tag)
+        return (tag, value, mod_rev)
+
+    def _reload(self, records, revision) -> list:
+        """Rebuild the index from scratch (after compaction)."""
+        old_index = self._index
+        self._index = {}
+        self._sorted = []
+        self._lease_index = {}
+        for record in records:
+            self._apply(record, remember=False)
+
+        # Work out what changed compared to what we knew
+        changes = [
+            (tag, entry.value, entry.mod_revision)
+            for tag, entry in self._index.items()
+            if tag not in old_index or old_index[tag].mod_revision != entry.mod_revision
+        ]
+        changes += [
+            (tag, None, revision) for tag in old_index if tag not in self._index
+        ]
+        for tag, _, mod_rev in sorted(changes, key=lambda change: change[2]):
+            self._remember(tag, mod_rev, old_index.get(tag))
+        return changes
+
+    # -------------------------------------
+    # Writing the log
+    # -------------------------------------
+
+    @contextlib.contextmanager
+    def _write_locked(self):
+        """Context for writing: excludes other threads and processes."""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _publish(self, **fields):
+        """Update header fields, bracketed by the sequence counter."""
+        header = list(_HEADER.unpack_from(self._mmap, 0))
+        seq = header[1]
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, seq + 1)
+        names = ["magic", "seq", "generation", "revision", "end", "next_lease"]
+        for name, value in fields.items():
+            header[names.index(name)] = value
+        header[1] = seq + 1
+        _HEADER.pack_into(self._mmap, 0, *header)
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, seq + 2)
+
+    @staticmethod
+    def _encode(record) -> bytes:
+        tag, opr, value, mod_rev, create_rev, lease = record
+        key = tag.encode("utf-8")
+        val = b"" if value is None else value.encode("utf-8")
+        length = _RECORD.size + len(key) + len(val)
+        return (
+            _RECORD.pack(length, mod_rev, create_rev, opr, lease, len(key)) + key + val
+        )
+
+    def _append(self, ops: Iterable[Tuple[str, str, int]]) -> int:
+        """Append changes as a new revision. Must hold the write lock.
+
+        :param ops: `(tagged path, value, lease ID)` triples, value None
+           for deletion
+        :returns: new revision
+        """
+        revision = self._revision + 1
+        records = []
+        for tag, value, lease in ops:
+            old = self._index.get(tag)
+            if value is None:
+                if old is not None:
+                    records.append(self._encode((tag, _DELETE, None, revision, 0, 0)))
+            else:
+                create_rev = revision if old is None else old.create_revision
+                records.append(
+                    self._encode((tag, _PUT, value, revision, create_rev, lease))
+                )
+        if not records:
+            return self._revision
+        data = b"".join(records)
+
+        if self._offset + len(data) > len(self._mmap):
+            self._make_room(len(data))
+        self._mmap[self._offset : self._offset + len(data)] = data
+        self._publish(revision=revision, end=self._offset + len(data))
+        self._sync()
+        return revision
+
+    def _make_room(self, needed: int):
+        """Compact the log, growing the file if it is mostly live data."""
+        if os.fstat(self._fd).st_size > len(self._mmap):
+            # Another process grew the file already
+            self._mmap = mmap.mmap(self._fd, 0)
+            if self._offset + needed <= len(self._mmap):
+                return
+        snapshot = b"".join(
+            self._encode(
+                (
+                    tag,
+                    _PUT,
+                    entry.value,
+                    entry.mod_revision,
+                    entry.create_revision,
+                    entry.lease,
+                )
+            )
+            for tag, entry in self._index.items()
+        )
+        capacity = len(self._mmap) - _LOG_START
+        if len(snapshot) + needed > capacity // 2:
+            size = len(self._mmap)
+            while size - _LOG_START < 2 * (len(snapshot) + needed):
+                size *= 2
+            os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, 0)
+
+        # Rewrite the log in place. Readers notice by the changed
+        # sequence counter and generation.
+        header = list(_HEADER.unpack_from(self._mmap, 0))
+        seq = header[1]
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, seq + 1)
+        self._mmap[_LOG_START : _LOG_START + len(snapshot)] = snapshot
+        header[1] = seq + 1
+        header[2] += 1
+        header[4] = _LOG_START + len(snapshot)
+        _HEADER.pack_into(self._mmap, 0, *header)
+        _SEQ.pack_into(self._mmap, _SEQ_OFFSET, seq + 2)
+        self._sync()
+
+    # -------------------------------------
+    # Leases and watches
+    # -------------------------------------
+
+    def lease(self, ttl: float = 10) -> SharedMemoryLease:
+        """
+        Generate a new lease.
+
+        Once entered it can be associated with keys, which will be
+        kept alive until the end of the lease. If it is not kept
+        alive, the lease expires after its time to live and all keys
+        associated with it get deleted.
+
+        :param ttl: Time to live for lease in seconds
+        :returns: lease object
+        """
+        return SharedMemoryLease(self, ttl)
+
+    def _find_lease(self, lease_id: int) -> int:
+        """Find the offset of a lease in the lease table, None if not found."""
+        for slot in range(_MAX_LEASES):
+            offset = _LEASES_START + slot * _LEASE.size
+            if _LEASE.unpack_from(self._mmap, offset)[0] == lease_id:
+                return offset
+        return None
+
+    def grant_lease(self, lease: SharedMemoryLease) -> int:
+        """
+        Grant a lease, allocating it in the lease table.
+
+        :param lease: Lease to grant
+        :returns: Lease ID
+        """
+        with self._write_locked():
+            offset = self._find_lease(0)
+            if offset is None:
+                raise RuntimeError("Too many leases!")
+            lease_id = _HEADER.unpack_from(self._mmap, 0)[5]
+            self._publish(next_lease=lease_id + 1)
+            lease.deadline = time.monotonic() + lease.granted_ttl
+            _LEASE.pack_into(
+                self._mmap, offset, lease_id, lease.granted_ttl, lease.deadline
+            )
+            self._leases[lease_id] = lease
+        self._start_poller()
+        return lease_id
+
+    def refresh_lease(self, lease: SharedMemoryLease) -> None:
+        """
+        Keep a lease alive, resetting its time to live.
+
+        :param lease: Lease to refresh
+        """
+        with self._write_locked():
+            offset = self._find_lease(lease.ID)
+            if offset is None:
+                raise ValueError("Lease {} not granted or expired!".format(lease.ID))
+            lease.deadline = time.monotonic() + lease.granted_ttl
+            _LEASE.pack_into(
+                self._mmap, offset, lease.ID, lease.granted_ttl, lease.deadline
+            )
+
+    def revoke_lease(self, lease: SharedMemoryLease) -> None:
+        """
+        Revoke a lease, deleting all keys associated with it.
+
+        :param lease: Lease to revoke
+        """
+        with self._write_locked():
+            self._leases.pop(lease.ID, None)
+            offset = self._find_lease(lease.ID)
+            if offset is not None:
+                self._expire_lease(lease.ID, offset)
+
+    def lease_ttl(self, lease: SharedMemoryLease) -> float:
+        """
+        Get the remaining time to live of a lease.
+
+        :param lease: Lease to query
+        :returns: time to live in seconds, -1 if expired or not granted
+        """
+        self._reap_leases()
+        offset = self._find_lease(lease.ID)
+        if offset is None:
+            return -1
+        _, ttl, deadline = _LEASE.unpack_from(self._mmap, offset)
+        if lease.keeping:
+            return ttl
+        return max(0.0, deadline - time.monotonic())
+
+    def _expire_lease(self, lease_id: int, offset: int):
+        """Delete keys of a lease and free its slot. Must hold write lock."""
+        tags = sorted(self._lease_index.get(lease_id, ()))
+        self._append((tag, None, 0) for tag in tags)
+        _LEASE.pack_into(self._mmap, offset, 0, 0.0, 0.0)
+
+    def _poll_changes(self):
+        self._sync()
+
+    def _reap_leases(self):
+        """Expire all leases (of any process) whose time to live has run out."""
+        now = time.monotonic()
+        expired = False
+        for slot in range(_MAX_LEASES):
+            lease_id, _, deadline = _LEASE.unpack_from(
+                self._mmap, _LEASES_START + slot * _LEASE.size
+            )
+            if lease_id and deadline < now:
+                expired = True
+                break
+        if not expired:
+            return
+        with self._write_locked():
+            for slot in range(_MAX_LEASES):
+                offset = _LEASES_START + slot * _LEASE.size
+                lease_id, _, deadline = _LEASE.unpack_from(self._mmap, offset)
+                if lease_id and deadline < now:
+                    self._expire_lease(lease_id, offset)
+
+    def watch(
+        self,
+        path: str,
+        prefix: bool = False,
+        depth: int = None,
+        **_kwargs,
+    ) -> SharedMemoryWatch:
+        """Watch key or key range.
+
+        Use a path ending with `'/'` in combination with `prefix` to
+        watch all child keys.
+
+        :param path: Path of key to query, or prefix of keys.
+        :param prefix: Watch for keys with given prefix if set
+        :param depth: Depth to watch at, defaults to that of the path
+        :returns: `SharedMemoryWatch` object for watch request
+        """
+        if not prefix:
+            _check_path(path)
+        return SharedMemoryWatch(self, _tag_depth(path, depth), prefix)
+
+    # -------------------------------------
+    # Transaction support
+    # -------------------------------------
+
+    def snapshot(self) -> _Snapshot:
+        """
+        Take a snapshot of the database, for a transaction to read from.
+
+        :returns: snapshot reading at the current revision
+        """
+        with self._lock:
+            self._sync()
+            snapshot = _Snapshot(self, self._revision)
+            self._snapshots.add(snapshot)
+            return snapshot
+
+    def _release(self, snapshot: _Snapshot):
+        """Release a snapshot, forgetting versions no longer needed."""
+        with self._lock:
+            self._snapshots.discard(snapshot)
+            oldest = min(
+                (other.revision for other in self._snapshots), default=self._revision
+            )
+            while self._undo_log and self._undo_log[0][0] <= oldest:
+                _, tag = self._undo_log.popleft()
+                versions = self._undo[tag]
+                del versions[0]
+                if not versions:
+                    del self._undo[tag]
+
+    def _entry_at(self, tag: str, revision: int):
+        """Get the entry of a key at a revision. Must hold the lock."""
+        for mod_revision, previous in self._undo.get(tag, ()):
+            if mod_revision > revision:
+                return previous
+        return self._index.get(tag)
+
+    def _tags_at(self, tagged_prefix: str, revision: int = None) -> List[str]:
+        """List tagged paths with a prefix, at a revision if given.
+
+        Must hold the lock.
+        """
+        start = bisect.bisect_left(self._sorted, tagged_prefix)
+        tags = []
+        for tag in self._sorted[start:]:
+            if not tag.startswith(tagged_prefix):
+                break
+            tags.append(tag)
+        if revision is None:
+            return tags
+
+        # Undo changes made after the revision
+        tags = set(tags)
+        for tag, versions in self._undo.items():
+            if tag.startswith(tagged_prefix) and versions[-1][0] > revision:
+                if self._entry_at(tag, revision) is None:
+                    tags.discard(tag)
+                else:
+                    tags.add(tag)
+        return sorted(tags)
+
+    def current_revision(self) -> Revision:
+        """
+        Get the current revision of the database.
+
+        Mirrors :py:meth:`Etcd3Backend.current_revision`.
+
+        :returns: current revision
+        """
+        self.throttle("read")
+        with self._lock:
+            self._sync()
+            return Revision(self._revision)
+
+    def range_values(
+        self, path: str = "/", max_depth: int = None, **_kwargs
+    ) -> Tuple[Revision, Iterator[Tuple[str, str, int]]]:
+        """
+        Read all keys with the given prefix, at any depth, with values.
+
+        Mirrors :py:meth:`Etcd3Backend.range_values`. Only the current
+        revision is available.
+
+        :param path: Prefix of keys to read
+        :param max_depth: Maximum depth of keys to read, relative to path.
+            Defaults to all depths.
+        :returns: (revision, iterator of (path, value, mod_revision))
+        """
+        self.throttle("read")
+        with self._lock:
+            self._sync()
+            if max_depth is None:
+                end_depth = 1 + max(
+                    (int(tag[: tag.index("/")]) for tag in self._index), default=0
+                )
+            else:
+                end_depth = _depth(path) + max_depth
+            items = []
+            for depth in range(_depth(path), end_depth):
+                tagged_prefix = _tag_depth(path, depth)
+                start = bisect.bisect_left(self._sorted, tagged_prefix)
+                for tag in self._sorted[start:]:
+                    if not tag.startswith(tagged_prefix):
+                        break
+                    entry = self._index[tag]
+                    items.append((_untag_depth(tag), entry.value, entry.mod_revision))
+            return (Revision(self._revision), iter(items))
+
+    def _check(self, gets: Dict[str, tuple], lists: Dict[tuple, list]) -> bool:
+        for path, (_, mod_revision) in gets.items():
+            entry = self._index.get(_tag_depth(path))
+            if (None if entry is None else entry.mod_revision) != mod_revision:
+                return False
+        for (path, depth), keys in lists.items():
+            tags = self._tags_at(_tag_depth(path, depth))
+            if [_untag_depth(tag) for tag in tags] != list(keys):
+                return False
+        return True
+
+    def check(self, gets: Dict[str, tuple], lists: Dict[tuple, list]) -> int:
+        """
+        Check that logged reads still reflect the database.
+
+        :param gets: Logged get queries, `path -> (value, mod_revision)`
+        :param lists: Logged list queries, `(path, depth) -> keys`
+        :returns: current revision, None if anything changed
+        """
+        with self._lock:
+            self._sync()
+            return self._revision if self._check(gets, lists) else None
+
+    def commit(
+        self,
+        gets: Dict[str, tuple],
+        lists: Dict[tuple, list],
+        updates: Dict[str, tuple],
+    ) -> int:
+        """
+        Atomically check logged reads and apply updates.
+
+        :param gets: Logged get queries, `path -> (value, mod_revision)`
+        :param lists: Logged list queries, `(path, depth) -> keys`
+        :param updates: Updates to apply, `path -> (value, lease)`
+        :returns: new revision, None if validation failed
+        """
+        with self._write_locked():
+            if not self._check(gets, lists):
+                return None
+            ops = []
+            for path, (value, lease) in updates.items():
+                lease_id = 0 if lease is None else lease.ID
+                if lease_id and self._find_lease(lease_id) is None:
+                    raise ValueError(
+                        "Lease {} not granted or expired!".format(lease_id)
+                    )
+                ops.append((_tag_depth(path), value, lease_id))
+            return self._append(ops)
+
+    def close(self):
+        """Stop background activity and unmap the shared file."""
+        super().close()
+        with self._lock:
+            if not self._mmap.closed:
+                self._mmap.close()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+__all__ = [
+    "DEFAULT_PATH",
+    "SharedMemoryBackend",
+    "SharedMemoryLease",
+    "SharedMemoryWatch",
+    "ConfigCollision",
+]
@@ -0,0 +1,579 @@
+"""
+SQLite backend for SKA SDP configuration DB.
+
+Stores the keyspace in an SQLite database file, which makes for a
+durable configuration database that does not need a server. This is
+meant for single-node lab setups and offline processing.
+
+The database runs in write-ahead logging (WAL) mode, so any number of
+processes can read concurrently while one of them writes. Keys are
+stored depth-tagged, as with etcd, and carry the same create and mod
+revisions. Transactions use :py:class:`OptimisticTransaction`: all
+reads of an attempt happen within one SQLite read transaction, and get
+validated against the database when committing, within an immediate
+(write-locked) SQLite transaction.
+
+Recent changes are kept in a history table, which is how processes
+find out about changes made by others for watches. A process falling
+behind by more than the history cancels its watches, in the same way
+as etcd does for compacted revisions.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from .common import (
+    _check_path,
+    _depth,
+    _prefix_end,
+    _tag_depth,
+    _untag_depth,
+    OptimisticBackend,
+    Revision,
+)
+from .memory import MemoryLease, MemoryWatch
+
+DEFAULT_PATH = "ska-sdp-config.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO meta VALUES ('revision', 1);
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    create_revision INTEGER NOT NULL,
+    mod_revision INTEGER NOT NULL,
+    lease INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS kv_lease ON kv (lease) WHERE lease != 0;
+CREATE TABLE IF NOT EXISTS history (
+    revision INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS history_revision ON history (revision);
+CREATE TABLE IF NOT EXISTS leases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ttl REAL NOT NULL,
+    deadline REAL NOT NULL
+);
+"""
+
+
+class _Snapshot:
+    """Reads the database within an SQLite read transaction.
+
+    WAL mode keeps showing the database as it was when the read
+    transaction started, until the snapshot gets closed.
+    """
+
+    def __init__(self, backend: "SQLiteBackend", conn: sqlite3.Connection):
+        self._backend = backend
+        self._conn = conn
+        conn.execute("BEGIN")
+        # The first read starts the transaction, fixing the revision
+        self.revision = backend._get_revision(conn)  # pylint: disable=protected-access
+
+    def read(self, path: str) -> Tuple[str, int]:
+        """Read value and mod revision of a key, both None if it doesn't exist."""
+        row = self._conn.execute(
+            "SELECT value, mod_revision FROM kv WHERE key = ?", (_tag_depth(path),)
+        ).fetchone()
+        return (None, None) if row is None else row
+
+    def read_keys(self, path: str, depth: int) -> List[str]:
+        """List keys with the given prefix at the given depth."""
+        # pylint: disable=protected-access
+        return self._backend._keys(self._conn, _tag_depth(path, depth))
+
+    def read_created(self, path: str, depth: int) -> List[str]:
+        """List keys with the given prefix at the given depth, oldest first."""
+        tagged_prefix = _tag_depth(path, depth)
+        return [
+            _untag_depth(tag)
+            for (tag,) in self._conn.execute(
+                "SELECT key FROM kv WHERE key >= ? AND key < ?"
+                " ORDER BY create_revision, key",
+                (tagged_prefix, _prefix_end(tagged_prefix)),
+            )
+        ]
+
+    def close(self):
+        """Release the snapshot, ending the read transaction."""
+        if self._conn is not None:
+            self._conn.execute("COMMIT")
+            self._backend._release(self._conn)  # pylint: disable=protected-access
+            self._conn = None
+
+
+class SQLiteWatch(MemoryWatch):
+    """
+    Watch request on the SQLite backend.
+
+    Entering the watch using a `with` block yields a queue of `(key,
+    val, rev)` triples, in the same way as :py:class:`Etcd3Watch`. If
+    the backend fell behind by more than its history, changes were
+    lost, and a `(None, None, None)` triple is put on the queue, after
+    which the watch continues with the oldest change still known.
+    """
+
+
+class SQLiteLease(MemoryLease):
+    """
+    Lease for the SQLite backend.
+
+    Leases are stored in the database, so keys associated with them
+    get deleted by whichever process notices the expiry first. As the
+    database is persistent, lease deadlines are kept in wall-clock
+    time. The lease ID is allocated when the lease is granted.
+    """
+
+    def grant(self) -> None:
+        """Grant the lease, starting its time to live."""
+        self._id = self._backend.grant_lease(self)
+
+
+class SQLiteBackend(OptimisticBackend):
+    """
+    Database backend storing the configuration in an SQLite file.
+
+    :param path: Path of the database file. Created if it doesn't exist.
+    :param history: Number of revisions to keep in the history used for
+        notifying other processes about changes
+    :param synchronous: SQLite synchronisation mode. The default
+        "NORMAL" is safe against application crashes, "FULL" against
+        power loss as well.
+    :param poll_interval: Interval in seconds in which to check for
+        changes made by other processes while watching
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        history: int = 10000,
+        synchronous: str = "NORMAL",
+        poll_interval: float = 0.01,
+    ):
+        """Open (or create) the database."""
+        super().__init__(poll_interval)
+        self._path = path
+        self._history = history
+        self._synchronous = synchronous
+        self._local = threading.local()
+        self._connections = []
+        self._idle = []  # Connections available for snapshots
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._last_revision = self._get_revision(conn)
+
+    @property
+    def path(self) -> str:
+        """Path of the database file."""
+        return self._path
+
+    def _conn(self) -> sqlite3.Connection:
+        """Get the database connection of the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new database connection, closed along with the backend."""
+        conn = sqlite3.connect(
+            self._path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA synchronous={}".format(self._synchronous))
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _get_revision(conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT value FROM meta WHERE name = 'revision'"
+        ).fetchone()[0]
+
+    def _write(self, func, *args):
+        """Call function within an immediate (write-locked) transaction."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn, *args)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _apply(self, conn: sqlite3.Connection, ops: List[Tuple[str, str, int]]) -> int:
+        """Write changes as a new revision. Must be in a write transaction.
+
+        :param ops: `(tagged path, value, lease ID)` triples, value None
+           for deletion
+        :returns: new revision
+        """
+        revision = self._get_revision(conn) + 1
+        changes = []
+        for tag, value, lease in ops:
+            if value is None:
+                if conn.execute("DELETE FROM kv WHERE key = ?", (tag,)).rowcount:
+                    changes.append((revision, tag, None))
+            else:
+                conn.execute(
+                    "INSERT INTO kv VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE"
+                    " SET value = excluded.value, mod_revision = excluded.mod_revision,"
+                    " lease = excluded.lease",
+                    (tag, value, revision, revision, lease),
+                )
+                changes.append((revision, tag, value))
+        if not changes:
+            return revision - 1
+        conn.executemany("INSERT INTO history VALUES (?, ?, ?)", changes)
+        conn.execute("UPDATE meta SET value = ? WHERE name = 'revision'", (revision,))
+        if revision % 100 == 0:
+            conn.execute(
+                "DELETE FROM history WHERE revision <= ?", (revision - self._history,)
+            )
+        return revision
+
+    # -------------------------------------
+    # Leases and watches
+    # -------------------------------------
+
+    def lease(self, ttl: float = 10) -> SQLiteLease:
+        """
+        Generate a new lease.
+
+        Once entered it can be associated with keys, which will be
+        kept alive until the end of the lease. If it is not kept
+        alive, the lease expires after its time to live and all keys
+        associated with it get deleted.
+
+        :param ttl: Time to live for lease in seconds
+        :returns: lease object
+        """
+        return SQLiteLease(self, ttl)
+
+    def grant_lease(self, lease: SQLiteLease) -> int:
+        """
+        Grant a lease, storing it in the database.
+
+        :param lease: Lease to grant
+        :returns: Lease ID
+        """
+        lease.deadline = time.monotonic() + lease.granted_ttl
+        cursor = self._conn().execute(
+            "INSERT INTO leases (ttl, deadline) VALUES (?, ?)",
+            (lease.granted_ttl, time.time() + lease.granted_ttl),
+        )
+        self._leases[cursor.lastrowid] = lease
+        self._start_poller()
+        return cursor.lastrowid
+
+    def refresh_lease(self, lease: SQLiteLease) -> None:
+        """
+        Keep a lease alive, resetting its time to live.
+
+        :param lease: Lease to refresh
+        """
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE leases SET deadline = ? WHERE id = ? AND deadline >= ?",
+            (now + lease.granted_ttl, lease.ID, now),
+        )
+        if not cursor.rowcount:
+            raise ValueError("Lease {} not granted or expired!".format(lease.ID))
+        lease.deadline = time.monotonic() + lease.granted_ttl
+
+    def revoke_lease(self, lease: SQLiteLease) -> None:
+        """
+        Revoke a lease, deleting all keys associated with it.
+
+        :param lease: Lease to revoke
+        """
+        self._leases.pop(lease.ID, None)
+        self._write(self._expire_leases, [lease.ID])
+
+    def lease_ttl(self, lease: SQLiteLease) -> float:
+        """
+        Get the remaining time to live of a lease.
+
+        :param lease: Lease to query
+        :returns: time to live in seconds, -1 if expired or not granted
+        """
+        self._reap_leases()
+        row = (
+            self._conn()
+            .execute("SELECT ttl, deadline FROM leases WHERE id = ?", (lease.ID,))
+            .fetchone()
+        )
+        if row is None:
+            return -1
+        if lease.keeping:
+            return row[0]
+        return max(0.0, row[1] - time.time())
+
+    def _expire_leases(self, conn: sqlite3.Connection, lease_ids: List[int]):
+        """Delete leases and their keys. Must be in a write transaction."""
+        ops = []
+        for lease_id in lease_ids:
+            ops += [
+                (tag, None, 0)
+                for (tag,) in conn.execute(
+                    "SELECT key FROM kv WHERE lease = ? ORDER BY key", (lease_id,)
+                )
+            ]
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+        self._apply(conn, ops)
+
+    def _reap_leases(self):
+        """Expire all leases (of any process) whose time to live has run out."""
+        query = "SELECT id FROM leases WHERE deadline < ?"
+        if self._conn().execute(query, (time.time(),)).fetchone() is None:
+            return
+
+        def reap(conn):
+            expired = conn.execute(query, (time.time(),)).fetchall()
+            self._expire_leases(conn, [lease_id for (lease_id,) in expired])
+
+        self._write(reap)
+
+    def _poll_changes(self):
+        """Pick up changes from the history."""
+        conn = self._conn()
+        changes = conn.execute(
+            "SELECT key, value, revision FROM history WHERE revision > ?"
+            " ORDER BY rowid",
+            (self._last_revision,),
+        ).fetchall()
+        if not changes:
+            return
+        # Every revision has history entries, so a gap means that the
+        # history got pruned past the changes we have seen
+        if changes[0][2] > self._last_revision + 1:
+            with self._lock:
+                for watch in self._watches:
+                    watch.queue.put((None, None, None))
+        self._last_revision = changes[-1][2]
+        self._dispatch(changes)
+
+    def watch(
+        self,
+        path: str,
+        prefix: bool = False,
+        depth: int = None,
+        **_kwargs,
+    ) -> SQLiteWatch:
+        """Watch key or key range.
+
+        Use a path ending with `'/'` in combination with `prefix` to
+        watch all child keys.
+
+        :param path: Path of key to query, or prefix of keys.
+        :param prefix: Watch for keys with given prefix if set
+        :param depth: Depth to watch at, defaults to that of the path
+        :returns: `SQLiteWatch` object for watch request
+        """
+        if not prefix:
+            _check_path(path)
+        return SQLiteWatch(self, _tag_depth(path, depth), prefix)
+
+    # -------------------------------------
+    # Transaction support
+    # -------------------------------------
+
+    def snapshot(self) -> "_Snapshot":
+        """
+        Take a snapshot of the database, for a transaction to read from.
+
+        The snapshot holds a read transaction open on a connection of
+        its own until it gets closed.
+
+        :returns: snapshot reading at the current revision
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        return _Snapshot(self, conn or self._connect())
+
+    def _release(self, conn: sqlite3.Connection):
+        """Return the connection of a closed snapshot for reuse."""
+        with self._lock:
+            if conn in self._connections:
+                self._idle.append(conn)
+
+    @staticmethod
+    def _keys(conn: sqlite3.Connection, tagged_prefix: str) -> List[str]:
+        return [
+            _untag_depth(tag)
+            for (tag,) in conn.execute(
+                "SELECT key FROM kv WHERE key >= ? AND key < ? ORDER BY key",
+                (tagged_prefix, _prefix_end(tagged_prefix)),
+            )
+        ]
+
+    def current_revision(self) -> Revision:
+        """
+        Get the current revision of the database.
+
+        Mirrors :py:meth:`Etcd3Backend.current_revision`.
+
+        :returns: current revision
+        """
+        self.throttle("read")
+        return Revision(self._get_revision(self._conn()))
+
+    def range_values(
+        self, path: str = "/", batch_size: int = 1000, max_depth: int = None, **_kwargs
+    ) -> Tuple[Revision, Iterator[Tuple[str, str, int]]]:
+        """
+        Read all keys with the given prefix, at any depth, with values.
+
+        Mirrors :py:meth:`Etcd3Backend.range_values`. Keys are read
+        within a read transaction on a separate connection, which
+        holds a consistent snapshot until the iterator is exhausted
+        or closed. Only the current revision is available.
+
+        :param path: Prefix of keys to read
+        :param batch_size: Number of keys to fetch at a time
+        :param max_depth: Maximum depth of keys to read, relative to path.
+            Defaults to all depths.
+        :returns: (revision, iterator of (path, value, mod_revision))
+        """
+        self.throttle("read")
+        conn = sqlite3.connect(self._path, timeout=60, isolation_level=None)
+        conn.execute("BEGIN")
+        revision = self._get_revision(conn)
+        if max_depth is None:
+            # Casting a key takes its leading number, which is the depth tag
+            (deepest,) = conn.execute(
+                "SELECT MAX(CAST(key AS INTEGER)) FROM kv"
+            ).fetchone()
+            end_depth = (deepest or 0) + 1
+        else:
+            end_depth = _depth(path) + max_depth
+
+        def iterate():
+            try:
+                for depth in range(_depth(path), end_depth):
+                    tagged_prefix = _tag_depth(path, depth)
+                    cursor = conn.execute(
+                        "SELECT key, value, mod_revision FROM kv"
+                        " WHERE key >= ? AND key < ? ORDER BY key",
+                        (tagged_prefix, _prefix_end(tagged_prefix)),
+                    )
+                    rows = cursor.fetchmany(batch_size)
+                    while rows:
+                        for tag, value, mod_revision in rows:
+                            yield (_untag_depth(tag), value, mod_revision)
+                        self.throttle("read")
+                        rows = cursor.fetchmany(batch_size)
+            finally:
+                conn.close()
+
+        return (Revision(revision), iterate())
+
+    def _check(
+        self,
+        conn: sqlite3.Connection,
+        gets: Dict[str, tuple],
+        lists: Dict[tuple, list],
+    ) -> bool:
+        for path, (_, mod_revision) in gets.items():
+            row = conn.execute(
+                "SELECT mod_revision FROM kv WHERE key = ?", (_tag_depth(path),)
+            ).fetchone()
+            if (None if row is None else row[0]) != mod_revision:
+                return False
+        for (path, depth), keys in lists.items():
+            if self._keys(conn, _tag_depth(path, depth)) != list(keys):
+                return False
+        return True
+
+    def check(self, gets: Dict[str, tuple], lists: Dict[tuple, list]) -> int:
+        """
+        Check that logged reads still reflect the database.
+
+        :param gets: Logged get queries, `path -> (value, mod_revision)`
+        :param lists: Logged list queries, `(path, depth) -> keys`
+        :returns: current revision, None if anything changed
+        """
+        conn = self._conn()
+        # Read within a transaction to get a consistent snapshot
+        conn.execute("BEGIN")
+        try:
+            if not self._check(conn, gets, lists):
+                return None
+            return self._get_revision(conn)
+        finally:
+            conn.execute("COMMIT")
+
+    def commit(
+        self,
+        gets: Dict[str, tuple],
+        lists: Dict[tuple, list],
+        updates: Dict[str, tuple],
+    ) -> int:
+        """
+        Atomically check logged reads and apply updates.
+
+        :param gets: Logged get queries, `path -> (value, mod_revision)`
+        :param lists: Logged list queries, `(path, depth) -> keys`
+        :param updates: Updates to apply, `path -> (value, lease)`
+        :returns: new revision, None if validation failed
+        """
+
+        def commit_txn(conn):
+            if not self._check(conn, gets, lists):
+                return None
+            ops = []
+            for path, (value, lease) in updates.items():
+                lease_id = 0 if lease is None else lease.ID
+                if (
+                    lease_id
+                    and not conn.execute(
+                        "SELECT 1 FROM leases WHERE id = ? AND deadline >= ?",
+                        (lease_id, time.time()),
+                    ).fetchone()
+                ):
+                    raise ValueError(
+                        "Lease {} not granted or expired!".format(lease_id)
+                    )
+                ops.append((_tag_depth(path), value, lease_id))
+            return self._apply(conn, ops)
+
+        return self._write(commit_txn)
+
+    def close(self):
+        """Stop background activity and close database connections."""
+        super().close()
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._idle = []
+        self._local = threading.local()
+
+
+__all__ = [
+    "DEFAULT_PATH",
+    "SQLiteBackend",
+    "SQLiteLease",
+    "SQLiteWatch",
+]
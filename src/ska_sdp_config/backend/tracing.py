@@ -0,0 +1,275 @@
+"""
+Tracing of transactions and requests.
+
+A :py:class:`Tracer` records spans: one per transaction attempt, with
+child spans for the reads made by the transaction, its commit, etcd
+round trips, decoding documents and waiting for changes. Spans carry
+the key path and sizes where applicable.
+
+Spans are written as JSON lines, or in the Chrome trace event format
+(for ``chrome://tracing`` or https://ui.perfetto.dev) if the file name
+ends in ``.json``. Enable tracing using ``Config(trace=...)`` or the
+``SDP_CONFIG_TRACE`` environment variable, e.g.
+``SDP_CONFIG_TRACE=/tmp/trace-{pid}.json``. Configurations tracing to
+the same file share a tracer, which is closed at exit.
+"""
+
+import atexit
+import contextlib
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, TextIO, Tuple, Union
+
+# Spans open in the current thread, innermost last
+_LOCAL = threading.local()
+
+
+def _open_spans() -> list:
+    spans = getattr(_LOCAL, "spans", None)
+    if spans is None:
+        spans = _LOCAL.spans = []
+    return spans
+
+
+class Tracer:
+    """Records spans to a file.
+
+    :param output: Path of file to write, ``{pid}`` gets replaced by
+        the process ID. Alternatively, an open text stream.
+    :param trace_format: "jsonl" or "chrome". Defaults to "chrome" for
+        paths ending in ``.json``, "jsonl" otherwise.
+    """
+
+    def __init__(self, output: Union[str, TextIO], trace_format: str = None):
+        """Open trace file."""
+        if isinstance(output, str):
+            path = output.format(pid=os.getpid())
+            if trace_format is None and path.endswith(".json"):
+                trace_format = "chrome"
+            # pylint: disable=consider-using-with
+            self._stream = open(path, "w", encoding="utf-8")
+            self._owned = True
+        else:
+            self._stream = output
+            self._owned = False
+        if trace_format is None:
+            trace_format = "jsonl"
+        if trace_format not in ("jsonl", "chrome"):
+            raise ValueError("Unknown trace format {}!".format(trace_format))
+        self._format = trace_format
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pid = os.getpid()
+        self._events = 0
+        if self._format == "chrome":
+            self._stream.write("[")
+
+    @property
+    def trace_format(self) -> str:
+        """Format of the trace, "jsonl" or "chrome"."""
+        return self._format
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args) -> Iterator[dict]:
+        """
+        Record a span for a block.
+
+        Spans opened while the block runs in the same thread become
+        children of this span.
+
+        :param name: Name of the span
+        :param args: Attributes of the span, e.g. ``path``
+        :returns: attributes, which can be updated within the block
+        """
+        span_id = next(self._ids)
+        spans = _open_spans()
+        parent_id = spans[-1][0] if spans else None
+        entry = (span_id, args)
+        spans.append(entry)
+        start = time.time()
+        start_perf = time.perf_counter()
+        try:
+            yield args
+        except Exception as exc:
+            args["error"] = type(exc).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start_perf
+            # Spans held open by generators might not close in order
+            if spans and spans[-1] is entry:
+                spans.pop()
+            else:
+                spans.remove(entry)
+            self._write(name, span_id, parent_id, start, duration, args)
+
+    @staticmethod
+    def annotate(**args) -> None:
+        """
+        Add attributes to the innermost open span of the thread.
+
+        :param args: Attributes to add
+        """
+        spans = _open_spans()
+        if spans:
+            spans[-1][1].update(args)
+
+    def _write(self, name, span_id, parent_id, start, duration, args):
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        if self._format == "chrome":
+            event = {
+                "name": name,
+                "cat": "ska_sdp_config",
+                "ph": "X",
+                "ts": round(start * 1e6, 3),
+                "dur": round(duration * 1e6, 3),
+                "pid": self._pid,
+                "tid": threading.get_native_id(),
+                "args": dict(args, span_id=span_id, parent_id=parent_id),
+            }
+        else:
+            event = {
+                "name": name,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "thread": threading.get_native_id(),
+                "start": start,
+                "duration": duration,
+                "args": args,
+            }
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if self._stream is None:
+                return
+            if self._format == "chrome":
+                self._stream.write(",\n" if self._events else "\n")
+                self._stream.write(line)
+            else:
+                self._stream.write(line + "\n")
+            self._events += 1
+
+    def flush(self) -> None:
+        """Flush spans written so far."""
+        with self._lock:
+            if self._stream is not None:
+                self._stream.flush()
+
+    def close(self) -> None:
+        """Finish trace, and close the file if opened by the tracer."""
+        with self._lock:
+            if self._stream is None:
+                return
+            if self._format == "chrome":
+                self._stream.write("\n]\n")
+            if self._owned:
+                self._stream.close()
+            else:
+                self._stream.flush()
+            self._stream = None
+
+
+# Tracers opened by file path, by process ID and resolved path
+_TRACERS: Dict[Tuple[int, str], Tracer] = {}
+_TRACERS_LOCK = threading.Lock()
+
+
+def file_tracer(path: str) -> Tracer:
+    """
+    Get the tracer writing to a file, opening it if needed.
+
+    Opening the file again would truncate it, so all users of a path
+    share one tracer, which stays open until :py:func:`close_tracers`.
+
+    :param path: Path of file to write, ``{pid}`` gets replaced by the
+        process ID
+    :returns: tracer
+    """
+    pid = os.getpid()
+    key = (pid, os.path.abspath(path.format(pid=pid)))
+    with _TRACERS_LOCK:
+        tracer = _TRACERS.get(key)
+        if tracer is None:
+            tracer = _TRACERS[key] = Tracer(path)
+    return tracer
+
+
+@atexit.register
+def close_tracers() -> None:
+    """Close tracers opened by :py:func:`file_tracer`, called at exit."""
+    with _TRACERS_LOCK:
+        tracers = list(_TRACERS.values())
+        _TRACERS.clear()
+    for tracer in tracers:
+        tracer.close()
+
+
+def maybe_span(tracer: Tracer, name: str, **args):
+    """
+    Record a span if tracing, otherwise do nothing.
+
+    :param tracer: Tracer, or None if not tracing
+    :param name: Name of the span
+    :param args: Attributes of the span
+    :returns: context manager, yielding the attributes or None
+    """
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.span(name, **args)
+
+
+def _size(result) -> int:
+    """Size of a read result: length of a value, or number of keys."""
+    return 0 if result is None else len(result)
+
+
+def traced(name: str):
+    """
+    Decorate a transaction method reading a path to record a span.
+
+    The transaction holds the tracer in its ``_tracer`` attribute. The
+    span records the path (first argument, if a string) and the size of
+    the result.
+
+    :param name: Name of the span
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            tracer = self._tracer  # pylint: disable=protected-access
+            if tracer is None:
+                return func(self, *args, **kwargs)
+            path = args[0] if args and isinstance(args[0], str) else None
+            with tracer.span(name, path=path) as span:
+                result = func(self, *args, **kwargs)
+                span["size"] = _size(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def traced_commit(func):
+    """
+    Decorate the commit method of a transaction to record a span, with
+    the number of updates and whether the commit succeeded.
+
+    The transaction holds the tracer in its ``_tracer`` attribute.
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        # pylint: disable=protected-access
+        tracer = self._tracer
+        if tracer is None:
+            return func(self, *args, **kwargs)
+        with tracer.span("commit", updates=len(self._updates)) as span:
+            committed = func(self, *args, **kwargs)
+            span["committed"] = committed
+            return committed
+
+    return wrapper
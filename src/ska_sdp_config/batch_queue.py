@@ -0,0 +1,191 @@
+"""
+Scheduling queue for batch processing blocks.
+
+Batch processing blocks get put into a queue in the configuration
+database, from which workers claim them one at a time, highest
+priority first:
+
+.. code-block:: python
+
+    queue = config.batch_queue()
+    for txn in config.txn():
+        txn.create_processing_block(pblock)
+        queue.put(txn, pblock.id, priority=10)
+
+    # Worker
+    with config.lease() as lease:
+        while True:
+            pb_id = queue.claim(lease)
+            # ...
+
+Workers waiting for processing blocks form a line. Only the worker at
+the front of the line watches the queue, and every other worker only
+watches the worker in front of it. Therefore a new processing block
+only wakes up one worker, and claiming one only wakes up the next
+worker in line, instead of every worker racing for every processing
+block.
+
+Entries with equal priority and workers in line are ordered by the
+revision their keys were created at.
+
+Note that the memory backend does not isolate transactions between
+threads, so it cannot be used with concurrent workers.
+"""
+
+import json
+import logging
+import time
+from typing import List, Optional
+
+from .waiting import join_line, keys_ahead, wait_for_change
+
+LOG = logging.getLogger(__name__)
+
+# Highest possible priority
+MAX_PRIORITY = 9999
+
+
+class BatchQueue:
+    """Priority queue of processing blocks, claimed by workers.
+
+    Use :py:meth:`Config.batch_queue` to create.
+
+    :param config: Configuration
+    :param path: Path of the queue in the database, ending in '/'
+    """
+
+    def __init__(self, config, path: str):
+        """Instantiate queue."""
+        self._config = config
+        self._path = path
+
+    @property
+    def path(self) -> str:
+        """Path of the queue in the database."""
+        return self._path
+
+    def put(self, txn, pb_id: str, priority: int = 0) -> None:
+        """
+        Add a processing block to the queue.
+
+        Processing blocks with higher priority get claimed first, and
+        ones with equal priority in the order they were added.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :param pb_id: Processing block ID
+        :param priority: Priority between 0 and :py:data:`MAX_PRIORITY`
+        """
+        if not 0 <= priority <= MAX_PRIORITY:
+            raise ValueError(
+                "Priority must be between 0 and {}, not {}!".format(
+                    MAX_PRIORITY, priority
+                )
+            )
+        # Entries sort by priority, and within one priority by their
+        # create revision
+        join_line(
+            txn,
+            "{}entry/{:04d}-".format(self._path, MAX_PRIORITY - priority),
+            json.dumps({"pb_id": pb_id, "priority": priority}),
+        )
+
+    def list(self, txn) -> List[str]:
+        """
+        List processing blocks in the queue.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: Processing block IDs, in the order they will be claimed
+        """
+        entry_path = self._path + "entry/"
+        values = dict(txn.raw.list_values(entry_path))
+        keys = sorted(
+            txn.raw.list_created(entry_path),
+            key=lambda path: path[len(entry_path) :].split("-", 1)[0],
+        )
+        return [json.loads(values[path])["pb_id"] for path in keys if path in values]
+
+    def claim_next(self, txn, lease) -> Optional[str]:
+        """
+        Claim the processing block at the front of the queue.
+
+        Removes the processing block from the queue and takes ownership
+        of it. Processing blocks that do not exist or are owned already
+        get dropped from the queue.
+
+        Note that this does not wait in line, so workers calling this
+        concurrently will conflict. Use :py:meth:`claim` instead.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :param lease: Lease to take ownership with
+        :returns: Processing block ID, or None if the queue is empty
+        """
+        while True:
+            path = self._front(txn)
+            if path is None:
+                return None
+            pb_id = json.loads(txn.raw.get(path))["pb_id"]
+            txn.raw.delete(path)
+            if txn.get_processing_block(pb_id) is None:
+                LOG.warning("Dropping %s from queue, as it does not exist", pb_id)
+            elif txn.get_processing_block_owner(pb_id) is not None:
+                LOG.warning("Dropping %s from queue, as it is owned already", pb_id)
+            else:
+                txn.take_processing_block(pb_id, lease)
+                return pb_id
+
+    def _front(self, txn) -> Optional[str]:
+        """
+        Find the entry at the front of the queue.
+
+        Only reads the first entry in key order to find the highest
+        priority, then the oldest entry with that priority.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: path of the entry, or None if the queue is empty
+        """
+        entry_path = self._path + "entry/"
+        for path, _ in txn.raw.iter_values(entry_path, batch_size=1):
+            prefix = path[: path.index("-", len(entry_path)) + 1]
+            return txn.raw.list_created(prefix, limit=1)[0]
+        return None
+
+    def claim(self, lease, timeout: float = None) -> Optional[str]:
+        """
+        Wait in line for a processing block and claim it.
+
+        :param lease: Lease to take ownership with. Also used to leave
+            the line if the worker dies.
+        :param timeout: Time to wait at most, in seconds
+        :returns: Processing block ID, or None if the wait timed out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        # Get into line
+        for txn in self._config.txn():
+            waiter = join_line(
+                txn, self._path + "waiter/", json.dumps(self._config.owner), lease
+            )
+
+        try:
+            while True:
+                # Anybody in front of us? Once at the front, we will
+                # stay there until we leave, so this check does not
+                # need to be part of the claiming transaction.
+                for txn in self._config.txn():
+                    ahead = keys_ahead(txn, self._path + "waiter/", waiter)
+                if not ahead:
+                    for txn in self._config.txn():
+                        pb_id = self.claim_next(txn, lease)
+                        if pb_id is not None:
+                            txn.raw.delete(waiter)
+                    if pb_id is not None:
+                        return pb_id
+
+                # Wait for the worker in front of us to leave, or for
+                # the queue to get a new entry
+                path = ahead[-1] if ahead else self._path + "entry/"
+                if not wait_for_change(self._config, path, deadline):
+                    return None
+        finally:
+            for txn in self._config.txn():
+                txn.raw.delete(waiter, must_exist=False)
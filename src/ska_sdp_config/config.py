@@ -1,19 +1,48 @@
 """High-level API for SKA SDP configuration."""
 
+# pylint: disable=too-many-lines
+
+import contextlib
+import itertools
 import os
 import sys
+import threading
+import time
 from datetime import date
 import json
 from socket import gethostname
-from typing import Iterable
-
-from . import backend as backend_mod, entity
-
-
-class Config:
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple
+from urllib.parse import quote
+
+from . import backend as backend_mod, entity, snapshot
+from .stats import KeyspaceStats
+from .backend import metrics as metrics_mod, ratelimit, tracing
+from .backend.common import deadline_scope
+from .backend.explain import TransactionReport
+from .batch_queue import BatchQueue
+from .dependencies import DependencyGraph
+from .election import Election
+from .locks import Lock, Semaphore
+from .replica import Replica
+from .sharding import ShardMembership
+
+
+class Config:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
     """Connection to SKA SDP configuration."""
 
-    def __init__(self, backend=None, global_prefix="", owner=None, **cargs):
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+
+    def __init__(
+        self,
+        backend=None,
+        global_prefix="",
+        owner=None,
+        rate_limits=None,
+        priority="control",
+        metrics=None,
+        trace=None,
+        **cargs,
+    ):
         """
         Connect to configuration using the given backend.
 
@@ -22,10 +51,60 @@ class Config:
         :param global_prefix: Prefix to use within the database
         :param owner: Dictionary used for identifying the process when claiming
             ownership.
+        :param rate_limits: Limits on requests per second by kind of
+            request ("read", "write" and "watch"), e.g. ``{"read": 200}``.
+            Defaults to environment (``SDP_CONFIG_RATE_LIMITS``, e.g.
+            ``read=200,write=50``) or no limits. See
+            :py:class:`ska_sdp_config.backend.ratelimit.RateLimiter`.
+        :param priority: Default priority class of requests ("control",
+            "interactive" or "bulk"), only used with rate limits
+        :param metrics: Whether to record metrics of requests (True to
+            use the registry of the process, or a
+            :py:class:`ska_sdp_config.backend.metrics.MetricsRegistry`).
+            Defaults to environment (``SDP_CONFIG_METRICS=1``) or off.
+        :param trace: File to write a trace of transactions to (see
+            :py:mod:`ska_sdp_config.backend.tracing`), or a
+            :py:class:`~ska_sdp_config.backend.tracing.Tracer`. Defaults
+            to environment (``SDP_CONFIG_TRACE``) or no tracing.
         :param cargs: Backend client arguments
         """
         self._backend = self._determine_backend(backend, **cargs)
 
+        # Rate limits, not supported by the memory backend
+        spec = os.getenv("SDP_CONFIG_RATE_LIMITS")
+        if rate_limits is None and spec and hasattr(self._backend, "rate_limiter"):
+            rate_limits = ratelimit.parse_rate_limits(spec)
+        if rate_limits is not None:
+            if not hasattr(self._backend, "rate_limiter"):
+                raise ValueError("Backend does not support rate limits!")
+            self._backend.rate_limiter = ratelimit.RateLimiter(
+                priority=priority, **rate_limits
+            )
+
+        # Metrics, not supported by the memory backend either
+        if metrics is None and hasattr(self._backend, "metrics"):
+            metrics = os.getenv("SDP_CONFIG_METRICS", "0").lower() in ("1", "true")
+        if metrics:
+            if not hasattr(self._backend, "metrics"):
+                raise ValueError("Backend does not support metrics!")
+            if metrics is True:
+                metrics = metrics_mod.REGISTRY
+            self._backend.metrics = metrics
+
+        # Tracing. Backends not supporting it only trace decoding.
+        self._owns_tracer = False
+        if trace is None:
+            trace = os.getenv("SDP_CONFIG_TRACE") or None
+        if isinstance(trace, str):
+            trace = tracing.file_tracer(trace)
+            self._owns_tracer = True
+        self._tracer = trace
+        if trace is not None and hasattr(self._backend, "tracer"):
+            self._backend.tracer = trace
+
+        # Reports of transactions in explain mode, per thread
+        self._explain = threading.local()
+
         # Owner dictionary
         if owner is None:
             owner = {"pid": os.getpid(), "hostname": gethostname(), "command": sys.argv}
@@ -33,6 +112,7 @@ class Config:
 
         # Prefixes
         assert global_prefix == "" or global_prefix[0] == "/"
+        self._global_prefix = global_prefix
         self._paths = {
             "pb": global_prefix + "/pb/",
             "sb": global_prefix + "/sb/",
@@ -40,18 +120,68 @@ class Config:
             "master": global_prefix + "/master",
             "deploy": global_prefix + "/deploy/",
             "workflow": global_prefix + "/workflow/",
+            "index": global_prefix + "/index/",
+            "queue": global_prefix + "/queue/",
+            "member": global_prefix + "/member/",
+            "election": global_prefix + "/election/",
+            "lock": global_prefix + "/lock/",
+            "semaphore": global_prefix + "/semaphore/",
         }
 
         # Lease associated with client
         self._client_lease = None
+        self._client_lease_lock = threading.Lock()
 
     @property
     def backend(self):
         """Get the backend database object."""
         return self._backend
 
+    @property
+    def rate_limiter(self) -> "ratelimit.RateLimiter":
+        """Rate limiter of requests, None if there are no rate limits.
+
+        Use :py:meth:`RateLimiter.stats` for statistics on throttling.
+        """
+        return getattr(self._backend, "rate_limiter", None)
+
+    @property
+    def tracer(self) -> "tracing.Tracer":
+        """Tracer recording transactions, None if not tracing."""
+        return self._tracer
+
+    @property
+    def metrics(self) -> "metrics_mod.MetricsRegistry":
+        """Registry of request metrics, None if metrics are disabled.
+
+        Use :py:meth:`MetricsRegistry.exposition` to export the metrics
+        for Prometheus, or :py:meth:`MetricsRegistry.serve` to serve
+        them over HTTP.
+        """
+        return getattr(self._backend, "metrics", None)
+
+    @contextlib.contextmanager
+    def priority(self, priority: str) -> Iterator[None]:
+        """Make requests in a block with the given priority class.
+
+        Only applies to requests made by the current thread, and only
+        matters if there are rate limits:
+
+        .. code-block:: python
+
+            with config.priority("bulk"):
+                config.snapshot(stream)
+
+        :param priority: Priority class ("control", "interactive" or "bulk")
+        """
+        if self.rate_limiter is None:
+            yield
+            return
+        with self.rate_limiter.priority_class(priority):
+            yield
+
     @staticmethod
-    def _determine_backend(backend, **cargs):
+    def _determine_backend(backend, **cargs):  # pylint: disable=too-many-branches
 
         # Determine backend
         if not backend:
@@ -79,6 +209,24 @@ class Config:
 
             return backend_mod.MemoryBackend()
 
+        if backend == "shm":
+
+            if "path" not in cargs:
+                cargs["path"] = os.getenv(
+                    "SDP_CONFIG_PATH", backend_mod.shm.DEFAULT_PATH
+                )
+
+            return backend_mod.SharedMemoryBackend(**cargs)
+
+        if backend == "sqlite":
+
+            if "path" not in cargs:
+                cargs["path"] = os.getenv(
+                    "SDP_CONFIG_PATH", backend_mod.sqlite.DEFAULT_PATH
+                )
+
+            return backend_mod.SQLiteBackend(**cargs)
+
         raise ValueError("Unknown configuration backend {}!".format(backend))
 
     def lease(self, ttl=10):
@@ -101,13 +249,17 @@ class Config:
 
         It will be kept alive until the client gets closed.
         """
-        if self._client_lease is None:
-            self._client_lease = self.lease()
-            self._client_lease.__enter__()
+        with self._client_lease_lock:
+            if self._client_lease is None:
+                lease = self.lease()
+                lease.__enter__()
+                self._client_lease = lease
 
         return self._client_lease
 
-    def txn(self, max_retries: int = 64) -> Iterable["Transaction"]:
+    def txn(
+        self, max_retries: int = 64, timeout: float = None, deadline: float = None
+    ) -> Iterable["Transaction"]:
         """Create a :class:`Transaction` for atomic configuration query/change.
 
         As we do not use locks, transactions might have to be repeated in
@@ -129,15 +281,33 @@ class Config:
         See also :ref:`Usage Guide <usage-guide>` for best practices
         for using transactions.
 
+        To bound the time a transaction can take, give a timeout or
+        deadline. Requests to the database get timed out once it
+        passed, and instead of retrying the transaction a
+        :class:`ska_sdp_config.ConfigTimeout` gets raised.
+
         :param max_retries: Number of transaction retries before a
             :class:`RuntimeError` gets raised.
+        :param timeout: Time in seconds the transaction can take
+        :param deadline: Time (as in :func:`time.time`) by which the
+            transaction must have succeeded
 
         """
 
-        for txn in self._backend.txn(max_retries=max_retries):
+        deadline = _deadline(timeout, deadline)
+        kwargs = {}
+        reports = getattr(self._explain, "reports", None)
+        if reports is not None:
+            kwargs["report"] = TransactionReport()
+            reports.append(kwargs["report"])
+        for txn in self._backend.txn(
+            max_retries=max_retries, deadline=deadline, **kwargs
+        ):
             yield Transaction(self, txn, self._paths)
 
-    def watcher(self, timeout=None) -> Iterable["Watcher"]:
+    def watcher(
+        self, timeout=None, deadline: float = None, name: str = None
+    ) -> Iterable["Watcher"]:
         """Create a new watcher.
 
         Useful for waiting for changes in the configuration. Calling
@@ -149,21 +319,319 @@ class Config:
         for using watchers.
 
         :param timeout: Timeout for waiting. Watcher will loop after this time.
+        :param deadline: Time (as in :func:`time.time`) by which the
+            watcher loop must have finished. Waiting stops at the
+            deadline and a :class:`ska_sdp_config.ConfigTimeout` gets
+            raised.
+        :param name: Name of the watcher in metrics, e.g. the control
+            loop it runs. See :py:attr:`metrics`.
 
         """
 
         def txn_wrapper(txn):
             return Transaction(self, txn, self._paths)
 
-        for watcher in self._backend.watcher(timeout, txn_wrapper):
+        for watcher in self._backend.watcher(
+            timeout, txn_wrapper, deadline=deadline, name=name
+        ):
             yield watcher
 
+    @contextlib.contextmanager
+    def time_limit(
+        self, timeout: float = None, deadline: float = None
+    ) -> Iterator[None]:
+        """Bound the time requests made in a block can take.
+
+        Applies to all transactions, watchers and direct backend calls
+        made by the current thread, for instance in a command handler:
+
+        .. code-block:: python
+
+            with config.time_limit(2.0):
+                for txn in config.txn():
+                    # ...
+
+        Once the time limit passed, requests get timed out and a
+        :class:`ska_sdp_config.ConfigTimeout` gets raised. Nested time
+        limits can only shorten the time available.
+
+        :param timeout: Time in seconds the block can take
+        :param deadline: Time (as in :func:`time.time`) by which the
+            block must have finished
+        """
+        with deadline_scope(_deadline(timeout, deadline)):
+            yield
+
+    @contextlib.contextmanager
+    def explain(self) -> Iterator[List[TransactionReport]]:
+        """Explain the transactions run by the current thread in a block.
+
+        Transactions created using :py:meth:`txn` run once against the
+        database, but do not get committed. Instead, they record the
+        reads going to the database, and the compares and writes their
+        commit would send:
+
+        .. code-block:: python
+
+            with config.explain() as reports:
+                for txn in config.txn():
+                    # ...
+            for report in reports:
+                print(report.summary())
+
+        This gives an idea of the number of requests, the bytes read
+        and written, and the size of the commit a transaction body
+        generates, and shows commits
+        exceeding the etcd limit on the number of operations.
+
+        :returns: list of
+            :py:class:`~ska_sdp_config.backend.explain.TransactionReport`,
+            one per transaction run in the block
+        """
+        if isinstance(self._backend, backend_mod.MemoryBackend):
+            raise ValueError("Memory backend cannot explain transactions!")
+        previous = getattr(self._explain, "reports", None)
+        self._explain.reports = reports = []
+        try:
+            yield reports
+        finally:
+            self._explain.reports = previous
+
+    def replica(self, prefix: str, max_depth: int = 3) -> Replica:
+        """Create a local replica of all keys with the given prefix.
+
+        The replica reads all keys once, and then gets kept current
+        by watching for changes. Reading from it does not involve the
+        database at all. Use this instead of repeatedly listing and
+        reading many keys in a watcher loop:
+
+        .. code-block:: python
+
+            with config.replica("/pb/") as pbs:
+                for key in pbs.list_keys("/pb/"):
+                    pb_state = pbs.get(key + "/state")
+
+        See :py:class:`ska_sdp_config.replica.Replica`.
+
+        :param prefix: Prefix of keys to replicate. Note that the
+            global prefix does not get added.
+        :param max_depth: Number of levels of keys to replicate
+        :returns: Started replica. Stop it using
+            :py:meth:`Replica.stop`, or by leaving the `with` block.
+        """
+        return Replica(self._backend, prefix, max_depth).start()
+
+    def batch_queue(self, name: str = "batch") -> BatchQueue:
+        """Get a scheduling queue for processing blocks.
+
+        See :py:class:`ska_sdp_config.batch_queue.BatchQueue`.
+
+        :param name: Name of the queue
+        :returns: Queue
+        """
+        return BatchQueue(self, self._paths["queue"] + name + "/")
+
+    def election(self, name: str) -> Election:
+        """Get an election of a leader between replicas.
+
+        See :py:class:`ska_sdp_config.election.Election`.
+
+        :param name: Name of the election, e.g. the name of the controller
+        :returns: Election, for campaigning as one candidate
+        """
+        return Election(self, self._paths["election"] + name + "/")
+
+    def lock(self, name: str) -> Lock:
+        """Get a lock, for instance to serialise updates of a key.
+
+        .. code-block:: python
+
+            with config.lock("master"):
+                for txn in config.txn():
+                    # ...
+
+        See :py:class:`ska_sdp_config.locks.Lock`.
+
+        :param name: Name of the lock
+        :returns: Lock, not acquired yet
+        """
+        return Lock(self, self._paths["lock"] + name + "/")
+
+    def semaphore(self, name: str, limit: int) -> Semaphore:
+        """Get a semaphore, limiting the number of concurrent clients.
+
+        See :py:class:`ska_sdp_config.locks.Semaphore`.
+
+        :param name: Name of the semaphore
+        :param limit: Number of clients that can hold it at a time
+        :returns: Semaphore, not acquired yet
+        """
+        return Semaphore(self, self._paths["semaphore"] + name + "/", limit)
+
+    def shard_membership(
+        self, group: str = "processing-controller", member_id: str = None
+    ) -> ShardMembership:
+        """Get membership in a group sharing processing blocks.
+
+        See :py:class:`ska_sdp_config.sharding.ShardMembership`.
+
+        :param group: Name of the group
+        :param member_id: ID of the member, defaults to host name and
+            process ID
+        :returns: Membership, call :py:meth:`ShardMembership.join` to join
+        """
+        if member_id is None:
+            member_id = "{}-{}".format(gethostname(), os.getpid())
+        return ShardMembership(
+            self,
+            self._paths["member"] + group + "/",
+            member_id,
+            pb_path=self._paths["pb"],
+        )
+
+    def dependency_graph(self) -> DependencyGraph:
+        """Create a graph of the dependencies between processing blocks.
+
+        The graph follows a replica of all processing blocks and their
+        states, and gets updated incrementally as they change. See
+        :py:class:`ska_sdp_config.dependencies.DependencyGraph`.
+
+        :returns: Dependency graph. Stop it using
+            :py:meth:`DependencyGraph.stop`, or by leaving the `with` block.
+        """
+        pb_path = self._paths["pb"]
+        graph = DependencyGraph(pb_path)
+        return graph.follow(self.replica(pb_path, max_depth=2))
+
+    def snapshot(
+        self, stream: TextIO, prefix: str = None, batch_size: int = 1000
+    ) -> int:
+        """Export all keys and values into a snapshot.
+
+        The keys are read in batches at a pinned database revision and
+        streamed out, so this works for any number of keys. See
+        :py:mod:`ska_sdp_config.snapshot` for the format.
+
+        :param stream: Text stream to write the snapshot to
+        :param prefix: Prefix of keys to export. Defaults to all keys
+            below the global prefix.
+        :param batch_size: Number of keys to read at a time
+        :returns: Database revision of the snapshot
+        """
+        if prefix is None:
+            prefix = self._global_prefix + "/"
+        revision, items = self._backend.range_values(prefix, batch_size=batch_size)
+        snapshot.write_snapshot(stream, revision.revision, items, prefix)
+        return revision.revision
+
+    def stats(
+        self, prefix: str = None, batch_size: int = 1000, top: int = 10
+    ) -> KeyspaceStats:
+        """Gather statistics of the keys and values in the database.
+
+        The keys are read in batches at a pinned database revision in a
+        single pass, and memory use does not grow with the number of
+        keys. Keys are grouped by the top-level path below the global
+        prefix they are in. See
+        :py:class:`ska_sdp_config.stats.KeyspaceStats`.
+
+        :param prefix: Prefix of keys to cover. Defaults to all keys
+            below the global prefix.
+        :param batch_size: Number of keys to read at a time
+        :param top: Number of largest keys to report
+        :returns: Statistics
+        """
+        if prefix is None:
+            prefix = self._global_prefix + "/"
+        revision, items = self._backend.range_values(prefix, batch_size=batch_size)
+        # Group by the top-level paths, as for a prefix below them every
+        # key would get a group of its own
+        stats = KeyspaceStats(
+            prefix, revision.revision, top, root=self._global_prefix + "/"
+        )
+        stats.add_all(items)
+        return stats
+
+    def restore(
+        self, stream: TextIO, batch_size: int = 100, overwrite: bool = False
+    ) -> int:
+        """Import keys and values from a snapshot.
+
+        Keys are written in batches, each using one transaction. Note
+        that this means that a failed restore can leave a part of the
+        snapshot in the database. Revisions are not restored, the keys
+        get new ones.
+
+        :param stream: Text stream to read the snapshot from
+        :param batch_size: Number of keys to write per transaction. Note
+            that etcd limits the number of operations per transaction
+            (128 by default).
+        :param overwrite: Overwrite existing keys? Otherwise fail if a
+            key exists already
+        :returns: Number of keys restored
+        :raises: ConfigCollision
+        """
+        _, items = snapshot.read_snapshot(stream)
+        count = 0
+        while True:
+            batch = list(itertools.islice(items, batch_size))
+            if not batch:
+                return count
+            for attempt, txn in enumerate(self._backend.txn()):
+                # Create keys without reading them first. Only once
+                # that failed (or to overwrite) read the whole batch.
+                existing = {}
+                if overwrite or attempt > 0:
+                    existing = txn.get_many(path for path, _, _ in batch)
+                for path, value, _ in batch:
+                    if overwrite and existing[path][0] is not None:
+                        txn.update(path, value)
+                    else:
+                        txn.create(path, value, check=bool(existing))
+            count += len(batch)
+
+    def rebuild_indexes(self, batch_size: int = 50) -> int:
+        """Rebuild the secondary indexes of processing blocks.
+
+        Indexes are maintained by the :py:class:`Transaction` methods
+        writing processing blocks and their state. Use this to create
+        them for an existing database, or to repair them after keys
+        were written directly. Processing blocks get re-indexed in
+        batches, one transaction each.
+
+        :param batch_size: Number of processing blocks per transaction
+        :returns: Number of index entries created or deleted
+        """
+        pb_path = self._paths["pb"]
+        for txn in self._backend.txn():
+            pb_keys = txn.list_keys(pb_path)
+            index_keys = txn.list_keys(self._paths["index"] + "pb/", recurse=2)
+
+        # Collect existing index entries by processing block ID
+        entries = {}
+        for key in index_keys:
+            entries.setdefault(key[key.rindex("/") + 1 :], set()).add(key)
+        pb_ids = sorted({key[len(pb_path) :] for key in pb_keys} | set(entries))
+
+        changes = 0
+        for start in range(0, len(pb_ids), batch_size):
+            for txn in self.txn():
+                batch_changes = sum(
+                    # pylint: disable=protected-access
+                    txn._reindex_processing_block(pb_id, entries.get(pb_id, set()))
+                    for pb_id in pb_ids[start : start + batch_size]
+                )
+            changes += batch_changes
+        return changes
+
     def close(self):
         """Close the client connection."""
         if self._client_lease:
             self._client_lease.__exit__(None, None, None)
             self._client_lease = None
         self._backend.close()
+        if self._owns_tracer:
+            self._tracer.flush()
 
     def __enter__(self):
         """Scope the client connection."""
@@ -191,6 +659,29 @@ def dict_to_json(obj):
     )
 
 
+def _deadline(timeout: float = None, deadline: float = None) -> float:
+    """Combine a timeout and a deadline into the earlier deadline."""
+    if timeout is not None:
+        deadline = min(time.time() + timeout, deadline or float("inf"))
+    return deadline
+
+
+# Secondary indexes of processing blocks. Each maps the name of a
+# query parameter of Transaction.list_processing_blocks to the name of
+# the index, the document it is derived from ("pb" or "state") and a
+# function extracting the indexed value from that document. Entries
+# are kept at <index>/pb/<name>/<value>/<pb_id>.
+PB_INDEXES = {
+    "sbi_id": ("by-sbi", "pb", lambda pb: pb.get("sbi_id")),
+    "workflow_type": (
+        "by-workflow-type",
+        "pb",
+        lambda pb: pb.get("workflow", {}).get("type"),
+    ),
+    "status": ("by-status", "state", lambda state: state.get("state")),
+}
+
+
 class Transaction:  # pylint: disable=too-many-public-methods
     """High-level configuration queries and updates to execute atomically."""
 
@@ -205,12 +696,25 @@ class Transaction:  # pylint: disable=too-many-public-methods
         """Return transaction object for accessing database directly."""
         return self._txn
 
+    @property
+    def pb_index_path(self) -> str:
+        """Path prefix of the processing block indexes, with trailing slash."""
+        return self._paths["index"] + "pb/"
+
+    def _decode(self, path: str, txt: str):
+        """Decode a JSON object read from a path."""
+        tracer = self._cfg.tracer
+        if tracer is None:
+            return json.loads(txt)
+        with tracer.span("decode", path=path, size=len(txt)):
+            return json.loads(txt)
+
     def _get(self, path):
         """Get a JSON object from the database."""
         txt = self._txn.get(path)
         if txt is None:
             return None
-        return json.loads(txt)
+        return self._decode(path, txt)
 
     def _create(self, path, obj, lease=None):
         """Set a new path in the database to a JSON object."""
@@ -229,20 +733,63 @@ class Transaction:  # pylint: disable=too-many-public-methods
         """
         return self._txn.loop(wait, timeout)
 
-    def list_processing_blocks(self, prefix=""):
+    def list_processing_blocks(
+        self, prefix="", sbi_id=None, workflow_type=None, status=None
+    ):
         """Query processing block IDs from the configuration.
 
+        Filtering by scheduling block instance, workflow type or
+        status uses secondary indexes, so processing blocks do not
+        need to be read. See :py:meth:`Config.rebuild_indexes`.
+
         :param prefix: If given, only search for processing block IDs
            with the given prefix
+        :param sbi_id: If given, only return processing blocks of
+           this scheduling block instance
+        :param workflow_type: If given, only return processing blocks
+           with this workflow type (e.g. "batch" or "realtime")
+        :param status: If given, only return processing blocks whose
+           state has this status (e.g. "RUNNING")
         :returns: Processing block ids, in lexicographical order
         """
-        # List keys
-        pb_path = self._paths["pb"]
-        keys = self._txn.list_keys(pb_path + prefix)
-
-        # return list, stripping the prefix
-        assert all(key.startswith(pb_path) for key in keys)
-        return list(key[len(pb_path) :] for key in keys)
+        filters = {"sbi_id": sbi_id, "workflow_type": workflow_type, "status": status}
+        filters = {name: value for name, value in filters.items() if value is not None}
+        if not filters:
+            # List keys
+            pb_path = self._paths["pb"]
+            keys = self._txn.list_keys(pb_path + prefix)
+
+            # return list, stripping the prefix
+            assert all(key.startswith(pb_path) for key in keys)
+            return list(key[len(pb_path) :] for key in keys)
+
+        # Intersect results from indexes
+        pb_ids = None
+        for name, value in filters.items():
+            index_path = self._pb_index_path(name, value) + "/"
+            keys = self._txn.list_keys(index_path + prefix)
+            found = {key[len(index_path) :] for key in keys}
+            pb_ids = found if pb_ids is None else pb_ids & found
+        return sorted(pb_ids)
+
+    def iter_processing_blocks(
+        self, prefix: str = "", batch_size: int = 100
+    ) -> Iterator[entity.ProcessingBlock]:
+        """Iterate over processing blocks in the configuration.
+
+        Processing blocks are read in batches as the iterator gets
+        consumed, so memory use does not depend on their number. Unlike
+        calling :py:meth:`get_processing_block` for every ID returned
+        by :py:meth:`list_processing_blocks`, this needs only one
+        request per batch.
+
+        :param prefix: If given, only return processing blocks with IDs
+           starting with the prefix
+        :param batch_size: Number of processing blocks to read at a time
+        :returns: Processing blocks, ordered by ID
+        """
+        for _, dct in self._iter_documents(self._paths["pb"] + prefix, batch_size):
+            yield entity.ProcessingBlock(**dct)
 
     def new_processing_block_id(self, generator: str):
         """Generate a new processing block ID that is not yet in use.
@@ -283,6 +830,7 @@ class Transaction:  # pylint: disable=too-many-public-methods
         """
         assert isinstance(pblock, entity.ProcessingBlock)
         self._create(self._paths["pb"] + pblock.id, pblock.to_dict())
+        self._update_pb_indexes(pblock.id, "pb", None, pblock.to_dict())
 
     def update_processing_block(self, pblock: entity.ProcessingBlock):
         """
@@ -291,7 +839,26 @@ class Transaction:  # pylint: disable=too-many-public-methods
         :param pb: Processing block to update
         """
         assert isinstance(pblock, entity.ProcessingBlock)
+        old = self._get(self._paths["pb"] + pblock.id)
         self._update(self._paths["pb"] + pblock.id, pblock.to_dict())
+        self._update_pb_indexes(pblock.id, "pb", old, pblock.to_dict())
+
+    def delete_processing_block(self, pb_id: str):
+        """
+        Delete a processing block, including its state and owner.
+
+        :param pb_id: Processing block ID
+        """
+        pb_path = self._paths["pb"] + pb_id
+        pblock = self._get(pb_path)
+        self._update_pb_indexes(pb_id, "pb", pblock, None)
+        self._update_pb_indexes(pb_id, "state", self._get(pb_path + "/state"), None)
+        if pblock is not None:
+            self._txn.delete(pb_path)
+        # Only list below the processing block, as other IDs might
+        # start with this one
+        for key in self._txn.list_keys(pb_path + "/", recurse=4):
+            self._txn.delete(key)
 
     def get_processing_block_owner(self, pb_id: str) -> dict:
         """
@@ -342,6 +909,64 @@ class Transaction:  # pylint: disable=too-many-public-methods
             return None
         return state
 
+    def get_all_processing_block_states(self, prefix: str = "") -> Dict[str, dict]:
+        """
+        Get the states of all processing blocks.
+
+        All states get read at once, which is much faster than calling
+        :py:meth:`get_processing_block_state` for every processing
+        block.
+
+        :param prefix: If given, only get states of processing blocks
+            with IDs starting with the prefix
+        :returns: Processing block states by processing block ID.
+            Processing blocks without state are left out.
+        """
+        return self._get_all_pb_subkeys("state", prefix)
+
+    def get_all_processing_block_owners(self, prefix: str = "") -> Dict[str, dict]:
+        """
+        Get the owners of all processing blocks.
+
+        See :py:meth:`get_all_processing_block_states`.
+
+        :param prefix: If given, only get owners of processing blocks
+            with IDs starting with the prefix
+        :returns: Processing block owners by processing block ID.
+            Processing blocks that are not claimed are left out.
+        """
+        return self._get_all_pb_subkeys("owner", prefix)
+
+    def get_processing_block_view(self, pb_id: str) -> entity.ProcessingBlockView:
+        """
+        Look up processing block together with its owner and state.
+
+        This reads all keys of the processing block with one request,
+        instead of one request for each of :py:meth:`get_processing_block`,
+        :py:meth:`get_processing_block_owner` and
+        :py:meth:`get_processing_block_state`.
+
+        :param pb_id: Processing block ID to look up
+        :returns: Processing block view, or None if the processing block
+            doesn't exist
+        """
+        views = self._get_pb_views(pb_id, exact=True)
+        return views[0] if views else None
+
+    def iter_processing_block_views(
+        self, prefix: str = ""
+    ) -> Iterator[entity.ProcessingBlockView]:
+        """
+        Iterate over processing blocks together with their owners and states.
+
+        All keys of the processing blocks get read with one request.
+
+        :param prefix: If given, only return processing blocks with IDs
+           starting with the prefix
+        :returns: Processing block views, ordered by processing block ID
+        """
+        return iter(self._get_pb_views(prefix))
+
     def create_processing_block_state(self, pb_id: str, state: dict):
         """
         Create processing block state.
@@ -350,6 +975,7 @@ class Transaction:  # pylint: disable=too-many-public-methods
         :param state: Processing block state to create
         """
         self._create(self._paths["pb"] + pb_id + "/state", state)
+        self._update_pb_indexes(pb_id, "state", None, state)
 
     def update_processing_block_state(self, pb_id: str, state: dict):
         """
@@ -358,7 +984,9 @@ class Transaction:  # pylint: disable=too-many-public-methods
         :param pb_id: Processing block ID
         :param state: Processing block state to update
         """
+        old = self._get(self._paths["pb"] + pb_id + "/state")
         self._update(self._paths["pb"] + pb_id + "/state", state)
+        self._update_pb_indexes(pb_id, "state", old, state)
 
     def get_deployment(self, deploy_id: str) -> entity.Deployment:
         """
@@ -383,6 +1011,21 @@ class Transaction:  # pylint: disable=too-many-public-methods
         assert all(key.startswith(self._paths["deploy"]) for key in keys)
         return list(key[len(self._paths["deploy"]) :] for key in keys)
 
+    def iter_deployments(
+        self, prefix: str = "", batch_size: int = 100
+    ) -> Iterator[entity.Deployment]:
+        """
+        Iterate over current deployments, reading them in batches.
+
+        :param prefix: If given, only return deployments with IDs
+           starting with the prefix
+        :param batch_size: Number of deployments to read at a time
+        :returns: Deployments, ordered by ID
+        """
+        path = self._paths["deploy"] + prefix
+        for _, dct in self._iter_documents(path, batch_size):
+            yield entity.Deployment(**dct)
+
     def create_deployment(self, dpl: entity.Deployment):
         """
         Request a change to cluster configuration.
@@ -419,6 +1062,20 @@ class Transaction:  # pylint: disable=too-many-public-methods
         assert all(key.startswith(sb_path) for key in keys)
         return list(key[len(sb_path) :] for key in keys)
 
+    def iter_scheduling_blocks(
+        self, prefix: str = "", batch_size: int = 100
+    ) -> Iterator[Tuple[str, dict]]:
+        """Iterate over scheduling blocks, reading them in batches.
+
+        :param prefix: if given, only return scheduling blocks with IDs
+           starting with the prefix
+        :param batch_size: number of scheduling blocks to read at a time
+        :returns: (scheduling block ID, state) pairs, ordered by ID
+        """
+        sb_path = self._paths["sb"]
+        for key, state in self._iter_documents(sb_path + prefix, batch_size):
+            yield (key[len(sb_path) :], state)
+
     def get_scheduling_block(self, sb_id: str) -> dict:
         """
         Get scheduling block.
@@ -429,6 +1086,48 @@ class Transaction:  # pylint: disable=too-many-public-methods
         state = self._get(self._paths["sb"] + sb_id)
         return state
 
+    def get_scheduling_block_with_pbs(self, sbi_id: str) -> entity.SchedulingBlockView:
+        """
+        Get scheduling block instance together with its processing blocks.
+
+        The processing blocks listed in the ``pb_realtime`` and
+        ``pb_batch`` fields of the scheduling block instance get read
+        together with their states and owners, using one batched
+        request.
+
+        :param sbi_id: scheduling block instance ID
+        :returns: view of scheduling block instance and processing
+            blocks, or None if the scheduling block instance doesn't exist
+        """
+        return self._get_sb_view(sbi_id)
+
+    def refresh_scheduling_block_with_pbs(
+        self, view: entity.SchedulingBlockView
+    ) -> entity.SchedulingBlockView:
+        """
+        Get scheduling block instance with processing blocks again.
+
+        Like :py:meth:`get_scheduling_block_with_pbs`, but values that
+        did not change since `view` was read are not transferred again,
+        and views of unchanged processing blocks get reused. This is
+        meant for watcher loops:
+
+        .. code-block:: python
+
+            view = None
+            for watcher in config.watcher():
+                for txn in watcher.txn():
+                    if view is None:
+                        view = txn.get_scheduling_block_with_pbs(sbi_id)
+                    else:
+                        view = txn.refresh_scheduling_block_with_pbs(view)
+
+        :param view: earlier view of the scheduling block instance
+        :returns: view of scheduling block instance and processing
+            blocks, or None if the scheduling block instance doesn't exist
+        """
+        return self._get_sb_view(view.id, view)
+
     def create_scheduling_block(self, sb_id: str, state: dict):
         """
         Create scheduling block.
@@ -565,6 +1264,25 @@ class Transaction:  # pylint: disable=too-many-public-methods
         # Return list, stripping the prefix
         return list(tuple(key[len(workflow_path) :].split(":")) for key in keys)
 
+    def iter_workflows(
+        self, w_type: str = "", w_id: str = "", batch_size: int = 100
+    ) -> Iterator[Tuple[Tuple[str, str, str], dict]]:
+        """
+        Iterate over workflows, reading them in batches.
+
+        :param w_type: workflow type. Default empty
+        :param w_id: workflow id/name. Default empty
+        :param batch_size: number of workflows to read at a time
+
+        :returns: ((type, id, version), workflow definition) pairs
+        """
+        workflow_path = self._paths["workflow"]
+        path = workflow_path + w_type
+        if w_type and w_id:
+            path += ":" + w_id
+        for key, workflow in self._iter_documents(path, batch_size):
+            yield (tuple(key[len(workflow_path) :].split(":")), workflow)
+
     def update_workflow(
         self, w_type: str, w_id: str, w_version: str, workflow: dict
     ) -> None:
@@ -598,6 +1316,196 @@ class Transaction:  # pylint: disable=too-many-public-methods
     # Private methods
     # -------------------------------------
 
+    def _get_all_pb_subkeys(self, name: str, prefix: str) -> Dict[str, dict]:
+        """
+        Get a sub-key of all processing blocks.
+
+        The keys of all processing blocks have the same depth, so we
+        can read them with a single range query.
+
+        :param name: name of sub-key, e.g. "state"
+        :param prefix: processing block ID prefix
+
+        :returns: JSON objects by processing block ID
+        """
+        pb_path = self._paths["pb"]
+        suffix = "/" + name
+        return {
+            key[len(pb_path) : -len(suffix)]: self._decode(key, value)
+            for key, value in self._txn.list_values(pb_path + prefix, recurse=(1,))
+            if key.endswith(suffix)
+        }
+
+    def _iter_documents(self, path: str, batch_size: int) -> Iterator[Tuple[str, dict]]:
+        """
+        Iterate over keys with a prefix, decoding their values.
+
+        :param path: prefix of keys
+        :param batch_size: number of keys to read at a time
+
+        :returns: (key, document) pairs, ordered by key
+        """
+        for key, value in self._txn.iter_values(path, batch_size=batch_size):
+            yield (key, self._decode(key, value))
+
+    def _get_sb_view(
+        self, sbi_id: str, previous: entity.SchedulingBlockView = None
+    ) -> entity.SchedulingBlockView:
+        """
+        Read scheduling block instance and processing blocks.
+
+        :param sbi_id: scheduling block instance ID
+        :param previous: earlier view to reuse unchanged values from
+
+        :returns: view, or None if the scheduling block doesn't exist
+        """
+        # pylint: disable=protected-access
+        known = {} if previous is None else previous._values
+        sb_path = self._paths["sb"] + sbi_id
+        values = self._txn.get_many([sb_path], known=known)
+        if values[sb_path][0] is None:
+            return None
+        state = self._decode(sb_path, values[sb_path][0])
+
+        # Read all keys of the processing blocks in one go
+        pb_ids = (state.get("pb_realtime") or []) + (state.get("pb_batch") or [])
+        pb_paths = {
+            pb_id: {
+                name: self._paths["pb"] + pb_id + suffix
+                for name, suffix in (("", ""), ("state", "/state"), ("owner", "/owner"))
+            }
+            for pb_id in pb_ids
+        }
+        values.update(
+            self._txn.get_many(
+                [path for paths in pb_paths.values() for path in paths.values()],
+                known=known,
+            )
+        )
+
+        pbs = {}
+        for pb_id, paths in pb_paths.items():
+            if values[paths[""]][0] is None:
+                continue
+            if previous is not None and pb_id in previous.processing_blocks:
+                if all(values[path] == known.get(path) for path in paths.values()):
+                    pbs[pb_id] = previous.processing_blocks[pb_id]
+                    continue
+            pbs[pb_id] = self._pb_view(
+                pb_id, {name: values[path][0] for name, path in paths.items()}
+            )
+        return entity.SchedulingBlockView(sbi_id, state, pbs, values)
+
+    def _get_pb_views(self, prefix: str, exact: bool = False) -> list:
+        """
+        Read processing blocks with all their sub-keys.
+
+        Processing blocks and their sub-keys are at two depths, which
+        we can read as ranges in one request.
+
+        :param prefix: processing block ID prefix
+        :param exact: only return the processing block with this ID
+
+        :returns: processing block views, ordered by ID
+        """
+        pb_path = self._paths["pb"]
+        values = {}
+        for key, value in self._txn.list_values(pb_path + prefix, recurse=(0, 1)):
+            pb_id, _, name = key[len(pb_path) :].partition("/")
+            if not exact or pb_id == prefix:
+                values.setdefault(pb_id, {})[name] = value
+        return [
+            self._pb_view(pb_id, values[pb_id])
+            for pb_id in sorted(values)
+            if "" in values[pb_id]
+        ]
+
+    def _pb_view(self, pb_id: str, values: dict) -> entity.ProcessingBlockView:
+        """Create a processing block view decoding through the transaction."""
+        pb_path = self._paths["pb"] + pb_id
+
+        def decode(name, txt):
+            return self._decode(pb_path + "/" + name if name else pb_path, txt)
+
+        return entity.ProcessingBlockView(pb_id, values, decode)
+
+    def _pb_index_path(self, name: str, value) -> str:
+        """
+        Construct path of a processing block index for a value.
+
+        :param name: name of query parameter, see PB_INDEXES
+        :param value: indexed value
+
+        :returns: index path, without trailing slash
+        """
+        index_name = PB_INDEXES[name][0]
+        return "{}{}/{}".format(
+            self.pb_index_path, index_name, quote(str(value), safe="")
+        )
+
+    def _pb_index_entries(self, pb_id: str, document: str, dct: dict) -> List[str]:
+        """
+        Determine index entries of a processing block.
+
+        :param pb_id: processing block ID
+        :param document: "pb" or "state"
+        :param dct: processing block or state, None if it doesn't exist
+
+        :returns: paths of index entries derived from the document
+        """
+        if dct is None:
+            return []
+        entries = []
+        for name, (_, source, extract) in PB_INDEXES.items():
+            if source != document:
+                continue
+            value = extract(dct)  # pylint: disable=not-callable
+            if value is not None and value != "":
+                entries.append(self._pb_index_path(name, value) + "/" + pb_id)
+        return entries
+
+    def _update_pb_indexes(self, pb_id: str, document: str, old: dict, new: dict):
+        """
+        Update index entries of a processing block after a change.
+
+        :param pb_id: processing block ID
+        :param document: "pb" or "state"
+        :param old: previous document, None if it didn't exist
+        :param new: new document, None if it got deleted
+        """
+        old_entries = set(self._pb_index_entries(pb_id, document, old))
+        new_entries = set(self._pb_index_entries(pb_id, document, new))
+        for path in sorted(old_entries - new_entries):
+            self._txn.delete(path, must_exist=False)
+        for path in sorted(new_entries - old_entries):
+            if self._txn.get(path) is None:
+                self._txn.create(path, pb_id)
+
+    def _reindex_processing_block(self, pb_id: str, entries: set) -> int:
+        """
+        Make index entries of a processing block match its documents.
+
+        :param pb_id: processing block ID
+        :param entries: paths of index entries found for the processing block
+
+        :returns: number of entries created or deleted
+        """
+        pb_path = self._paths["pb"] + pb_id
+        expected = set(self._pb_index_entries(pb_id, "pb", self._get(pb_path)))
+        expected.update(
+            self._pb_index_entries(pb_id, "state", self._get(pb_path + "/state"))
+        )
+        changes = 0
+        for path in sorted(entries - expected):
+            if self._txn.get(path) is not None:
+                self._txn.delete(path)
+                changes += 1
+        for path in sorted(expected):
+            if self._txn.get(path) is None:
+                self._txn.create(path, pb_id)
+                changes += 1
+        return changes
+
     def _workflow_path(self, w_type: str, w_id: str, w_version: str) -> str:
         """
         Construct workflow path.
@@ -0,0 +1,326 @@
+"""
+Dependency graph of processing blocks.
+
+Processing blocks can depend on other processing blocks (see
+:py:attr:`ProcessingBlock.dependencies`), for instance a batch
+workflow processing the output of a real-time one. A dependency is
+resolved once the processing block depended on reaches a terminal
+state. The graph keeps track of this incrementally, so a scheduler
+does not need to read all processing blocks to find out which are
+ready to run:
+
+.. code-block:: python
+
+    with config.dependency_graph() as graph:
+        graph.add_callback(lambda pb_id: print(pb_id, "is ready"))
+        for pb_id in graph.ready():
+            # ...
+
+Every change to a processing block or its state only touches the
+processing blocks directly connected to it. The topological order
+gets cached, and is only determined again once dependencies change.
+"""
+
+import heapq
+import json
+import threading
+from typing import Callable, Iterable, List, Optional, Set
+
+from .replica import Replica
+
+# Processing block states after which a processing block will not change
+TERMINAL_STATES = frozenset(["FINISHED", "FAILED", "CANCELLED"])
+
+
+def _dependency_ids(dependencies: Iterable) -> Set[str]:
+    """
+    Get IDs of processing blocks depended on.
+
+    :param dependencies: dependencies as stored in the processing block
+    :returns: set of processing block IDs
+    """
+    pb_ids = set()
+    for dependency in dependencies:
+        if isinstance(dependency, dict):
+            dependency = dependency.get("pb_id", dependency.get("pblockId"))
+        if dependency is not None:
+            pb_ids.add(str(dependency))
+    return pb_ids
+
+
+class DependencyGraph:
+    """Graph of dependencies between processing blocks.
+
+    The graph can be fed changes to processing block keys directly
+    using :py:meth:`apply`, or :py:meth:`follow` a replica of the
+    processing blocks. Queries only involve the graph.
+
+    A processing block is *resolved* once all processing blocks it
+    depends on are in a terminal state (see :py:data:`TERMINAL_STATES`).
+    Dependencies on processing blocks that do not exist are never
+    resolved.
+
+    :param pb_path: Path of processing blocks, as used by the
+        configuration (i.e. including the global prefix)
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, pb_path: str = "/pb/"):
+        """Create an empty graph."""
+        self._pb_path = pb_path
+        self._lock = threading.RLock()
+        self._deps = {}  # pb_id -> set of pb_ids depended on
+        self._dependents = {}  # pb_id -> set of pb_ids depending on it
+        self._states = {}  # pb_id -> state
+        self._unresolved = {}  # pb_id -> number of unresolved dependencies
+        self._ready = set()
+        self._order = None  # Cached topological order
+        self._callbacks = []
+        self._replica = None
+
+    # -------------------------------------
+    # Updating
+    # -------------------------------------
+
+    def follow(self, replica: Replica) -> "DependencyGraph":
+        """
+        Keep the graph current using a replica of the processing blocks.
+
+        :param replica: Replica of the processing block path, covering
+            processing blocks and their states (``max_depth=2``)
+        :returns: the graph
+        """
+        self._replica = replica
+        replica.add_listener(self.apply)
+        return self
+
+    def stop(self) -> None:
+        """Stop the replica the graph follows, if any."""
+        if self._replica is not None:
+            self._replica.stop()
+
+    def __enter__(self) -> "DependencyGraph":
+        """Scope the graph to a block."""
+        return self
+
+    def __exit__(self, *args):
+        """Scope the graph to a block."""
+        self.stop()
+
+    def load(self, txn) -> "DependencyGraph":
+        """
+        Add all processing blocks read in a transaction.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction`
+        :returns: the graph
+        """
+        for pblock in txn.iter_processing_blocks():
+            self.set_processing_block(pblock.id, pblock.dependencies)
+        for pb_id, state in txn.get_all_processing_block_states().items():
+            self.set_state(pb_id, state)
+        return self
+
+    def apply(self, path: str, value: Optional[str]) -> None:
+        """
+        Apply a change to a key in the configuration database.
+
+        Changes to keys other than processing blocks and their states
+        get ignored.
+
+        :param path: Path of key changed
+        :param value: New value, or None if the key was deleted
+        """
+        if not path.startswith(self._pb_path):
+            return
+        pb_id, _, name = path[len(self._pb_path) :].partition("/")
+        document = None if value is None else json.loads(value)
+        if name == "":
+            self.set_processing_block(
+                pb_id, None if document is None else document.get("dependencies", [])
+            )
+        elif name == "state":
+            self.set_state(pb_id, document)
+
+    def set_processing_block(self, pb_id: str, dependencies: Optional[list]) -> None:
+        """
+        Add, change or remove a processing block.
+
+        :param pb_id: Processing block ID
+        :param dependencies: Dependencies of the processing block as
+            stored in the processing block, None if it was removed
+        """
+        with self._lock:
+            old = self._deps.get(pb_id)
+            new = None if dependencies is None else _dependency_ids(dependencies)
+            if old == new:
+                return
+            was_resolved = self.is_resolved(pb_id)
+            old = old or set()
+            for dep in old - (new or set()):
+                self._dependents[dep].discard(pb_id)
+                if not self._dependents[dep]:
+                    del self._dependents[dep]
+            for dep in (new or set()) - old:
+                self._dependents.setdefault(dep, set()).add(pb_id)
+            if new is None:
+                del self._deps[pb_id]
+                del self._unresolved[pb_id]
+            else:
+                self._deps[pb_id] = new
+                self._unresolved[pb_id] = sum(
+                    1 for dep in new if not self._is_terminal(dep)
+                )
+            self._order = None
+            self._update_ready(pb_id)
+            resolved = not was_resolved and self.is_resolved(pb_id)
+            callbacks = list(self._callbacks)
+
+        # Added without dependencies, or with all of them finished already
+        if resolved:
+            for callback in callbacks:
+                callback(pb_id)
+
+    def set_state(self, pb_id: str, state: Optional[dict]) -> None:
+        """
+        Change the state of a processing block.
+
+        :param pb_id: Processing block ID
+        :param state: Processing block state, None if it was removed
+        """
+        resolved = []
+        with self._lock:
+            was_terminal = self._is_terminal(pb_id)
+            if state is None:
+                self._states.pop(pb_id, None)
+            else:
+                self._states[pb_id] = state.get("state")
+            is_terminal = self._is_terminal(pb_id)
+
+            # Only processing blocks depending on this one are affected
+            if was_terminal != is_terminal:
+                for dependent in self._dependents.get(pb_id, ()):
+                    self._unresolved[dependent] += -1 if is_terminal else 1
+                    if self._unresolved[dependent] == 0:
+                        resolved.append(dependent)
+                    self._update_ready(dependent)
+            self._update_ready(pb_id)
+            callbacks = list(self._callbacks)
+
+        for dependent in sorted(resolved):
+            for callback in callbacks:
+                callback(dependent)
+
+    def add_callback(self, callback: Callable[[str], None]) -> None:
+        """
+        Call a function when a processing block becomes resolved.
+
+        The function gets called with the processing block ID once the
+        last of its dependencies reaches a terminal state, or when it
+        gets added with all of its dependencies resolved already.
+
+        :param callback: Function to call
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    # -------------------------------------
+    # Queries
+    # -------------------------------------
+
+    def __contains__(self, pb_id: str) -> bool:
+        """Check whether the processing block exists."""
+        return pb_id in self._deps
+
+    def dependencies(self, pb_id: str) -> Set[str]:
+        """
+        Get processing blocks a processing block depends on.
+
+        :param pb_id: Processing block ID
+        :returns: processing block IDs
+        """
+        with self._lock:
+            return set(self._deps.get(pb_id, ()))
+
+    def dependents(self, pb_id: str) -> Set[str]:
+        """
+        Get processing blocks depending on a processing block.
+
+        :param pb_id: Processing block ID
+        :returns: processing block IDs
+        """
+        with self._lock:
+            return set(self._dependents.get(pb_id, ()))
+
+    def is_resolved(self, pb_id: str) -> bool:
+        """
+        Check whether all dependencies are in a terminal state.
+
+        :param pb_id: Processing block ID
+        :returns: False if not, or if the processing block doesn't exist
+        """
+        return self._unresolved.get(pb_id) == 0
+
+    def ready(self) -> Set[str]:
+        """
+        Get processing blocks that are ready to run.
+
+        These are the processing blocks that are resolved, but do not
+        have a state yet, i.e. have not been started.
+
+        :returns: processing block IDs
+        """
+        with self._lock:
+            return set(self._ready)
+
+    def topological_order(self) -> List[str]:
+        """
+        Order processing blocks such that dependencies come first.
+
+        Ties are broken by processing block ID, so the order is stable.
+
+        :returns: processing block IDs
+        :raises: ValueError if the dependencies contain a cycle
+        """
+        with self._lock:
+            if self._order is None:
+                self._order = self._sort()
+            return list(self._order)
+
+    # -------------------------------------
+    # Private methods
+    # -------------------------------------
+
+    def _is_terminal(self, pb_id: str) -> bool:
+        return self._states.get(pb_id) in TERMINAL_STATES
+
+    def _update_ready(self, pb_id: str):
+        if self._unresolved.get(pb_id) == 0 and pb_id not in self._states:
+            self._ready.add(pb_id)
+        else:
+            self._ready.discard(pb_id)
+
+    def _sort(self) -> List[str]:
+        """Kahn's algorithm, ignoring processing blocks that don't exist."""
+        in_degree = {
+            pb_id: sum(1 for dep in deps if dep in self._deps)
+            for pb_id, deps in self._deps.items()
+        }
+        queue = [pb_id for pb_id, degree in in_degree.items() if degree == 0]
+        heapq.heapify(queue)
+        order = []
+        while queue:
+            pb_id = heapq.heappop(queue)
+            order.append(pb_id)
+            for dependent in self._dependents.get(pb_id, ()):
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    heapq.heappush(queue, dependent)
+        if len(order) < len(in_degree):
+            cycle = sorted(set(in_degree) - set(order))
+            raise ValueError(
+                "Processing blocks have cyclic dependencies: {}".format(
+                    ", ".join(cycle)
+                )
+            )
+        return order
@@ -0,0 +1,207 @@
+"""
+Leader election between replicas of a controller.
+
+Replicas campaign by getting in line for leadership, and the replica at
+the front of the line is the leader:
+
+.. code-block:: python
+
+    election = config.election("processing-controller")
+    with config.lease() as lease:
+        election.campaign(lease)
+        # Now leader, until resigning or the lease expires
+        for watcher in config.watcher():
+            for txn in watcher.txn():
+                if not election.is_leader(txn):
+                    break
+                # ...
+
+While waiting, a candidate only watches the key of the candidate in
+front of it, and does not read anything else, so standby replicas
+cost next to nothing. Candidates are in line in the order their keys
+were created. The keys are associated with the lease of the candidate,
+so a leader that dies loses leadership once its lease expires, and the
+next candidate in line takes over.
+
+The current leader can be observed without campaigning, either by
+calling :py:meth:`Election.leader` in a watcher loop, or by iterating
+over :py:meth:`Election.observe`.
+"""
+
+import concurrent.futures
+import json
+import threading
+import time
+from typing import Iterator, Optional
+
+from .waiting import join_line, keys_ahead, wait_for_change
+
+
+def _resolve(future: concurrent.futures.Future, result) -> None:
+    """Resolve future, unless it was resolved already."""
+    try:
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+    except concurrent.futures.InvalidStateError:
+        pass
+
+
+class Election:
+    """Election of a leader between candidates.
+
+    Use :py:meth:`Config.election` to create. An instance campaigns as
+    one candidate, so use separate instances for separate candidates.
+
+    :param config: Configuration
+    :param path: Path of the election in the database, ending in '/'
+    """
+
+    def __init__(self, config, path: str):
+        """Instantiate election."""
+        self._config = config
+        self._path = path
+        self._key = None
+        self._elected = False
+        self._future = None
+
+    @property
+    def path(self) -> str:
+        """Path of the election in the database."""
+        return self._path
+
+    def campaign(self, lease, value: dict = None, timeout: float = None) -> bool:
+        """
+        Campaign for leadership, waiting until elected.
+
+        :param lease: Lease of the candidate. Leadership ends once it
+            expires or gets revoked.
+        :param value: Information about the candidate, defaults to the
+            owner of the configuration
+        :param timeout: Time to wait at most, in seconds
+        :returns: True if elected, False if the wait timed out or the
+            candidate resigned meanwhile
+        :raises: RuntimeError if the lease expired while waiting
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        self._join(lease, value)
+        return self._campaign(self._key, deadline)
+
+    def _campaign(self, key: str, deadline: Optional[float]) -> bool:
+        """Wait until the candidate with the key is elected."""
+        while True:
+            for txn in self._config.txn():
+                exists = txn.raw.get(key) is not None
+                ahead = keys_ahead(txn, self._path + "candidate/", key)
+            if self._key != key:
+                return False
+            if not exists:
+                raise RuntimeError("Candidate {} vanished, lease expired?".format(key))
+            if not ahead:
+                self._elected = True
+                return True
+
+            # Wait for the candidate in front of us to go away
+            if not wait_for_change(self._config, ahead[-1], deadline):
+                self.resign()
+                return False
+
+    def campaign_async(
+        self, lease, value: dict = None
+    ) -> "concurrent.futures.Future[bool]":
+        """
+        Campaign for leadership in the background.
+
+        :param lease: Lease of the candidate
+        :param value: Information about the candidate
+        :returns: Future, which resolves to True once elected. Call
+            :py:meth:`resign` to give up campaigning, which resolves it
+            to False.
+        """
+        # Get in line right away, so that resigning cannot race it. The
+        # background thread only waits for this key, and never joins
+        # again after resigning.
+        self._join(lease, value)
+        key = self._key
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        self._future = future
+
+        def run():
+            try:
+                result = self._campaign(key, None)
+            except Exception as err:  # pylint: disable=broad-except
+                result = err
+            _resolve(future, result)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def resign(self) -> None:
+        """
+        Give up leadership, or stop campaigning.
+
+        The next candidate in line becomes leader.
+        """
+        if self._key is None:
+            return
+        for txn in self._config.txn():
+            txn.raw.delete(self._key, must_exist=False)
+        self._key = None
+        self._elected = False
+        if self._future is not None:
+            _resolve(self._future, False)
+
+    def _join(self, lease, value: Optional[dict]) -> None:
+        """Get in line, unless campaigning already."""
+        if self._key is not None:
+            return
+        value = self._config.owner if value is None else value
+        for txn in self._config.txn():
+            key = join_line(txn, self._path + "candidate/", json.dumps(value), lease)
+        self._key = key
+
+    def is_leader(self, txn) -> bool:
+        """
+        Check whether this candidate is (still) the leader.
+
+        Call this after :py:meth:`campaign` succeeded. Once at the front
+        of the line, a candidate stays there until it resigns or its
+        lease expires, so this only needs to read the candidate's own
+        key. In a watcher loop, the watcher wakes up once it goes away.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: Whether this candidate is the leader
+        """
+        return self._elected and txn.raw.get(self._key) is not None
+
+    def leader(self, txn) -> Optional[dict]:
+        """
+        Get the current leader.
+
+        In a watcher loop, the watcher wakes up once candidates change.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: Information about the leader, None if there is none
+        """
+        for key in txn.raw.list_created(self._path + "candidate/", limit=1):
+            return json.loads(txn.raw.get(key))
+        return None
+
+    def observe(self, timeout: float = None) -> Iterator[Optional[dict]]:
+        """
+        Observe changes of leadership.
+
+        The leader gets yielded whenever candidates change, which
+        might not change the leader.
+
+        :param timeout: Time to wait for changes, after which the
+            leader gets yielded again
+        :returns: Iterator over leaders, starting with the current one.
+            None is yielded when there is no leader.
+        """
+        for watcher in self._config.watcher(timeout):
+            for txn in watcher.txn():
+                leader = self.leader(txn)
+            yield leader
@@ -1,4 +1,5 @@
 """Configuration entities."""
 
-from .pb import ProcessingBlock
+from .pb import ProcessingBlock, ProcessingBlockView
 from .deployment import Deployment
+from .sb import SchedulingBlockView
@@ -2,6 +2,7 @@
 
 import re
 import copy
+import json
 
 # Permit identifiers up to 64 bytes in length
 _PB_ID_RE = re.compile("^[A-Za-z0-9\\-]{1,64}$")
@@ -90,3 +91,64 @@ class ProcessingBlock:
     def __eq__(self, other):
         """Equality check."""
         return self.to_dict() == other.to_dict()
+
+
+class ProcessingBlockView:
+    """Processing block together with its owner and state.
+
+    Returned by :py:meth:`Transaction.get_processing_block_view`. The
+    documents are only decoded when first accessed.
+    """
+
+    def __init__(self, pb_id: str, values: dict, decode=None):
+        """
+        Create a view from raw values.
+
+        :param pb_id: Processing block ID
+        :param values: JSON strings by sub-key ("owner", "state"), with
+            the processing block itself at ""
+        :param decode: Function decoding the JSON string of a sub-key,
+            called as ``decode(name, txt)``. Defaults to ``json.loads``.
+        """
+        self._id = pb_id
+        self._values = values
+        self._decoded = {}
+        self._decode_json = decode
+
+    def _decode(self, name):
+        if name not in self._decoded:
+            txt = self._values.get(name)
+            if txt is None:
+                self._decoded[name] = None
+            elif self._decode_json is None:
+                self._decoded[name] = json.loads(txt)
+            else:
+                self._decoded[name] = self._decode_json(name, txt)
+        return self._decoded[name]
+
+    @property
+    def id(self) -> str:  # pylint: disable=invalid-name
+        """Processing block ID."""
+        return self._id
+
+    @property
+    def processing_block(self) -> ProcessingBlock:
+        """Processing block, or None if it doesn't exist."""
+        if "pb" not in self._decoded:
+            dct = self._decode("")
+            self._decoded["pb"] = None if dct is None else ProcessingBlock(**dct)
+        return self._decoded["pb"]
+
+    @property
+    def owner(self) -> dict:
+        """Processing block owner, or None if not claimed."""
+        return self._decode("owner")
+
+    @property
+    def state(self) -> dict:
+        """Processing block state, or None if not present."""
+        return self._decode("state")
+
+    def __repr__(self):
+        """Build string representation."""
+        return "ProcessingBlockView({})".format(repr(self._id))
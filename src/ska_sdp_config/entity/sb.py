@@ -0,0 +1,53 @@
+"""Scheduling block configuration entities."""
+
+from .pb import ProcessingBlockView
+
+
+class SchedulingBlockView:
+    """Scheduling block instance together with its processing blocks.
+
+    Returned by :py:meth:`Transaction.get_scheduling_block_with_pbs`.
+    """
+
+    def __init__(self, sbi_id: str, state: dict, processing_blocks: dict, values: dict):
+        """
+        Create a view.
+
+        :param sbi_id: Scheduling block instance ID
+        :param state: Scheduling block instance state
+        :param processing_blocks: Views of the referenced processing
+            blocks by ID. Processing blocks that don't exist are left out.
+        :param values: Keys read, as {path: (value, mod_revision)}
+        """
+        self._id = sbi_id
+        self._state = state
+        self._processing_blocks = processing_blocks
+        self._values = values
+
+    @property
+    def id(self) -> str:  # pylint: disable=invalid-name
+        """Scheduling block instance ID."""
+        return self._id
+
+    @property
+    def state(self) -> dict:
+        """Scheduling block instance state."""
+        return self._state
+
+    @property
+    def processing_blocks(self) -> dict:
+        """Processing block views by ID, real-time ones first."""
+        return self._processing_blocks
+
+    def get(self, pb_id: str) -> ProcessingBlockView:
+        """
+        Get view of a processing block.
+
+        :param pb_id: Processing block ID
+        :returns: Processing block view, or None if it doesn't exist
+        """
+        return self._processing_blocks.get(pb_id)
+
+    def __repr__(self):
+        """Build string representation."""
+        return "SchedulingBlockView({})".format(repr(self._id))
@@ -0,0 +1,167 @@
+"""
+Locks and semaphores in the configuration database.
+
+Transactions are optimistic: they get repeated if anything they read
+changed before they were committed. For keys that many clients update,
+such as ``/master`` or ``/subarray/<id>``, this can turn into clients
+repeating transactions over and over. Taking a lock around the
+transaction serialises the writers instead:
+
+.. code-block:: python
+
+    with config.lock("master"):
+        for txn in config.txn():
+            master = txn.get_master()
+            # ...
+            txn.update_master(master)
+
+Clients waiting for a lock or semaphore form a line, and get it in
+order. Every client only watches the key of the client in front of it
+(for semaphores, the first client not holding it watches the holders),
+so releasing only wakes up the next client. Keys in the line are
+ordered by the revision they were created at, and associated with a
+lease, so a lock gets released if its holder dies.
+
+Note that locks are advisory: transactions that do not take the lock
+can still change the keys.
+"""
+
+import json
+import time
+from typing import List
+
+from .waiting import join_line, keys_ahead, wait_for_deletion
+
+
+class Semaphore:
+    """Semaphore, which can be held by a number of clients at a time.
+
+    Use :py:meth:`Config.semaphore` to create. All clients using a
+    semaphore must use the same limit. Instances are not thread-safe,
+    use separate instances for separate threads.
+
+    :param config: Configuration
+    :param path: Path of the semaphore in the database, ending in '/'
+    :param limit: Number of clients that can hold the semaphore
+    """
+
+    def __init__(self, config, path: str, limit: int = 1):
+        """Instantiate semaphore."""
+        if limit < 1:
+            raise ValueError("Limit must be at least 1, not {}!".format(limit))
+        self._config = config
+        self._path = path
+        self._limit = limit
+        self._key = None
+
+    @property
+    def path(self) -> str:
+        """Path of the semaphore in the database."""
+        return self._path
+
+    @property
+    def limit(self) -> int:
+        """Number of clients that can hold the semaphore."""
+        return self._limit
+
+    @property
+    def held(self) -> bool:
+        """Whether this instance holds the semaphore."""
+        return self._key is not None
+
+    def acquire(self, lease=None, timeout: float = None) -> bool:
+        """
+        Wait in line for the semaphore and take it.
+
+        :param lease: Lease to hold the semaphore with, defaults to the
+            lease of the client (see :py:attr:`Config.client_lease`)
+        :param timeout: Time to wait at most, in seconds
+        :returns: True if taken, False if the wait timed out
+        :raises: RuntimeError if held already, or the lease expired
+        """
+        if self._key is not None:
+            raise RuntimeError("Semaphore {} is held already!".format(self._path))
+        deadline = None if timeout is None else time.time() + timeout
+        line = self._path + "holder/"
+        key = self._join(line, lease)
+        try:
+            while True:
+                for txn in self._config.txn():
+                    exists = txn.raw.get(key) is not None
+                    ahead = keys_ahead(txn, line, key)
+                if not exists:
+                    raise RuntimeError(
+                        "Lost place for {} in line, lease expired?".format(self._path)
+                    )
+                if len(ahead) < self._limit:
+                    self._key = key
+                    return True
+
+                # The first client not holding the semaphore waits for
+                # any holder to release it, the others for the client in
+                # front of them
+                if len(ahead) == self._limit:
+                    waiting_for = ahead
+                else:
+                    waiting_for = ahead[-1:]
+                if not wait_for_deletion(self._config, line, waiting_for, deadline):
+                    return False
+        finally:
+            if self._key != key:
+                for txn in self._config.txn():
+                    txn.raw.delete(key, must_exist=False)
+
+    def _join(self, line: str, lease) -> str:
+        """Get into line, returns key."""
+        if lease is None:
+            lease = self._config.client_lease
+        for txn in self._config.txn():
+            key = join_line(txn, line, json.dumps(self._config.owner), lease)
+        return key
+
+    def release(self) -> None:
+        """
+        Release the semaphore.
+
+        :raises: RuntimeError if not held
+        """
+        if self._key is None:
+            raise RuntimeError("Semaphore {} is not held!".format(self._path))
+        for txn in self._config.txn():
+            txn.raw.delete(self._key, must_exist=False)
+        self._key = None
+
+    def holders(self, txn) -> List[dict]:
+        """
+        Get the clients holding the semaphore.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: Owners of the clients, see :py:attr:`Config.owner`
+        """
+        return [
+            json.loads(txn.raw.get(key))
+            for key in txn.raw.list_created(self._path + "holder/", limit=self._limit)
+        ]
+
+    def __enter__(self) -> "Semaphore":
+        """Acquire the semaphore for a block."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        """Release the semaphore."""
+        self.release()
+
+
+class Lock(Semaphore):
+    """Lock, which can be held by one client at a time.
+
+    Use :py:meth:`Config.lock` to create.
+
+    :param config: Configuration
+    :param path: Path of the lock in the database, ending in '/'
+    """
+
+    def __init__(self, config, path: str):
+        """Instantiate lock."""
+        super().__init__(config, path, limit=1)
@@ -0,0 +1,305 @@
+"""
+Local replica of a part of the SKA SDP configuration database.
+
+A replica holds a copy of all keys with a given prefix in memory, and
+keeps it current by following a watch on the prefix. This is the
+"informer" pattern: instead of repeatedly listing keys and reading
+their values in transactions, a process lists them once, and from then
+on only receives the changes.
+
+.. code-block:: python
+
+    with config.replica("/pb/") as pbs:
+        while True:
+            for key in pbs.list_keys("/pb/"):
+                state = pbs.get(key + "/state")
+                # ...
+            pbs.wait(timeout=10)
+
+Reads never touch the database. Note that the replica only reflects
+the database *eventually*: changes become visible once the watch
+delivered them, and reads are not isolated from updates as in a
+transaction. Use transactions for anything that needs to be atomic.
+"""
+
+import bisect
+import logging
+import queue as queue_m
+import threading
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .backend.common import Revision, _depth, _depth_range
+
+LOG = logging.getLogger(__name__)
+
+
+class Replica:
+    """Watch-fed local copy of all keys with a given prefix.
+
+    The replica first reads all keys with their values at one revision,
+    then follows watches from the next revision on. If the database
+    cancels a watch - for instance because the revision was compacted
+    away - the replica reads all keys again.
+
+    :param backend: Database backend
+    :param prefix: Prefix of keys to replicate, e.g. ``"/pb/"``
+    :param max_depth: Number of levels of keys to replicate, relative to
+        the prefix. Note that for etcd this is the number of watches
+        used.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, backend, prefix: str, max_depth: int = 3):
+        """Instantiate the replica. Use :py:meth:`start` to fill it."""
+        self._backend = backend
+        self._prefix = prefix
+        self._max_depth = max_depth
+        self._data = {}
+        self._keys = []
+        self._list_revision = None
+        self._revision = None
+        self._changed = threading.Condition()
+        self._queue = None
+        self._watches = []
+        self._thread = None
+        self._running = False
+        self._listeners = []
+
+    @property
+    def prefix(self) -> str:
+        """Prefix of replicated keys."""
+        return self._prefix
+
+    @property
+    def revision(self) -> Optional[int]:
+        """Latest database revision the replica reflects.
+
+        Changes to keys outside of the prefix do not get reported, so
+        this is typically older than the current database revision.
+        """
+        return self._revision
+
+    def start(self) -> "Replica":
+        """Read all keys and start following changes.
+
+        :returns: the replica
+        """
+        self._running = True
+        self._resync()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop following changes."""
+        with self._changed:
+            self._running = False
+            if self._queue is not None:
+                self._queue.put((None, None, None))
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._stop_watches()
+
+    def __enter__(self) -> "Replica":
+        """Scope the replica to a block."""
+        if self._thread is None:
+            self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Scope the replica to a block."""
+        self.stop()
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        Get the value of a key.
+
+        :param path: Path of key
+        :returns: value, or None if it doesn't exist
+        """
+        return self._data.get(path)
+
+    def list_keys(self, path: str, recurse: int = 0) -> List[str]:
+        """
+        List keys under given path.
+
+        Works like :py:meth:`Etcd3Backend.list_keys`, but only finds
+        keys within the replicated prefix.
+
+        :param path: Prefix of keys to query. Append '/' to list
+           child paths.
+        :param recurse: Maximum recursion level to query. If iterable,
+           cover exactly the recursion levels specified.
+        :returns: sorted key list
+        """
+        depths = {_depth(path) + depth for depth in _depth_range(recurse)}
+        with self._changed:
+            start = bisect.bisect_left(self._keys, path)
+            keys = []
+            for key in self._keys[start:]:
+                if not key.startswith(path):
+                    break
+                if _depth(key) in depths:
+                    keys.append(key)
+            return keys
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """
+        Iterate over all replicated keys and their values.
+
+        :returns: iterator of (path, value), sorted by path
+        """
+        with self._changed:
+            return iter([(key, self._data[key]) for key in self._keys])
+
+    def __len__(self) -> int:
+        """Number of replicated keys."""
+        return len(self._data)
+
+    def __contains__(self, path: str) -> bool:
+        """Check whether a key exists."""
+        return path in self._data
+
+    def add_listener(self, callback: Callable[[str, Optional[str]], None]):
+        """
+        Call a function for every change to the replicated keys.
+
+        The function gets called with the path and new value of the
+        key, or None if it was deleted. It is first called for all
+        keys the replica holds already, so that listeners can build
+        derived state incrementally. Calls happen on the thread
+        following the watch while holding the replica's lock, so they
+        should return quickly.
+
+        :param callback: Function to call with (path, value)
+        """
+        with self._changed:
+            self._listeners.append(callback)
+            for key in self._keys:
+                self._notify(callback, key, self._data[key])
+
+    def wait(self, revision: int = None, timeout: float = None) -> bool:
+        """
+        Wait for the replica to reflect a newer revision.
+
+        :param revision: Revision to wait past. Defaults to the
+            current revision of the replica, i.e. wait for any change.
+        :param timeout: Time to wait at most, in seconds
+        :returns: False if the wait timed out
+        """
+        with self._changed:
+            if revision is None:
+                revision = self._revision
+            return self._changed.wait_for(
+                lambda: self._revision > revision, timeout=timeout
+            )
+
+    def _stop_watches(self):
+        for watch in self._watches:
+            watch.stop()
+        self._watches = []
+
+    def _resync(self):
+        """(Re-)start watches and read all keys."""
+        self._stop_watches()
+
+        # Watch all depths from after revision R into one queue, then
+        # read at R. Local backends can only read the current revision,
+        # which might be past R: changes we already read get skipped.
+        revision = self._backend.current_revision()
+        queue = queue_m.Queue()
+        for depth in range(
+            _depth(self._prefix), _depth(self._prefix) + self._max_depth
+        ):
+            watch = self._backend.watch(
+                self._prefix,
+                prefix=True,
+                revision=Revision(revision.revision + 1),
+                depth=depth,
+            )
+            watch.start(queue)
+            self._watches.append(watch)
+
+        revision, items = self._backend.range_values(
+            self._prefix, revision=revision, max_depth=self._max_depth
+        )
+        data = {path: value for path, value, _ in items}
+        with self._changed:
+            self._queue = queue
+            if not self._running:
+                queue.put((None, None, None))
+
+            # Tell listeners about any changes we missed
+            if self._listeners:
+                changes = [(path, None) for path in self._data if path not in data]
+                changes.extend(
+                    (path, value)
+                    for path, value in data.items()
+                    if self._data.get(path) != value
+                )
+                for path, value in sorted(changes):
+                    for listener in self._listeners:
+                        self._notify(listener, path, value)
+            self._data = data
+            self._keys = sorted(data)
+            self._list_revision = revision.revision
+            self._revision = max(self._revision or 0, revision.revision)
+            self._changed.notify_all()
+        LOG.debug(
+            "Replicated %d keys of %s at revision %d",
+            len(data),
+            self._prefix,
+            revision.revision,
+        )
+
+    def _run(self):
+        while True:
+            # Collect all available changes
+            events = [self._queue.get()]
+            while not self._queue.empty():
+                events.append(self._queue.get())
+            if not self._running:
+                return
+
+            # Cancelled watch? Start again
+            if any(rev is None for _, _, rev in events):
+                LOG.info("Watch on %s cancelled, reading again", self._prefix)
+                self._retry_resync()
+                continue
+
+            with self._changed:
+                for path, value, rev in events:
+                    if rev.revision > self._list_revision:
+                        self._apply(path, value)
+                        self._revision = max(self._revision, rev.revision)
+                self._changed.notify_all()
+
+    def _retry_resync(self):
+        while self._running:
+            try:
+                self._resync()
+                return
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("Could not read %s, retrying", self._prefix)
+                time.sleep(1)
+
+    def _apply(self, path: str, value: Optional[str]):
+        if value is None:
+            if self._data.pop(path, None) is None:
+                return
+            del self._keys[bisect.bisect_left(self._keys, path)]
+        else:
+            if path not in self._data:
+                bisect.insort(self._keys, path)
+            self._data[path] = value
+        for listener in self._listeners:
+            self._notify(listener, path, value)
+
+    def _notify(self, listener, path: str, value: Optional[str]):
+        try:
+            listener(path, value)
+        except Exception:  # pylint: disable=broad-except
+            LOG.exception("Replica listener failed on %s", path)
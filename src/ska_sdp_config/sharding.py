@@ -0,0 +1,229 @@
+"""
+Sharded ownership of processing blocks.
+
+With several replicas of a controller (such as the processing
+controller), every replica trying to take every new processing block
+means all but one of them fail, and the failed transactions have to be
+repeated. Instead, replicas can register as members of a group, and
+processing blocks get assigned to live members by consistent hashing
+of their IDs:
+
+.. code-block:: python
+
+    with config.lease() as lease:
+        shards = config.shard_membership("processing-controller")
+        shards.join(lease)
+        for watcher in config.watcher():
+            for txn in watcher.txn():
+                for pb_id in shards.claim(txn, lease):
+                    # ...
+
+Members are keys associated with the lease of the member, so they go
+away when it expires. As the members get read in the transaction, a
+watcher wakes up whenever they change, and the shards get rebalanced.
+Consistent hashing means that only the processing blocks of a member
+that joins or leaves move to a different member.
+"""
+
+import bisect
+import hashlib
+import json
+from typing import Iterable, List, Optional
+
+# Number of points on the ring per member
+DEFAULT_VNODES = 64
+
+
+def _hash(key: str) -> int:
+    """Hash a string to a point on the ring."""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring, assigning keys to members.
+
+    Every member gets placed on the ring at several points, and a key
+    is assigned to the member at the first point after the hash of the
+    key. This spreads keys evenly, and adding or removing a member only
+    moves keys from or to that member.
+
+    :param members: Initial members
+    :param vnodes: Number of points on the ring per member
+    """
+
+    def __init__(self, members: Iterable[str] = (), vnodes: int = DEFAULT_VNODES):
+        """Create ring."""
+        self._vnodes = vnodes
+        self._points = []  # sorted (hash, member)
+        self._members = set()
+        for member in members:
+            self.add(member)
+
+    @property
+    def members(self) -> List[str]:
+        """Members of the ring, sorted."""
+        return sorted(self._members)
+
+    def add(self, member: str) -> None:
+        """
+        Add a member to the ring.
+
+        :param member: Member ID
+        """
+        if member in self._members:
+            return
+        self._members.add(member)
+        for i in range(self._vnodes):
+            bisect.insort(self._points, (_hash("{}#{}".format(member, i)), member))
+
+    def remove(self, member: str) -> None:
+        """
+        Remove a member from the ring.
+
+        :param member: Member ID
+        """
+        if member not in self._members:
+            return
+        self._members.discard(member)
+        self._points = [point for point in self._points if point[1] != member]
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        Get the member a key is assigned to.
+
+        :param key: Key to look up
+        :returns: Member ID, or None if there are no members
+        """
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, (_hash(key), ""))
+        return self._points[i % len(self._points)][1]
+
+
+class ShardMembership:
+    """Membership in a group sharing processing blocks.
+
+    Use :py:meth:`Config.shard_membership` to create.
+
+    :param config: Configuration
+    :param path: Path of the group's members in the database, ending in '/'
+    :param member_id: ID of this member, must be unique within the group
+    :param pb_path: Path of processing blocks, as used by the
+        configuration (i.e. including the global prefix)
+    :param vnodes: Number of points on the hash ring per member
+    """
+
+    # pylint: disable=too-many-arguments
+
+    def __init__(
+        self,
+        config,
+        path: str,
+        member_id: str,
+        pb_path: str = "/pb/",
+        vnodes: int = DEFAULT_VNODES,
+    ):
+        """Instantiate membership."""
+        self._config = config
+        self._path = path
+        self._pb_path = pb_path
+        self._member_id = member_id
+        self._vnodes = vnodes
+        self._ring = HashRing(vnodes=vnodes)
+
+    @property
+    def member_id(self) -> str:
+        """ID of this member."""
+        return self._member_id
+
+    def join(self, lease) -> None:
+        """
+        Join the group.
+
+        The member stays in the group until it leaves, or the lease
+        expires or gets revoked.
+
+        :param lease: Lease of the member
+        """
+        for txn in self._config.txn():
+            txn.raw.delete(self._path + self._member_id, must_exist=False)
+            txn.raw.create(
+                self._path + self._member_id, json.dumps(self._config.owner), lease
+            )
+
+    def leave(self) -> None:
+        """Leave the group."""
+        for txn in self._config.txn():
+            txn.raw.delete(self._path + self._member_id, must_exist=False)
+
+    def members(self, txn) -> List[str]:
+        """
+        Get live members of the group.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: Member IDs, sorted
+        """
+        return [key[len(self._path) :] for key in txn.raw.list_keys(self._path)]
+
+    def ring(self, txn) -> HashRing:
+        """
+        Get hash ring of the live members of the group.
+
+        The ring only gets changed if members joined or left since the
+        last call.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: Hash ring
+        """
+        members = self.members(txn)
+        if members != self._ring.members:
+            self._ring = HashRing(members, self._vnodes)
+        return self._ring
+
+    def owns(self, txn, pb_id: str) -> bool:
+        """
+        Check whether a processing block is assigned to this member.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :param pb_id: Processing block ID
+        :returns: Whether it is in the shard of this member
+        """
+        return self.ring(txn).owner(pb_id) == self._member_id
+
+    def shard(self, txn) -> List[str]:
+        """
+        List processing blocks assigned to this member.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :returns: Processing block IDs
+        """
+        ring = self.ring(txn)
+        return [
+            pb_id
+            for pb_id in txn.list_processing_blocks()
+            if ring.owner(pb_id) == self._member_id
+        ]
+
+    def claim(self, txn, lease) -> List[str]:
+        """
+        Take ownership of processing blocks in this member's shard.
+
+        Only the owners of processing blocks in the shard get read, so
+        a watcher using this only wakes up for changes to the shard,
+        the list of processing blocks or the members of the group.
+        Processing blocks that are owned already, for instance by the
+        member they were assigned to before a rebalance, are left alone.
+
+        :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+        :param lease: Lease to take ownership with
+        :returns: Processing block IDs taken
+        """
+        shard = self.shard(txn)
+        paths = [self._pb_path + pb_id + "/owner" for pb_id in shard]
+        owners = txn.raw.get_many(paths)
+        taken = []
+        for pb_id, path in zip(shard, paths):
+            if owners[path][0] is None:
+                txn.take_processing_block(pb_id, lease)
+                taken.append(pb_id)
+        return taken
@@ -43,6 +43,18 @@ def cmd_delete(txn, path, recurse=True, quiet=False):
         txn.raw.delete(path)
 
 
+def cmd_delete_pb_index(txn, pb_id=None):
+    """
+    Delete index entries of processing blocks.
+
+    :param txn: Config object transaction
+    :param pb_id: processing block ID, all processing blocks if None
+    """
+    for key in txn.raw.list_keys(txn.pb_index_path, recurse=2):
+        if pb_id is None or key.endswith("/" + pb_id):
+            txn.raw.delete(key)
+
+
 def _get_input():
     return input("Continue? (yes, no) ")
 
@@ -104,6 +116,9 @@ def main(argv, config):
             break  # only one can be true, or none
 
     for txn in config.txn():
+        if args["pb"] and not prefix:
+            # Processing blocks are also listed in the indexes
+            cmd_delete_pb_index(txn, args["<item-id>"])
         cmd_delete(txn, path, recurse=True, quiet=args["--quiet"])
 
     LOG.info("Deleted above keys with prefix %s.", path)
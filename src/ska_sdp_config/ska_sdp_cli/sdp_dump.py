@@ -0,0 +1,101 @@
+"""
+Dump the Configuration Database into a snapshot file, or load it back.
+
+Usage:
+    ska-sdp dump [options] [<file>]
+    ska-sdp load [options] <file>
+    ska-sdp (dump|load) (-h|--help)
+
+Arguments:
+    <file>    Snapshot file, compressed if the name ends with ".gz".
+              Use "-" (or leave out for dump) for standard input/output.
+
+Options:
+    -h, --help           Show this screen
+    --prefix=<prefix>    Only dump keys with this prefix
+    --batch=<size>       Number of keys per request or transaction
+    --overwrite          Overwrite existing keys when loading
+
+Note:
+    Loading writes keys in batches, one transaction each. Keys that
+    exist already cause the load to fail unless --overwrite is given.
+    Key revisions are not restored.
+
+Example:
+    ska-sdp dump config.jsonl.gz
+    ska-sdp load --overwrite config.jsonl.gz
+"""
+import contextlib
+import gzip
+import logging
+import sys
+
+from docopt import docopt
+
+LOG = logging.getLogger("ska-sdp")
+
+
+@contextlib.contextmanager
+def open_snapshot(filename: str, mode: str):
+    """
+    Open a snapshot file, handling compression and standard streams.
+
+    :param filename: name of file, "-" for standard input/output
+    :param mode: "r" or "w"
+    """
+    if filename == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+    elif filename.endswith(".gz"):
+        with gzip.open(filename, mode + "t", encoding="utf-8") as file:
+            yield file
+    else:
+        with open(filename, mode, encoding="utf-8") as file:
+            yield file
+
+
+def cmd_dump(config, filename: str, prefix: str = None, batch_size: int = 1000):
+    """
+    Dump keys into a snapshot file.
+
+    :param config: Config object
+    :param filename: name of snapshot file
+    :param prefix: prefix of keys to dump, None for all keys below the
+        global prefix
+    :param batch_size: number of keys to read per request
+    """
+    with open_snapshot(filename, "w") as file:
+        revision = config.snapshot(file, prefix, batch_size=batch_size)
+    LOG.info("Dumped %s at revision %d", prefix or "all keys", revision)
+
+
+def cmd_load(config, filename: str, overwrite: bool, batch_size: int = 100):
+    """
+    Load keys from a snapshot file.
+
+    :param config: Config object
+    :param filename: name of snapshot file
+    :param overwrite: whether to overwrite existing keys
+    :param batch_size: number of keys to write per transaction
+    """
+    with open_snapshot(filename, "r") as file:
+        count = config.restore(file, batch_size=batch_size, overwrite=overwrite)
+    LOG.info("Loaded %d keys", count)
+
+
+def main(argv, config):
+    """Run ska-sdp dump / load."""
+    args = docopt(__doc__, argv=argv)
+    filename = args["<file>"] or "-"
+
+    # Log to stderr, as the snapshot might be written to stdout
+    if filename == "-":
+        LOG.handlers = [logging.StreamHandler(sys.stderr)]
+
+    batch = {}
+    if args["--batch"]:
+        batch["batch_size"] = int(args["--batch"])
+
+    if args["dump"]:
+        cmd_dump(config, filename, args["--prefix"], **batch)
+    elif args["load"]:
+        cmd_load(config, filename, args["--overwrite"], **batch)
@@ -0,0 +1,39 @@
+"""
+Rebuild the secondary indexes of the Configuration Database.
+
+Usage:
+    ska-sdp reindex [options]
+    ska-sdp reindex (-h|--help)
+
+Options:
+    -h, --help           Show this screen
+    --batch=<size>       Number of processing blocks per transaction [default: 50]
+
+Note:
+    Processing blocks are indexed by scheduling block instance, workflow
+    type and status. The indexes are maintained automatically, this is
+    only needed for databases written by older versions, or if keys were
+    changed directly.
+"""
+import logging
+
+from docopt import docopt
+
+LOG = logging.getLogger("ska-sdp")
+
+
+def cmd_reindex(config, batch_size: int = 50):
+    """
+    Rebuild indexes.
+
+    :param config: Config object
+    :param batch_size: number of processing blocks per transaction
+    """
+    changes = config.rebuild_indexes(batch_size=batch_size)
+    LOG.info("Rebuilt indexes, %d entries changed", changes)
+
+
+def main(argv, config):
+    """Run ska-sdp reindex."""
+    args = docopt(__doc__, argv=argv)
+    cmd_reindex(config, int(args["--batch"]))
@@ -0,0 +1,60 @@
+"""
+Print statistics of the keys in the Configuration Database.
+
+Usage:
+    ska-sdp stats [options]
+    ska-sdp stats (-h|--help)
+
+Options:
+    -h, --help           Show this screen
+    --prefix=<prefix>    Only cover keys with this prefix
+    --top=<number>       Number of largest keys to list [default: 10]
+    --batch=<size>       Number of keys per request [default: 1000]
+    --json               Print statistics as JSON
+
+Note:
+    Keys are read in a single pass at one database revision. They are
+    grouped by their top-level path (e.g. /pb), whatever the prefix, and
+    their depth (number of slashes). Value size percentiles are
+    approximate, to within about 10%.
+
+Example:
+    ska-sdp stats --prefix=/pb --top=5
+"""
+import json
+import logging
+
+from docopt import docopt
+
+LOG = logging.getLogger("ska-sdp")
+
+
+def cmd_stats(
+    config, prefix: str, top: int = 10, batch_size: int = 1000, as_json=False
+):
+    """
+    Print statistics of keys.
+
+    :param config: Config object
+    :param prefix: prefix of keys to cover, None for all
+    :param top: number of largest keys to list
+    :param batch_size: number of keys to read per request
+    :param as_json: whether to print JSON instead of a table
+    """
+    stats = config.stats(prefix, batch_size=batch_size, top=top)
+    if as_json:
+        LOG.info(json.dumps(stats.summary(), indent=2))
+    else:
+        LOG.info(stats.format())
+
+
+def main(argv, config):
+    """Run ska-sdp stats."""
+    args = docopt(__doc__, argv=argv)
+    cmd_stats(
+        config,
+        args["--prefix"],
+        top=int(args["--top"]),
+        batch_size=int(args["--batch"]),
+        as_json=args["--json"],
+    )
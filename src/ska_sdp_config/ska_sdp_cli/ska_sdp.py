@@ -23,6 +23,10 @@ Commands:
     edit            Edit a raw key value from text editor
     delete          Delete a single key or all keys within a path from the Config DB
     import          Import workflow definitions from file or URL
+    dump            Dump the Config DB into a snapshot file
+    load            Load the Config DB from a snapshot file
+    reindex         Rebuild the indexes of processing blocks
+    stats           Print statistics of the keys in the Config DB
 """
 import logging
 import sys
@@ -37,6 +41,9 @@ from ska_sdp_config.ska_sdp_cli import (
     sdp_list,
     sdp_delete,
     sdp_import,
+    sdp_dump,
+    sdp_reindex,
+    sdp_stats,
 )
 
 LOG = logging.getLogger("ska-sdp")
@@ -45,14 +52,23 @@ LOG.addHandler(logging.StreamHandler(sys.stdout))
 
 COMMAND = "COMMAND"
 
+# Commands reading or writing the whole database
+BULK_COMMANDS = ("dump", "load", "reindex", "stats")
+
 
 def main(argv=None):
     """Run ska-sdp."""
+    # pylint: disable=too-many-branches
     if argv is None:
         argv = sys.argv[1:]
 
     args = docopt(__doc__, argv=argv, options_first=True)
-    cfg = config.Config()
+
+    # With rate limits, control-path traffic takes precedence
+    if args[COMMAND] in BULK_COMMANDS:
+        cfg = config.Config(priority="bulk")
+    else:
+        cfg = config.Config(priority="interactive")
 
     if args[COMMAND] == "list":
         sdp_list.main(argv, cfg)
@@ -72,6 +88,15 @@ def main(argv=None):
     elif args[COMMAND] == "import":
         sdp_import.main(argv, cfg)
 
+    elif args[COMMAND] == "dump" or args[COMMAND] == "load":
+        sdp_dump.main(argv, cfg)
+
+    elif args[COMMAND] == "reindex":
+        sdp_reindex.main(argv, cfg)
+
+    elif args[COMMAND] == "stats":
+        sdp_stats.main(argv, cfg)
+
     else:
         LOG.error(
             "Command '%s' is not supported. Run 'ska-sdp --help' to view usage.",
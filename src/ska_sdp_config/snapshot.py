@@ -0,0 +1,84 @@
+"""
+Snapshot file format for the SKA SDP configuration database.
+
+A snapshot is a text file with one JSON document per line. The first
+line is a header identifying the format and the database revision the
+snapshot was taken at. Every following line holds one key as a
+``[path, value, mod_revision]`` array, and the last line is a trailer
+giving the number of keys, which allows detecting truncated files.
+Both writing and reading work as streams, so snapshots of any size can
+be handled in bounded memory.
+"""
+
+import json
+from typing import Iterable, Iterator, TextIO, Tuple
+
+FORMAT = "ska-sdp-config-snapshot"
+VERSION = 1
+
+
+def write_snapshot(
+    stream: TextIO,
+    revision: int,
+    items: Iterable[Tuple[str, str, int]],
+    prefix: str = "/",
+) -> int:
+    """
+    Write a snapshot to a stream.
+
+    :param stream: Text stream to write to
+    :param revision: Database revision the snapshot reflects
+    :param items: Keys to write, as (path, value, mod_revision)
+    :param prefix: Prefix of keys covered by the snapshot
+    :returns: number of keys written
+    """
+    header = {"format": FORMAT, "version": VERSION, "revision": revision}
+    header["prefix"] = prefix
+    stream.write(json.dumps(header) + "\n")
+    count = 0
+    for item in items:
+        stream.write(json.dumps(list(item), ensure_ascii=False) + "\n")
+        count += 1
+    stream.write(json.dumps({"count": count}) + "\n")
+    return count
+
+
+def read_snapshot(stream: TextIO) -> Tuple[dict, Iterator[Tuple[str, str, int]]]:
+    """
+    Read a snapshot from a stream.
+
+    The keys are only read while iterating. If the file turns out to
+    be truncated or corrupt, the iterator raises a :py:class:`ValueError`.
+
+    :param stream: Text stream to read from
+    :returns: (header, iterator of (path, value, mod_revision))
+    """
+    try:
+        header = json.loads(stream.readline())
+    except json.JSONDecodeError as err:
+        raise ValueError("Not a configuration snapshot!") from err
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise ValueError("Not a configuration snapshot!")
+    if header.get("version") != VERSION:
+        raise ValueError(
+            "Unsupported snapshot version {}!".format(header.get("version"))
+        )
+
+    def iterate():
+        count = 0
+        for line in stream:
+            record = json.loads(line)
+            if isinstance(record, dict):
+                if record.get("count") != count:
+                    raise ValueError(
+                        "Snapshot should contain {} keys, found {}!".format(
+                            record.get("count"), count
+                        )
+                    )
+                return
+            path, value, mod_revision = record
+            yield (path, value, mod_revision)
+            count += 1
+        raise ValueError("Snapshot is truncated after {} keys!".format(count))
+
+    return (header, iterate())
@@ -0,0 +1,219 @@
+"""
+Statistics of the keys in the SKA SDP configuration database.
+
+Statistics get gathered in a single pass over the keys, as streamed by
+:py:meth:`ska_sdp_config.config.Config.stats`, and in bounded memory:
+value sizes are counted in buckets growing by a factor of 2^(1/8),
+which gives percentiles accurate to about 10%, and only the largest
+keys are kept.
+"""
+
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Buckets per doubling of the value size
+BUCKETS_PER_OCTAVE = 8
+
+# Percentiles reported
+PERCENTILES = (50, 90, 99)
+
+# Groups reported at most, further keys get grouped as "other"
+MAX_GROUPS = 100
+
+
+class SizeDistribution:
+    """Distribution of value sizes, in bounded memory."""
+
+    def __init__(self):
+        """Create empty distribution."""
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._buckets = {}  # bucket index -> count
+
+    def add(self, size: int) -> None:
+        """
+        Add a value size.
+
+        :param size: Size in bytes
+        """
+        self.count += 1
+        self.total += size
+        self.max = max(self.max, size)
+        index = 0 if size <= 1 else math.ceil(BUCKETS_PER_OCTAVE * math.log2(size))
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def percentile(self, percent: float) -> int:
+        """
+        Get approximate percentile of the sizes.
+
+        :param percent: Percentile, between 0 and 100
+        :returns: Upper bound of the bucket holding the percentile
+        """
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                bound = math.floor(2 ** (index / BUCKETS_PER_OCTAVE))
+                return min(self.max, bound)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Summarise the distribution.
+
+        :returns: dictionary with count, total, percentiles (as
+            ``p50`` etc.) and maximum size
+        """
+        summary = {"count": self.count, "total": self.total}
+        for percent in PERCENTILES:
+            summary["p{}".format(percent)] = self.percentile(percent)
+        summary["max"] = self.max
+        return summary
+
+
+class KeyspaceStats:
+    """Statistics of the keys with a prefix.
+
+    Keys are grouped by their first path component below the root (e.g.
+    ``/pb``) and their depth, i.e. the number of slashes. Once there are
+    :py:data:`MAX_GROUPS` groups, keys of further groups get counted
+    in the group "other".
+
+    :param prefix: Prefix of the keys
+    :param revision: Database revision the keys were read at
+    :param top: Number of largest keys to keep
+    :param root: Path the groups are below, defaults to the prefix
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self, prefix: str, revision: int = None, top: int = 10, *, root: str = None
+    ):
+        """Create empty statistics."""
+        self.prefix = prefix
+        self.revision = revision
+        self.top = top
+        self.root = prefix if root is None else root
+        self.sizes = SizeDistribution()
+        self.groups = {}  # (group, depth) -> SizeDistribution
+        self.oldest = None  # (mod_revision, path)
+        self.newest = None  # (mod_revision, path)
+        self._largest = []  # heap of (size, path)
+        self._groups = set()
+
+    def _group(self, path: str) -> str:
+        """Get group of a key: the root and first component below it."""
+        base = self.root if self.root.endswith("/") else self.root + "/"
+        if not path.startswith(base):
+            return "other"
+        group = base + path[len(base) :].split("/", 1)[0]
+        if len(self._groups) < MAX_GROUPS:
+            self._groups.add(group)
+        return group if group in self._groups else "other"
+
+    def add(self, path: str, value: str, mod_revision: Optional[int]) -> None:
+        """
+        Add a key.
+
+        :param path: Path of the key
+        :param value: Value of the key
+        :param mod_revision: Revision the key was modified at, None if
+            not known
+        """
+        size = len(value.encode("utf-8"))
+        self.sizes.add(size)
+        group = (self._group(path), path.count("/"))
+        distribution = self.groups.get(group)
+        if distribution is None:
+            distribution = self.groups[group] = SizeDistribution()
+        distribution.add(size)
+
+        if len(self._largest) < self.top:
+            heapq.heappush(self._largest, (size, path))
+        elif self.top > 0 and (size, path) > self._largest[0]:
+            heapq.heapreplace(self._largest, (size, path))
+
+        if mod_revision is not None:
+            if self.oldest is None or mod_revision < self.oldest[0]:
+                self.oldest = (mod_revision, path)
+            if self.newest is None or mod_revision > self.newest[0]:
+                self.newest = (mod_revision, path)
+
+    def add_all(self, items: Iterable[Tuple[str, str, Optional[int]]]) -> None:
+        """
+        Add keys.
+
+        :param items: Keys as (path, value, mod_revision)
+        """
+        for path, value, mod_revision in items:
+            self.add(path, value, mod_revision)
+
+    @property
+    def largest(self) -> List[Tuple[str, int]]:
+        """Largest keys as (path, size), largest first."""
+        return [(path, size) for size, path in sorted(self._largest, reverse=True)]
+
+    def summary(self) -> dict:
+        """
+        Summarise the statistics.
+
+        :returns: dictionary suitable for conversion to JSON
+        """
+        groups: Dict[str, dict] = {}
+        for (group, depth), distribution in sorted(self.groups.items()):
+            groups.setdefault(group, {})[str(depth)] = distribution.summary()
+        return {
+            "prefix": self.prefix,
+            "revision": self.revision,
+            "keys": self.sizes.summary(),
+            "groups": groups,
+            "largest": [{"path": path, "size": size} for path, size in self.largest],
+            "oldest": _revision_summary(self.oldest),
+            "newest": _revision_summary(self.newest),
+        }
+
+    def format(self) -> str:
+        """
+        Format the statistics as a table.
+
+        :returns: text
+        """
+        columns = ["p{}".format(percent) for percent in PERCENTILES] + ["max"]
+        header = ["prefix", "depth", "keys", "bytes"] + columns
+        columns = ["count", "total"] + columns
+        rows = []
+        for (group, depth), distribution in sorted(self.groups.items()):
+            summary = distribution.summary()
+            rows.append([group, depth] + [summary[name] for name in columns])
+        summary = self.sizes.summary()
+        rows.append(["total", ""] + [summary[name] for name in columns])
+        rows = [header] + [[str(cell) for cell in row] for row in rows]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = [
+            "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            for row in rows
+        ]
+
+        lines.append("")
+        lines.append("Largest keys:")
+        for path, size in self.largest:
+            lines.append("  {:>10}  {}".format(size, path))
+        for name, entry in (("Oldest", self.oldest), ("Newest", self.newest)):
+            if entry is not None:
+                lines.append("{} revision: {} ({})".format(name, entry[0], entry[1]))
+        if self.revision is not None:
+            lines.append("Read at revision: {}".format(self.revision))
+        return "\n".join(lines)
+
+
+def _revision_summary(entry: Optional[Tuple[int, str]]) -> Optional[dict]:
+    if entry is None:
+        return None
+    return {"revision": entry[0], "path": entry[1]}
@@ -0,0 +1,5 @@
+"""
+Helpers for testing and benchmarking the configuration library.
+
+Not imported by :py:mod:`ska_sdp_config`, import the modules directly.
+"""
@@ -0,0 +1,882 @@
+"""
+In-process stand-in for the etcd v3 JSON gateway.
+
+Implements enough of etcd's gRPC-JSON gateway for :py:mod:`etcd3`
+(``etcd3-py``) to drive :py:class:`Etcd3Backend` end to end without a
+real etcd server: ranges, transactions with compares, puts, deletes,
+watch streams, leases and compaction, all against a multi-version key
+store with proper revisions.
+
+Start it in-process:
+
+.. code-block:: python
+
+    with Etcd3Gateway() as gateway:
+        backend = Etcd3Backend(host=gateway.host, port=gateway.port)
+
+or from the command line::
+
+    python -m ska_sdp_config.testing.etcd3_gateway --port 2379
+"""
+
+import argparse
+import base64
+import bisect
+import itertools
+import json
+import logging
+import queue as queue_m
+import select
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOGGER = logging.getLogger(__name__)
+
+# gRPC status codes used by the etcd errors we generate
+_GRPC_INVALID_ARGUMENT = 3
+_GRPC_NOT_FOUND = 5
+_GRPC_OUT_OF_RANGE = 11
+_GRPC_UNIMPLEMENTED = 12
+
+_ERR_COMPACTED = "etcdserver: mvcc: required revision has been compacted"
+_ERR_FUTURE_REV = "etcdserver: mvcc: required revision is a future revision"
+_ERR_LEASE_NOT_FOUND = "etcdserver: requested lease not found"
+_ERR_DUPLICATE_KEY = "etcdserver: duplicate key given in txn request"
+
+
+class GatewayError(Exception):
+    """Error to be returned to the client as a gRPC gateway error."""
+
+    def __init__(self, message: str, code: int, status: int = 400):
+        """Instantiate the error."""
+        self.code = code
+        self.status = status
+        super().__init__(message)
+
+
+def _b64decode(value) -> bytes:
+    if value is None:
+        return b""
+    return base64.b64decode(value)
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.b64encode(value).decode("ascii")
+
+
+def _in_range(key: bytes, start: bytes, end: bytes) -> bool:
+    """Check whether a key falls into an etcd key range."""
+    if not end:
+        return key == start
+    if end == b"\0":
+        return key >= start
+    return start <= key < end
+
+
+class _KeyValue:
+    """One version of a key."""
+
+    # pylint: disable=too-few-public-methods
+
+    __slots__ = ["key", "value", "create_revision", "mod_revision", "version", "lease"]
+
+    def __init__(self, key, value, *, create_revision, mod_revision, version, lease):
+        # pylint: disable=too-many-arguments
+        self.key = key
+        self.value = value
+        self.create_revision = create_revision
+        self.mod_revision = mod_revision
+        self.version = version
+        self.lease = lease
+
+    def to_json(self, keys_only=False):
+        """Encode like the gateway does (omitting defaults)."""
+        data = {
+            "key": _b64encode(self.key),
+            "create_revision": str(self.create_revision),
+            "mod_revision": str(self.mod_revision),
+            "version": str(self.version),
+        }
+        if not keys_only and self.value:
+            data["value"] = _b64encode(self.value)
+        if self.lease:
+            data["lease"] = str(self.lease)
+        return data
+
+
+class _Lease:
+    """Granted lease."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, lease_id: int, ttl: int):
+        self.id = lease_id  # pylint: disable=invalid-name
+        self.ttl = ttl
+        self.expiry = time.monotonic() + ttl
+        self.keys = set()
+
+    def remaining(self) -> int:
+        """Remaining time to live, in whole seconds."""
+        return max(0, int(round(self.expiry - time.monotonic())))
+
+
+class Etcd3Store:
+    """
+    Multi-version key-value store with etcd's semantics.
+
+    Every write (put, delete or transaction) creates a new revision,
+    and the history of every key is retained until compacted. All
+    methods take and return gateway-style JSON dictionaries.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self):
+        """Create an empty store."""
+        self._lock = threading.RLock()
+        self._revision = 1
+        self._compact_revision = 0
+        self._keys = []  # Sorted list of keys with any history
+        self._history = {}  # key -> list of _KeyValue (None value: tombstone)
+        self._events = []  # (revision, event_type, _KeyValue) in order
+        self._leases = {}
+        self._lease_ids = itertools.count(0x1000)
+        self._watches = set()
+
+    @property
+    def revision(self) -> int:
+        """Current revision of the store."""
+        return self._revision
+
+    def header(self, revision: int = None) -> dict:
+        """Build a response header."""
+        return {
+            "cluster_id": "1",
+            "member_id": "1",
+            "revision": str(self._revision if revision is None else revision),
+            "raft_term": "1",
+        }
+
+    # -------------------------------------
+    # Key-value reads
+    # -------------------------------------
+
+    def _latest(self, key: bytes, revision: int = None) -> _KeyValue:
+        """Return the live version of a key at the given revision."""
+        history = self._history.get(key)
+        if not history:
+            return None
+        if revision is None or revision >= self._revision:
+            kv = history[-1]
+        else:
+            ix = bisect.bisect_right([kv.mod_revision for kv in history], revision)
+            if ix == 0:
+                return None
+            kv = history[ix - 1]
+        return None if kv.version == 0 else kv
+
+    def _key_span(self, start: bytes, end: bytes):
+        """Iterate keys with history in the given range, in order."""
+        if not end:
+            if start in self._history:
+                yield start
+            return
+        ix = bisect.bisect_left(self._keys, start)
+        while ix < len(self._keys):
+            key = self._keys[ix]
+            if end != b"\0" and key >= end:
+                return
+            yield key
+            ix += 1
+
+    def _range_kvs(self, start: bytes, end: bytes, revision: int = None):
+        for key in self._key_span(start, end):
+            kv = self._latest(key, revision)
+            if kv is not None:
+                yield kv
+
+    def range(self, request: dict) -> dict:
+        """Execute a range request."""
+        # pylint: disable=too-many-locals
+        with self._lock:
+            start = _b64decode(request.get("key"))
+            end = _b64decode(request.get("range_end"))
+            revision = int(request.get("revision", 0) or 0)
+            if revision > self._revision:
+                raise GatewayError(_ERR_FUTURE_REV, _GRPC_OUT_OF_RANGE)
+            if 0 < revision < self._compact_revision:
+                raise GatewayError(_ERR_COMPACTED, _GRPC_OUT_OF_RANGE)
+            kvs = list(self._range_kvs(start, end, revision or None))
+
+            # Filters
+            for field, attr, cmp in [
+                ("min_mod_revision", "mod_revision", lambda a, b: a >= b),
+                ("max_mod_revision", "mod_revision", lambda a, b: a <= b),
+                ("min_create_revision", "create_revision", lambda a, b: a >= b),
+                ("max_create_revision", "create_revision", lambda a, b: a <= b),
+            ]:
+                bound = int(request.get(field, 0) or 0)
+                if bound:
+                    kvs = [kv for kv in kvs if cmp(getattr(kv, attr), bound)]
+
+            # Sorting
+            order = request.get("sort_order", "NONE")
+            target = request.get("sort_target", "KEY")
+            if order not in ("NONE", 0):
+                attr = {
+                    "KEY": "key",
+                    "VERSION": "version",
+                    "CREATE": "create_revision",
+                    "MOD": "mod_revision",
+                    "VALUE": "value",
+                }[target]
+                kvs.sort(key=lambda kv: getattr(kv, attr), reverse=order == "DESCEND")
+
+            # Limit
+            count = len(kvs)
+            limit = int(request.get("limit", 0) or 0)
+            more = False
+            if 0 < limit < count:
+                kvs = kvs[:limit]
+                more = True
+
+            response = {"header": self.header()}
+            if count:
+                response["count"] = str(count)
+            if more:
+                response["more"] = True
+            if kvs and not request.get("count_only"):
+                keys_only = bool(request.get("keys_only"))
+                response["kvs"] = [kv.to_json(keys_only) for kv in kvs]
+            return response
+
+    # -------------------------------------
+    # Key-value writes
+    # -------------------------------------
+
+    def _write(self, key: bytes, value: bytes, lease: int, revision: int):
+        """Write a new version of a key (value None: delete)."""
+        history = self._history.get(key)
+        if history is None:
+            history = self._history[key] = []
+            bisect.insort(self._keys, key)
+        current = history[-1] if history and history[-1].version else None
+
+        # Detach from old lease
+        if current is not None and current.lease and current.lease in self._leases:
+            self._leases[current.lease].keys.discard(key)
+
+        if value is None:
+            if current is None:
+                return None
+            kv = _KeyValue(
+                key, b"", create_revision=0, mod_revision=revision, version=0, lease=0
+            )
+            history.append(kv)
+            event = (revision, "DELETE", kv)
+        else:
+            if current is None:
+                kv = _KeyValue(
+                    key,
+                    value,
+                    create_revision=revision,
+                    mod_revision=revision,
+                    version=1,
+                    lease=lease,
+                )
+            else:
+                kv = _KeyValue(
+                    key,
+                    value,
+                    create_revision=current.create_revision,
+                    mod_revision=revision,
+                    version=current.version + 1,
+                    lease=lease,
+                )
+            history.append(kv)
+            if lease:
+                self._leases[lease].keys.add(key)
+            event = (revision, "PUT", kv)
+        self._events.append(event)
+        return event
+
+    def _check_lease(self, lease: int):
+        if lease and lease not in self._leases:
+            raise GatewayError(_ERR_LEASE_NOT_FOUND, _GRPC_NOT_FOUND)
+
+    def _apply_put(self, request: dict, revision: int, events: list) -> dict:
+        key = _b64decode(request.get("key"))
+        lease = int(request.get("lease", 0) or 0)
+        self._check_lease(lease)
+        prev = self._latest(key)
+        value = _b64decode(request.get("value"))
+        if request.get("ignore_value") and prev is not None:
+            value = prev.value
+        if request.get("ignore_lease") and prev is not None:
+            lease = prev.lease
+        events.append(self._write(key, value, lease, revision))
+        response = {"header": self.header(revision)}
+        if request.get("prev_kv") and prev is not None:
+            response["prev_kv"] = prev.to_json()
+        return response
+
+    def _apply_delete(self, request: dict, revision: int, events: list) -> dict:
+        start = _b64decode(request.get("key"))
+        end = _b64decode(request.get("range_end"))
+        prev_kvs = list(self._range_kvs(start, end))
+        for kv in prev_kvs:
+            events.append(self._write(kv.key, None, 0, revision))
+        response = {"header": self.header(revision)}
+        if prev_kvs:
+            response["deleted"] = str(len(prev_kvs))
+        if request.get("prev_kv") and prev_kvs:
+            response["prev_kvs"] = [kv.to_json() for kv in prev_kvs]
+        return response
+
+    def _finish_write(self, events: list):
+        """Advance the revision if anything changed and notify watchers."""
+        events = [event for event in events if event is not None]
+        if not events:
+            return
+        self._revision += 1
+        for watch in list(self._watches):
+            watch.notify(events, self._revision)
+
+    def put(self, request: dict) -> dict:
+        """Execute a put request."""
+        with self._lock:
+            events = []
+            response = self._apply_put(request, self._revision + 1, events)
+            self._finish_write(events)
+            response["header"] = self.header()
+            return response
+
+    def delete_range(self, request: dict) -> dict:
+        """Execute a delete range request."""
+        with self._lock:
+            events = []
+            response = self._apply_delete(request, self._revision + 1, events)
+            self._finish_write(events)
+            response["header"] = self.header()
+            return response
+
+    def _compare(self, compare: dict) -> bool:
+        """Evaluate a transaction compare."""
+        start = _b64decode(compare.get("key"))
+        end = _b64decode(compare.get("range_end"))
+        target = compare.get("target", "VERSION")
+        result = compare.get("result", "EQUAL")
+        if target == "VALUE":
+            expected = _b64decode(compare.get("value"))
+        else:
+            field = {
+                "VERSION": "version",
+                "CREATE": "create_revision",
+                "MOD": "mod_revision",
+                "LEASE": "lease",
+            }[target]
+            expected = int(compare.get(field, 0) or 0)
+
+        kvs = list(self._range_kvs(start, end))
+        if not kvs:
+            if target == "VALUE":
+                return False
+            kvs = [
+                _KeyValue(
+                    start, b"", create_revision=0, mod_revision=0, version=0, lease=0
+                )
+            ]
+        for kv in kvs:
+            actual = {
+                "VERSION": kv.version,
+                "CREATE": kv.create_revision,
+                "MOD": kv.mod_revision,
+                "LEASE": kv.lease,
+                "VALUE": kv.value,
+            }[target]
+            ok = {
+                "EQUAL": actual == expected,
+                "NOT_EQUAL": actual != expected,
+                "GREATER": actual > expected,
+                "LESS": actual < expected,
+            }[result]
+            if not ok:
+                return False
+        return True
+
+    def _apply_ops(self, ops: list, revision: int, events: list) -> list:
+        responses = []
+        for op in ops:
+            if "request_range" in op:
+                responses.append({"response_range": self.range(op["request_range"])})
+            elif "request_put" in op:
+                responses.append(
+                    {
+                        "response_put": self._apply_put(
+                            op["request_put"], revision, events
+                        )
+                    }
+                )
+            elif "request_delete_range" in op:
+                responses.append(
+                    {
+                        "response_delete_range": self._apply_delete(
+                            op["request_delete_range"], revision, events
+                        )
+                    }
+                )
+            elif "request_txn" in op:
+                responses.append(
+                    {
+                        "response_txn": self._apply_txn(
+                            op["request_txn"], revision, events
+                        )
+                    }
+                )
+            else:
+                raise GatewayError("unknown txn op", _GRPC_INVALID_ARGUMENT)
+        return responses
+
+    def _apply_txn(self, request: dict, revision: int, events: list) -> dict:
+        succeeded = all(self._compare(cmp) for cmp in request.get("compare") or [])
+        ops = request.get("success" if succeeded else "failure") or []
+
+        # Reject multiple writes to the same key, as etcd does
+        written = [
+            _b64decode(op["request_put"].get("key"))
+            for op in ops
+            if "request_put" in op
+        ]
+        if len(written) != len(set(written)):
+            raise GatewayError(_ERR_DUPLICATE_KEY, _GRPC_INVALID_ARGUMENT)
+
+        responses = self._apply_ops(ops, revision, events)
+        response = {"header": self.header()}
+        if succeeded:
+            response["succeeded"] = True
+        if responses:
+            response["responses"] = responses
+        return response
+
+    def txn(self, request: dict) -> dict:
+        """Execute a transaction."""
+        with self._lock:
+            events = []
+            response = self._apply_txn(request, self._revision + 1, events)
+            self._finish_write(events)
+            response["header"] = self.header()
+            return response
+
+    def compact(self, request: dict) -> dict:
+        """Compact history up to the given revision."""
+        with self._lock:
+            revision = int(request.get("revision", 0) or 0)
+            if revision > self._revision:
+                raise GatewayError(_ERR_FUTURE_REV, _GRPC_OUT_OF_RANGE)
+            if revision <= self._compact_revision:
+                raise GatewayError(_ERR_COMPACTED, _GRPC_OUT_OF_RANGE)
+            self._compact_revision = revision
+            for key in list(self._keys):
+                history = self._history[key]
+                ix = bisect.bisect_right([kv.mod_revision for kv in history], revision)
+                # Keep the last version at or before the compaction
+                # revision, unless it is a tombstone
+                keep_from = max(0, ix - 1)
+                if ix > 0 and history[ix - 1].version == 0:
+                    keep_from = ix
+                del history[:keep_from]
+                if not history:
+                    del self._history[key]
+                    self._keys.remove(key)
+            self._events = [ev for ev in self._events if ev[0] > revision]
+            return {"header": self.header()}
+
+    # -------------------------------------
+    # Leases
+    # -------------------------------------
+
+    def lease_grant(self, request: dict) -> dict:
+        """Grant a new lease."""
+        with self._lock:
+            ttl = max(int(request.get("TTL", 0) or 0), 1)
+            lease_id = int(request.get("ID", 0) or 0) or next(self._lease_ids)
+            self._leases[lease_id] = _Lease(lease_id, ttl)
+            return {"header": self.header(), "ID": str(lease_id), "TTL": str(ttl)}
+
+    def lease_revoke(self, request: dict) -> dict:
+        """Revoke a lease, deleting all attached keys."""
+        with self._lock:
+            lease_id = int(request.get("ID", 0) or 0)
+            if lease_id not in self._leases:
+                raise GatewayError(_ERR_LEASE_NOT_FOUND, _GRPC_NOT_FOUND)
+            self._expire(lease_id)
+            return {"header": self.header()}
+
+    def lease_keepalive(self, request: dict) -> dict:
+        """Refresh a lease."""
+        with self._lock:
+            lease_id = int(request.get("ID", 0) or 0)
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                return {"header": self.header(), "ID": str(lease_id)}
+            lease.expiry = time.monotonic() + lease.ttl
+            return {
+                "header": self.header(),
+                "ID": str(lease_id),
+                "TTL": str(lease.ttl),
+            }
+
+    def lease_time_to_live(self, request: dict) -> dict:
+        """Query remaining time to live of a lease."""
+        with self._lock:
+            lease_id = int(request.get("ID", 0) or 0)
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                return {"header": self.header(), "ID": str(lease_id), "TTL": "-1"}
+            response = {
+                "header": self.header(),
+                "ID": str(lease_id),
+                "TTL": str(lease.remaining()),
+                "grantedTTL": str(lease.ttl),
+            }
+            if request.get("keys") and lease.keys:
+                response["keys"] = [_b64encode(key) for key in sorted(lease.keys)]
+            return response
+
+    def _expire(self, lease_id: int):
+        lease = self._leases.pop(lease_id)
+        events = []
+        for key in sorted(lease.keys):
+            events.append(self._write(key, None, 0, self._revision + 1))
+        self._finish_write(events)
+
+    def expire_leases(self):
+        """Expire all leases whose time to live has run out."""
+        with self._lock:
+            now = time.monotonic()
+            for lease_id, lease in list(self._leases.items()):
+                if lease.expiry <= now:
+                    self._expire(lease_id)
+
+    # -------------------------------------
+    # Watches
+    # -------------------------------------
+
+    def watch(self, request: dict) -> "_Watch":
+        """Register a watch, replaying history from its start revision."""
+        with self._lock:
+            watch = _Watch(self, request)
+            start = watch.start_revision
+            if start and start <= self._compact_revision:
+                watch.queue.put(("compacted", self._compact_revision + 1))
+                return watch
+            if start and start <= self._revision:
+                ix = bisect.bisect_left([ev[0] for ev in self._events], start)
+                by_revision = itertools.groupby(self._events[ix:], key=lambda ev: ev[0])
+                for revision, events in by_revision:
+                    watch.notify(list(events), revision)
+            self._watches.add(watch)
+            return watch
+
+    def cancel_watch(self, watch: "_Watch"):
+        """Remove a watch."""
+        with self._lock:
+            self._watches.discard(watch)
+
+
+class _Watch:
+    """A registered watch, collecting matching events in a queue."""
+
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+
+    _ids = itertools.count()
+
+    def __init__(self, store: Etcd3Store, request: dict):
+        self.store = store
+        self.id = next(self._ids)  # pylint: disable=invalid-name
+        self.start = _b64decode(request.get("key"))
+        self.end = _b64decode(request.get("range_end"))
+        self.start_revision = int(request.get("start_revision", 0) or 0)
+        filters = request.get("filters") or []
+        self.no_put = "NOPUT" in filters
+        self.no_delete = "NODELETE" in filters
+        self.queue = queue_m.Queue()
+
+    def notify(self, events: list, revision: int):
+        """Queue all events matching the watch."""
+        matching = [
+            ev
+            for ev in events
+            if _in_range(ev[2].key, self.start, self.end)
+            and not (self.no_put and ev[1] == "PUT")
+            and not (self.no_delete and ev[1] == "DELETE")
+        ]
+        if matching:
+            self.queue.put(("events", revision, matching))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves gateway requests against the store of the server."""
+
+    protocol_version = "HTTP/1.1"
+
+    # Responses get written in several pieces (headers, body, watch
+    # chunks). With Nagle's algorithm, the later ones wait for the
+    # client's delayed ACK, which adds ~40 ms to every request.
+    disable_nagle_algorithm = True
+
+    _ROUTES = {
+        "/kv/range": "range",
+        "/kv/put": "put",
+        "/kv/deleterange": "delete_range",
+        "/kv/txn": "txn",
+        "/kv/compaction": "compact",
+        "/lease/grant": "lease_grant",
+        "/lease/revoke": "lease_revoke",
+        "/kv/lease/revoke": "lease_revoke",
+        "/lease/timetolive": "lease_time_to_live",
+        "/kv/lease/timetolive": "lease_time_to_live",
+    }
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOGGER.debug(format, *args)
+
+    @property
+    def store(self) -> Etcd3Store:
+        """The store served."""
+        return self.server.store
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve version requests."""
+        if self.path == "/version":
+            self._send_json({"etcdserver": "3.4.0", "etcdcluster": "3.4.0"})
+        elif self.path == "/health":
+            self._send_json({"health": "true"})
+        else:
+            self._send_json({"error": "Not Found", "code": _GRPC_UNIMPLEMENTED}, 404)
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Serve RPC requests."""
+        body = self._read_body()
+        path = self.path
+        for prefix in ("/v3alpha", "/v3beta", "/v3"):
+            if path.startswith(prefix + "/"):
+                path = path[len(prefix) :]
+                break
+        try:
+            if path == "/watch":
+                self._serve_watch(json.loads(body or b"{}"))
+            elif path == "/lease/keepalive":
+                self._serve_keepalive(body)
+            elif path in self._ROUTES:
+                request = json.loads(body or b"{}")
+                self._send_json(getattr(self.store, self._ROUTES[path])(request))
+            else:
+                raise GatewayError("Not Found", _GRPC_UNIMPLEMENTED, 404)
+        except GatewayError as err:
+            self._send_json(
+                {"error": str(err), "message": str(err), "code": err.code}, err.status
+            )
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _send_chunk(self, data: dict):
+        chunk = json.dumps({"result": data}).encode("utf-8") + b"\n"
+        self.wfile.write("{:x}\r\n".format(len(chunk)).encode() + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _serve_keepalive(self, body: bytes):
+        self._start_stream()
+        for line in body.splitlines():
+            if line.strip():
+                self._send_chunk(self.store.lease_keepalive(json.loads(line)))
+        self._end_stream()
+
+    def _client_closed(self) -> bool:
+        """Check whether the client has hung up on us."""
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return self.connection.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def _serve_watch(self, request: dict):
+        create = request.get("create_request")
+        if create is None:
+            raise GatewayError("watch cancel not supported", _GRPC_UNIMPLEMENTED)
+        watch = self.store.watch(create)
+        self.close_connection = True
+        try:
+            self._start_stream()
+            self._send_chunk(
+                {
+                    "header": self.store.header(),
+                    "watch_id": str(watch.id),
+                    "created": True,
+                }
+            )
+            while not self.server.stopping:
+                try:
+                    item = watch.queue.get(timeout=0.1)
+                except queue_m.Empty:
+                    if self._client_closed():
+                        return
+                    continue
+                if item[0] == "compacted":
+                    self._send_chunk(
+                        {
+                            "header": self.store.header(),
+                            "watch_id": str(watch.id),
+                            "canceled": True,
+                            "compact_revision": str(item[1]),
+                        }
+                    )
+                    self._end_stream()
+                    return
+                _, revision, events = item
+                self._send_chunk(
+                    {
+                        "header": self.store.header(revision),
+                        "watch_id": str(watch.id),
+                        "events": [
+                            dict(
+                                {"kv": kv.to_json()},
+                                **({"type": "DELETE"} if typ == "DELETE" else {}),
+                            )
+                            for _, typ, kv in events
+                        ],
+                    }
+                )
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            LOGGER.debug("Watch stream closed by client")
+        finally:
+            self.store.cancel_watch(watch)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, store: Etcd3Store):
+        self.store = store
+        self.stopping = False
+        super().__init__(address, _Handler)
+
+    def handle_error(self, request, client_address):
+        """Log errors, connections reset by clients only for debugging."""
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            LOGGER.debug("Connection from %s:%d reset", *client_address)
+        else:
+            super().handle_error(request, client_address)
+
+
+class Etcd3Gateway:
+    """
+    Local etcd v3 JSON gateway stand-in, serving from a background thread.
+
+    Can be used as a context manager, which starts and stops the server.
+
+    :param host: Address to bind to
+    :param port: Port to listen on. Zero picks a free port.
+    :param store: Store to serve. A fresh one is created by default.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, store: Etcd3Store = None
+    ):
+        """Create (but do not start) the gateway."""
+        self.store = Etcd3Store() if store is None else store
+        self._server = _Server((host, port), self.store)
+        self._threads = []
+
+    @property
+    def host(self) -> str:
+        """Address the gateway listens on."""
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        """Port the gateway listens on."""
+        return self._server.server_address[1]
+
+    def start(self):
+        """Start serving requests in background threads."""
+        serve = threading.Thread(target=self._server.serve_forever, daemon=True)
+        reap = threading.Thread(target=self._reap_leases, daemon=True)
+        self._threads = [serve, reap]
+        for thread in self._threads:
+            thread.start()
+
+    def _reap_leases(self):
+        while not self._server.stopping:
+            self.store.expire_leases()
+            time.sleep(0.1)
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._server.stopping = True
+        self._server.shutdown()
+        self._server.server_close()
+        for thread in self._threads:
+            thread.join(1)
+        self._threads = []
+
+    def __enter__(self):
+        """Start the gateway."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stop the gateway."""
+        self.stop()
+        return False
+
+
+def main(argv=None):
+    """Run the gateway stand-in until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind to")
+    parser.add_argument("--port", type=int, default=2379, help="Port to listen on")
+    args = parser.parse_args(argv)
+
+    gateway = Etcd3Gateway(args.host, args.port)
+    gateway.start()
+    print(
+        "Serving etcd v3 gateway stand-in on {}:{}".format(gateway.host, gateway.port)
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.stop()
+
+
+if __name__ == "__main__":
+    main()
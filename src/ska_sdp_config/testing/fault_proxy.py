@@ -0,0 +1,276 @@
+"""
+TCP proxy injecting latency and faults, for testing the etcd3 backend.
+
+Forwards connections to a server (such as etcd, or the stand-in from
+:py:mod:`ska_sdp_config.testing.etcd3_gateway`) and can delay data,
+limit bandwidth, stall all traffic and reset connections. Settings can
+be changed while the proxy runs, and apply to data forwarded from then
+on.
+
+.. code-block:: python
+
+    with Etcd3Gateway() as gateway:
+        with FaultProxy(gateway.host, gateway.port, latency=0.01) as proxy:
+            backend = Etcd3Backend(host=proxy.host, port=proxy.port)
+            ...
+            proxy.reset()
+"""
+
+import logging
+import queue as queue_m
+import socket
+import struct
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# Size of reads from sockets
+CHUNK_SIZE = 65536
+
+
+class _Pipe:
+    """Forwards data from one socket to another, in one direction.
+
+    Data is read as soon as it arrives, and written once it is due:
+    after the latency of the proxy, paced to its bandwidth, and not
+    while the proxy is stalled.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, proxy: "FaultProxy", source, target, name):
+        self._proxy = proxy
+        self._source = source
+        self._target = target
+        self._queue = queue_m.Queue()
+        self.threads = [
+            threading.Thread(target=self._read, name=name + "-read", daemon=True),
+            threading.Thread(target=self._write, name=name + "-write", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _read(self):
+        try:
+            while True:
+                data = self._source.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                self._queue.put((time.monotonic() + self._proxy.latency, data))
+        except OSError:
+            pass
+        self._queue.put(None)
+
+    def _write(self):
+        proxy = self._proxy
+        free = 0.0  # Time the link is free again, for bandwidth limits
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._target.shutdown(socket.SHUT_WR)
+                    return
+                due, data = item
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                proxy.wait_flowing()
+                if proxy.bandwidth:
+                    free = max(free, time.monotonic()) + len(data) / proxy.bandwidth
+                    delay = free - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._target.sendall(data)
+        except OSError:
+            pass
+
+
+class _Connection:
+    """Connection forwarded by the proxy."""
+
+    def __init__(self, proxy: "FaultProxy", client: socket.socket, name: str):
+        self.client = client
+        self.upstream = socket.create_connection(proxy.target, timeout=10)
+        self.upstream.settimeout(None)
+        for sock in (self.client, self.upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._pipes = [
+            _Pipe(proxy, self.client, self.upstream, name + "-up"),
+            _Pipe(proxy, self.upstream, self.client, name + "-down"),
+        ]
+
+    @property
+    def alive(self) -> bool:
+        """Whether data is still forwarded in either direction."""
+        return any(thread.is_alive() for pipe in self._pipes for thread in pipe.threads)
+
+    def close(self, reset: bool = False):
+        """Close both sides, optionally by resetting them."""
+        for sock in (self.client, self.upstream):
+            # Wake up the thread reading from the socket first. The
+            # socket only gets closed once nothing uses it any more.
+            try:
+                if reset:
+                    # Zero linger time makes close() send a RST
+                    sock.setsockopt(
+                        socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+                    )
+                    sock.shutdown(socket.SHUT_RD)
+                else:
+                    sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        # Make sure the connection is gone before returning
+        for pipe in self._pipes:
+            for thread in pipe.threads:
+                if thread is not threading.current_thread():
+                    thread.join(1)
+
+
+class FaultProxy:
+    """
+    TCP proxy injecting latency and faults, serving from background threads.
+
+    Can be used as a context manager, which starts and stops the proxy.
+
+    :param target_host: Host of the server to forward to
+    :param target_port: Port of the server to forward to
+    :param host: Address to bind to
+    :param port: Port to listen on. Zero picks a free port.
+    :param latency: Delay of data in each direction, in seconds. The
+        round trip time is twice this.
+    :param bandwidth: Bandwidth of each direction of a connection in
+        bytes per second, None for no limit
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        target_host: str,
+        target_port: int,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        bandwidth: float = None,
+    ):
+        """Create (but do not start) the proxy."""
+        # pylint: disable=too-many-arguments
+        self.target = (target_host, int(target_port))
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._listener = socket.create_server((host, port))
+        self._listener.settimeout(0.1)
+        self._flowing = threading.Event()
+        self._flowing.set()
+        self._resume_timer = None
+        self._connections = []
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self.accepted = 0
+
+    @property
+    def host(self) -> str:
+        """Address the proxy listens on."""
+        return self._listener.getsockname()[0]
+
+    @property
+    def port(self) -> int:
+        """Port the proxy listens on."""
+        return self._listener.getsockname()[1]
+
+    @property
+    def connections(self) -> int:
+        """Number of open connections."""
+        with self._lock:
+            self._connections = [conn for conn in self._connections if conn.alive]
+            return len(self._connections)
+
+    def start(self):
+        """Start accepting connections in a background thread."""
+        self._thread = threading.Thread(
+            target=self._accept, name="fault-proxy", daemon=True
+        )
+        self._thread.start()
+
+    def _accept(self):
+        while not self._stopping:
+            try:
+                client, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            name = "fault-proxy-{}".format(self.accepted)
+            self.accepted += 1
+            try:
+                connection = _Connection(self, client, name)
+            except OSError as err:
+                LOGGER.debug("Cannot connect to %s:%d: %s", *self.target, err)
+                client.close()
+                continue
+            with self._lock:
+                self._connections.append(connection)
+
+    def wait_flowing(self):
+        """Wait while the proxy is stalled."""
+        self._flowing.wait()
+
+    def stall(self, duration: float = None):
+        """
+        Stop forwarding data. Data sent in the meantime is kept.
+
+        :param duration: Time after which to resume, None to wait for
+            :py:meth:`resume`
+        """
+        self._flowing.clear()
+        if duration is not None:
+            self._resume_timer = threading.Timer(duration, self.resume)
+            self._resume_timer.daemon = True
+            self._resume_timer.start()
+
+    def resume(self):
+        """Resume forwarding data after a stall."""
+        if self._resume_timer is not None:
+            self._resume_timer.cancel()
+            self._resume_timer = None
+        self._flowing.set()
+
+    def reset(self) -> int:
+        """
+        Reset all open connections, on both sides.
+
+        :returns: Number of connections reset
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close(reset=True)
+        return len(connections)
+
+    def stop(self):
+        """Stop accepting connections and close all open ones."""
+        self._stopping = True
+        self.resume()
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+        self._listener.close()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+    def __enter__(self):
+        """Start the proxy."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stop the proxy."""
+        self.stop()
+        return False
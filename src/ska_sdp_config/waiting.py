@@ -0,0 +1,154 @@
+"""
+Helpers for waiting in line for keys.
+
+Used by the batch queue, elections and locks, where clients line up
+by creating keys, ordered by the revision they were created at, and
+each client only watches the key in front of it.
+"""
+
+import itertools
+import queue as queue_m
+import time
+import uuid
+from typing import List
+
+from .backend.common import Revision
+
+# Orders keys created in the same transaction, which share their create
+# revision. Only needs to be unique within the process, as a transaction
+# runs in one process.
+_JOINED = itertools.count()
+
+
+def join_line(txn, line: str, value: str, lease=None) -> str:
+    """
+    Get into a line by creating a uniquely named key in it.
+
+    Keys in line are ordered by their create revision, and keys created
+    by the same transaction by their name.
+
+    :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+    :param line: Prefix of keys in line, ending with '/'
+    :param value: Value to set
+    :param lease: Lease to associate
+    :returns: key created
+    """
+    key = "{}{:012x}-{}".format(line, next(_JOINED), uuid.uuid4().hex)
+    txn.raw.create(key, value, lease)
+    return key
+
+
+def keys_ahead(txn, line: str, key: str) -> List[str]:
+    """
+    List the keys in front of a key in line.
+
+    Keys are in line in the order they were created.
+
+    :param txn: :py:class:`ska_sdp_config.config.Transaction` to use
+    :param line: Prefix of keys in line, ending with '/'
+    :param key: Key to look for
+    :returns: keys in front, oldest first
+    """
+    keys = txn.raw.list_created(line)
+    return keys[: keys.index(key)] if key in keys else keys
+
+
+def _wait(config, path: str, prefix: bool, check, is_done, *, deadline) -> bool:
+    """
+    Wait for a change of a key or prefix.
+
+    :param config: Configuration to use
+    :param path: Key or prefix to watch
+    :param prefix: Whether path is a prefix
+    :param check: Function checking in a transaction whether the
+        change happened already
+    :param is_done: Function checking whether a watch event
+        ``(path, value, revision)`` is the change
+    :param deadline: Time to wait until
+    :returns: False if the wait timed out
+    """
+    # pylint: disable=too-many-arguments
+    backend = config.backend
+
+    # Watch from the current revision, then check whether we need to
+    # wait at all. This way we cannot miss the change.
+    revision = backend.current_revision()
+    events = queue_m.Queue()
+    watch = backend.watch(path, prefix=prefix, revision=Revision(revision.revision + 1))
+    watch.start(events)
+    try:
+        for txn in config.txn():
+            done = check(txn)
+        while not done:
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    return False
+            try:
+                event = events.get(timeout=timeout)
+            except queue_m.Empty:
+                return False
+            # A cancelled watch ends the wait as well
+            done = event[2] is None or is_done(*event)
+        return True
+    finally:
+        watch.stop()
+
+
+def wait_for_change(config, path: str, deadline: float = None) -> bool:
+    """
+    Wait for a key to be deleted, or for a key with a prefix to change.
+
+    Only the given key (or prefix) gets watched. A prefix is considered
+    changed immediately if any key with it exists.
+
+    :param config: :py:class:`ska_sdp_config.config.Config` to use
+    :param path: Path of key, or prefix ending with '/'
+    :param deadline: Time to wait until
+    :returns: False if the wait timed out
+    """
+    if path.endswith("/"):
+        return _wait(
+            config,
+            path,
+            True,
+            lambda txn: bool(txn.raw.list_keys(path)),
+            lambda *_: True,
+            deadline=deadline,
+        )
+    return _wait(
+        config,
+        path,
+        False,
+        lambda txn: txn.raw.get(path) is None,
+        lambda _path, value, _rev: value is None,
+        deadline=deadline,
+    )
+
+
+def wait_for_deletion(
+    config, prefix: str, paths: List[str], deadline: float = None
+) -> bool:
+    """
+    Wait for any of several keys with a prefix to be deleted.
+
+    With a single key, only that key gets watched. Otherwise the prefix
+    gets watched, but only deletions of the given keys end the wait.
+
+    :param config: :py:class:`ska_sdp_config.config.Config` to use
+    :param prefix: Common prefix of the keys, ending with '/'
+    :param paths: Paths of keys
+    :param deadline: Time to wait until
+    :returns: False if the wait timed out
+    """
+    if len(paths) == 1:
+        return wait_for_change(config, paths[0], deadline)
+    return _wait(
+        config,
+        prefix,
+        True,
+        lambda txn: any(txn.raw.get(path) is None for path in paths),
+        lambda path, value, _rev: value is None and path in paths,
+        deadline=deadline,
+    )
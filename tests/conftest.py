@@ -0,0 +1,34 @@
+"""Fixtures shared between tests."""
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+import os
+
+import pytest
+
+from ska_sdp_config import Config
+
+
+@pytest.fixture(params=["memory", "shm", "sqlite", "etcd3"])
+def backend_cfg(request, tmp_path):
+    # Keys go below the PREFIX of the test module, which gets cleared
+    # before and after each test
+    prefix = request.module.PREFIX
+    if request.param == "shm":
+        cargs = {"path": str(tmp_path / "config.shm")}
+    elif request.param == "sqlite":
+        cargs = {"path": str(tmp_path / "config.db"), "poll_interval": 0.005}
+    elif request.param == "etcd3":
+        cargs = {"host": os.getenv("SDP_TEST_HOST", "127.0.0.1")}
+    else:
+        cargs = {}
+    with Config(backend=request.param, global_prefix=prefix, **cargs) as config:
+        config.backend.delete(prefix, must_exist=False, recursive=True)
+        yield config
+        config.backend.delete(prefix, must_exist=False, recursive=True)
+
+
+@pytest.fixture
+def cfg(backend_cfg):
+    # Modules testing against etcd only override this one
+    return backend_cfg
@@ -9,7 +9,9 @@ from unittest.mock import patch, call
 import pytest
 
 from ska_sdp_config import config, ConfigCollision, ConfigVanished
-from ska_sdp_config.ska_sdp_cli.sdp_delete import cmd_delete
+from ska_sdp_config.ska_sdp_cli.sdp_delete import cmd_delete, cmd_delete_pb_index
+from ska_sdp_config.ska_sdp_cli.sdp_dump import cmd_dump, cmd_load
+from ska_sdp_config.ska_sdp_cli.sdp_stats import cmd_stats
 from ska_sdp_config.ska_sdp_cli.sdp_import import parse_definitions, import_workflows
 from ska_sdp_config.ska_sdp_cli.sdp_update import cmd_update
 from ska_sdp_config.ska_sdp_cli.sdp_create import cmd_create, cmd_create_pb, cmd_deploy
@@ -416,6 +418,82 @@ def test_cmd_delete_recursive(temp_cfg):
         assert len(keys) == 0
 
 
+def test_cmd_delete_pb_index(temp_cfg):
+    """
+    Index entries are found below the global prefix.
+    """
+    entry = f"{PREFIX}/index/pb/by-sbi/sbi-test/pb-20210101-test"
+    other = f"{PREFIX}/index/pb/by-sbi/sbi-test/pb-20220101-test"
+    for txn in temp_cfg.txn():
+        txn.raw.create(entry, "pb-20210101-test")
+        txn.raw.create(other, "pb-20220101-test")
+
+    for txn in temp_cfg.txn():
+        cmd_delete_pb_index(txn, "pb-20210101-test")
+
+    for txn in temp_cfg.txn():
+        assert txn.raw.list_keys(f"{PREFIX}/index/pb/by-sbi/sbi-test/") == [other]
+        txn.raw.delete(other)
+
+
+def test_cmd_dump_load(temp_cfg, tmp_path):
+    """
+    Keys dumped into a (compressed) file can be loaded back.
+    """
+    for txn in temp_cfg.txn():
+        cmd_delete(txn, f"{PREFIX}/pb", recurse=True, quiet=True)
+        txn.raw.create(f"{PREFIX}/pb/pb-20210101-test/state", '{"pb": "info"}')
+        txn.raw.create(f"{PREFIX}/pb/pb-20220101-test/state", '{"pb": "info"}')
+
+    filename = str(tmp_path / "dump.jsonl.gz")
+    cmd_dump(temp_cfg, filename, f"{PREFIX}/pb/")
+
+    for txn in temp_cfg.txn():
+        cmd_delete(txn, f"{PREFIX}/pb", recurse=True, quiet=True)
+        txn.raw.create(f"{PREFIX}/pb/pb-20210101-test/state", '{"pb": "old"}')
+
+    with pytest.raises(ConfigCollision):
+        cmd_load(temp_cfg, filename, overwrite=False)
+    cmd_load(temp_cfg, filename, overwrite=True)
+
+    for txn in temp_cfg.txn():
+        keys = txn.raw.list_keys(f"{PREFIX}/pb", recurse=8)
+        assert len(keys) == 2
+        assert txn.raw.get(f"{PREFIX}/pb/pb-20210101-test/state") == '{"pb": "info"}'
+
+    # Without a prefix, keys below the global prefix get dumped
+    filename = str(tmp_path / "all.jsonl")
+    cmd_dump(temp_cfg, filename)
+    with open(filename, encoding="utf-8") as file:
+        header = json.loads(file.readline())
+    assert header["prefix"] == f"{PREFIX}/"
+
+
+@patch("ska_sdp_config.ska_sdp_cli.sdp_stats.LOG")
+def test_cmd_stats(mock_log, temp_cfg):
+    """
+    Statistics cover the keys with the prefix, as a table or JSON.
+    """
+    for txn in temp_cfg.txn():
+        cmd_delete(txn, f"{PREFIX}/pb", recurse=True, quiet=True)
+        txn.raw.create(f"{PREFIX}/pb/pb-20210101-test/state", '{"pb": "info"}')
+        txn.raw.create(f"{PREFIX}/pb/pb-20220101-test", '{"pb": "large"}')
+
+    cmd_stats(temp_cfg, f"{PREFIX}/pb/", top=1, as_json=True)
+    summary = json.loads(mock_log.info.call_args[0][0])
+    assert summary["keys"]["count"] == 2
+    assert summary["keys"]["total"] == 29
+    assert summary["largest"] == [{"path": f"{PREFIX}/pb/pb-20220101-test", "size": 15}]
+    assert summary["newest"]["path"] == f"{PREFIX}/pb/pb-20220101-test"
+
+    cmd_stats(temp_cfg, f"{PREFIX}/pb/")
+    table = mock_log.info.call_args[0][0]
+    # Grouped by the top-level path, not one group per processing block
+    groups = [line.split()[0] for line in table.splitlines()[1:3]]
+    assert groups == [f"{PREFIX}/pb", f"{PREFIX}/pb"]
+    assert "Largest keys:" in table
+
+
 @pytest.mark.parametrize("workflow_def", [STRUCTURED_WORKFLOW, FLAT_WORKFLOW])
 def test_parse_definitions_for_import(workflow_def):
     """
@@ -22,6 +22,9 @@ SDP_CREATE = "sdp_create"
 SDP_UPDATE = "sdp_update"
 SDP_DELETE = "sdp_delete"
 SDP_IMPORT = "sdp_import"
+SDP_DUMP = "sdp_dump"
+SDP_REINDEX = "sdp_reindex"
+SDP_STATS = "sdp_stats"
 
 
 class MockConfig:
@@ -56,6 +59,10 @@ class MockConfig:
         ("edit", SDP_UPDATE),
         ("delete", SDP_DELETE),
         ("import", SDP_IMPORT),
+        ("dump", SDP_DUMP),
+        ("load", SDP_DUMP),
+        ("reindex", SDP_REINDEX),
+        ("stats", SDP_STATS),
     ],
 )
 @patch(f"{PATH_PREFIX}.{SKA_SDP}.config")
@@ -65,7 +72,13 @@ class MockConfig:
 @patch(f"{PATH_PREFIX}.{SKA_SDP}.{SDP_UPDATE}.{MAIN}")
 @patch(f"{PATH_PREFIX}.{SKA_SDP}.{SDP_DELETE}.{MAIN}")
 @patch(f"{PATH_PREFIX}.{SKA_SDP}.{SDP_IMPORT}.{MAIN}")
+@patch(f"{PATH_PREFIX}.{SKA_SDP}.{SDP_DUMP}.{MAIN}")
+@patch(f"{PATH_PREFIX}.{SKA_SDP}.{SDP_REINDEX}.{MAIN}")
+@patch(f"{PATH_PREFIX}.{SKA_SDP}.{SDP_STATS}.{MAIN}")
 def test_ska_sdp_main(
+    mock_sdp_stats,
+    mock_sdp_reindex,
+    mock_sdp_dump,
     mock_sdp_import,
     mock_sdp_delete,
     mock_sdp_update,
@@ -87,6 +100,9 @@ def test_ska_sdp_main(
         SDP_UPDATE: mock_sdp_update,
         SDP_DELETE: mock_sdp_delete,
         SDP_IMPORT: mock_sdp_import,
+        SDP_DUMP: mock_sdp_dump,
+        SDP_REINDEX: mock_sdp_reindex,
+        SDP_STATS: mock_sdp_stats,
     }
 
     command_dict[executable].Config().return_value = Mock()
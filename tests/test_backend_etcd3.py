@@ -6,7 +6,12 @@ import os
 import time
 import pytest
 
-from ska_sdp_config.backend import ConfigCollision, ConfigVanished, Etcd3Backend
+from ska_sdp_config.backend import (
+    ConfigCollision,
+    ConfigTimeout,
+    ConfigVanished,
+    Etcd3Backend,
+)
 
 PREFIX = "/__test"
 
@@ -176,6 +181,34 @@ def test_list(etcd3):
     etcd3.delete(key, must_exist=False, recursive=True)
 
 
+def test_range_values(etcd3):
+
+    key = PREFIX + "/test_range_values"
+    keys = [key + "/" + str(i) for i in range(20)]
+    keys += [key + "/0/x", key + "/0/x/y", key + "/0" + 20 * "/z", key + "x"]
+    for path in keys:
+        etcd3.create(path, path)
+
+    # Pages are read at the revision of the first request
+    revision, items = etcd3.range_values(key + "/", batch_size=3)
+    first = next(items)
+    assert first[:2] == (key + "/0", key + "/0")
+    assert first[2] <= revision.revision
+    etcd3.create(key + "/late", "")
+    etcd3.update(key + "/5", "changed")
+    result = [first] + list(items)
+    assert [path for path, _, _ in result] == sorted(keys[:20]) + keys[20:23]
+    assert dict((path, value) for path, value, _ in result)[key + "/5"] == key + "/5"
+
+    # Or at a revision of our choosing
+    _, items = etcd3.range_values(key + "/", revision=revision, max_depth=1)
+    assert len(list(items)) == 20
+
+    etcd3.delete(key, recursive=True, must_exist=False)
+    etcd3.delete(keys[22])
+    etcd3.delete(key + "x")
+
+
 def test_lease(etcd3):
     key = PREFIX + "/test_lease"
     with etcd3.lease(ttl=5) as lease:
@@ -508,6 +541,99 @@ def test_transaction_list(etcd3):
     etcd3.delete(key, recursive=True, must_exist=False)
 
 
+def test_transaction_list_values(etcd3):
+
+    key = PREFIX + "/test_txn_list_values"
+    for txn in etcd3.txn():
+        for i in range(3):
+            txn.create("{}/{}".format(key, i), str(i))
+            txn.create("{}/{}/sub".format(key, i), "sub")
+
+    assert etcd3.list_values(key + "/", recurse=(1,))[0] == [
+        ("{}/{}/sub".format(key, i), "sub", mod_rev)
+        for i, (_, _, mod_rev) in enumerate(etcd3.list_values(key + "/")[0])
+    ]
+    for txn in etcd3.txn():
+        assert txn.list_values(key + "/") == [
+            ("{}/{}".format(key, i), str(i)) for i in range(3)
+        ]
+        assert txn.get(key + "/1") == "1"
+        txn.update(key + "/1", "x")
+        assert txn.list_values(key + "/")[1] == (key + "/1", "x")
+
+    # In contrast to list_keys, a value update causes a re-run
+    for i, txn in enumerate(etcd3.txn()):
+        txn.list_values(key + "/")
+        if i == 0:
+            etcd3.update(key + "/2", "y")
+        txn.create(key + "/3", "z")
+    assert i == 1
+    etcd3.delete(key, recursive=True, must_exist=False)
+
+
+def test_transaction_iter_values(etcd3):
+
+    key = PREFIX + "/test_txn_iter_values"
+    for txn in etcd3.txn():
+        for i in range(7):
+            txn.create("{}/{}".format(key, i), str(i))
+        txn.create(key + "/1/sub", "sub")
+
+    for i, txn in enumerate(etcd3.txn()):
+        txn.update(key + "/3", "x")
+        txn.delete(key + "/4")
+        txn.create(key + "/8", "new")
+        values = txn.iter_values(key + "/", recurse=(0, 1), batch_size=2)
+        assert next(values) == (key + "/0", "0")
+
+        # Changes made while iterating are not visible, as all batches
+        # are read at the same revision
+        if i == 0:
+            etcd3.update(key + "/6", "late")
+        assert list(values) == [
+            (key + "/1", "1"),
+            (key + "/1/sub", "sub"),
+            (key + "/2", "2"),
+            (key + "/3", "x"),
+            (key + "/5", "5"),
+            (key + "/6", "6" if i == 0 else "late"),
+            (key + "/8", "new"),
+        ]
+
+    # ... but cause the transaction to run again
+    assert i == 1
+    assert etcd3.get(key + "/3")[0] == "x"
+    etcd3.delete(key, recursive=True, must_exist=False)
+
+
+def test_get_many(etcd3):
+
+    key = PREFIX + "/test_get_many"
+    paths = ["{}/{}".format(key, i) for i in range(100)]
+    for txn in etcd3.txn():
+        for i, path in enumerate(paths[:-1]):
+            txn.create(path, str(i))
+
+    values, _ = etcd3.get_many(paths)
+    assert values[paths[5]] == ("5", etcd3.get(paths[5])[1].mod_revision)
+    assert values[paths[-1]] == (None, None)
+
+    # Known values are only transferred again if they changed
+    known = {path: ("known", mod_rev) for path, (_, mod_rev) in values.items()}
+    etcd3.update(paths[1], "new")
+    values, _ = etcd3.get_many(paths[:3], known=known)
+    assert values[paths[0]] == known[paths[0]]
+    assert values[paths[1]][0] == "new"
+    mod_rev = values[paths[1]][1]
+
+    for txn in etcd3.txn():
+        txn.update(paths[0], "x")
+        values = txn.get_many(paths[:2], known=known)
+        assert values == {paths[0]: ("x", None), paths[1]: ("new", mod_rev)}
+        assert txn.get(paths[1]) == "new"
+    etcd3.delete(key, recursive=True, must_exist=False)
+
+
 # pylint: disable=W0212
 @pytest.mark.timeout(2)
 def test_transaction_wait(etcd3):
@@ -756,6 +882,46 @@ def test_transaction_watch_list_new(etcd3):
     etcd3.delete(key, must_exist=False, recursive=True)
 
 
+@pytest.mark.timeout(5)
+def test_watcher_list_values(etcd3):
+
+    key = PREFIX + "/test_watcher_list_values"
+    etcd3.create(key + "/a", "1")
+
+    for i, watch in enumerate(etcd3.watcher(timeout=1)):
+        for txn in watch.txn():
+            values = txn.list_values(key + "/")
+        if i == 0:
+            # Updating a value read should cause a loop
+            etcd3.update(key + "/a", "2")
+        else:
+            assert not watch._wait_txn._got_timeout
+            assert values == [(key + "/a", "2")]
+            break
+
+    etcd3.delete(key, must_exist=False, recursive=True)
+
+
+@pytest.mark.timeout(5)
+def test_watcher_iter_values(etcd3):
+
+    key = PREFIX + "/test_watcher_iter_values"
+    etcd3.create(key + "/a", "1")
+
+    for i, watch in enumerate(etcd3.watcher(timeout=1)):
+        for txn in watch.txn():
+            values = list(txn.iter_values(key + "/", batch_size=1))
+        if i == 0:
+            # Updating a value read should cause a loop
+            etcd3.update(key + "/a", "2")
+        else:
+            assert not watch._wait_txn._got_timeout
+            assert values == [(key + "/a", "2")]
+            break
+
+    etcd3.delete(key, must_exist=False, recursive=True)
+
+
 @pytest.mark.timeout(10)
 def test_transaction_retries(etcd3):
 
@@ -795,5 +961,40 @@ def test_transaction_retries(etcd3):
         break
 
 
+@pytest.mark.timeout(10)
+def test_transaction_deadline(etcd3):
+
+    key = PREFIX + "/test_txn_deadline"
+    etcd3.create(key, "0")
+
+    # Give up retrying once the deadline passed
+    with pytest.raises(ConfigTimeout, match="deadline"):
+        deadline = time.time() + 0.5
+        for i, txn in enumerate(etcd3.txn(max_retries=10**6, deadline=deadline)):
+            v2 = txn.get(key)
+            etcd3.update(key, str(i))
+            txn.update(key, v2 + "x")
+    assert i > 0
+
+    # Waiting for changes stops at the deadline, too
+    start = time.time()
+    with pytest.raises(ConfigTimeout):
+        for txn in etcd3.txn(deadline=time.time() + 0.5):
+            txn.get(key)
+            txn.loop(watch=True)
+    assert time.time() - start < 2
+    with pytest.raises(ConfigTimeout, match="Watcher"):
+        for watcher in etcd3.watcher(deadline=time.time() + 0.5):
+            for txn in watcher.txn():
+                txn.get(key)
+    assert time.time() - start < 4
+
+    # Transactions finishing in time are not affected
+    for txn in etcd3.txn(deadline=time.time() + 5):
+        txn.update(key, "done")
+    assert etcd3.get(key)[0] == "done"
+    etcd3.delete(key)
+
+
 if __name__ == "__main__":
     pytest.main()
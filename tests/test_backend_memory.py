@@ -1,8 +1,10 @@
 # pylint: disable=missing-docstring,redefined-outer-name
 
+import time
+
 import pytest
 from ska_sdp_config.backend import ConfigVanished, ConfigCollision, MemoryBackend
-from ska_sdp_config.backend.memory import MemoryTransaction
+from ska_sdp_config.backend.memory import MemoryTransaction, TimerWheel
 from ska_sdp_config.config import dict_to_json
 
 
@@ -33,6 +35,12 @@ def test_stuff(txn: MemoryTransaction):
     paths = txn.list_keys("/")
     assert len(paths) == 1
     assert paths[0] == "/x"
+    assert txn.list_values("/x/") == [("/x/y", "v3")]
+    assert txn.list_values("/x/", recurse=(1,)) == [("/x/y/z", "v2")]
+    assert list(txn.iter_values("/x/", recurse=(0, 1))) == [
+        ("/x/y", "v3"),
+        ("/x/y/z", "v2"),
+    ]
     txn.delete("/x")
     paths = txn.list_keys("/")
     assert len(paths) == 0
@@ -56,3 +64,100 @@ def test_state(txn: MemoryTransaction):
     txn.delete("/master", must_exist=False, recursive=True)
     paths = txn.list_keys("/")
     assert len(paths) == 0
+
+
+def test_lease_expiry():
+    backend = MemoryBackend()
+    backend.delete("/lease", must_exist=False, recursive=True)
+
+    # Keys associated with a lease that is not kept alive disappear,
+    # and watchers get told about it
+    lease = backend.lease(0.2)
+    lease.grant()
+    assert lease.alive()
+    backend.create("/lease/a", "v", lease)
+    backend.create("/lease/b", "v")
+    with backend.watch("/lease/", prefix=True) as queue:
+        key, val, rev = queue.get(timeout=2)
+        assert key == "/lease/a"
+        assert val is None
+        assert rev.revision > 0
+    assert not lease.alive()
+    assert lease.ttl() == -1
+    assert backend.get("/lease/a") is None
+    assert backend.get("/lease/b") == "v"
+
+    # Cannot use an expired lease
+    with pytest.raises(ValueError, match="Lease"):
+        backend.create("/lease/a", "v", lease)
+    with pytest.raises(ValueError, match="Lease"):
+        lease.refresh()
+    backend.delete("/lease", must_exist=False, recursive=True)
+
+
+def test_lease_keepalive():
+    backend = MemoryBackend()
+
+    # Entering the lease keeps it alive
+    with backend.lease(0.1) as lease:
+        for txn in backend.txn():
+            txn.create("/lease/owner", "me", lease)
+        time.sleep(0.3)
+        assert backend.get("/lease/owner") == "me"
+        assert lease.ttl() == pytest.approx(0.1)
+
+        # Simulate owner dying
+        lease.cancel_keepalive()
+        assert 0 < lease.ttl() <= 0.1
+        time.sleep(0.3)
+        assert backend.get("/lease/owner") is None
+
+    # Revoking on exit deletes keys immediately
+    with backend.lease(10) as lease:
+        backend.create("/lease/owner", "me", lease)
+    assert backend.get("/lease/owner") is None
+
+    # Manual refresh
+    lease = backend.lease(0.2)
+    lease.grant()
+    backend.create("/lease/owner", "me", lease)
+    for _ in range(4):
+        time.sleep(0.1)
+        lease.refresh()
+    assert backend.get("/lease/owner") == "me"
+
+    # Updating the key detaches it from the lease
+    backend.update("/lease/owner", "you")
+    lease.revoke()
+    assert backend.get("/lease/owner") == "you"
+    backend.delete("/lease", must_exist=False, recursive=True)
+
+
+def test_lease_many():
+    backend = MemoryBackend()
+    leases = [backend.lease(0.1 + 0.0001 * i) for i in range(2000)]
+    for i, lease in enumerate(leases):
+        lease.grant()
+        backend.create("/many/{:04}".format(i), "v", lease)
+    assert len(backend.list_keys("/many/")) == 2000
+    deadline = time.time() + 5
+    while backend.list_keys("/many/") and time.time() < deadline:
+        time.sleep(0.1)
+    assert backend.list_keys("/many/") == []
+
+
+def test_timer_wheel():
+    wheel = TimerWheel(resolution=1, slots=4)
+    start = time.monotonic()
+    wheel.schedule("a", start + 2)
+    wheel.schedule("b", start + 6)
+    wheel.schedule("c", start + 3)
+    assert len(wheel) == 3
+    wheel.cancel("c")
+    assert "c" not in wheel
+    assert wheel.advance(start) == []
+    assert wheel.advance(start + 3) == ["a"]
+    # "b" shares a slot with an earlier tick, but is one revolution ahead
+    assert wheel.advance(start + 5) == []
+    assert wheel.advance(start + 100) == ["b"]
+    assert len(wheel) == 0
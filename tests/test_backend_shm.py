@@ -0,0 +1,218 @@
+"""Tests for the shared-memory backend."""
+
+# pylint: disable=missing-docstring,redefined-outer-name,invalid-name
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from ska_sdp_config import Config
+from ska_sdp_config.backend import (
+    ConfigCollision,
+    ConfigVanished,
+    SharedMemoryBackend,
+)
+
+PREFIX = "/__test"
+
+
+@pytest.fixture
+def shm_path(tmp_path):
+    return str(tmp_path / "config.shm")
+
+
+@pytest.fixture
+def shm(shm_path):
+    with SharedMemoryBackend(shm_path, poll_interval=0.005) as backend:
+        yield backend
+
+
+def test_create(shm):
+    key = PREFIX + "/test_create"
+
+    shm.create(key, "foo")
+    with pytest.raises(ConfigCollision):
+        shm.create(key, "foo")
+
+    v, ver = shm.get(key)
+    assert v == "foo"
+
+    shm.update(key, "bar", must_be_rev=ver)
+    v2, ver2 = shm.get(key)
+    assert v2 == "bar"
+    assert ver2.revision > ver.revision
+    assert ver2.mod_revision == ver.mod_revision + 1
+
+    with pytest.raises(ConfigVanished):
+        shm.update(key, "baz", must_be_rev=ver)
+    assert shm.get(key)[0] == "bar"
+
+    shm.delete(key)
+    with pytest.raises(ConfigVanished):
+        shm.delete(key)
+    with pytest.raises(ValueError, match="trailing"):
+        shm.get(key + "/")
+
+
+def test_list_delete(shm):
+    key = PREFIX + "/test_delete"
+
+    childs = ["/".join([key] + n * ["x"]) for n in range(10)]
+    for n, child in enumerate(childs):
+        shm.create(child, n)
+    shm.create(key + "x", "keep!")
+
+    assert shm.list_keys(PREFIX + "/")[0] == [key, key + "x"]
+    assert shm.list_keys(key + "/", recurse=8)[0] == childs[1:]
+
+    shm.delete(key)
+    assert shm.get(childs[1])[0] == "1"
+    shm.delete(key, recursive=True, must_exist=False)
+    for child in childs:
+        assert shm.get(child)[0] is None
+    assert shm.get(key + "x")[0] == "keep!"
+
+
+def test_transaction(shm):
+    # pylint: disable=undefined-loop-variable
+    key = PREFIX + "/test_txn"
+    key2 = key + "/2"
+
+    shm.create(key, "1")
+    for i, txn in enumerate(shm.txn()):
+        v = txn.get(key)
+        if i < 3:
+            shm.update(key, str(int(v) + 1))
+        txn.create(key2, v)
+    assert i == 3
+    assert shm.get(key2)[0] == "4"
+
+    # Reads see the database as it was at the first read, so
+    # read-only transactions always see a consistent state
+    for i, txn in enumerate(shm.txn()):
+        txn.get(key)
+        if i == 0:
+            shm.update(key2, "x")
+        assert txn.get(key2) == "4"
+    assert i == 0
+
+    # Changes made meanwhile make the commit fail instead of the
+    # transaction body
+    seq = PREFIX + "/test_txn_seq/"
+    for i, txn in enumerate(shm.txn()):
+        child = seq + str(len(txn.list_keys(seq)))
+        if i == 0:
+            shm.create(child, "other")
+        assert txn.get(child) is None
+        txn.create(child, "mine")
+    assert i == 1
+    assert shm.get(seq + "1")[0] == "mine"
+
+    # Listings get validated as well
+    for i, txn in enumerate(shm.txn()):
+        keys = txn.list_keys(key + "/")
+        if i == 0:
+            shm.create(key + "/3", "")
+        txn.create(key + "/4", len(keys))
+    assert i == 1
+    assert shm.get(key + "/4")[0] == "2"
+
+
+@pytest.mark.timeout(5)
+def test_watch(shm):
+    key = PREFIX + "/test_watch"
+
+    with shm.watch(key + "/", prefix=True) as watch:
+        shm.create(key + "/a", "bla")
+        shm.update(key + "/a", "bla2")
+        shm.create(key + "/b/c", "ignored")
+        shm.delete(key + "/a")
+
+        assert watch.get()[0:2] == (key + "/a", "bla")
+        assert watch.get()[0:2] == (key + "/a", "bla2")
+        assert watch.get()[0:2] == (key + "/a", None)
+
+
+@pytest.mark.timeout(5)
+def test_transaction_wait(shm):
+    key = PREFIX + "/test_txn_wait"
+    shm.create(key, "0")
+
+    def update():
+        for j in range(1, 5):
+            time.sleep(0.01)
+            shm.update(key, str(j))
+
+    values_seen = []
+    for i, txn in enumerate(shm.txn()):
+        values_seen.append(txn.get(key))
+        if i == 0:
+            threading.Thread(target=update).start()
+        if values_seen[-1] != "4":
+            txn.loop(watch=True)
+    assert values_seen[0] == "0"
+    assert values_seen[-1] == "4"
+
+
+def test_lease(shm):
+    key = PREFIX + "/test_lease"
+    with shm.lease(ttl=5) as lease:
+        shm.create(key, "blub", lease=lease)
+        assert lease.alive()
+    assert shm.get(key)[0] is None
+
+    lease = shm.lease(ttl=0.1)
+    lease.grant()
+    shm.create(key, "blub", lease=lease)
+    time.sleep(0.2)
+    assert not lease.alive()
+    assert shm.get(key)[0] is None
+
+
+def _child_process(path, key):
+    with SharedMemoryBackend(path) as backend:
+        value = backend.get(key)[0]
+        for txn in backend.txn():
+            txn.update(key, value + "!")
+
+
+@pytest.mark.timeout(20)
+def test_multi_process(shm, shm_path):
+    key = PREFIX + "/test_multi_process"
+    shm.create(key, "hello")
+
+    with shm.watch(key) as watch:
+        proc = multiprocessing.get_context("spawn").Process(
+            target=_child_process, args=(shm_path, key)
+        )
+        proc.start()
+        proc.join()
+        assert proc.exitcode == 0
+        assert watch.get()[0:2] == (key, "hello!")
+    assert shm.get(key)[0] == "hello!"
+
+
+def test_compaction(shm_path):
+    key = PREFIX + "/test_compaction"
+    with SharedMemoryBackend(shm_path, size=64 * 1024) as shm, SharedMemoryBackend(
+        shm_path
+    ) as other:
+        for i in range(2000):
+            shm.create(key + "/" + str(i % 100), "x" * i)
+            shm.delete(key + "/" + str(i % 100))
+            if i % 300 == 0:
+                assert other.get(key + "/" + str(i % 100))[0] is None
+        for i in range(1000):
+            shm.create(key + "/" + str(i), str(i))
+        assert len(other.list_keys(key + "/")[0]) == 1000
+        assert other.get(key + "/999")[0] == "999"
+
+
+def test_config(shm_path):
+    with Config(backend="shm", path=shm_path) as cfg:
+        for txn in cfg.txn():
+            txn.create_master({"state": "on"})
+        for txn in cfg.txn():
+            assert txn.get_master()["state"] == "on"
@@ -0,0 +1,289 @@
+"""Tests for the SQLite backend."""
+
+# pylint: disable=missing-docstring,redefined-outer-name,invalid-name
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from ska_sdp_config import Config
+from ska_sdp_config.backend import (
+    ConfigCollision,
+    ConfigTimeout,
+    ConfigVanished,
+    SQLiteBackend,
+)
+
+PREFIX = "/__test"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "config.db")
+
+
+@pytest.fixture
+def sqlite(db_path):
+    with SQLiteBackend(db_path, poll_interval=0.005) as backend:
+        yield backend
+
+
+def test_create(sqlite):
+    key = PREFIX + "/test_create"
+
+    sqlite.create(key, "foo")
+    with pytest.raises(ConfigCollision):
+        sqlite.create(key, "foo")
+
+    v, ver = sqlite.get(key)
+    assert v == "foo"
+
+    sqlite.update(key, "bar", must_be_rev=ver)
+    v2, ver2 = sqlite.get(key)
+    assert v2 == "bar"
+    assert ver2.revision > ver.revision
+    assert ver2.mod_revision == ver.mod_revision + 1
+
+    with pytest.raises(ConfigVanished):
+        sqlite.update(key, "baz", must_be_rev=ver)
+    assert sqlite.get(key)[0] == "bar"
+
+    sqlite.delete(key)
+    with pytest.raises(ConfigVanished):
+        sqlite.delete(key)
+    with pytest.raises(ValueError, match="trailing"):
+        sqlite.get(key + "/")
+
+
+def test_list_delete(sqlite):
+    key = PREFIX + "/test_delete"
+
+    childs = ["/".join([key] + n * ["x"]) for n in range(10)]
+    for n, child in enumerate(childs):
+        sqlite.create(child, n)
+    sqlite.create(key + "x", "keep!")
+
+    assert sqlite.list_keys(PREFIX + "/")[0] == [key, key + "x"]
+    assert sqlite.list_keys(key + "/", recurse=8)[0] == childs[1:]
+
+    sqlite.delete(key)
+    assert sqlite.get(childs[1])[0] == "1"
+    sqlite.delete(key, recursive=True, must_exist=False)
+    for child in childs:
+        assert sqlite.get(child)[0] is None
+    assert sqlite.get(key + "x")[0] == "keep!"
+
+
+def test_transaction(sqlite):
+    # pylint: disable=undefined-loop-variable
+    key = PREFIX + "/test_txn"
+    key2 = key + "/2"
+
+    sqlite.create(key, "1")
+    for i, txn in enumerate(sqlite.txn()):
+        v = txn.get(key)
+        if i < 3:
+            sqlite.update(key, str(int(v) + 1))
+        txn.create(key2, v)
+    assert i == 3
+    assert sqlite.get(key2)[0] == "4"
+
+    # Reads see the database as it was at the first read, so
+    # read-only transactions always see a consistent state
+    for i, txn in enumerate(sqlite.txn()):
+        txn.get(key)
+        if i == 0:
+            sqlite.update(key2, "x")
+        assert txn.get(key2) == "4"
+    assert i == 0
+    sqlite.update(key2, "4")
+
+    # Changes made meanwhile make the commit fail instead of the
+    # transaction body
+    seq = PREFIX + "/test_txn_seq/"
+    for i, txn in enumerate(sqlite.txn()):
+        child = seq + str(len(txn.list_keys(seq)))
+        if i == 0:
+            sqlite.create(child, "other")
+        assert txn.get(child) is None
+        txn.create(child, "mine")
+    assert i == 1
+    assert sqlite.get(seq + "1")[0] == "mine"
+
+    # Listings get validated as well
+    for i, txn in enumerate(sqlite.txn()):
+        keys = txn.list_keys(key + "/")
+        if i == 0:
+            sqlite.create(key + "/3", "")
+        txn.create(key + "/4", len(keys))
+    assert i == 1
+    assert sqlite.get(key + "/4")[0] == "2"
+
+    for txn in sqlite.txn():
+        assert txn.list_values(key + "/") == [
+            (key + "/2", "4"),
+            (key + "/3", ""),
+            (key + "/4", "2"),
+        ]
+        assert list(txn.iter_values(key + "/")) == txn.list_values(key + "/")
+
+
+def test_persistence(db_path):
+    key = PREFIX + "/test_persistence"
+    with SQLiteBackend(db_path) as sqlite:
+        sqlite.create(key, "durable")
+        revision = sqlite.get(key)[1].revision
+    with SQLiteBackend(db_path) as sqlite:
+        value, ver = sqlite.get(key)
+        assert value == "durable"
+        assert ver.revision == revision
+
+
+@pytest.mark.timeout(5)
+def test_watch(sqlite):
+    key = PREFIX + "/test_watch"
+
+    with sqlite.watch(key + "/", prefix=True) as watch:
+        sqlite.create(key + "/a", "bla")
+        sqlite.update(key + "/a", "bla2")
+        sqlite.create(key + "/b/c", "ignored")
+        sqlite.delete(key + "/a")
+
+        assert watch.get()[0:2] == (key + "/a", "bla")
+        assert watch.get()[0:2] == (key + "/a", "bla2")
+        assert watch.get()[0:2] == (key + "/a", None)
+
+
+@pytest.mark.timeout(5)
+@pytest.mark.timeout(10)
+def test_watch_history_pruned(db_path):
+    key = PREFIX + "/test_watch_pruned"
+    with SQLiteBackend(db_path, poll_interval=2) as slow, SQLiteBackend(
+        db_path, history=10
+    ) as writer:
+        with slow.watch(key) as watch:
+            # Once a change got picked up, the next poll is a while off
+            writer.create(key, "")
+            assert watch.get(timeout=5)[0] == key
+            writer.delete(key)
+
+            # Fall behind by more than the history of the writer
+            for i in range(200):
+                writer.create(key, str(i))
+                writer.delete(key)
+            assert watch.get(timeout=5) == (None, None, None)
+            assert watch.get(timeout=1)[0] == key
+
+
+def test_transaction_deadline(sqlite):
+    key = PREFIX + "/test_txn_deadline"
+    sqlite.create(key, "0")
+
+    # Give up retrying once the deadline passed
+    with pytest.raises(ConfigTimeout, match="deadline"):
+        deadline = time.time() + 0.2
+        for i, txn in enumerate(sqlite.txn(max_retries=10**6, deadline=deadline)):
+            value = txn.get(key)
+            sqlite.update(key, str(i))
+            txn.update(key, value + "x")
+
+    # Waiting for changes stops at the deadline, too
+    start = time.time()
+    with pytest.raises(ConfigTimeout):
+        for txn in sqlite.txn(deadline=time.time() + 0.2):
+            txn.get(key)
+            txn.loop(watch=True)
+    with pytest.raises(ConfigTimeout, match="Watcher"):
+        for watcher in sqlite.watcher(deadline=time.time() + 0.2):
+            for txn in watcher.txn():
+                txn.get(key)
+    assert time.time() - start < 1
+
+
+@pytest.mark.timeout(5)
+def test_transaction_wait(sqlite):
+    key = PREFIX + "/test_txn_wait"
+    sqlite.create(key, "0")
+
+    def update():
+        for j in range(1, 5):
+            time.sleep(0.01)
+            sqlite.update(key, str(j))
+
+    values_seen = []
+    for i, txn in enumerate(sqlite.txn()):
+        values_seen.append(txn.get(key))
+        if i == 0:
+            threading.Thread(target=update).start()
+        if values_seen[-1] != "4":
+            txn.loop(watch=True)
+    assert values_seen[0] == "0"
+    assert values_seen[-1] == "4"
+
+
+def test_lease(sqlite):
+    key = PREFIX + "/test_lease"
+    with sqlite.lease(ttl=5) as lease:
+        sqlite.create(key, "blub", lease=lease)
+        assert lease.alive()
+    assert sqlite.get(key)[0] is None
+
+    lease = sqlite.lease(ttl=0.1)
+    lease.grant()
+    sqlite.create(key, "blub", lease=lease)
+    time.sleep(0.2)
+    assert not lease.alive()
+    assert sqlite.get(key)[0] is None
+
+
+def _child_process(path, key):
+    with SQLiteBackend(path) as backend:
+        for _ in range(50):
+            for txn in backend.txn():
+                txn.update(key, int(txn.get(key)) + 1)
+
+
+@pytest.mark.timeout(30)
+def test_multi_process(sqlite, db_path):
+    key = PREFIX + "/test_multi_process"
+    sqlite.create(key, "0")
+
+    procs = [
+        multiprocessing.get_context("spawn").Process(
+            target=_child_process, args=(db_path, key)
+        )
+        for _ in range(3)
+    ]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+    assert sqlite.get(key)[0] == "150"
+
+
+def test_config(db_path):
+    with Config(backend="sqlite", path=db_path) as cfg:
+        for txn in cfg.txn():
+            txn.create_master({"state": "on"})
+        for txn in cfg.txn():
+            assert txn.get_master()["state"] == "on"
+
+
+def test_config_time_limit(db_path):
+    with Config(backend="sqlite", path=db_path) as cfg:
+        for txn in cfg.txn(timeout=1.0):
+            txn.create_master({"state": "on"})
+        with cfg.time_limit(0.2):
+            # Direct backend requests are bounded as well
+            cfg.backend.get(PREFIX)
+            time.sleep(0.2)
+            with pytest.raises(ConfigTimeout):
+                cfg.backend.get(PREFIX)
+            with pytest.raises(ConfigTimeout):
+                for txn in cfg.txn(timeout=10):
+                    txn.get_master()
+        for txn in cfg.txn(timeout=1.0):
+            assert txn.get_master()["state"] == "on"
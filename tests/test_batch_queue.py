@@ -0,0 +1,92 @@
+"""Tests for the batch processing queue."""
+
+# pylint: disable=missing-docstring
+
+import threading
+
+import pytest
+
+from ska_sdp_config import ProcessingBlock
+from ska_sdp_config.backend import MemoryBackend
+
+PREFIX = "/__test_queue"
+WORKFLOW = {"type": "batch", "id": "test_batch", "version": "0.0.1"}
+
+
+def _enqueue(config, pb_ids, priority=0):
+    queue = config.batch_queue()
+    for txn in config.txn():
+        for pb_id in pb_ids:
+            txn.create_processing_block(ProcessingBlock(pb_id, None, WORKFLOW))
+            queue.put(txn, pb_id, priority)
+
+
+def test_list_created(cfg):
+    line = PREFIX + "/line/"
+    for key in ["c", "a", "b"]:
+        for txn in cfg.txn():
+            txn.raw.create(line + key, key)
+    for txn in cfg.txn():
+        assert txn.raw.list_created(line) == [line + "c", line + "a", line + "b"]
+        assert txn.raw.list_created(line, limit=1) == [line + "c"]
+
+        # Changes made by the transaction come last
+        txn.raw.delete(line + "c")
+        txn.raw.create(line + "0", "0")
+        assert txn.raw.list_created(line) == [line + "a", line + "b", line + "0"]
+
+
+def test_queue_order(cfg):
+    queue = cfg.batch_queue()
+    _enqueue(cfg, ["pb-low-1", "pb-low-2"], priority=1)
+    _enqueue(cfg, ["pb-high"], priority=5)
+    _enqueue(cfg, ["pb-low-3"], priority=1)
+    with pytest.raises(ValueError, match="Priority"):
+        for txn in cfg.txn():
+            queue.put(txn, "pb-x", priority=-1)
+
+    for txn in cfg.txn():
+        assert queue.list(txn) == ["pb-high", "pb-low-1", "pb-low-2", "pb-low-3"]
+
+    with cfg.lease() as lease:
+        # Processing blocks that were taken in the meantime get dropped
+        for txn in cfg.txn():
+            txn.take_processing_block("pb-low-1", lease)
+        for txn in cfg.txn():
+            assert queue.claim_next(txn, lease) == "pb-high"
+            assert txn.get_processing_block_owner("pb-high") == cfg.owner
+        assert queue.claim(lease) == "pb-low-2"
+        assert queue.claim(lease, timeout=1) == "pb-low-3"
+        assert queue.claim(lease, timeout=0.1) is None
+        for txn in cfg.txn():
+            assert not txn.raw.list_keys(queue.path + "waiter/")
+
+
+@pytest.mark.timeout(60)
+def test_queue_workers(cfg):
+    if isinstance(cfg.backend, MemoryBackend):
+        pytest.skip("Memory backend transactions are not isolated")
+    queue = cfg.batch_queue()
+    claimed = []
+
+    def worker():
+        with cfg.lease() as lease:
+            while True:
+                pb_id = queue.claim(lease, timeout=2)
+                if pb_id is None:
+                    return
+                claimed.append(pb_id)
+
+    # Workers wait in line for processing blocks to arrive
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    pb_ids = ["pb-work-{:02d}".format(i) for i in range(20)]
+    for i in range(0, len(pb_ids), 5):
+        _enqueue(cfg, pb_ids[i : i + 5])
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == pb_ids
+    for txn in cfg.txn():
+        assert queue.list(txn) == []
@@ -0,0 +1,80 @@
+"""Tests for the processing block dependency graph."""
+
+# pylint: disable=missing-docstring
+
+import threading
+
+import pytest
+
+from ska_sdp_config import Config, ProcessingBlock
+from ska_sdp_config.dependencies import DependencyGraph
+
+WORKFLOW = {"type": "batch", "id": "test_batch", "version": "0.0.1"}
+
+
+def test_graph():
+    graph = DependencyGraph()
+    resolved = []
+    graph.add_callback(resolved.append)
+
+    graph.set_processing_block("pb-a", [])
+    graph.set_processing_block("pb-b", [{"pb_id": "pb-a", "kind": ["data"]}])
+    graph.set_processing_block("pb-c", [{"pblockId": "pb-a"}, "pb-b"])
+    graph.set_processing_block("pb-d", ["pb-missing"])
+    assert graph.topological_order() == ["pb-a", "pb-b", "pb-c", "pb-d"]
+    assert graph.dependents("pb-a") == {"pb-b", "pb-c"}
+    assert graph.ready() == {"pb-a"}
+    assert resolved == ["pb-a"]
+
+    graph.set_state("pb-a", {"state": "RUNNING"})
+    assert graph.ready() == set()
+    graph.set_state("pb-a", {"state": "FINISHED"})
+    assert resolved == ["pb-a", "pb-b"]
+    assert graph.ready() == {"pb-b"}
+    assert not graph.is_resolved("pb-c")
+
+    graph.set_state("pb-b", {"state": "FAILED"})
+    assert resolved == ["pb-a", "pb-b", "pb-c"]
+    assert graph.ready() == {"pb-c"}
+
+    # Processing blocks added with finished dependencies are resolved
+    graph.set_processing_block("pb-e", ["pb-a", "pb-b"])
+    assert resolved[-1] == "pb-e"
+    graph.set_processing_block("pb-e", None)
+
+    # Dependencies can change, and processing blocks vanish
+    graph.set_processing_block("pb-b", None)
+    assert "pb-b" not in graph
+    assert graph.is_resolved("pb-c")
+    graph.set_processing_block("pb-a", ["pb-c"])
+    with pytest.raises(ValueError, match="cyclic"):
+        graph.topological_order()
+    graph.set_processing_block("pb-a", [])
+    assert graph.topological_order() == ["pb-a", "pb-c", "pb-d"]
+    assert resolved[-1] == "pb-a"
+
+
+def test_config_dependency_graph():
+    with Config(backend="memory", global_prefix="/__test_deps") as config:
+        for txn in config.txn():
+            txn.create_processing_block(ProcessingBlock("pb-x", None, WORKFLOW))
+            txn.create_processing_block(
+                ProcessingBlock("pb-y", None, WORKFLOW, dependencies=["pb-x"])
+            )
+
+        with config.dependency_graph() as graph:
+            assert graph.topological_order() == ["pb-x", "pb-y"]
+            assert graph.ready() == {"pb-x"}
+
+            resolved = threading.Event()
+            graph.add_callback(lambda pb_id: resolved.set())
+            for txn in config.txn():
+                txn.create_processing_block_state("pb-x", {"state": "FINISHED"})
+            assert resolved.wait(timeout=5)
+            assert graph.ready() == {"pb-y"}
+
+            for txn in config.txn():
+                loaded = DependencyGraph().load(txn)
+            assert loaded.ready() == {"pb-y"}
+
+        config.backend.delete("/__test_deps", must_exist=False, recursive=True)
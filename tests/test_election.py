@@ -0,0 +1,82 @@
+"""Tests for leader election."""
+
+# pylint: disable=missing-docstring,protected-access
+
+import threading
+
+import pytest
+
+from ska_sdp_config.backend import MemoryBackend
+from ska_sdp_config.election import Election
+
+PREFIX = "/__test_election"
+
+
+@pytest.mark.timeout(60)
+def test_election(cfg):
+    first = cfg.election("test")
+    second = cfg.election("test")
+    third = cfg.election("test")
+    observer = cfg.election("test")
+
+    with cfg.lease() as lease_1, cfg.lease() as lease_2:
+        assert first.campaign(lease_1, {"name": "first"})
+        assert third.campaign(lease_2, {"name": "third"}, timeout=0.1) is False
+        elected = second.campaign_async(lease_2, {"name": "second"})
+        assert not elected.done()
+        for txn in cfg.txn():
+            assert first.is_leader(txn)
+            assert not second.is_leader(txn)
+            assert observer.leader(txn) == {"name": "first"}
+
+        # Standby takes over once the leader resigns
+        first.resign()
+        assert elected.result(timeout=5)
+        for txn in cfg.txn():
+            assert not first.is_leader(txn)
+            assert second.is_leader(txn)
+            assert observer.leader(txn) == {"name": "second"}
+
+        # Resigning stops campaigning
+        standby = first.campaign_async(lease_1)
+        assert not standby.done()
+        first.resign()
+        assert standby.result(timeout=5) is False
+
+    # Leadership ends with the lease
+    for txn in cfg.txn():
+        assert not second.is_leader(txn)
+        assert observer.leader(txn) is None
+
+
+@pytest.mark.timeout(60)
+def test_election_async_joins_once(cfg, monkeypatch):
+    # Background campaigns must not get in line again, as they would
+    # after resigning
+    joined = []
+    join = Election._join
+
+    def _join(self, lease, value):
+        joined.append(threading.current_thread())
+        join(self, lease, value)
+
+    monkeypatch.setattr(Election, "_join", _join)
+    candidate = cfg.election("test")
+    with cfg.lease() as lease:
+        assert candidate.campaign_async(lease).result(timeout=5)
+        candidate.resign()
+    assert joined == [threading.current_thread()]
+
+
+@pytest.mark.timeout(60)
+def test_election_observe(cfg):
+    if isinstance(cfg.backend, MemoryBackend):
+        pytest.skip("Memory backend watchers do not wait")
+    candidate = cfg.election("test")
+    leaders = cfg.election("test").observe(timeout=5)
+    assert next(leaders) is None
+    with cfg.lease() as lease:
+        assert candidate.campaign(lease, {"name": "candidate"})
+        assert next(leaders) == {"name": "candidate"}
+        candidate.resign()
+        assert next(leaders) is None
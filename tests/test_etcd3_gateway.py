@@ -0,0 +1,138 @@
+"""Tests for the etcd v3 gateway stand-in."""
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+import base64
+import time
+
+import pytest
+
+from ska_sdp_config.backend import ConfigCollision, ConfigVanished, Etcd3Backend
+from ska_sdp_config.testing.etcd3_gateway import Etcd3Gateway, Etcd3Store, GatewayError
+
+PREFIX = "/__test_gateway"
+
+
+def _b64(text):
+    return base64.b64encode(text.encode()).decode()
+
+
+@pytest.fixture(scope="module")
+def gateway():
+    with Etcd3Gateway() as gateway:
+        yield gateway
+
+
+@pytest.fixture
+def etcd3(gateway):
+    with Etcd3Backend(host=gateway.host, port=gateway.port) as etcd3:
+        yield etcd3
+        etcd3.delete(PREFIX, must_exist=False, recursive=True)
+
+
+def test_store_revisions():
+    store = Etcd3Store()
+    store.put({"key": _b64("a"), "value": _b64("1")})
+    store.put({"key": _b64("a"), "value": _b64("2")})
+    assert store.revision == 3
+
+    # Reads at earlier revisions see earlier values
+    old = store.range({"key": _b64("a"), "revision": "2"})
+    assert old["kvs"][0]["value"] == _b64("1")
+    assert old["kvs"][0]["version"] == "1"
+    new = store.range({"key": _b64("a")})
+    assert new["kvs"][0]["value"] == _b64("2")
+    assert new["kvs"][0]["create_revision"] == "2"
+
+    # Transactions only apply if their compares hold
+    compare = {"key": _b64("a"), "target": "MOD", "mod_revision": "2"}
+    put = {"request_put": {"key": _b64("a"), "value": _b64("3")}}
+    assert "succeeded" not in store.txn({"compare": [compare], "success": [put]})
+    compare["mod_revision"] = "3"
+    assert store.txn({"compare": [compare], "success": [put]})["succeeded"]
+
+    store.compact({"revision": "3"})
+    with pytest.raises(GatewayError, match="compacted"):
+        store.range({"key": _b64("a"), "revision": "2"})
+    with pytest.raises(GatewayError, match="future"):
+        store.range({"key": _b64("a"), "revision": "10"})
+
+
+def test_lease_expiry(gateway, etcd3):
+    key = PREFIX + "/lease"
+    with etcd3.lease(ttl=5) as lease:
+        etcd3.create(key, "y", lease=lease)
+        assert etcd3.get(key)[0] == "y"
+    # Revoked at the end of the block, which deletes the key
+    assert etcd3.get(key)[0] is None
+
+    # Expires once its time to live ran out
+    lease = gateway.store.lease_grant({"TTL": 1})
+    gateway.store.put({"key": _b64("lease"), "value": _b64("x"), "lease": lease["ID"]})
+    assert gateway.store.range({"key": _b64("lease")}).get("kvs")
+    time.sleep(1.5)
+    assert not gateway.store.range({"key": _b64("lease")}).get("kvs")
+
+
+def test_backend(etcd3):
+    key = PREFIX + "/key"
+    etcd3.create(key, "foo")
+    with pytest.raises(ConfigCollision):
+        etcd3.create(key, "foo")
+    assert etcd3.get(key)[0] == "foo"
+
+    # A conflicting update repeats the transaction
+    attempts = 0
+    for txn in etcd3.txn():
+        attempts += 1
+        value = txn.get(key)
+        if attempts == 1:
+            etcd3.update(key, "bar")
+        txn.update(key, value + "!")
+    assert attempts == 2
+    assert etcd3.get(key)[0] == "bar!"
+
+    etcd3.delete(key)
+    with pytest.raises(ConfigVanished):
+        etcd3.delete(key)
+
+
+def test_watch(etcd3):
+    key = PREFIX + "/watched"
+    with etcd3.watch(key) as watch:
+        time.sleep(0.1)
+        etcd3.create(key, "a")
+        etcd3.update(key, "b")
+        etcd3.delete(key)
+        assert watch.get()[1] == "a"
+        assert watch.get()[1] == "b"
+        assert watch.get()[1] is None
+
+
+def test_round_trip_latency(etcd3):
+    # Responses are written in pieces, so without disabling Nagle's
+    # algorithm every request waits for a delayed ACK (~40 ms)
+    key = PREFIX + "/latency"
+    etcd3.create(key, "x")
+    start = time.perf_counter()
+    for _ in range(20):
+        for txn in etcd3.txn():
+            txn.get(key)
+    assert time.perf_counter() - start < 20 * 0.04
+
+
+def test_unchecked_create(etcd3):
+    # pylint: disable=undefined-loop-variable
+    # Transactions that only create keys unchecked take the revision of
+    # their commit
+    key = PREFIX + "/unchecked"
+    for txn in etcd3.txn():
+        txn.create(key, "x", check=False)
+    assert txn.revision == etcd3.get(key)[1].revision
+
+    for i, watcher in enumerate(etcd3.watcher(timeout=0.1)):
+        for txn in watcher.txn():
+            txn.create("{}{}".format(key, i), "x", check=False)
+        if i == 1:
+            break
+    assert etcd3.get(key + "1")[0] == "x"
@@ -0,0 +1,86 @@
+"""Tests for explaining transactions."""
+
+# pylint: disable=missing-docstring
+
+import os
+
+import pytest
+
+from ska_sdp_config import Config
+from ska_sdp_config.config import dict_to_json
+
+PREFIX = "/__test_explain"
+
+
+def test_explain_local(tmp_path):
+    with pytest.raises(ValueError, match="explain"):
+        with Config(backend="memory") as config:
+            with config.explain():
+                pass
+
+    with Config(backend="sqlite", path=str(tmp_path / "config.db")) as config:
+        for txn in config.txn():
+            txn.create_master({"state": "on"})
+
+        with config.explain() as reports:
+            for txn in config.txn():
+                txn.get_master()
+            for txn in config.txn():
+                txn.raw.list_keys("/pb/")
+                txn.update_master({"state": "off"})
+                txn.raw.create("/new", "value")
+
+        # Nothing got committed
+        for txn in config.txn():
+            assert txn.get_master() == {"state": "on"}
+            assert txn.raw.get("/new") is None
+
+    assert len(reports) == 2
+    readonly, update = reports[0], reports[1]
+    master_on = len(dict_to_json({"state": "on"}))
+    master_off = len(dict_to_json({"state": "off"}))
+    assert readonly.reads == [("get", "/master", 1, master_on)]
+    assert readonly.summary() == {
+        "requests": 1,
+        "reads": 1,
+        "bytes_read": master_on,
+        "compares": 0,
+        "writes": 0,
+        "bytes_written": 0,
+        "over_limit": {},
+    }
+    assert [read[0] for read in update.reads] == ["list_keys", "get", "get"]
+    assert update.writes == [("put", "/master", master_off), ("put", "/new", 5)]
+    assert update.bytes_read == master_on
+    assert update.bytes_written == master_off + 5
+    assert update.compares == 3
+    assert update.requests == 4
+
+
+def test_explain_etcd3():
+    host = os.getenv("SDP_TEST_HOST", "127.0.0.1")
+    with Config(backend="etcd3", global_prefix=PREFIX, host=host) as config:
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+        for txn in config.txn():
+            for i in range(5):
+                txn.raw.create(PREFIX + "/key/{}".format(i), "value")
+
+        with config.explain() as reports:
+            for txn in config.txn():
+                values = txn.raw.list_values(PREFIX + "/key/")
+                for i in range(200):
+                    txn.raw.update(PREFIX + "/key/{}".format(i % 5), str(i))
+                    txn.raw.create(PREFIX + "/other/{}".format(i), "value")
+        for txn in config.txn():
+            assert txn.raw.list_keys(PREFIX + "/other/") == []
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+
+    assert len(reports) == 1
+    report = reports[0]
+    assert len(values) == 5
+    assert report.reads[0] == ("list_values", PREFIX + "/key/", 1, 5 * 5)
+    assert len(report.reads) == 201
+    assert report.requests == 202
+    assert len(report.writes) == 205
+    assert report.compares == 5 + 2 + 200
+    assert report.over_limit == {"compares": 207, "writes": 205}
@@ -0,0 +1,98 @@
+"""Tests for the etcd3 backend through the fault-injecting proxy."""
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+import threading
+import time
+
+import pytest
+
+from ska_sdp_config import Config, ConfigTimeout
+from ska_sdp_config.testing.etcd3_gateway import Etcd3Gateway
+from ska_sdp_config.testing.fault_proxy import FaultProxy
+
+PREFIX = "/__test_proxy"
+
+
+@pytest.fixture(scope="module")
+def gateway():
+    with Etcd3Gateway() as gateway:
+        yield gateway
+
+
+@pytest.fixture
+def proxy(gateway):
+    with FaultProxy(gateway.host, gateway.port) as proxy:
+        yield proxy
+
+
+@pytest.fixture
+def cfg(proxy):
+    with Config(backend="etcd3", host=proxy.host, port=proxy.port) as config:
+        yield config
+        proxy.resume()
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+
+
+def _timed_get(config, path):
+    start = time.perf_counter()
+    for txn in config.txn():
+        txn.raw.get(path)
+    return time.perf_counter() - start
+
+
+def test_latency(cfg, proxy):
+    proxy.latency = 0.025
+    assert _timed_get(cfg, PREFIX + "/key") >= 0.05
+    proxy.latency = 0
+    assert _timed_get(cfg, PREFIX + "/key") < 0.05
+
+
+def test_bandwidth(cfg, proxy):
+    for txn in cfg.txn():
+        txn.raw.create(PREFIX + "/large", "x" * 100000)
+    # Values are encoded as base64, so this is more than 100 kB
+    proxy.bandwidth = 1e6
+    assert _timed_get(cfg, PREFIX + "/large") >= 0.1
+
+
+@pytest.mark.timeout(10)
+def test_stall(cfg, proxy):
+    proxy.stall()
+    with pytest.raises(ConfigTimeout):
+        for txn in cfg.txn(timeout=0.2):
+            txn.raw.get(PREFIX + "/key")
+
+    done = threading.Event()
+
+    def get():
+        for txn in cfg.txn():
+            txn.raw.get(PREFIX + "/key")
+        done.set()
+
+    thread = threading.Thread(target=get)
+    thread.start()
+    assert not done.wait(0.2)
+    proxy.resume()
+    assert done.wait(2)
+    thread.join()
+
+    proxy.stall(0.1)
+    assert _timed_get(cfg, PREFIX + "/key") >= 0.1
+
+
+@pytest.mark.timeout(10)
+def test_reset(cfg, proxy):
+    key = PREFIX + "/watched"
+    with cfg.backend.watch(key) as queue:
+        time.sleep(0.1)
+        for txn in cfg.txn():
+            txn.raw.create(key, "a")
+        assert queue.get(timeout=2)[1] == "a"
+
+        # The watch reconnects and resumes from the last revision seen
+        assert proxy.reset() >= 2
+        for txn in cfg.txn():
+            txn.raw.update(key, "b")
+        assert queue.get(timeout=2)[1] == "b"
+    assert proxy.accepted >= 4
@@ -0,0 +1,80 @@
+"""Tests for locks and semaphores."""
+
+# pylint: disable=missing-docstring
+
+import threading
+import time
+
+import pytest
+
+from ska_sdp_config.backend import MemoryBackend
+
+PREFIX = "/__test_locks"
+
+
+def test_lock(cfg):
+    lock = cfg.lock("test")
+    other = cfg.lock("test")
+    with lock:
+        assert lock.held
+        with pytest.raises(RuntimeError, match="held already"):
+            lock.acquire()
+        assert not other.acquire(timeout=0.1)
+        assert not other.held
+        for txn in cfg.txn():
+            assert lock.holders(txn) == [cfg.owner]
+    assert not lock.held
+    with pytest.raises(RuntimeError, match="not held"):
+        lock.release()
+
+    with cfg.lease() as lease:
+        assert other.acquire(lease, timeout=1)
+    # Released with the lease
+    assert lock.acquire(timeout=1)
+    lock.release()
+    for txn in cfg.txn():
+        assert not txn.raw.list_keys(lock.path + "holder/")
+
+
+def test_lock_create_order(cfg):
+    # Keys are in line by create revision, not by name
+    lock = cfg.lock("test")
+    stale = lock.path + "holder/~"
+    for txn in cfg.txn():
+        txn.raw.create(stale, "{}")
+    assert not lock.acquire(timeout=0.1)
+    for txn in cfg.txn():
+        txn.raw.delete(stale)
+    assert lock.acquire(timeout=1)
+    lock.release()
+
+
+@pytest.mark.timeout(60)
+def test_semaphore_threads(cfg):
+    if isinstance(cfg.backend, MemoryBackend):
+        pytest.skip("Memory backend transactions are not isolated")
+    with pytest.raises(ValueError, match="Limit"):
+        cfg.semaphore("test", 0)
+
+    active = []
+    peak = []
+    guard = threading.Lock()
+
+    def worker():
+        semaphore = cfg.semaphore("test", 2)
+        for _ in range(3):
+            with semaphore:
+                with guard:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.01)
+                with guard:
+                    active.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(peak) == 15
+    assert max(peak) <= 2
@@ -0,0 +1,151 @@
+"""Tests for request metrics."""
+
+# pylint: disable=missing-docstring
+
+import os
+import urllib.request
+
+import pytest
+
+from ska_sdp_config import Config
+from ska_sdp_config.backend.metrics import MetricsRegistry
+
+PREFIX = "/__test_metrics"
+
+
+def test_exposition():
+    registry = MetricsRegistry()
+    counter = registry.counter("things", "Number of things", ("kind",))
+    counter.inc("a")
+    counter.inc("b", amount=2.5)
+    histogram = registry.histogram("wait_seconds", "Waits", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert counter.get("b") == 2.5
+    assert histogram.count() == 3
+    assert histogram.sum() == pytest.approx(5.55)
+    assert registry.summary()["things"] == 3.5
+    text = registry.exposition()
+    assert "# TYPE ska_sdp_config_things counter\n" in text
+    assert 'ska_sdp_config_things_total{kind="a"} 1\n' in text
+    assert 'ska_sdp_config_things_total{kind="b"} 2.5\n' in text
+    assert "# TYPE ska_sdp_config_wait_seconds histogram\n" in text
+    assert 'ska_sdp_config_wait_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'ska_sdp_config_wait_seconds_bucket{le="1"} 2\n' in text
+    assert 'ska_sdp_config_wait_seconds_bucket{le="+Inf"} 3\n' in text
+    assert "ska_sdp_config_wait_seconds_count 3\n" in text
+
+
+def test_local_metrics(tmp_path):
+    with pytest.raises(ValueError, match="metrics"):
+        Config(backend="memory", metrics=True)
+
+    registry = MetricsRegistry()
+    path = str(tmp_path / "config.db")
+    with Config(backend="sqlite", path=path, metrics=registry) as config:
+        assert config.metrics is registry
+        for txn in config.txn():
+            txn.create_master({"state": "on"})
+        config.backend.create("/key", "value")
+
+        # Conflicting transaction gets retried
+        for i, txn in enumerate(config.txn()):
+            txn.get_master()
+            if i == 0:
+                config.backend.update("/master", "{}")
+            txn.update_master({"state": "off"})
+
+        for i, watcher in enumerate(config.watcher(timeout=0.01)):
+            for txn in watcher.txn():
+                txn.get_master()
+            if i == 1:
+                break
+
+    # Direct updates and watcher transactions get committed as well
+    assert registry.commits.count("success") == 6
+    assert registry.commits.count("conflict") == 1
+    assert registry.retries.get() == 1
+    assert registry.operations.count("create") == 1
+    assert registry.operations.count("update") == 1
+    assert registry.watcher_wakeups.get("timeout") == 1
+
+
+def test_local_watcher_metrics(tmp_path):
+    registry = MetricsRegistry()
+    path = str(tmp_path / "config.db")
+    with Config(backend="sqlite", path=path, metrics=registry) as config:
+        config.backend.create("/key", "value")
+        for i, watcher in enumerate(config.watcher(timeout=5, name="local")):
+            for txn in watcher.txn():
+                txn.raw.get("/key")
+            if i == 1:
+                break
+            config.backend.update("/key", "changed")
+
+    assert registry.watcher_wakeups.get("change") == 1
+    assert registry.watcher_latency.count("local", "action") == 1
+
+
+def test_etcd3_metrics():
+    registry = MetricsRegistry()
+    host = os.getenv("SDP_TEST_HOST", "127.0.0.1")
+    with Config(
+        backend="etcd3", global_prefix=PREFIX, host=host, metrics=registry
+    ) as config:
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+        for txn in config.txn():
+            txn.create_master({"state": "on"})
+        for txn in config.txn():
+            assert txn.get_master()["state"] == "on"
+        gets = registry.operations.count("get")
+        assert config.backend.get(PREFIX + "/master")[0] is not None
+        assert registry.operations.count("get") == gets + 1
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+
+    assert registry.commits.count("success") == 2
+    assert registry.requests.count("/kv/range") >= 2
+    assert registry.requests.count("/kv/txn") >= 2
+    assert registry.request_bytes.get("/kv/txn") > 0
+    assert registry.response_bytes.get("/kv/range") > 0
+
+    server = registry.serve(0, "127.0.0.1")
+    try:
+        url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+        with urllib.request.urlopen(url) as response:
+            text = response.read().decode()
+    finally:
+        server.shutdown()
+    assert 'ska_sdp_config_request_duration_seconds_count{method="/kv/txn"}' in text
+
+
+def test_etcd3_watcher_metrics():
+    registry = MetricsRegistry()
+    host = os.getenv("SDP_TEST_HOST", "127.0.0.1")
+    with Config(
+        backend="etcd3", global_prefix=PREFIX, host=host, metrics=registry
+    ) as config:
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+        config.backend.create(PREFIX + "/key/a", "value")
+        for i, watcher in enumerate(config.watcher(timeout=5, name="test")):
+            assert watcher.name == "test"
+            for txn in watcher.txn():
+                keys = txn.raw.list_keys(PREFIX + "/key/")
+            if i == 0:
+                # Value changes of listed keys do not matter, new keys do
+                config.backend.update(PREFIX + "/key/a", "changed")
+                config.backend.create(PREFIX + "/key/b", "value")
+            else:
+                break
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+
+    assert keys == [PREFIX + "/key/a", PREFIX + "/key/b"]
+    assert registry.watcher_wakeups.get("change") == 1
+    assert registry.watcher_events.get("test", "filtered") == 1
+    assert registry.watcher_events.get("test", "change") == 1
+    for stage in ("queue", "action", "total"):
+        assert registry.watcher_latency.count("test", stage) == 1
+    assert registry.watcher_latency.sum(
+        "test", "total"
+    ) >= registry.watcher_latency.sum("test", "action")
@@ -152,5 +152,154 @@ def test_pblock_state(cfg):
         assert state_out == state2
 
 
+def test_pblock_all_states(cfg):
+
+    for txn in cfg.txn():
+        for i in range(3):
+            pblock = entity.ProcessingBlock("pb-all-{}".format(i), None, WORKFLOW)
+            txn.create_processing_block(pblock)
+            if i > 0:
+                txn.create_processing_block_state(pblock.id, {"state": str(i)})
+
+    with cfg.lease() as lease:
+        for txn in cfg.txn():
+            txn.take_processing_block("pb-all-2", lease)
+        for txn in cfg.txn():
+            states = txn.get_all_processing_block_states("pb-all")
+            assert states == {"pb-all-1": {"state": "1"}, "pb-all-2": {"state": "2"}}
+            assert txn.get_processing_block_state("pb-all-2") == {"state": "2"}
+            assert txn.get_all_processing_block_owners() == {"pb-all-2": cfg.owner}
+
+
+def test_pblock_indexes(cfg):
+
+    batch = {"type": "batch", "id": "test_batch", "version": "0.0.1"}
+    pblocks = [
+        entity.ProcessingBlock("pb-index-0", "sbi-index-0", WORKFLOW),
+        entity.ProcessingBlock("pb-index-1", "sbi-index-0", batch),
+        entity.ProcessingBlock("pb-index-2", "sbi-index-1", batch),
+    ]
+    for txn in cfg.txn():
+        for pblock in pblocks:
+            txn.create_processing_block(pblock)
+        txn.create_processing_block_state("pb-index-1", {"state": "RUNNING"})
+        txn.create_processing_block_state("pb-index-2", {"state": "RUNNING"})
+
+    def check():
+        for txn in cfg.txn():
+            assert txn.list_processing_blocks(sbi_id="sbi-index-0") == [
+                "pb-index-0",
+                "pb-index-1",
+            ]
+            assert txn.list_processing_blocks(workflow_type="batch") == [
+                "pb-index-1",
+                "pb-index-2",
+            ]
+            assert txn.list_processing_blocks(
+                "pb-index", sbi_id="sbi-index-0", status="RUNNING"
+            ) == ["pb-index-1"]
+            assert txn.list_processing_blocks("pb-index", status="FINISHED") == [
+                "pb-index-2"
+            ]
+            assert txn.list_processing_blocks(sbi_id="sbi-index-1") == []
+
+    # Indexes follow updates
+    for txn in cfg.txn():
+        txn.update_processing_block_state("pb-index-2", {"state": "FINISHED"})
+        pblock = entity.ProcessingBlock("pb-index-2", "sbi-index-0", batch)
+        txn.update_processing_block(pblock)
+    for txn in cfg.txn():
+        txn.delete_processing_block("pb-index-2")
+    for txn in cfg.txn():
+        assert txn.list_processing_blocks("pb-index", status="FINISHED") == []
+        txn.create_processing_block(entity.ProcessingBlock("pb-index-2", None, batch))
+        txn.create_processing_block_state("pb-index-2", {"state": "FINISHED"})
+    check()
+
+    # Rebuild indexes from scratch
+    cfg.backend.delete(PREFIX + "/index", must_exist=False, recursive=True)
+    for txn in cfg.txn():
+        assert txn.list_processing_blocks(workflow_type="batch") == []
+    assert cfg.rebuild_indexes(batch_size=2) > 0
+    check()
+    assert cfg.rebuild_indexes() == 0
+
+
+def test_pblock_delete_prefix_id(backend_cfg):
+
+    batch = {"type": "batch", "id": "test_batch", "version": "0.0.1"}
+    for txn in backend_cfg.txn():
+        for pb_id in ["pb-delete-1", "pb-delete-10"]:
+            txn.create_processing_block(
+                entity.ProcessingBlock(pb_id, "sbi-delete", batch)
+            )
+            txn.create_processing_block_state(pb_id, {"state": "RUNNING"})
+    for txn in backend_cfg.txn():
+        txn.delete_processing_block("pb-delete-1")
+
+    # The processing block whose ID starts with the deleted one stays
+    for txn in backend_cfg.txn():
+        assert txn.list_processing_blocks() == ["pb-delete-10"]
+        assert txn.get_processing_block_state("pb-delete-1") is None
+        assert txn.get_processing_block_state("pb-delete-10") == {"state": "RUNNING"}
+        assert txn.list_processing_blocks(sbi_id="sbi-delete") == ["pb-delete-10"]
+        assert txn.list_processing_blocks(status="RUNNING") == ["pb-delete-10"]
+
+
 if __name__ == "__main__":
     pytest.main()
+
+
+def test_pblock_views(cfg):
+
+    for txn in cfg.txn():
+        for i in range(3):
+            pblock = entity.ProcessingBlock("pb-view-{}".format(i), None, WORKFLOW)
+            txn.create_processing_block(pblock)
+        txn.create_processing_block_state("pb-view-1", {"state": "RUNNING"})
+        txn.create_processing_block(
+            entity.ProcessingBlock("pb-view-10", None, WORKFLOW)
+        )
+
+    with cfg.lease() as lease:
+        for txn in cfg.txn():
+            txn.take_processing_block("pb-view-1", lease)
+        for txn in cfg.txn():
+            view = txn.get_processing_block_view("pb-view-1")
+            assert view.id == "pb-view-1"
+            assert view.processing_block.id == "pb-view-1"
+            assert view.processing_block.workflow == WORKFLOW
+            assert view.state == {"state": "RUNNING"}
+            assert view.owner == cfg.owner
+            assert txn.get_processing_block_view("pb-view-3") is None
+
+            view = txn.get_processing_block_view("pb-view-0")
+            assert view.state is None and view.owner is None
+
+            views = list(txn.iter_processing_block_views("pb-view-"))
+            assert [view.id for view in views] == [
+                "pb-view-0",
+                "pb-view-1",
+                "pb-view-10",
+                "pb-view-2",
+            ]
+            assert views[1].state == {"state": "RUNNING"}
+
+
+def test_pblock_iter(cfg):
+
+    for txn in cfg.txn():
+        for i in range(5):
+            pblock = entity.ProcessingBlock("pb-iter-{}".format(i), None, WORKFLOW)
+            txn.create_processing_block(pblock)
+            txn.create_processing_block_state(pblock.id, {"state": "RUNNING"})
+        dpl = entity.Deployment("proc-pb-iter-0", "helm", {"chart": "test"})
+        txn.create_deployment(dpl)
+
+    for txn in cfg.txn():
+        pblocks = list(txn.iter_processing_blocks("pb-iter-", batch_size=2))
+        assert [pblock.id for pblock in pblocks] == [
+            "pb-iter-{}".format(i) for i in range(5)
+        ]
+        assert pblocks[3] == txn.get_processing_block("pb-iter-3")
+        assert list(txn.iter_deployments("proc-pb-iter-")) == [dpl]
@@ -0,0 +1,81 @@
+"""Tests for client-side rate limiting."""
+
+# pylint: disable=missing-docstring
+
+import time
+
+import pytest
+
+from ska_sdp_config import Config, ConfigTimeout
+from ska_sdp_config.backend.common import deadline_scope
+from ska_sdp_config.backend.ratelimit import RateLimiter, parse_rate_limits
+
+
+def test_rate_limiter():
+    assert parse_rate_limits("read=200, write=50,") == {"read": 200, "write": 50}
+    with pytest.raises(ValueError, match="priority"):
+        RateLimiter(priority="urgent")
+
+    limiter = RateLimiter(read=100, burst=0.1)
+    assert limiter.limits == {"read": 100}
+
+    # The burst is available right away, then requests get throttled
+    start = time.monotonic()
+    for _ in range(10):
+        assert limiter.acquire("read") == 0
+    assert limiter.acquire("watch") == 0
+    assert limiter.acquire("read") > 0
+    assert time.monotonic() - start >= 0.005
+
+    # Bulk requests leave half of the budget to others
+    time.sleep(0.1)
+    with limiter.priority_class("bulk"):
+        assert limiter.priority == "bulk"
+        waits = [limiter.acquire("read") for _ in range(6)]
+    assert waits[:5] == [0] * 5 and waits[5] > 0
+    assert limiter.priority == "control"
+    assert limiter.acquire("read") == 0
+
+    stats = limiter.stats()
+    assert stats["read"]["control"]["requests"] == 12
+    assert stats["read"]["control"]["throttled"] == 1
+    assert stats["read"]["bulk"] == {
+        "requests": 6,
+        "throttled": 1,
+        "throttled_seconds": pytest.approx(waits[5]),
+    }
+    assert stats["watch"]["control"]["throttled"] == 0
+
+    # Requests that would have to wait past the deadline fail right away
+    limiter = RateLimiter(write=1)
+    limiter.acquire("write")
+    start = time.monotonic()
+    with deadline_scope(time.time() + 0.5):
+        with pytest.raises(ConfigTimeout, match="write"):
+            limiter.acquire("write")
+    assert time.monotonic() - start < 0.1
+
+
+def test_config_rate_limits(tmp_path):
+    with pytest.raises(ValueError, match="rate limits"):
+        Config(backend="memory", rate_limits={"read": 10})
+
+    path = str(tmp_path / "config.db")
+    with Config(backend="sqlite", path=path) as config:
+        assert config.rate_limiter is None
+        with config.priority("bulk"):
+            pass
+
+    with Config(
+        backend="sqlite", path=path, rate_limits={"read": 1000, "write": 10}
+    ) as config:
+        assert config.rate_limiter.limits == {"read": 1000, "write": 10}
+        with config.priority("interactive"):
+            for i in range(15):
+                for txn in config.txn():
+                    txn.raw.create("/test/{}".format(i), "value")
+        stats = config.rate_limiter.stats()
+    assert stats["write"]["interactive"]["requests"] == 15
+    assert stats["write"]["interactive"]["throttled"] > 0
+    assert stats["read"]["interactive"]["requests"] >= 15
+    assert stats["write"]["control"]["requests"] == 0
@@ -0,0 +1,121 @@
+"""Tests for watch-fed replicas."""
+
+# pylint: disable=missing-docstring,redefined-outer-name,protected-access
+
+import json
+
+import pytest
+
+from ska_sdp_config import Config
+from ska_sdp_config.backend import MemoryBackend, SQLiteBackend
+from ska_sdp_config.replica import Replica
+from tests.test_backend_etcd3 import PREFIX
+
+# pylint: disable=unused-import
+from tests.test_backend_etcd3 import etcd3
+
+
+@pytest.fixture(params=["memory", "sqlite", "etcd3"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryBackend()
+    elif request.param == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "config.db"), poll_interval=0.005)
+    else:
+        backend = request.getfixturevalue("etcd3")
+    yield backend
+    backend.delete(PREFIX, must_exist=False, recursive=True)
+    if request.param == "sqlite":
+        backend.close()
+
+
+def _wait_for(replica, condition):
+    while not condition():
+        assert replica.wait(timeout=5)
+
+
+@pytest.mark.timeout(20)
+def test_current_revision(backend):
+    revision = backend.current_revision()
+    backend.create(PREFIX + "/key", "a")
+    after = backend.current_revision()
+    assert after.revision > revision.revision
+
+    # Reading at the revision sees the change
+    read_revision, items = backend.range_values(PREFIX + "/", revision=after)
+    assert read_revision.revision == after.revision
+    assert [(path, value) for path, value, _ in items] == [(PREFIX + "/key", "a")]
+
+
+@pytest.mark.timeout(20)
+def test_replica(backend):
+    backend.create(PREFIX + "/pb/pb-1", "a")
+    backend.create(PREFIX + "/pb/pb-1/state", "b")
+    backend.create(PREFIX + "/pb/pb-1/state/deep/deeper", "too deep")
+    backend.create(PREFIX + "/pbx", "outside")
+
+    with Replica(backend, PREFIX + "/pb/") as replica:
+        assert len(replica) == 2
+        assert replica.get(PREFIX + "/pb/pb-1") == "a"
+        assert replica.get(PREFIX + "/pbx") is None
+        assert replica.list_keys(PREFIX + "/pb/") == [PREFIX + "/pb/pb-1"]
+        assert replica.list_keys(PREFIX + "/pb/", recurse=1) == [
+            PREFIX + "/pb/pb-1",
+            PREFIX + "/pb/pb-1/state",
+        ]
+
+        # Changes get picked up
+        backend.create(PREFIX + "/pb/pb-2", "c")
+        backend.update(PREFIX + "/pb/pb-1/state", "d")
+        backend.delete(PREFIX + "/pb/pb-1")
+        _wait_for(replica, lambda: PREFIX + "/pb/pb-1" not in replica)
+        assert list(replica.items()) == [
+            (PREFIX + "/pb/pb-1/state", "d"),
+            (PREFIX + "/pb/pb-2", "c"),
+        ]
+        revision = replica.revision
+        assert not replica.wait(timeout=0.1)
+
+        # Listeners see the current contents first
+        changes = []
+        replica.add_listener(lambda path, value: changes.append((path, value)))
+        assert changes == list(replica.items())
+
+        # Cancelled watch: Changes get picked up by reading again
+        replica._stop_watches()
+        backend.create(PREFIX + "/pb/pb-3", "e")
+        replica._queue.put((None, None, None))
+        _wait_for(replica, lambda: PREFIX + "/pb/pb-3" in replica)
+        assert replica.revision > revision
+        assert len(replica) == 3
+        assert changes[-1] == (PREFIX + "/pb/pb-3", "e")
+
+    # Stopped, so no more updates
+    backend.delete(PREFIX + "/pb/pb-2")
+    assert replica.get(PREFIX + "/pb/pb-2") == "c"
+
+
+def test_config_replica():
+    with Config(backend="memory") as config:
+        for txn in config.txn():
+            txn.create_master({"state": "on"})
+        with config.replica("/master", max_depth=1) as replica:
+            revision = replica.revision
+            for txn in config.txn():
+                txn.update_master({"state": "off"})
+            assert replica.wait(revision, timeout=5)
+            assert json.loads(replica.get("/master")) == {"state": "off"}
+        config.backend.delete("/master")
+
+
+@pytest.mark.timeout(20)
+def test_replica_compacted(etcd3):
+    etcd3.create(PREFIX + "/cp/a", "1")
+    _, rev = etcd3.get(PREFIX + "/cp/a")
+    etcd3.update(PREFIX + "/cp/a", "2")
+    etcd3._client.compact(rev.revision + 1)
+
+    # Watching from a compacted revision cancels the watch
+    with etcd3.watch(PREFIX + "/cp/", prefix=True, revision=rev) as queue:
+        assert queue.get(timeout=5) == (None, None, None)
+    etcd3.delete(PREFIX + "/cp/a")
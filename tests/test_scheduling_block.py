@@ -46,6 +46,10 @@ def test_sb_list(cfg):
     for txn in cfg.txn():
         sb_ids = txn.list_scheduling_blocks()
         assert sb_ids == sorted([sb1_id, sb2_id])
+        assert list(txn.iter_scheduling_blocks(batch_size=1)) == [
+            (sb2_id, {}),
+            (sb1_id, {}),
+        ]
 
 
 def test_sb_create_update(cfg):
@@ -95,3 +99,47 @@ def test_sb_create_update(cfg):
 
 if __name__ == "__main__":
     pytest.main()
+
+
+def test_sb_with_pbs(cfg):
+
+    workflow = {"type": "realtime", "id": "test_rt_workflow", "version": "0.0.1"}
+    sbi_id = "sbi-with-pbs"
+    state = {"pb_realtime": ["pb-sbv-1"], "pb_batch": ["pb-sbv-2", "pb-sbv-3"]}
+
+    for txn in cfg.txn():
+        assert txn.get_scheduling_block_with_pbs(sbi_id) is None
+        txn.create_scheduling_block(sbi_id, state)
+        for pb_id in ["pb-sbv-1", "pb-sbv-2"]:
+            pblock = ska_sdp_config.ProcessingBlock(pb_id, sbi_id, workflow)
+            txn.create_processing_block(pblock)
+        txn.create_processing_block_state("pb-sbv-2", {"state": "WAITING"})
+
+    for txn in cfg.txn():
+        view = txn.get_scheduling_block_with_pbs(sbi_id)
+    assert view.id == sbi_id
+    assert view.state == state
+    assert list(view.processing_blocks) == ["pb-sbv-1", "pb-sbv-2"]
+    assert view.get("pb-sbv-1").processing_block.sbi_id == sbi_id
+    assert view.get("pb-sbv-1").state is None
+    assert view.get("pb-sbv-2").state == {"state": "WAITING"}
+    assert view.get("pb-sbv-3") is None
+
+    # Refreshing only replaces changed processing blocks
+    for txn in cfg.txn():
+        txn.update_processing_block_state("pb-sbv-2", {"state": "RUNNING"})
+    for txn in cfg.txn():
+        new_view = txn.refresh_scheduling_block_with_pbs(view)
+    assert new_view.get("pb-sbv-1") is view.get("pb-sbv-1")
+    assert new_view.get("pb-sbv-2").state == {"state": "RUNNING"}
+    assert new_view.get("pb-sbv-2").processing_block.id == "pb-sbv-2"
+
+    # Reads get validated on commit
+    for i, txn in enumerate(cfg.txn()):
+        view = txn.refresh_scheduling_block_with_pbs(new_view)
+        if i == 0:
+            for txn2 in cfg.txn():
+                txn2.update_processing_block_state("pb-sbv-2", {"state": "DONE"})
+        txn.update_scheduling_block(sbi_id, dict(state, status="seen"))
+    assert i == 1  # pylint: disable=undefined-loop-variable
+    assert view.get("pb-sbv-2").state == {"state": "DONE"}
@@ -0,0 +1,70 @@
+"""Tests for sharded ownership of processing blocks."""
+
+# pylint: disable=missing-docstring
+
+from ska_sdp_config import Config, ProcessingBlock
+from ska_sdp_config.sharding import HashRing
+
+PREFIX = "/__test_shard"
+WORKFLOW = {"type": "batch", "id": "test_batch", "version": "0.0.1"}
+
+
+def test_hash_ring():
+    keys = ["pb-test-{:04d}".format(i) for i in range(1000)]
+    assert HashRing().owner("pb-x") is None
+
+    ring = HashRing(["a", "b", "c", "d"])
+    assert ring.members == ["a", "b", "c", "d"]
+    before = {key: ring.owner(key) for key in keys}
+    counts = [list(before.values()).count(member) for member in ring.members]
+    assert min(counts) > 150
+
+    # Only keys of the removed member move
+    ring.remove("c")
+    after = {key: ring.owner(key) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert moved and all(before[key] == "c" for key in moved)
+
+    ring.add("c")
+    assert {key: ring.owner(key) for key in keys} == before
+
+
+def test_shard_claim():
+    with Config(backend="memory", global_prefix=PREFIX) as config:
+        pb_ids = ["pb-shard-{:02d}".format(i) for i in range(20)]
+        for txn in config.txn():
+            for pb_id in pb_ids:
+                txn.create_processing_block(ProcessingBlock(pb_id, None, WORKFLOW))
+
+        member_a = config.shard_membership("test", member_id="a")
+        member_b = config.shard_membership("test", member_id="b")
+        with config.lease() as lease_a:
+            member_a.join(lease_a)
+            with config.lease() as lease_b:
+                member_b.join(lease_b)
+                for txn in config.txn():
+                    assert member_a.members(txn) == ["a", "b"]
+                    shard_a = member_a.shard(txn)
+                    shard_b = member_b.shard(txn)
+                    assert member_a.owns(txn, shard_a[0])
+                    assert not member_b.owns(txn, shard_a[0])
+                assert shard_a and shard_b
+                assert sorted(shard_a + shard_b) == pb_ids
+
+                # Members only take their own shard
+                for txn in config.txn():
+                    assert member_a.claim(txn, lease_a) == shard_a
+                    assert member_a.claim(txn, lease_a) == []
+                for txn in config.txn():
+                    owners = txn.get_all_processing_block_owners()
+                assert sorted(owners) == shard_a
+
+            # Once b's lease is gone, its processing blocks move to a
+            for txn in config.txn():
+                assert member_a.members(txn) == ["a"]
+                assert member_a.claim(txn, lease_a) == shard_b
+            member_a.leave()
+            for txn in config.txn():
+                assert member_a.members(txn) == []
+
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
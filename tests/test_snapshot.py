@@ -0,0 +1,122 @@
+"""Tests for snapshot export and import."""
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+import io
+import json
+
+import pytest
+
+from ska_sdp_config import Config, ConfigCollision
+from ska_sdp_config.snapshot import read_snapshot, write_snapshot
+
+PREFIX = "/__test_snapshot"
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    with Config(backend="sqlite", path=str(tmp_path / "config.db")) as config:
+        yield config
+
+
+def _fill(config, count):
+    for txn in config.txn():
+        for i in range(count):
+            txn.raw.create("{}/pb/pb-{:04d}".format(PREFIX, i), json.dumps({"i": i}))
+            txn.raw.create("{}/pb/pb-{:04d}/state".format(PREFIX, i), "{}")
+        txn.raw.create(PREFIX + "x", "other")
+
+
+def test_format():
+    stream = io.StringIO()
+    items = [("/a", "1", 2), ("/a/b", "ä", 3)]
+    assert write_snapshot(stream, 5, iter(items)) == 2
+
+    stream.seek(0)
+    header, records = read_snapshot(stream)
+    assert header["revision"] == 5
+    assert list(records) == items
+
+    # Truncated file
+    truncated = io.StringIO("\n".join(stream.getvalue().split("\n")[:2]))
+    _, records = read_snapshot(truncated)
+    with pytest.raises(ValueError, match="truncated"):
+        list(records)
+
+    with pytest.raises(ValueError, match="Not a configuration snapshot"):
+        read_snapshot(io.StringIO('{"foo": 1}\n'))
+
+
+def test_snapshot_restore(cfg, tmp_path, monkeypatch):
+    _fill(cfg, 250)
+
+    stream = io.StringIO()
+    revision = cfg.snapshot(stream, PREFIX + "/", batch_size=7)
+    fill_revision = cfg.backend.get(PREFIX + "/pb/pb-0000")[1].revision
+    assert revision == fill_revision
+
+    stream.seek(0)
+    header, records = read_snapshot(stream)
+    assert header["prefix"] == PREFIX + "/"
+    keys = [path for path, _, _ in records]
+    assert len(keys) == 500
+    assert PREFIX + "x" not in keys
+
+    # Changes made while reading must not be included
+    _, items = cfg.backend.range_values(PREFIX + "/", batch_size=7)
+    assert next(items)[0] == PREFIX + "/pb/pb-0000"
+    for txn in cfg.txn():
+        txn.raw.create(PREFIX + "/pb/late", "{}")
+    assert len(list(items)) == 499
+
+    # Restore into a fresh database, without reading keys first
+    with Config(backend="sqlite", path=str(tmp_path / "other.db")) as other:
+        requests = []
+        monkeypatch.setattr(other.backend, "throttle", requests.append)
+        stream.seek(0)
+        assert other.restore(stream, batch_size=64) == 500
+        assert "read" not in requests
+        monkeypatch.undo()
+        for txn in other.txn():
+            assert txn.raw.get(PREFIX + "/pb/pb-0123") == '{"i": 123}'
+            assert len(txn.raw.list_keys(PREFIX + "/pb/")) == 250
+
+        # Restoring again collides, unless we overwrite
+        stream.seek(0)
+        with pytest.raises(ConfigCollision):
+            other.restore(stream)
+        stream.seek(0)
+        assert other.restore(stream, overwrite=True) == 500
+
+
+@pytest.mark.parametrize("backend", ["memory", "shm", "sqlite"])
+def test_snapshot_deep(backend, tmp_path):
+    kwargs = {} if backend == "memory" else {"path": str(tmp_path / "config")}
+    with Config(backend=backend, **kwargs) as cfg:
+        deep = PREFIX + "/deep" + 30 * "/x"
+        for txn in cfg.txn():
+            txn.raw.create(PREFIX + "/deep", "top")
+            txn.raw.create(deep, "bottom")
+        stream = io.StringIO()
+        cfg.snapshot(stream, PREFIX + "/")
+        cfg.backend.delete(deep)
+        cfg.backend.delete(PREFIX + "/deep")
+
+    stream.seek(0)
+    _, records = read_snapshot(stream)
+    assert [path for path, _, _ in records] == [PREFIX + "/deep", deep]
+
+
+def test_snapshot_memory():
+    with Config(backend="memory") as cfg:
+        _fill(cfg, 10)
+        stream = io.StringIO()
+        cfg.snapshot(stream, PREFIX + "/")
+        cfg.backend.delete(PREFIX, must_exist=False, recursive=True)
+
+        stream.seek(0)
+        assert cfg.restore(stream) == 20
+        for txn in cfg.txn():
+            assert txn.raw.get(PREFIX + "/pb/pb-0003/state") == "{}"
+        cfg.backend.delete(PREFIX, must_exist=False, recursive=True)
+        cfg.backend.delete(PREFIX + "x", must_exist=False)
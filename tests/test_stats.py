@@ -0,0 +1,108 @@
+"""Tests for keyspace statistics."""
+
+# pylint: disable=missing-docstring,redefined-outer-name
+
+import json
+
+import pytest
+
+from ska_sdp_config import Config
+from ska_sdp_config.stats import MAX_GROUPS, KeyspaceStats, SizeDistribution
+
+PREFIX = "/__test_stats"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cfg(request, tmp_path):
+    cargs = {}
+    if request.param == "sqlite":
+        cargs = {"path": str(tmp_path / "config.db")}
+    with Config(backend=request.param, global_prefix=PREFIX, **cargs) as config:
+        yield config
+
+
+def test_size_distribution():
+    sizes = SizeDistribution()
+    for size in range(1, 1001):
+        sizes.add(size)
+    assert sizes.count == 1000
+    assert sizes.total == 500500
+    assert sizes.max == 1000
+    # Percentiles are upper bounds, accurate to a bucket
+    assert 500 <= sizes.percentile(50) <= 500 * 1.1
+    assert 990 <= sizes.percentile(99) <= 1000
+    assert sizes.percentile(100) == 1000
+    assert SizeDistribution().summary() == {
+        "count": 0,
+        "total": 0,
+        "p50": 0,
+        "p90": 0,
+        "p99": 0,
+        "max": 0,
+    }
+
+
+def test_keyspace_stats():
+    stats = KeyspaceStats("/", revision=9, top=2)
+    stats.add_all(
+        [
+            ("/master", "x" * 10, 3),
+            ("/pb/pb-1", "x" * 100, 5),
+            ("/pb/pb-1/state", "x" * 20, 8),
+            ("/pb/pb-2", "ä" * 60, 4),
+        ]
+    )
+    assert stats.largest == [("/pb/pb-2", 120), ("/pb/pb-1", 100)]
+    summary = json.loads(json.dumps(stats.summary()))
+    assert summary["revision"] == 9
+    assert summary["keys"]["count"] == 4
+    assert summary["keys"]["total"] == 250
+    assert sorted(summary["groups"]) == ["/master", "/pb"]
+    assert summary["groups"]["/pb"]["2"]["count"] == 2
+    assert summary["groups"]["/pb"]["2"]["max"] == 120
+    assert summary["groups"]["/pb"]["3"]["total"] == 20
+    assert summary["oldest"] == {"revision": 3, "path": "/master"}
+    assert summary["newest"] == {"revision": 8, "path": "/pb/pb-1/state"}
+
+    lines = stats.format().splitlines()
+    assert lines[0].split() == ["prefix", "depth", "keys", "bytes"] + [
+        "p50",
+        "p90",
+        "p99",
+        "max",
+    ]
+    assert lines[1].split()[:4] == ["/master", "1", "1", "10"]
+    assert lines[4].split()[:3] == ["total", "4", "250"]
+    assert "Oldest revision: 3 (/master)" in lines
+
+
+def test_config_stats(cfg):
+    for txn in cfg.txn():
+        for i in range(50):
+            txn.raw.create("{}/pb/pb-{:04d}".format(PREFIX, i), "x" * i)
+        txn.raw.create(PREFIX + "/master", "{}")
+
+    stats = cfg.stats(batch_size=7, top=3)
+    summary = stats.summary()
+    assert summary["prefix"] == PREFIX + "/"
+    assert summary["keys"]["count"] == 51
+    assert summary["groups"][PREFIX + "/pb"]["3"]["count"] == 50
+    assert [path for path, _ in stats.largest] == [
+        "{}/pb/pb-{:04d}".format(PREFIX, i) for i in (49, 48, 47)
+    ]
+
+    # Groups stay the top-level paths for a prefix below them
+    stats = cfg.stats(PREFIX + "/pb/", top=0)
+    assert stats.sizes.count == 50
+    assert list(stats.summary()["groups"]) == [PREFIX + "/pb"]
+    assert stats.largest == []
+
+
+def test_keyspace_stats_groups():
+    stats = KeyspaceStats("/pb/")
+    stats.add_all(("/pb/pb-{:04d}".format(i), "x", None) for i in range(MAX_GROUPS + 5))
+    stats.add("/elsewhere", "x", None)
+    groups = stats.summary()["groups"]
+    assert len(groups) == MAX_GROUPS + 1
+    assert groups["other"]["2"]["count"] == 5
+    assert groups["other"]["1"]["count"] == 1
@@ -0,0 +1,138 @@
+"""Tests for tracing transactions."""
+
+# pylint: disable=missing-docstring
+
+import io
+import json
+import os
+
+from ska_sdp_config import Config
+from ska_sdp_config.entity import ProcessingBlock
+from ska_sdp_config.backend.tracing import Tracer, close_tracers
+
+PREFIX = "/__test_tracing"
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_tracer():
+    stream = io.StringIO()
+    tracer = Tracer(stream, "chrome")
+    with tracer.span("outer", path="/a") as outer:
+        outer["size"] = 3
+        with tracer.span("inner"):
+            tracer.annotate(bytes=10)
+    tracer.close()
+
+    inner, outer = json.loads(stream.getvalue())
+    assert outer["name"] == "outer" and outer["ph"] == "X"
+    assert outer["args"]["path"] == "/a" and outer["args"]["size"] == 3
+    assert inner["args"]["parent_id"] == outer["args"]["span_id"]
+    assert inner["args"]["bytes"] == 10
+    assert outer["ts"] <= inner["ts"]
+    assert inner["dur"] <= outer["dur"]
+
+
+def test_trace_local(tmp_path, monkeypatch):
+    path = str(tmp_path / "trace-{pid}.jsonl")
+    monkeypatch.setenv("SDP_CONFIG_TRACE", path)
+    with Config(backend="sqlite", path=str(tmp_path / "config.db")) as config:
+        assert config.tracer is not None
+        for txn in config.txn():
+            txn.create_master({"state": "on"})
+
+        # Conflicting transaction gets retried
+        for i, txn in enumerate(config.txn()):
+            txn.get_master()
+            if i == 0:
+                config.backend.update("/master", '{"state": "off"}')
+            txn.update_master({"state": "standby"})
+        for i, watcher in enumerate(config.watcher(timeout=0.01)):
+            for txn in watcher.txn():
+                txn.get_master()
+            if i == 1:
+                break
+
+    # Configurations tracing to the same file share the tracer
+    with Config(backend="sqlite", path=str(tmp_path / "config.db")) as config:
+        for txn in config.txn():
+            txn.get_master()
+
+    spans = _read_jsonl(path.format(pid=os.getpid()))
+    by_id = {span["span_id"]: span for span in spans}
+    assert len(by_id) == len(spans)
+    txns = [span for span in spans if span["name"] == "txn"]
+    commits = [span for span in spans if span["name"] == "commit"]
+    assert any(span["args"]["attempt"] == 1 for span in txns)
+    assert [span["args"]["committed"] for span in commits].count(False) == 1
+    for span in spans:
+        if span["name"] in ("get", "commit"):
+            assert by_id[span["parent_id"]]["name"] == "txn"
+    decodes = [span for span in spans if span["name"] == "decode"]
+    assert decodes and decodes[0]["args"]["path"] == "/master"
+    assert by_id[decodes[0]["parent_id"]]["name"] == "txn"
+    watches = [span for span in spans if span["name"] == "watch"]
+    assert watches[0]["args"] == {"keys": 1, "ranges": 0, "timeout": True}
+
+    # Backends without tracing still trace decoding
+    stream = io.StringIO()
+    with Config(backend="memory", trace=Tracer(stream)) as config:
+        for txn in config.txn():
+            txn.create_master({"state": "on"})
+        for txn in config.txn():
+            txn.get_master()
+    assert [json.loads(line)["name"] for line in stream.getvalue().splitlines()] == [
+        "decode"
+    ]
+
+
+def test_trace_pb_view(tmp_path):
+    stream = io.StringIO()
+    workflow = {"type": "batch", "id": "test", "version": "0.0.1"}
+    path = str(tmp_path / "config.db")
+    with Config(backend="sqlite", path=path, trace=Tracer(stream)) as config:
+        for txn in config.txn():
+            txn.create_processing_block(ProcessingBlock("pb-trace", None, workflow))
+            txn.create_processing_block_state("pb-trace", {"state": "RUNNING"})
+        for txn in config.txn():
+            view = txn.get_processing_block_view("pb-trace")
+
+        # Documents get decoded (and traced) when accessed
+        assert view.state == {"state": "RUNNING"}
+        assert view.processing_block.id == "pb-trace"
+        assert view.owner is None
+
+    spans = [json.loads(line) for line in stream.getvalue().splitlines()]
+    decodes = [span["args"]["path"] for span in spans if span["name"] == "decode"]
+    assert decodes[-2:] == ["/pb/pb-trace/state", "/pb/pb-trace"]
+
+
+def test_trace_etcd3(tmp_path):
+    path = str(tmp_path / "trace.json")
+    host = os.getenv("SDP_TEST_HOST", "127.0.0.1")
+    with Config(backend="etcd3", global_prefix=PREFIX, host=host, trace=path) as config:
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+        for txn in config.txn():
+            txn.create_master({"state": "on"})
+        for txn in config.txn():
+            txn.get_master()
+        config.backend.delete(PREFIX, must_exist=False, recursive=True)
+
+    close_tracers()
+    with open(path, encoding="utf-8") as file:
+        events = json.load(file)
+    by_id = {event["args"]["span_id"]: event for event in events}
+    rpcs = [event for event in events if event["name"] == "rpc"]
+    assert {"/kv/range", "/kv/txn"} <= {event["args"]["method"] for event in rpcs}
+    for event in rpcs:
+        assert event["args"]["request_bytes"] > 0
+    gets = [event for event in events if event["name"] == "get"]
+    assert gets[0]["args"]["path"] == PREFIX + "/master"
+    assert by_id[gets[0]["args"]["parent_id"]]["name"] == "txn"
+    child_rpcs = [event for event in rpcs if event["args"]["parent_id"] in by_id]
+    assert any(
+        by_id[event["args"]["parent_id"]]["name"] == "get" for event in child_rpcs
+    )
@@ -46,6 +46,9 @@ def test_workflow_list_all(cfg):
             assert w_type == workflow_type
             assert w_id == workflow_id
             assert w_version == workflow_version
+        assert list(txn.iter_workflows()) == [
+            ((workflow_type, workflow_id, workflow_version), workflow)
+        ]
 
 
 def test_workflow_list_type(cfg):